@@ -1,13 +1,25 @@
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
-from backend.api import router
+from contextlib import asynccontextmanager
+from backend.api import router, start_warm_up
+from backend.middleware import RequestSizeLimitMiddleware
+from backend.config import MAX_REQUEST_BYTES, MODEL_WARMUP
 import logging
 import traceback
 
 logging.basicConfig(level=logging.DEBUG)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MODEL_WARMUP:
+        start_warm_up()  # /readyz turns 200 once the models are in
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
 
 # Include the API router
 app.include_router(router)
@@ -1,223 +1,351 @@
 import os
+import asyncio
 import logging
-import pytesseract
-from fastapi import APIRouter, HTTPException, File, UploadFile, Form
+import uuid
+import hashlib
+import json
+import shutil
+import threading
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List
 import traceback
-from models.qa_pipeline import QAPipeline
-from backend.config import UPLOAD_DIR
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    Docx2txtLoader,
-    UnstructuredPowerPointLoader,
-    UnstructuredExcelLoader,
-    CSVLoader,
-    JSONLoader,
-    TextLoader,
-    UnstructuredImageLoader,
-    WebBaseLoader,
+from models.qa_pipeline import QAPipeline, default_embeddings, default_llm
+from models.chunk_store import SLOT_BYTES
+from models.collection_manager import CollectionManager
+from models.embedding_cache import EmbeddingCache
+from models.answer_cache import SemanticAnswerCache
+from models.reranker import CrossEncoderReranker
+from models.context_builder import ContextBuilder, HuggingFaceTokenCounter
+from models.model_registry import MODELS
+from backend.parsing import PARSERS, ParserPool, table_directory
+from backend.ingestion import IngestionQueue, JobStore, SavedUpload
+from backend.config import (
+    UPLOAD_DIR,
+    INDEX_DIR,
+    COLLECTIONS_DIR,
+    DEFAULT_COLLECTION,
+    RESIDENT_COLLECTIONS_MAX_BYTES,
+    COLLECTION_MAX_BYTES,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_BYTES,
+    PARSE_WORKERS,
+    PARSE_TIMEOUT_SECONDS,
+    INGEST_WORKERS,
+    UPLOAD_CHUNK_BYTES,
+    MAX_FILE_BYTES,
+    MAX_REQUEST_BYTES,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_MAX_ENTRIES,
+    QUERY_BATCH_WINDOW_MS,
+    QUERY_BATCH_MAX_SIZE,
+    INDEX_BACKEND,
+    INDEX_NPROBE,
+    INDEX_EF_SEARCH,
+    INDEX_VECTOR_DTYPE,
+    INDEX_SHARED,
+    JOBS_PATH,
+    RETRIEVAL_K,
+    RERANKER_MODEL,
+    RERANK_CANDIDATES,
+    RERANK_TOP_K,
+    RERANK_BATCH_SIZE,
+    RERANK_BUDGET_MS,
+    RERANK_CACHE_ENTRIES,
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_MMR_LAMBDA,
+    CONTEXT_TOKENIZER,
+    CONTEXT_TOKEN_HEADROOM,
+    MODEL_WARMUP,
 )
-from unstructured.partition.auto import partition  # Direct unstructured import
-
-# Set Tesseract path for Windows
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
 router = APIRouter()
-qa_pipeline = QAPipeline()
+# Models and the content-addressed embedding cache are shared; everything else is per collection.
+# The models are handles into MODELS: nothing is loaded until warm_up or first use.
+embeddings = default_embeddings()
+llm = default_llm()
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_BYTES)
+# Loads its model on the first reranked query
+reranker = CrossEncoderReranker(
+    RERANKER_MODEL,
+    batch_size=RERANK_BATCH_SIZE,
+    budget_seconds=RERANK_BUDGET_MS / 1000,
+    cache_entries=RERANK_CACHE_ENTRIES,
+) if RERANKER_MODEL else None
+token_counter = HuggingFaceTokenCounter(CONTEXT_TOKENIZER)
+# Warmed up with the required models, but queries work without them
+if reranker is not None:
+    MODELS.register("reranker", reranker.load, required=False)
+MODELS.register("tokenizer", token_counter.load, required=False)
+
+
+def start_warm_up():
+    """Load every model in a background thread, so the server accepts requests (and /healthz) meanwhile."""
+    threading.Thread(target=MODELS.warm_up, name="model-warm-up", daemon=True).start()
+
+
+def open_collection(name, directory):
+    return QAPipeline(
+        embeddings=embeddings,
+        llm=llm,
+        index_dir=directory,
+        embedding_cache=embedding_cache,
+        answer_cache=SemanticAnswerCache(
+            threshold=ANSWER_CACHE_THRESHOLD,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+            max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        ),
+        query_batch_window=QUERY_BATCH_WINDOW_MS / 1000,
+        query_batch_size=QUERY_BATCH_MAX_SIZE,
+        index_options={"backend": INDEX_BACKEND, "nprobe": INDEX_NPROBE, "ef_search": INDEX_EF_SEARCH,
+                       "vector_dtype": INDEX_VECTOR_DTYPE},
+        retrieval_k=RETRIEVAL_K,
+        reranker=reranker,
+        rerank_candidates=RERANK_CANDIDATES,
+        rerank_top_k=RERANK_TOP_K,
+        context_builder=ContextBuilder(
+            max_tokens=CONTEXT_MAX_TOKENS,
+            mmr_lambda=CONTEXT_MMR_LAMBDA,
+            count_tokens=token_counter,
+            token_headroom=CONTEXT_TOKEN_HEADROOM,
+        ),
+        shared_index=INDEX_SHARED,
+    )
+
+
+collections = CollectionManager(
+    COLLECTIONS_DIR,
+    open_collection,
+    max_resident_bytes=RESIDENT_COLLECTIONS_MAX_BYTES,
+    collection_max_bytes=COLLECTION_MAX_BYTES,
+)
+collections.adopt(DEFAULT_COLLECTION, INDEX_DIR)  # The single index from before collections existed
+parser_pool = ParserPool(max_workers=PARSE_WORKERS, timeout=PARSE_TIMEOUT_SECONDS)
+
 
+class UploadBatch:
+    """Per-request upload state: remaining byte budget and the content hashes seen so far."""
 
-async def parse_file(file: UploadFile):
-    """Parse uploaded file based on its extension."""
+    def __init__(self, max_bytes):
+        self.remaining_bytes = max_bytes
+        self.seen_hashes = {}  # SHA-256 -> filename
+        self.duplicates = []
+
+
+def collection_name(collection: str = DEFAULT_COLLECTION):
+    """Route dependency: the collection from the path (or query string), validated."""
+    try:
+        CollectionManager.validate(collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+    return collection
+
+
+async def save_upload(file: UploadFile, file_path, batch: UploadBatch):
+    """Copy an upload to disk in fixed-size chunks, enforcing size limits and hashing on the fly.
+
+    Starlette has already spooled the body by the time this runs; the request as
+    a whole is capped while it is received by RequestSizeLimitMiddleware, so the
+    per-file limit here only ever applies to a bounded amount of buffered data.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            batch.remaining_bytes -= len(chunk)
+            if size > MAX_FILE_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail={"error": f"{file.filename} exceeds the {MAX_FILE_BYTES} byte per-file limit"}
+                )
+            if batch.remaining_bytes < 0:
+                raise HTTPException(
+                    status_code=413,
+                    detail={"error": f"Upload exceeds the {MAX_REQUEST_BYTES} byte per-request limit"}
+                )
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)  # Keep disk I/O off the event loop
+    return digest.hexdigest()
+
+
+async def receive_file(file: UploadFile, batch: UploadBatch, collection, pipeline: QAPipeline):
+    """Save an uploaded file and return it as a SavedUpload, or None if its content is a duplicate."""
     filename = file.filename
-    file_ext = os.path.splitext(filename)[1].lower()
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    # Unique on-disk name so concurrent uploads of the same filename never clash
+    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{filename}")
 
-    # Save file to disk
     try:
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-    except Exception as e:
+        content_hash = await save_upload(file, file_path, batch)
+    except BaseException as e:
+        remove_upload(file_path)
+        if isinstance(e, HTTPException) or not isinstance(e, Exception):
+            raise
         logging.error(f"Error saving file {filename}: {str(e)}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail={"error": f"Error saving file: {str(e)}"})
 
-    logging.debug(f"Starting to parse file: {filename} with extension: {file_ext}")
-    text = ""
-
+    duplicate_of = (
+        batch.seen_hashes.get(content_hash)
+        or pipeline.find_duplicate(content_hash)
+        or ingestion_queue.find_pending(content_hash, collection)
+    )
+    if duplicate_of:
+        logging.warning(f"Skipping {filename}: same content as {duplicate_of}")
+        batch.duplicates.append(filename)
+        remove_upload(file_path)
+        return None
+    batch.seen_hashes[content_hash] = filename
+    return SavedUpload(file_path, filename, content_hash, collection)
+
+
+def remove_upload(file_path):
     try:
-        if file_ext == ".pdf":
-            try:
-                loader = PyPDFLoader(file_path)
-                docs = loader.load()
-                text = "\n".join([doc.page_content for doc in docs])
-                logging.debug(f"PyPDFLoader extracted text from {filename}: {len(text)} characters")
-            except Exception as e:
-                logging.debug(f"PyPDFLoader failed for {filename}: {str(e)}")
-                with pdfplumber.open(file_path) as pdf:
-                    text = "\n".join([page.extract_text() or "" for page in pdf.pages])
-                logging.debug(f"pdfplumber extracted text from {filename}: {len(text)} characters")
-
-        elif file_ext == ".docx":
-            try:
-                loader = Docx2txtLoader(file_path)
-                docs = loader.load()
-                text = "\n".join([doc.page_content for doc in docs])
-                logging.debug(f"Docx2txtLoader extracted text from {filename}: {len(text)} characters")
-            except Exception as e:
-                logging.debug(f"Docx2txtLoader failed for {filename}: {str(e)}")
-                elements = partition(filename=file_path)
-                text = "\n".join([str(el) for el in elements])
-                logging.debug(f"Unstructured partition extracted text from {filename}: {len(text)} characters")
-
-        elif file_ext == ".pptx":
-            try:
-                loader = UnstructuredPowerPointLoader(file_path)
-                docs = loader.load()
-                text = "\n".join([doc.page_content for doc in docs])
-                logging.debug(f"UnstructuredPowerPointLoader extracted text from {filename}: {len(text)} characters")
-            except Exception as e:
-                logging.debug(f"UnstructuredPowerPointLoader failed for {filename}: {str(e)}")
-                elements = partition(filename=file_path)
-                text = "\n".join([str(el) for el in elements])
-                logging.debug(f"Unstructured partition extracted text from {filename}: {len(text)} characters")
-
-        elif file_ext in [".xlsx", ".xls"]:
-            try:
-                loader = UnstructuredExcelLoader(file_path)
-                docs = loader.load()
-                text = "\n".join([doc.page_content for doc in docs])
-                logging.debug(f"UnstructuredExcelLoader extracted text from {filename}: {len(text)} characters")
-            except Exception as e:
-                logging.debug(f"UnstructuredExcelLoader failed for {filename}: {str(e)}")
-                elements = partition(filename=file_path)
-                text = "\n".join([str(el) for el in elements])
-                logging.debug(f"Unstructured partition extracted text from {filename}: {len(text)} characters")
-
-        elif file_ext == ".csv":
-            try:
-                loader = CSVLoader(file_path)
-                docs = loader.load()
-                text = "\n".join([doc.page_content for doc in docs])
-                logging.debug(f"CSVLoader extracted text from {filename}: {len(text)} characters")
-            except Exception as e:
-                logging.debug(f"CSVLoader failed for {filename}: {str(e)}")
-                elements = partition(filename=file_path)
-                text = "\n".join([str(el) for el in elements])
-                logging.debug(f"Unstructured partition extracted text from {filename}: {len(text)} characters")
-
-        elif file_ext == ".json":
-            try:
-                loader = JSONLoader(file_path, jq_schema=".", text_content=False)
-                docs = loader.load()
-                text = "\n".join([doc.page_content for doc in docs])
-                logging.debug(f"JSONLoader extracted text from {filename}: {len(text)} characters")
-            except Exception as e:
-                logging.debug(f"JSONLoader failed for {filename}: {str(e)}")
-                elements = partition(filename=file_path)
-                text = "\n".join([str(el) for el in elements])
-                logging.debug(f"Unstructured partition extracted text from {filename}: {len(text)} characters")
-
-        elif file_ext == ".txt":
-            try:
-                loader = TextLoader(file_path)
-                docs = loader.load()
-                text = "\n".join([doc.page_content for doc in docs])
-                logging.debug(f"TextLoader extracted text from {filename}: {len(text)} characters")
-            except Exception as e:
-                logging.debug(f"TextLoader failed for {filename}: {str(e)}")
-                elements = partition(filename=file_path)
-                text = "\n".join([str(el) for el in elements])
-                logging.debug(f"Unstructured partition extracted text from {filename}: {len(text)} characters")
-
-        elif file_ext in [".png", ".jpg", ".jpeg"]:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            logging.debug(f"Deleted temporary file: {file_path}")
+        shutil.rmtree(table_directory(file_path), ignore_errors=True)  # Left behind if the upload was not indexed
+    except Exception as e:
+        logging.error(f"Error deleting temporary file {file_path}: {str(e)}")
+
+
+INDEX_BATCH_CHUNKS = 64  # Chunks embedded and made searchable together
+
+
+async def index_batch(entry, upload: SavedUpload, pipeline: QAPipeline, chunks):
+    """Embed and index chunks of a streamed upload; False if its filename turned out to be taken."""
+    filename = upload.filename
+    for start in range(0, len(chunks), INDEX_BATCH_CHUNKS):
+        batch = chunks[start:start + INDEX_BATCH_CHUNKS]
+        if not entry["chunks"] and not await asyncio.to_thread(pipeline.begin_document, filename, upload.content_hash):
+            return False
+        entry["chunks"] += len(batch)
+        entry["stage"] = "embedding"
+        embedded = entry["embedded_chunks"]
+        vectors = await asyncio.to_thread(
+            pipeline.embed_chunks, batch, lambda count: entry.__setitem__("embedded_chunks", embedded + count)
+        )
+
+        # Indexing (with its fsync'd log append and any compaction) runs on a thread; the pipeline's write lock
+        # serialises it with other writes, and queries keep reading the version published before it
+        entry["stage"] = "indexing"
+        added_bytes = vectors.nbytes + len(vectors) * (8 + SLOT_BYTES) + sum(len(chunk) for chunk in batch)
+        collections.check_budget(upload.collection, pipeline, added_bytes)
+        await asyncio.to_thread(pipeline.add_chunks, filename, batch, vectors)
+    return True
+
+
+async def ingest_file(entry, upload: SavedUpload):
+    """Parse, split, embed and index one saved upload, recording the current stage in ``entry``.
+
+    The parser streams pages or sections; every completed batch of chunks is
+    embedded and indexed right away, so the first pages are searchable while
+    later ones are still being parsed, and memory is bounded by the batch
+    rather than the file. The document is listed once its last batch is in.
+    """
+    filename = upload.filename
+    sections = parser_pool.stream(upload.file_path, filename)
+    try:
+        with collections.use(upload.collection) as pipeline:
+            splitter = pipeline.streaming_splitter()
             try:
-                loader = UnstructuredImageLoader(file_path)
-                docs = loader.load()
-                text = "\n".join([doc.page_content for doc in docs])
-                logging.debug(f"UnstructuredImageLoader extracted text from {filename}: {len(text)} characters")
-            except Exception as e:
-                logging.debug(f"UnstructuredImageLoader failed for {filename}: {str(e)}")
-                elements = partition(filename=file_path)
-                text = "\n".join([str(el) for el in elements])
-                logging.debug(f"Unstructured partition extracted text from {filename}: {len(text)} characters")
-
-        else:
-            elements = partition(filename=file_path)
-            text = "\n".join([str(el) for el in elements])
-            logging.debug(f"Unstructured partition extracted text from {filename}: {len(text)} characters")
-
-        if not text.strip():
-            logging.warning(f"No text extracted from {filename}")
-            return None, None
-
-        logging.debug(f"Finished parsing {filename} with {len(text)} characters")
-        return text, filename
-
+                entry["stage"] = "parsing"
+                indexed = True
+                async for section in sections:
+                    entry["sections"] += 1
+                    entry["stage"] = "splitting"
+                    indexed = await index_batch(entry, upload, pipeline, await asyncio.to_thread(splitter.feed, section))
+                    if not indexed:
+                        break
+                    entry["stage"] = "parsing"
+                if indexed:
+                    indexed = await index_batch(entry, upload, pipeline, await asyncio.to_thread(splitter.flush))
+            except BaseException:
+                await asyncio.to_thread(pipeline.abort_document, filename)
+                raise
+            if not indexed:
+                entry["stage"] = "skipped"
+                entry["error"] = "A document with this filename is already indexed"
+            elif not entry["chunks"]:
+                logging.warning(f"No text extracted from {filename}")
+                entry["stage"] = "skipped"
+                entry["error"] = "No text extracted"
+            else:
+                if os.path.isdir(table_directory(upload.file_path)):
+                    await asyncio.to_thread(pipeline.add_table, filename, table_directory(upload.file_path))
+                await asyncio.to_thread(pipeline.finish_document, filename)
+                entry["stage"] = "done"
+                logging.debug(f"Indexed {filename} with {entry['chunks']} chunks into collection {upload.collection}")
+    except asyncio.TimeoutError:
+        logging.error(f"Parsing {filename} exceeded {parser_pool.timeout}s; skipping file")
+        entry["stage"] = "failed"
+        entry["error"] = f"Parsing exceeded {parser_pool.timeout}s"
     finally:
-        # Clean up file from disk
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logging.debug(f"Deleted temporary file: {file_path}")
-        except Exception as e:
-            logging.error(f"Error deleting temporary file {file_path}: {str(e)}")
+        await sections.aclose()
+        remove_upload(upload.file_path)
+
 
+ingestion_queue = IngestionQueue(ingest_file, workers=INGEST_WORKERS, store=JobStore(JOBS_PATH) if JOBS_PATH else None)
 
-@router.post("/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
-    """Upload and index multiple files."""
-    texts = []
-    filenames = []
 
+@router.post("/upload", status_code=202)
+@router.post("/collections/{collection}/upload", status_code=202)
+async def upload_files(files: List[UploadFile] = File(...), collection: str = Depends(collection_name)):
+    """Accept files for indexing into a collection and return the ID of the background job that ingests them."""
     if not files:
         logging.error("No files uploaded")
         raise HTTPException(status_code=400, detail={"error": "No files uploaded"})
 
-    if len(files) > 10:
-        logging.error(f"Too many files uploaded: {len(files)}. Maximum is 10.")
-        raise HTTPException(status_code=400, detail={"error": f"Too many files uploaded. Maximum is 10."})
-
     try:
-        current_count = qa_pipeline.get_document_count()
-        if current_count + len(files) > 10:
-            logging.error(
-                f"Upload would exceed maximum of 10 documents. Current: {current_count}, Attempted: {len(files)}")
+        with collections.use(collection) as pipeline:
+            batch = UploadBatch(MAX_REQUEST_BYTES)
+            tasks = [asyncio.ensure_future(receive_file(file, batch, collection, pipeline)) for file in files]
+            try:
+                received = await asyncio.gather(*tasks)
+            except BaseException:
+                # One file failed (e.g. over the size limit): stop saving the rest and discard what was saved
+                for task in tasks:
+                    task.cancel()
+                for task in tasks:
+                    if task.done() and not task.cancelled() and task.exception() is None and task.result():
+                        remove_upload(task.result().file_path)
+                raise
+        uploads = [upload for upload in received if upload is not None]
+
+        if not uploads:
             raise HTTPException(
                 status_code=400,
-                detail={
-                    "error": f"Cannot upload {len(files)} files. Maximum 10 documents allowed (current: {current_count})."}
+                detail={"error": f"Duplicate content already uploaded: {', '.join(batch.duplicates)}"}
             )
 
-        for file in files:
-            text, filename = await parse_file(file)
-            if text and filename:
-                logging.debug(f"Adding {filename} to index with {len(text)} characters")
-                texts.append(text)
-                filenames.append(filename)
-
-        if not texts:
-            logging.error("No valid documents extracted from uploaded files")
-            raise HTTPException(status_code=400, detail={"error": "No valid documents extracted"})
-
-        qa_pipeline.index_documents(texts, filenames)
-        uploaded_filenames = qa_pipeline.get_uploaded_filenames()
-        logging.debug(f"Indexed {len(uploaded_filenames)} unique filenames: {uploaded_filenames}")
+        job = ingestion_queue.submit(uploads, batch.duplicates)
         return {
-            "message": f"Uploaded and indexed {len(texts)} files",
-            "filenames": uploaded_filenames,
-            "document_count": qa_pipeline.get_document_count()
+            "message": f"Accepted {len(uploads)} files for indexing",
+            "job_id": job.id,
+            "collection": collection,
+            "filenames": [upload.filename for upload in uploads],
+            "duplicates": batch.duplicates
         }
 
-    except ValueError as ve:
-        logging.error(f"Error uploading files: {str(ve)}\n{traceback.format_exc()}")
-        raise HTTPException(status_code=400, detail={"error": str(ve)})
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error uploading files: {str(e)}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail={"error": f"Error uploading files: {str(e)}"})
 
 
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Report the per-file stage and overall progress of an ingestion job."""
+    status = ingestion_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail={"error": f"Unknown job: {job_id}"})
+    return status
+
+
 @router.post("/query")
-async def query(query: str = Form(...)):
+@router.post("/collections/{collection}/query")
+async def query(query: str = Form(...), collection: str = Depends(collection_name)):
     """Process a query."""
     logging.debug(f"Received query: {query}")
     if not query.strip():
@@ -225,19 +353,44 @@ async def query(query: str = Form(...)):
         raise HTTPException(status_code=400, detail={"error": "Query cannot be empty"})
     logging.debug(f"Processing query: {query}")
     try:
-        response, references = qa_pipeline.answer_query(query)
+        with collections.use(collection) as pipeline:
+            response, references = await pipeline.aanswer_query(query)
         return {"response": response, "references": references}
     except Exception as e:
         logging.error(f"Error processing query: {str(e)}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail={"error": f"Error processing query: {str(e)}"})
 
 
+@router.post("/query/stream")
+@router.post("/collections/{collection}/query/stream")
+async def query_stream(query: str = Form(...), collection: str = Depends(collection_name)):
+    """Process a query and stream the answer as server-sent events while the LLM generates it."""
+    logging.debug(f"Received streaming query: {query}")
+    if not query.strip():
+        logging.error("Empty query received")
+        raise HTTPException(status_code=400, detail={"error": "Query cannot be empty"})
+
+    async def events():
+        try:
+            with collections.use(collection) as pipeline:
+                async for event, data in pipeline.astream_answer(query):
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            logging.error(f"Error streaming query: {str(e)}\n{traceback.format_exc()}")
+            yield f"event: error\ndata: {json.dumps({'error': f'Error processing query: {str(e)}'})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @router.post("/summarize")
-async def summarize():
-    """Summarize all indexed documents."""
+@router.post("/collections/{collection}/summarize")
+async def summarize(collection: str = Depends(collection_name)):
+    """Summarize all documents indexed in a collection."""
     logging.debug("Processing summarization request")
     try:
-        summary = qa_pipeline.summarize_documents()
+        with collections.use(collection) as pipeline:
+            summary = await pipeline.asummarize_documents()
         return {"summary": summary}
     except Exception as e:
         logging.error(f"Error processing summarization: {str(e)}\n{traceback.format_exc()}")
@@ -245,24 +398,65 @@ async def summarize():
 
 
 @router.post("/delete")
-async def delete_document(filename: str = Form(...)):
-    """Delete a document by filename."""
+@router.post("/collections/{collection}/delete")
+async def delete_document(filename: str = Form(...), collection: str = Depends(collection_name)):
+    """Delete a document from a collection by filename."""
     logging.debug(f"Received delete request for: {filename}")
     if not filename.strip():
         logging.error("Empty filename received")
         raise HTTPException(status_code=400, detail={"error": "Filename cannot be empty"})
     try:
-        success = qa_pipeline.delete_document(filename)
-        if not success:
-            logging.error(f"Failed to delete document: {filename}")
-            raise HTTPException(status_code=500, detail={"error": f"Failed to delete document: {filename}"})
-        uploaded_filenames = qa_pipeline.get_uploaded_filenames()
+        with collections.use(collection) as pipeline:
+            # Off the event loop: the delete appends to the log with an fsync and may compact the index
+            success = await asyncio.to_thread(pipeline.delete_document, filename)
+            if not success:
+                logging.error(f"Failed to delete document: {filename}")
+                raise HTTPException(status_code=500, detail={"error": f"Failed to delete document: {filename}"})
+            uploaded_filenames = pipeline.get_uploaded_filenames()
+            document_count = pipeline.get_document_count()
         logging.debug(f"Deleted document: {filename}. Remaining documents: {uploaded_filenames}")
         return {
             "message": f"Deleted document: {filename}",
             "filenames": uploaded_filenames,
-            "document_count": qa_pipeline.get_document_count()
+            "document_count": document_count
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error deleting document: {str(e)}\n{traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail={"error": f"Error deleting document: {str(e)}"})
\ No newline at end of file
+        raise HTTPException(status_code=500, detail={"error": f"Error deleting document: {str(e)}"})
+
+
+@router.get("/documents")
+@router.get("/collections/{collection}/documents")
+async def list_documents(collection: str = Depends(collection_name)):
+    """List the filenames indexed in a collection."""
+    with collections.use(collection) as pipeline:
+        return pipeline.get_uploaded_filenames()
+
+
+@router.get("/collections")
+async def list_collections():
+    """List collections with their resident memory and the node-wide load/eviction counters."""
+    return {"collections": collections.names(), **collections.stats()}
+
+
+@router.get("/stats")
+@router.get("/collections/{collection}/stats")
+async def stats(collection: str = Depends(collection_name)):
+    """Return a collection's cache hit/miss counters and active vector index backend, plus parser backend stats."""
+    with collections.use(collection) as pipeline:
+        return {**pipeline.get_cache_stats(), "parsers": PARSERS.stats()}
+
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness: the process is serving requests; models may still be loading."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the required models have loaded (immediately with MODEL_WARMUP off), else 503."""
+    ready = MODELS.ready() or not MODEL_WARMUP
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "models": MODELS.status()})
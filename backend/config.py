@@ -1,3 +1,58 @@
 import os
 UPLOAD_DIR = os.path.join("frontend", "static", "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+INDEX_DIR = os.getenv("INDEX_DIR", os.path.join("data", "index"))  # Pre-collections index, adopted as the default collection
+COLLECTIONS_DIR = os.getenv("COLLECTIONS_DIR", os.path.join("data", "collections"))
+DEFAULT_COLLECTION = os.getenv("DEFAULT_COLLECTION", "default")
+RESIDENT_COLLECTIONS_MAX_BYTES = int(os.getenv("RESIDENT_COLLECTIONS_MAX_BYTES", 2 * 1024 ** 3))
+COLLECTION_MAX_BYTES = int(os.getenv("COLLECTION_MAX_BYTES", 512 * 1024 ** 2))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join("data", "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+PARSE_TIMEOUT_SECONDS = float(os.getenv("PARSE_TIMEOUT_SECONDS", 300))
+PARSER_STATS_PATH = os.getenv("PARSER_STATS_PATH", os.path.join("data", "parser_stats.sqlite3"))  # Backend success rates and throughput
+# OCR page processes in all; each of the PARSE_WORKERS parser processes gets an equal share (at least one, itself)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join("data", "ocr_cache.sqlite3"))
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", 3500))  # Pixels; larger scans are downsampled to about 300 DPI
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", 20))  # PDF pages with less extractable text get OCR
+CRAWL_MAX_CONNECTIONS = int(os.getenv("CRAWL_MAX_CONNECTIONS", 16))  # Pooled connections for a document's links
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", 4))  # Requests in flight to one host
+CRAWL_TIMEOUT_SECONDS = float(os.getenv("CRAWL_TIMEOUT_SECONDS", 5))
+CRAWL_BUDGET_SECONDS = float(os.getenv("CRAWL_BUDGET_SECONDS", 30))  # For all links of one document
+CRAWL_MAX_URLS = int(os.getenv("CRAWL_MAX_URLS", 100))
+CRAWL_CACHE_PATH = os.getenv("CRAWL_CACHE_PATH", os.path.join("data", "crawl_cache.sqlite3"))
+CRAWL_CACHE_MAX_BYTES = int(os.getenv("CRAWL_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+MAX_FILE_BYTES = int(os.getenv("MAX_FILE_BYTES", 50 * 1024 * 1024))
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", 200 * 1024 * 1024))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", 5))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", 32))
+INDEX_BACKEND = os.getenv("INDEX_BACKEND", "auto")  # auto, flat, hnsw, ivf or ivfpq
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", 8))
+INDEX_EF_SEARCH = int(os.getenv("INDEX_EF_SEARCH", 64))
+INDEX_VECTOR_DTYPE = os.getenv("INDEX_VECTOR_DTYPE", "float32")  # float32, or float16 for half-size exact vectors
+# true when several uvicorn workers serve one index: they map the same snapshot and follow each other's writes
+INDEX_SHARED = os.getenv("INDEX_SHARED", "false").lower() == "true"
+# Ingestion job statuses, readable by every worker; by default only kept there when workers share the index
+JOBS_PATH = os.getenv("JOBS_PATH") or (os.path.join(COLLECTIONS_DIR, "jobs.sqlite3") if INDEX_SHARED else None)
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 5))  # Chunks sent to the LLM per query
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")  # Empty to disable reranking
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 30))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", 3))  # Chunks sent to the LLM after reranking
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 16))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 150))
+RERANK_CACHE_ENTRIES = int(os.getenv("RERANK_CACHE_ENTRIES", 10_000))
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", 1500))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", 0.7))  # 1 ranks by relevance only, lower favours diversity
+# A Hugging Face tokenizer as close to the LLM's as is available; Gemini's is not published, so the default is a
+# stand-in and CONTEXT_TOKEN_HEADROOM of CONTEXT_MAX_TOKENS is left unused for the difference (0 for an exact match)
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "sentence-transformers/all-MiniLM-L6-v2")
+CONTEXT_TOKEN_HEADROOM = float(os.getenv("CONTEXT_TOKEN_HEADROOM", 0.2))
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() != "false"  # Else models load on first use
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+
+from models.index_store import process_alive, process_token
+
+# Per-file stages in the order a file moves through them; the last three are final
+STAGES = ("queued", "parsing", "splitting", "embedding", "indexing", "done", "skipped", "failed")
+FINAL_STAGES = {"done", "skipped", "failed"}
+
+
+class SavedUpload:
+    """An accepted upload waiting on disk to be ingested."""
+
+    def __init__(self, file_path, filename, content_hash, collection):
+        self.file_path = file_path
+        self.filename = filename
+        self.content_hash = content_hash
+        self.collection = collection
+
+
+def job_status(job_id, collection, files, duplicates):
+    """The status report of a job whose files are in the given per-file records."""
+    completed = sum(entry["stage"] in FINAL_STAGES for entry in files)
+    if completed == len(files):
+        state = "completed"
+    elif all(entry["stage"] == "queued" for entry in files):
+        state = "queued"
+    else:
+        state = "running"
+    return {
+        "job_id": job_id,
+        "collection": collection,
+        "state": state,
+        "total_files": len(files),
+        "completed_files": completed,
+        "progress": completed / len(files) if files else 1.0,
+        "files": [dict(entry) for entry in files],
+        "duplicates": list(duplicates),
+    }
+
+
+class FileProgress(dict):
+    """A file's record in a job; each change of its stage is saved with the job (see JobStore)."""
+
+    def __init__(self, job, **fields):
+        super().__init__(**fields)
+        self.job = job
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if key == "stage":
+            self.job.changed()
+
+
+class IngestionJob:
+    """Progress of one upload batch: a record per file with its current stage."""
+
+    def __init__(self, uploads, duplicates=(), store=None):
+        self.id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.uploads = list(uploads)
+        self.duplicates = list(duplicates)
+        self.store = store
+        self.files = [
+            FileProgress(self, filename=upload.filename, stage="queued", sections=0, chunks=0, embedded_chunks=0,
+                         error=None)
+            for upload in self.uploads
+        ]
+        self.tasks = []
+
+    @property
+    def finished(self):
+        return all(entry["stage"] in FINAL_STAGES for entry in self.files)
+
+    def changed(self):
+        if self.store is not None:
+            self.store.save(self)
+
+    def status(self):
+        return job_status(self.id, self.uploads[0].collection if self.uploads else None, self.files, self.duplicates)
+
+
+class JobStore:
+    """Job statuses in SQLite at ``path``, so any worker process serving the index can report any job.
+
+    Each status is stored with the process token of the worker running the
+    job; if that worker exits first, the job's unfinished files are reported
+    as failed. Only the ``max_jobs`` most recent jobs are kept.
+    """
+
+    def __init__(self, path, max_jobs=1000):
+        self.path = path
+        self.max_jobs = max_jobs
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+        self.token = None
+
+    def connection(self):
+        # One connection per process: uvicorn may fork its workers from a parent that opened one
+        if self.conn is None or self.pid != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # Saves run on the event loop; a status lost to a power cut is only a stale progress report
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, created_at REAL NOT NULL, "
+                "writer TEXT NOT NULL, status TEXT NOT NULL)"
+            )
+            self.conn.commit()
+            self.pid, self.token = os.getpid(), process_token()
+        return self.conn
+
+    def save(self, job):
+        status = job.status()
+        with self.lock:
+            conn = self.connection()
+            new = conn.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job.id,)).fetchone() is None
+            conn.execute("INSERT OR REPLACE INTO jobs (job_id, created_at, writer, status) VALUES (?, ?, ?, ?)",
+                         (job.id, job.created_at, self.token, json.dumps(status)))
+            if new:
+                conn.execute("DELETE FROM jobs WHERE job_id NOT IN "
+                             "(SELECT job_id FROM jobs ORDER BY created_at DESC LIMIT ?)", (self.max_jobs,))
+            conn.commit()
+
+    def get(self, job_id):
+        """The last saved status of a job, or None if it is unknown."""
+        with self.lock:
+            row = self.connection().execute("SELECT writer, status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            token = self.token
+        if row is None:
+            return None
+        writer, status = row[0], json.loads(row[1])
+        if status["state"] != "completed" and writer != token and not process_alive(writer):
+            for entry in status["files"]:
+                if entry["stage"] not in FINAL_STAGES:
+                    entry["stage"], entry["error"] = "failed", "The worker ingesting it exited"
+            status = job_status(status["job_id"], status["collection"], status["files"], status["duplicates"])
+        return status
+
+
+class IngestionQueue:
+    """Runs uploaded files through ``ingest_fn`` in the background, at most ``workers`` at a time.
+
+    ``ingest_fn(entry, upload)`` is a coroutine that moves a file through the
+    parse, split, embed and index stages, recording the current one in
+    ``entry["stage"]``; a file streamed in batches cycles through them once per
+    batch. Each batch is queryable as soon as it is indexed. Exceptions mark
+    the file as failed without affecting the rest of the job. Only the most
+    recent ``max_jobs`` finished jobs are kept for status lookups. With a
+    ``store`` (a JobStore) statuses are also saved there, so other worker
+    processes can report jobs this one runs.
+    """
+
+    def __init__(self, ingest_fn, workers=2, max_jobs=100, store=None):
+        self.ingest_fn = ingest_fn
+        self.max_jobs = max_jobs
+        self.store = store
+        self.slots = asyncio.Semaphore(workers)
+        self.jobs = OrderedDict()  # Job id -> IngestionJob
+
+    def submit(self, uploads, duplicates=()):
+        """Start a job for a list of SavedUploads and return it."""
+        job = IngestionJob(uploads, duplicates, self.store)
+        self.jobs[job.id] = job
+        job.changed()
+        job.tasks = [asyncio.ensure_future(self.run(job, entry, upload)) for entry, upload in zip(job.files, uploads)]
+        self.prune()
+        logging.debug(f"Queued ingestion job {job.id} for {len(uploads)} files")
+        return job
+
+    async def run(self, job, entry, upload):
+        async with self.slots:
+            try:
+                await self.ingest_fn(entry, upload)
+            except Exception as e:
+                logging.error(f"Error ingesting {entry['filename']}: {str(e)}\n{traceback.format_exc()}")
+                entry["stage"] = "failed"
+                entry["error"] = str(e)
+            job.changed()  # The error and counts set after the final stage
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def status(self, job_id):
+        """Status of a job run by this process, else as saved in the store by another one; None if unknown."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.status()
+        return self.store.get(job_id) if self.store is not None else None
+
+    def pending_count(self):
+        """Number of accepted files that have not reached a final stage yet."""
+        return sum(
+            entry["stage"] not in FINAL_STAGES
+            for job in self.jobs.values()
+            for entry in job.files
+        )
+
+    def find_pending(self, content_hash, collection):
+        """Filename of an unfinished upload to ``collection`` with this content hash, or None."""
+        for job in self.jobs.values():
+            for entry, upload in zip(job.files, job.uploads):
+                if (entry["stage"] not in FINAL_STAGES and upload.content_hash == content_hash
+                        and upload.collection == collection):
+                    return entry["filename"]
+        return None
+
+    async def wait(self, job_id):
+        job = self.jobs[job_id]
+        await asyncio.gather(*job.tasks)
+        return job
+
+    def prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
@@ -0,0 +1,56 @@
+import json
+import logging
+import re
+
+from fastapi import HTTPException
+
+# /upload and /collections/{collection}/upload
+UPLOAD_PATHS = r"(?:/collections/[^/]+)?/upload"
+
+
+class RequestSizeLimitMiddleware:
+    """ASGI middleware that caps the body size of upload requests while they are received.
+
+    Starlette buffers the whole multipart body before the route runs, so limits
+    checked in the handler come too late. Requests announcing a larger
+    Content-Length are refused before any body is read, and chunked requests are
+    cut off as soon as the running total passes ``max_bytes``. ``paths`` is a
+    regular expression the whole request path must match.
+    """
+
+    def __init__(self, app, max_bytes, paths=UPLOAD_PATHS):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = re.compile(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.paths.fullmatch(scope["path"].rstrip("/") or "/"):
+            await self.app(scope, receive, send)
+            return
+
+        error = {"detail": {"error": f"Upload exceeds the {self.max_bytes} byte per-request limit"}}
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and int(content_length) > self.max_bytes:
+            logging.error(f"Rejected {scope['path']} request with Content-Length {int(content_length)}")
+            body = json.dumps(error).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while FastAPI reads the form, which passes HTTPExceptions through
+                    raise HTTPException(status_code=413, detail=error["detail"])
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,390 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from concurrent.futures.process import BrokenProcessPool
+
+import pdfplumber
+import langchain_community.document_loaders  # Imports each loader class (and its libraries) on first access
+
+from backend.config import (
+    OCR_WORKERS, OCR_CACHE_PATH, OCR_CACHE_MAX_BYTES, OCR_MAX_SIDE, OCR_LANG, OCR_MIN_PAGE_CHARS, PARSER_STATS_PATH,
+    PARSE_WORKERS,
+)
+from parsers.ocr import OcrOptions, ocr_image_file, ocr_pdf  # Also sets the Tesseract path on Windows
+from parsers.registry import ParserRegistry
+from parsers.docx_parser import docx_text
+from parsers.pptx_parser import pptx_text
+from parsers.xlsx_parser import xlsx_text
+from parsers.csv_parser import csv_text
+from parsers.json_parser import json_text
+from parsers.txt_parser import txt_text
+from models.table_store import TABLE_EXTENSIONS, Table
+
+OCR_OPTIONS = OcrOptions(lang=OCR_LANG, max_side=OCR_MAX_SIDE, cache_path=OCR_CACHE_PATH, cache_max_bytes=OCR_CACHE_MAX_BYTES)
+# OCR runs inside the parser workers, so each gets a share of OCR_WORKERS rather than a pool of that size
+OCR_WORKERS_PER_PARSER = max(1, OCR_WORKERS // max(1, PARSE_WORKERS))
+PDF_WINDOW_PAGES = 16  # PDF pages are buffered this many at a time so their scanned pages are OCRed together
+SECTION_CHARS = 64 * 1024  # Plain text and CSV rows are streamed in sections of about this size
+
+
+def ocr_scanned_pages(file_path, filename, page_texts, first_page=0):
+    """Fill in pages with (almost) no extractable text from OCR of their images; keeps the text on OCR failure.
+
+    ``page_texts`` are consecutive pages starting at 0-based page ``first_page``.
+    """
+    scanned = [number for number, page_text in enumerate(page_texts) if len(page_text.strip()) < OCR_MIN_PAGE_CHARS]
+    if not scanned:
+        return page_texts
+    try:
+        ocr_texts = ocr_pdf(file_path, [first_page + number for number in scanned], workers=OCR_WORKERS_PER_PARSER,
+                            options=OCR_OPTIONS)
+    except Exception as e:
+        logging.warning(f"OCR failed for {filename}; keeping {len(page_texts) - len(scanned)} text pages: {str(e)}")
+        return page_texts
+    page_texts = list(page_texts)
+    for number, ocr_text in zip(scanned, ocr_texts):
+        page_texts[number] = "\n".join(part for part in (page_texts[number].strip(), ocr_text) if part)
+    logging.debug(f"OCR read {len(scanned)} scanned pages of {filename}")
+    return page_texts
+
+
+class ParseTimeout(Exception):
+    """Raised inside a worker when a parse overruns its deadline."""
+
+
+def loader(name):
+    """A LangChain document loader class; some pull in heavy libraries, so they are imported when first used."""
+    return getattr(langchain_community.document_loaders, name)
+
+
+def pypdf_pages(file_path, filename):
+    for doc in loader("PyPDFLoader")(file_path).lazy_load():
+        yield doc.page_content
+
+
+def pdfplumber_pages(file_path, filename):
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages:
+            yield page.extract_text() or ""
+            page.close()  # Drop the page's parsed objects; pdfplumber caches them otherwise
+
+
+def load_text(loader_name, file_path, filename, **kwargs):
+    """Text of the documents a LangChain loader produces for the file."""
+    return "\n".join(doc.page_content for doc in loader(loader_name)(file_path, **kwargs).load())
+
+
+def partition_text(file_path, filename):
+    from unstructured.partition.auto import partition
+    return "\n".join(str(element) for element in partition(filename=file_path))
+
+
+def register_parsers(registry):
+    """The backends for each extension, in default order: fast direct parsers, LangChain loaders, unstructured."""
+    registry.register([".pdf"], "pypdf", pypdf_pages, streaming=True)
+    registry.register([".pdf"], "pdfplumber", pdfplumber_pages, streaming=True)
+    registry.register([".docx"], "python-docx", lambda file_path, filename: docx_text(file_path))
+    registry.register([".docx"], "docx2txt", partial(load_text, "Docx2txtLoader"))
+    registry.register([".pptx"], "python-pptx", lambda file_path, filename: pptx_text(file_path))
+    registry.register([".pptx"], "unstructured-pptx", partial(load_text, "UnstructuredPowerPointLoader"))
+    registry.register([".xlsx", ".xls"], "pandas-excel", lambda file_path, filename: xlsx_text(file_path))
+    registry.register([".xlsx", ".xls"], "unstructured-excel", partial(load_text, "UnstructuredExcelLoader"))
+    registry.register([".csv"], "csv-loader", partial(load_text, "CSVLoader"))
+    registry.register([".csv"], "pandas-csv", lambda file_path, filename: csv_text(file_path))
+    registry.register([".json"], "json", lambda file_path, filename: json_text(file_path))
+    registry.register([".json"], "json-loader", partial(load_text, "JSONLoader", jq_schema=".", text_content=False))
+    registry.register([".txt"], "text", lambda file_path, filename: txt_text(file_path))
+    registry.register([".txt"], "text-loader", partial(load_text, "TextLoader"))
+    registry.register([".png", ".jpg", ".jpeg"], "tesseract", lambda file_path, filename: ocr_image_file(
+        file_path, OCR_OPTIONS))
+    registry.register(None, "unstructured", partition_text)
+    return registry
+
+
+# Used inside parser workers; the success and throughput counts they record are shared through PARSER_STATS_PATH
+PARSERS = register_parsers(ParserRegistry(PARSER_STATS_PATH, fatal_errors=(ParseTimeout,)))
+
+
+def pdf_page_texts(file_path, filename):
+    """Yield the extractable text of each PDF page, without OCR."""
+    return PARSERS.sections(file_path, filename)
+
+
+def pdf_pages(file_path, filename):
+    """Yield the text of each PDF page, OCRing scanned pages PDF_WINDOW_PAGES at a time."""
+    window, first_page = [], 0
+    for page_text in pdf_page_texts(file_path, filename):
+        window.append(page_text)
+        if len(window) == PDF_WINDOW_PAGES:
+            yield from ocr_scanned_pages(file_path, filename, window, first_page)
+            first_page += len(window)
+            window = []
+    if window:
+        yield from ocr_scanned_pages(file_path, filename, window, first_page)
+
+
+def grouped(texts, size=SECTION_CHARS):
+    """Join consecutive texts with newlines into sections of about ``size`` characters."""
+    group, length = [], 0
+    for text in texts:
+        group.append(text)
+        length += len(text) + 1
+        if length >= size:
+            yield "\n".join(group)
+            group, length = [], 0
+    if group:
+        yield "\n".join(group)
+
+
+def text_lines(file_path):
+    with open(file_path) as f:  # The platform default encoding, like TextLoader
+        for line in f:
+            yield line[:-1] if line.endswith("\n") else line
+
+
+def csv_rows(file_path):
+    for doc in loader("CSVLoader")(file_path).lazy_load():
+        yield doc.page_content
+
+
+def stream_or_load(sections, file_path, filename):
+    """Yield from a streaming reader, or the whole extract_text result if it fails before its first section."""
+    produced = False
+    try:
+        for section in sections:
+            produced = True
+            yield section
+    except Exception as e:
+        if produced:
+            raise
+        logging.debug(f"Streaming {filename} failed, loading it whole: {str(e)}")
+        yield extract_text(file_path, filename)
+
+
+def table_directory(file_path):
+    """Where iter_sections saves the columnar copy of a tabular upload: next to the upload itself."""
+    return file_path + ".table"
+
+
+def read_table(file_path, filename):
+    """Read a CSV, Excel or JSON upload as a typed Table, or None if it is not tabular or fails to parse."""
+    try:
+        return Table.read(file_path, filename)
+    except Exception as e:
+        logging.debug(f"{filename} is not read as a table: {str(e)}")
+        return None
+
+
+def iter_sections(file_path, filename):
+    """Yield the text of a saved upload piece by piece: PDFs page by page, text and CSV in SECTION_CHARS sections.
+
+    Other formats are read whole by their loaders and come out as one section.
+    Joining the sections with newlines gives the extract_text result, except
+    for tables: a CSV, Excel or JSON file of records is saved column by column
+    to table_directory(file_path) for the table query engine, and only its
+    schema, statistics and sample rows are yielded for embedding. Runs in a
+    ParserPool worker process, so it must stay a picklable module-level function.
+    """
+    file_ext = os.path.splitext(filename)[1].lower()
+    table = read_table(file_path, filename) if file_ext in TABLE_EXTENSIONS else None
+    if table is not None:
+        table.save(table_directory(file_path))
+        yield table.describe()
+    elif file_ext == ".pdf":
+        yield from pdf_pages(file_path, filename)
+    elif file_ext == ".txt":
+        yield from stream_or_load(grouped(text_lines(file_path)), file_path, filename)
+    elif file_ext == ".csv":
+        yield from stream_or_load(grouped(csv_rows(file_path)), file_path, filename)
+    else:
+        yield extract_text(file_path, filename)
+
+
+def extract_text(file_path, filename):
+    """Extract text from a saved upload with the backend PARSERS picks for its extension; PDFs also get OCR.
+
+    Runs in a ParserPool worker process, so it must stay a picklable module-level function.
+    """
+    file_ext = os.path.splitext(filename)[1].lower()
+    logging.debug(f"Starting to parse file: {filename} with extension: {file_ext}")
+    if file_ext == ".pdf":
+        return "\n".join(pdf_pages(file_path, filename))
+    return PARSERS.parse(file_path, filename)
+
+
+def run_with_deadline(parse_fn, file_path, filename, timeout):
+    """Worker entry point: run ``parse_fn`` and abort it with ParseTimeout after ``timeout`` seconds.
+
+    The deadline is enforced inside the worker with SIGALRM, so the worker
+    survives and the shared pool stays healthy. Platforms without SIGALRM
+    (Windows) rely on the caller-side timeout in ParserPool.parse instead.
+    """
+    if not hasattr(signal, "SIGALRM"):
+        return parse_fn(file_path, filename)
+
+    def expire(signum, frame):
+        raise ParseTimeout(f"Parsing {filename} exceeded {timeout}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return parse_fn(file_path, filename)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+FRAME_HEADER = struct.Struct("<I")  # Byte length of the UTF-8 section that follows
+
+
+def spool_sections(parse_fn, spool_path, file_path, filename):
+    """Worker entry point: append what ``parse_fn`` returns (a string or an iterable of sections) to ``spool_path``.
+
+    Each section is written and flushed as one length-prefixed frame as soon as
+    it is parsed, so the event loop can consume it while the rest is parsed.
+    """
+    result = parse_fn(file_path, filename)
+    sections = [result] if isinstance(result, str) else result
+    count = 0
+    with open(spool_path, "ab") as spool:
+        for section in sections:
+            data = section.encode("utf-8", "surrogatepass")
+            spool.write(FRAME_HEADER.pack(len(data)) + data)
+            spool.flush()
+            count += 1
+    return count
+
+
+def read_frame(spool):
+    """The next complete section in an open spool file, or None if it has not been fully written yet."""
+    position = spool.tell()
+    header = spool.read(FRAME_HEADER.size)
+    if len(header) == FRAME_HEADER.size:
+        size, = FRAME_HEADER.unpack(header)
+        data = spool.read(size)
+        if len(data) == size:
+            return data.decode("utf-8", "surrogatepass")
+    spool.seek(position)
+    return None
+
+
+# Imported once by the forkserver, so every parser worker starts with them while the API process never loads them
+WORKER_PRELOAD = [
+    __name__,
+    "langchain_community.document_loaders.pdf",
+    "langchain_community.document_loaders.word_document",
+    "langchain_community.document_loaders.powerpoint",
+    "langchain_community.document_loaders.excel",
+    "langchain_community.document_loaders.csv_loader",
+    "langchain_community.document_loaders.json_loader",
+    "langchain_community.document_loaders.text",
+    "unstructured.partition.auto",
+]
+
+
+def worker_context():
+    """forkserver where available, spawn otherwise: never fork a parent that holds model threads or SQLite handles."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(WORKER_PRELOAD)  # Workers start with the loaders already imported
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class ParserPool:
+    """Bounded process pool that runs CPU-heavy parsing off the event loop.
+
+    ``parse_fn(file_path, filename)`` returns a file's text or yields it section
+    by section; ``stream`` hands sections to the caller while the worker is
+    still parsing (through a spool file, see spool_sections), and ``parse``
+    returns them joined. Each file gets its own timeout, enforced inside the worker (see
+    run_with_deadline). Cancelling a parse only drops its pending future; work
+    already running finishes in the background and is discarded, so one
+    client's cancelled upload never disturbs parses serving other requests. If a
+    worker ignores its deadline, the pool is retired rather than killed: its
+    other tasks run to completion while new parses go to a fresh pool.
+    """
+
+    def __init__(self, max_workers, timeout, parse_fn=iter_sections, grace_seconds=5, poll_seconds=0.02):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.parse_fn = parse_fn
+        self.grace_seconds = grace_seconds
+        self.poll_seconds = poll_seconds  # How often to look for new sections while the worker is parsing
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=worker_context())
+        return self.executor
+
+    async def parse(self, file_path, filename):
+        """Parse one file in a worker process; raises asyncio.TimeoutError after ``timeout`` seconds."""
+        return "\n".join([section async for section in self.stream(file_path, filename)])
+
+    async def stream(self, file_path, filename):
+        """Yield one file's sections as the worker parses them; raises asyncio.TimeoutError after ``timeout`` seconds.
+
+        Sections wait in the spool file, not in memory, when the caller is
+        slower than the parser. If the caller stops early the worker still runs
+        to completion (or its deadline) in the background and its output is discarded.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            fd, spool_path = tempfile.mkstemp(prefix="sections-")
+            os.close(fd)
+            executor = self.get_executor()
+            future = loop.run_in_executor(executor, run_with_deadline, partial(spool_sections, self.parse_fn, spool_path),
+                                          file_path, filename, self.timeout)
+            deadline = loop.time() + self.timeout + self.grace_seconds
+            yielded = 0
+            try:
+                with open(spool_path, "rb") as spool:
+                    while True:
+                        section = await asyncio.to_thread(read_frame, spool)
+                        if section is not None:
+                            yielded += 1
+                            yield section
+                        elif future.done():
+                            future.result()
+                            section = read_frame(spool)  # Written just before the worker finished
+                            if section is None:
+                                return
+                            yielded += 1
+                            yield section
+                        elif loop.time() > deadline:
+                            logging.error(f"Worker parsing {filename} ignored its deadline; retiring parser pool")
+                            self.retire(executor)
+                            raise asyncio.TimeoutError(f"Parsing {filename} exceeded {self.timeout}s")
+                        else:
+                            await asyncio.wait([future], timeout=self.poll_seconds)
+            except ParseTimeout as e:
+                raise asyncio.TimeoutError(str(e))
+            except BrokenProcessPool:
+                # A worker died (e.g. a crashing native parser); start a new pool and retry once if nothing was consumed
+                self.retire(executor)
+                if attempt or yielded:
+                    raise
+                logging.warning(f"Parser pool broke while parsing {filename}; retrying")
+            finally:
+                try:
+                    os.remove(spool_path)
+                except OSError:
+                    pass  # Still open in a worker on Windows; it is a temporary file either way
+
+    def retire(self, executor):
+        """Stop sending work to ``executor``; tasks already running on it are left to finish."""
+        if self.executor is executor:
+            self.executor = None
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
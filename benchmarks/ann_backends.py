@@ -0,0 +1,63 @@
+"""Recall@k and query latency of each vector index backend against exact flat search.
+
+Usage:
+    python -m benchmarks.ann_backends --chunks 100000 --dimension 384
+
+The corpus is synthetic: clustered Gaussian vectors, which is closer to real
+sentence embeddings than uniform noise. Each backend goes through VectorStore,
+so the numbers include ID filtering and the IVF-PQ exact re-rank.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from models.vector_store import VectorStore
+
+
+def clustered_vectors(count, dimension, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    noise = 0.5 * rng.normal(size=(count, dimension)).astype(np.float32)
+    return centers[rng.integers(0, clusters, count)] + noise
+
+
+def measure(store, queries, k):
+    start = time.perf_counter()
+    results = [store.search_ids(query, k=k)[0] for query in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--ef-search", type=int, default=64)
+    args = parser.parse_args()
+
+    corpus = clustered_vectors(args.chunks, args.dimension, clusters=max(10, args.chunks // 1000), seed=0)
+    queries = clustered_vectors(args.queries, args.dimension, clusters=max(10, args.chunks // 1000), seed=0)[::-1]
+    queries = queries + 0.1 * np.random.default_rng(1).normal(size=queries.shape).astype(np.float32)
+    documents = [None] * args.chunks
+
+    print(f"{args.chunks} chunks x {args.dimension} dims, {args.queries} queries, k={args.k}")
+    print(f"{'backend':>8} {'build s':>8} {'ms/query':>9} {'recall@k':>9}")
+    truth = None
+    for backend in ("flat", "hnsw", "ivf", "ivfpq"):
+        store = VectorStore(args.dimension, backend=backend, nprobe=args.nprobe, ef_search=args.ef_search)
+        start = time.perf_counter()
+        store.add(corpus, documents)
+        store.wait_for_build()  # Rebuilds of background_build_min vectors or more run on the builder thread
+        build_seconds = time.perf_counter() - start
+        results, latency = measure(store, queries, args.k)
+        if truth is None:
+            truth = results
+        recall = np.mean([len(set(got) & set(want)) / args.k for got, want in zip(results, truth)])
+        print(f"{backend:>8} {build_seconds:>8.2f} {latency:>9.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
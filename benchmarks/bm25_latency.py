@@ -0,0 +1,79 @@
+"""Build, update and query latency of the BM25 lexical index.
+
+Usage:
+    python -m benchmarks.bm25_latency --chunks 100000
+
+The corpus is synthetic: chunks of Zipf-distributed words (so common words
+have long posting lists, as in real text) with an identifier such as
+"PN-12345" mixed into every chunk. Queries combine two or three words with an
+identifier, the shape of the lookups BM25 is there to catch.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from models.bm25_index import BM25Index
+
+
+def synthetic_chunks(count, words_per_chunk, vocabulary, seed):
+    rng = np.random.default_rng(seed)
+    words = np.minimum(rng.zipf(1.2, size=(count, words_per_chunk)), vocabulary)
+    return [
+        " ".join(f"w{word}" for word in row) + f" PN-{rng.integers(0, count)}"
+        for row in words
+    ]
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--words", type=int, default=150, help="Words per chunk (~1000 characters)")
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks, args.words, args.vocabulary, seed=0)
+    index = BM25Index()
+    start = time.perf_counter()
+    for chunk_id, text in enumerate(chunks):
+        index.add(chunk_id, text)
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    queries = [
+        " ".join(f"w{word}" for word in np.minimum(rng.zipf(1.2, size=rng.integers(2, 4)), args.vocabulary))
+        + f" PN-{rng.integers(0, args.chunks)}"
+        for _ in range(args.queries)
+    ]
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, args.k)
+        latencies.append(time.perf_counter() - start)
+
+    # One document's worth of chunks in and out, as an upload and a delete do
+    document = list(range(args.chunks, args.chunks + 50))
+    start = time.perf_counter()
+    for chunk_id, text in zip(document, chunks):
+        index.add(chunk_id, text)
+    add_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    index.remove(document)
+    remove_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{args.chunks} chunks x {args.words} words, {len(index.postings)} terms, "
+          f"~{index.memory_bytes() / 2 ** 20:.0f} MiB")
+    print(f"build: {build_seconds:.1f} s ({build_seconds / args.chunks * 1e6:.0f} us/chunk)")
+    print(f"query: p50 {percentile_ms(latencies, 50):.2f} ms, p95 {percentile_ms(latencies, 95):.2f} ms, "
+          f"p99 {percentile_ms(latencies, 99):.2f} ms (k={args.k}, {args.queries} queries)")
+    print(f"add 50 chunks: {add_ms:.1f} ms, remove them: {remove_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Bytes per chunk: the chunk dicts and LangChain Documents vs the ChunkStore, float lists vs float32/float16 vectors.
+
+Usage:
+    python -m benchmarks.chunk_memory --chunks 20000
+
+Builds ``--chunks`` chunk texts of about 1000 characters (as the splitter
+produces) spread over ``--files`` files and measures, with tracemalloc, what
+holding them costs per chunk:
+
+    dicts        QAPipeline.documents as it was (chunk id -> {"text",
+                 "filename"}) plus VectorStore.documents (chunk id ->
+                 LangChain Document); both share the text strings
+    chunk store  ChunkStore: one UTF-8 buffer, offset/length/filename-id
+                 slots, interned filenames
+
+and for the ``--dimension``-wide vectors:
+
+    float lists  the list of Python floats embed_documents returns, which
+                 Retriever kept one per chunk
+    float32      the exact FAISS index (code plus int64 id)
+    float16      the same with INDEX_VECTOR_DTYPE=float16
+"""
+import argparse
+import random
+import tracemalloc
+
+import numpy as np
+from langchain_core.documents import Document
+
+from models.chunk_store import ChunkStore
+from models.vector_store import VectorStore
+
+WORDS = ("invoice", "revenue", "region", "quarter", "customer", "order", "shipped", "pending", "contract",
+         "delivery", "warehouse", "payment", "supplier", "forecast", "budget", "north", "south", "report")
+
+
+def chunk_texts(count, rng, chars=1000):
+    texts = []
+    for _ in range(count):
+        words = []
+        while sum(len(word) + 1 for word in words) < chars:
+            words.append(rng.choice(WORDS))
+        texts.append(" ".join(words))
+    return texts
+
+
+def measured(build):
+    """Bytes still allocated by ``build()``'s result once everything else it allocated is freed."""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=384)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    encoded = [text.encode("utf-8") for text in chunk_texts(args.chunks, rng)]  # Decoded inside each measurement
+    filenames = [f"report-{n % args.files}.pdf" for n in range(args.chunks)]
+    text_bytes = sum(len(text) for text in encoded)
+
+    def dicts():
+        documents, store_documents = {}, {}
+        for chunk_id, (text, filename) in enumerate(zip(encoded, filenames)):
+            documents[chunk_id] = {"text": text.decode("utf-8"), "filename": filename}
+            store_documents[chunk_id] = Document(page_content=documents[chunk_id]["text"],
+                                                 metadata={"filename": filename})
+        return documents, store_documents
+
+    def chunk_store():
+        store = ChunkStore()
+        store.add(range(args.chunks), [text.decode("utf-8") for text in encoded], filenames)
+        return store
+
+    print(f"{args.chunks} chunks, {text_bytes / args.chunks:.0f} text bytes each on average, {args.files} files")
+    for name, build in (("dicts", dicts), ("chunk store", chunk_store)):
+        size, result = measured(build)
+        print(f"{name:12} {size / args.chunks:8.0f} bytes/chunk  ({(size - text_bytes) / args.chunks:6.0f} overhead)")
+        del result
+
+    vectors = np.random.default_rng(0).standard_normal((args.chunks, args.dimension)).astype(np.float32)
+    size, lists = measured(lambda: [vector.tolist() for vector in vectors])
+    print(f"{'float lists':12} {size / args.chunks:8.0f} bytes/vector")
+    del lists
+    for dtype in ("float32", "float16"):
+        store = VectorStore(args.dimension, backend="flat", vector_dtype=dtype)
+        store.add_chunks(vectors, [""] * args.chunks, [None] * args.chunks)
+        exact = store.index.ntotal * (store.index.sa_code_size() + 8)
+        error = np.abs(store.index.index.reconstruct_n(0, 1000) - vectors[:1000]).max()
+        print(f"{dtype:12} {exact / args.chunks:8.0f} bytes/vector  (max error {error:.1e})")
+
+
+if __name__ == "__main__":
+    main()
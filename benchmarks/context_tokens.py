@@ -0,0 +1,102 @@
+"""Prompt context size with and without the token-budgeted context builder.
+
+Usage:
+    python -m benchmarks.context_tokens --retrieval-k 8 --tokenizer sentence-transformers/all-MiniLM-L6-v2
+
+The corpus is synthetic: documents of random sentences, plus lightly edited
+second versions of some of them (the near-duplicates re-uploads produce).
+Embeddings are hashed bags of words, so similar text gets similar vectors
+without a model download. For each query the same retrieved chunks are
+joined as-is (the old prompt) and passed through the context builder; the
+coverage column is the share of the old context's distinct sentences that
+the built context still contains.
+"""
+import argparse
+import hashlib
+import re
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from models.context_builder import ContextBuilder, HuggingFaceTokenCounter, approximate_tokens
+from models.qa_pipeline import QAPipeline
+
+
+class HashingEmbeddings(Embeddings):
+    def __init__(self, dimension=256):
+        self.dimension = dimension
+
+    def vector(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int.from_bytes(hashlib.md5(word.encode()).digest()[:4], "little") % self.dimension] += 1
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.vector(text)
+
+
+def sentences(text):
+    return {sentence.strip() for sentence in text.split(".") if len(sentence.strip()) > 20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--sentences", type=int, default=60, help="Sentences per document")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--retrieval-k", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=1500)
+    parser.add_argument("--tokenizer", default=None, help="Hugging Face tokenizer; default estimates 4 chars/token")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vocabulary = [f"term{n}" for n in range(3000)]
+
+    def sentence():
+        return " ".join(rng.choice(vocabulary, size=12)) + "."
+
+    count_tokens = HuggingFaceTokenCounter(args.tokenizer) if args.tokenizer else approximate_tokens
+    builder = ContextBuilder(max_tokens=args.max_tokens, count_tokens=count_tokens)
+    pipeline = QAPipeline(embeddings=HashingEmbeddings(), llm=FakeListChatModel(responses=["summary"]),
+                          retrieval_k=args.retrieval_k, context_builder=builder)
+    corpus = []
+    for n in range(args.documents):
+        body = [sentence() for _ in range(args.sentences)]
+        corpus.append(body)
+        pipeline.index_documents([" ".join(body)], [f"doc{n}.txt"])
+        if n % 2 == 0:  # A second version with two sentences edited
+            edited = list(body)
+            for i in rng.choice(len(edited), size=2, replace=False):
+                edited[i] = sentence()
+            pipeline.index_documents([" ".join(edited)], [f"doc{n}_v2.txt"])
+
+    naive_tokens, built_tokens, coverage = [], [], []
+    for _ in range(args.queries):
+        body = corpus[rng.integers(len(corpus))]
+        start = rng.integers(len(body) - 3)
+        query = " ".join(body[start:start + 3])
+        chunk_ids, docs, _ = pipeline.retrieve(pipeline.embeddings.embed_query(query), query)
+        naive = "\n".join(doc.page_content for doc in docs)
+        built, _, _ = pipeline.build_context(chunk_ids, docs)
+        naive_tokens.append(count_tokens([naive])[0])
+        built_tokens.append(count_tokens([built])[0])
+        # Per chunk: fragments cut at chunk boundaries must be found inside the merged sentences
+        wanted = set().union(*(sentences(doc.page_content) for doc in docs))
+        coverage.append(sum(sentence in built for sentence in wanted) / len(wanted) if wanted else 1.0)
+
+    print(f"{args.documents} documents (+{(args.documents + 1) // 2} edited copies), {len(pipeline.documents)} chunks, "
+          f"k={args.retrieval_k}, budget {args.max_tokens} tokens, tokenizer {args.tokenizer or '4 chars/token'}")
+    print(f"{'context':>8} {'mean tokens':>12} {'p95 tokens':>11} {'coverage':>9}")
+    print(f"{'joined':>8} {np.mean(naive_tokens):>12.0f} {np.percentile(naive_tokens, 95):>11.0f} {1.0:>9.3f}")
+    print(f"{'built':>8} {np.mean(built_tokens):>12.0f} {np.percentile(built_tokens, 95):>11.0f} {np.mean(coverage):>9.3f}")
+    pipeline.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Embedding throughput and parity: PyTorch sentence-transformers vs the int8 ONNX backend.
+
+Usage:
+    python -m benchmarks.embedding_backends --docs 512
+    python -m benchmarks.embedding_backends --random-weights   # No model hub access
+
+Embeds ``--docs`` chunk-sized texts (about 1000 characters, as the splitter
+produces) ``--batch-size`` at a time with each backend and reports docs/sec,
+plus the cosine similarity of every ONNX vector to its PyTorch counterpart:
+
+    torch       SentenceTransformerEmbeddings, float32 PyTorch
+    onnx-fp32   OnnxEmbeddings on the exported float32 graph
+    onnx-int8   OnnxEmbeddings on the int8-quantized graph (EMBEDDING_BACKEND=onnx)
+
+The model is exported and quantized locally with export_onnx. With
+``--random-weights`` it is an untrained BERT of all-MiniLM-L6-v2's shape
+(6 layers, 384 wide, 30522-token vocabulary): the speed is representative,
+the parity numbers only show the quantization error of random weights.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from models.embedder import SentenceTransformerEmbeddings
+from models.onnx_embedder import OnnxEmbeddings, export_onnx
+
+WORDS = ("invoice", "revenue", "region", "quarter", "customer", "order", "shipped", "pending", "contract",
+         "delivery", "warehouse", "payment", "supplier", "forecast", "budget", "north", "south", "report")
+
+
+def chunk_texts(count, rng, chars=1000):
+    texts = []
+    for _ in range(count):
+        words = []
+        while sum(len(word) + 1 for word in words) < chars:
+            words.append(rng.choice(WORDS) + (str(rng.randint(0, 999)) if rng.random() < 0.1 else ""))
+        texts.append(" ".join(words) + ".")
+    return texts
+
+
+def random_minilm(directory, texts):
+    """An untrained sentence-transformers BERT with all-MiniLM-L6-v2's dimensions, saved to ``directory``."""
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from tokenizers import Tokenizer, normalizers, pre_tokenizers, processors, trainers
+    from tokenizers.models import WordPiece
+    from transformers import BertConfig, BertModel, PreTrainedTokenizerFast
+
+    tokenizer = Tokenizer(WordPiece(unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.train_from_iterator(texts, trainers.WordPieceTrainer(
+        vocab_size=30522, special_tokens=["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]))
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", tokenizer.token_to_id("[CLS]")), ("[SEP]", tokenizer.token_to_id("[SEP]"))])
+    fast = PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]", pad_token="[PAD]",
+                                   cls_token="[CLS]", sep_token="[SEP]", mask_token="[MASK]")
+    torch.manual_seed(0)
+    bert_directory = os.path.join(directory, "bert")
+    BertModel(BertConfig(vocab_size=30522, hidden_size=384, num_hidden_layers=6, num_attention_heads=12,
+                         intermediate_size=1536)).save_pretrained(bert_directory)
+    fast.save_pretrained(bert_directory)
+    transformer = models.Transformer(bert_directory, max_seq_length=256)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), "mean")
+    model = SentenceTransformer(modules=[transformer, pooling, models.Normalize()], device="cpu")
+    model.save(os.path.join(directory, "sentence-transformer"))
+    return os.path.join(directory, "sentence-transformer")
+
+
+def docs_per_second(embeddings, texts, batch_size):
+    embeddings.embed_documents(texts[:batch_size])  # Warm-up: first-call allocations and graph setup
+    started = time.perf_counter()
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+    return len(texts) / (time.perf_counter() - started), np.asarray(vectors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="sentence-transformers model name or path")
+    parser.add_argument("--random-weights", action="store_true", help="Use an untrained model of the same shape")
+    parser.add_argument("--docs", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per call, as embed_chunks sends them")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts = chunk_texts(args.docs, rng)
+    with tempfile.TemporaryDirectory(prefix="embedding-bench-") as directory:
+        model = random_minilm(directory, texts) if args.random_weights else args.model
+        export_onnx(model, os.path.join(directory, "onnx"))
+        torch_embeddings = SentenceTransformerEmbeddings(model)
+        backends = {
+            "torch": torch_embeddings,
+            "onnx-fp32": OnnxEmbeddings(args.model, path=os.path.join(directory, "onnx"), onnx_file="model.onnx"),
+            "onnx-int8": OnnxEmbeddings(args.model, path=os.path.join(directory, "onnx")),
+        }
+        print(f"{args.docs} texts of ~1000 characters, batches of {args.batch_size}"
+              f"{' (random weights)' if args.random_weights else ''}")
+        reference = None
+        for name, embeddings in backends.items():
+            speed, vectors = docs_per_second(embeddings, texts, args.batch_size)
+            if reference is None:
+                reference = vectors
+                print(f"{name:10} {speed:8.1f} docs/s")
+                continue
+            cosines = (vectors * reference).sum(axis=1)  # Both are unit length
+            print(f"{name:10} {speed:8.1f} docs/s  cosine to torch: min {cosines.min():.4f} "
+                  f"mean {cosines.mean():.4f}")
+
+
+if __name__ == "__main__":
+    main()
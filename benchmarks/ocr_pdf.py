@@ -0,0 +1,127 @@
+"""OCR throughput on generated scanned PDFs: per-image serial OCR vs the OCR subsystem.
+
+Usage:
+    python -m benchmarks.ocr_pdf --documents 3 --pages 8 --workers 4
+    python -m benchmarks.ocr_pdf --simulate   # No tesseract binary: a stand-in that costs time like one
+
+Each page is a 300 DPI grayscale scan of rendered text with a logo and a
+horizontal rule, like letterhead. The baseline reads every embedded image
+with its own pytesseract call at full resolution, one page after another
+(what parsers/pdf_parser.py did). The subsystem runs three ways: cold cache,
+warm cache (the same files re-uploaded), and cold with a single worker to
+separate batching and filtering from parallelism. --simulate replaces
+tesseract with a function that sleeps for a fixed process start plus a cost
+per megapixel, so the structure of the pipeline can be checked anywhere;
+its timings are not OCR timings.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from parsers.ocr import OcrOptions, ocr_images, ocr_pdf, page_images, run_tesseract
+
+START_SECONDS = 0.15  # Simulated tesseract process start
+SECONDS_PER_MEGAPIXEL = 0.25
+
+
+def simulated_tesseract(images, lang="eng"):
+    time.sleep(START_SECONDS + SECONDS_PER_MEGAPIXEL * sum(image.width * image.height for image in images) / 1e6)
+    return [f"{image.size} ink {np.mean(np.asarray(image.convert('L')) < 128):.4f}" for image in images]
+
+
+def scanned_page(rng, words, font, size=(2480, 3508)):
+    page = Image.new("L", size, 238)
+    draw = ImageDraw.Draw(page)
+    draw.rectangle((150, 120, 450, 300), fill=40)  # Logo, identical on every page
+    draw.text((180, 190), "ACME", fill=230, font=font)
+    draw.rectangle((150, 340, size[0] - 150, 346), fill=60)  # Rule
+    for line in range(70):
+        text = " ".join(rng.choice(words, size=9))
+        draw.text((150, 420 + line * 42), text, fill=int(rng.integers(10, 60)), font=font)
+    noise = rng.normal(0, 6, size=(size[1], size[0]))
+    return Image.fromarray(np.clip(np.asarray(page, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+
+
+def logo():
+    image = Image.new("L", (300, 180), 40)
+    ImageDraw.Draw(image).text((30, 70), "ACME", fill=230, font=ImageFont.load_default(size=34))
+    return image
+
+
+def write_scanned_pdf(path, rng, pages, words):
+    """A PDF with one full-page 300 DPI scan per page, as a scanner produces."""
+    font = ImageFont.load_default(size=34)
+    scans = [scanned_page(rng, words, font) for _ in range(pages)]
+    scans[0].save(path, save_all=True, append_images=scans[1:], resolution=300)
+
+
+def baseline(paths, ocr_fn, lang):
+    """One OCR call per embedded image at full resolution, serially."""
+    import pdfplumber
+
+    texts = []
+    for path in paths:
+        with pdfplumber.open(path) as pdf:
+            for page in pdf.pages:
+                texts.append("\n".join(ocr_fn([image], lang)[0] for image in page_images(page)))
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=8, help="Pages per document")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--max-side", type=int, default=2500)
+    parser.add_argument("--simulate", action="store_true", help="Use a timed stand-in instead of tesseract")
+    args = parser.parse_args()
+
+    ocr_fn = simulated_tesseract if args.simulate else run_tesseract
+    rng = np.random.default_rng(0)
+    words = np.array([f"word{n}" for n in range(2000)] + ["invoice", "total", "payment", "account", "due"])
+    with tempfile.TemporaryDirectory(prefix="ocr-bench-") as directory:
+        paths = []
+        for n in range(args.documents):
+            paths.append(os.path.join(directory, f"scan{n}.pdf"))
+            write_scanned_pdf(paths[-1], rng, args.pages, words)
+        # The letterhead logo and rule arrive as separate small images on some scanners; time their handling too
+        extras = [logo() for _ in range(args.documents * args.pages)] + \
+                 [Image.new("L", (2000, 8), 60) for _ in range(args.documents * args.pages)]
+
+        rows = []
+        start = time.perf_counter()
+        baseline(paths, ocr_fn, "eng")
+        for image in extras:
+            ocr_fn([image], "eng")
+        rows.append(("per-image serial", time.perf_counter() - start))
+
+        cache_path = os.path.join(directory, "ocr.sqlite3")
+        options = OcrOptions(max_side=args.max_side, cache_path=cache_path, ocr_fn=ocr_fn)
+        for label, workers in ((f"subsystem, {args.workers} workers, cold", args.workers),
+                               (f"subsystem, {args.workers} workers, warm", args.workers)):
+            start = time.perf_counter()
+            for path in paths:
+                ocr_pdf(path, workers=workers, options=options)
+            ocr_images(extras, options)
+            rows.append((label, time.perf_counter() - start))
+        serial = OcrOptions(max_side=args.max_side, cache_path=os.path.join(directory, "serial.sqlite3"), ocr_fn=ocr_fn)
+        start = time.perf_counter()
+        for path in paths:
+            ocr_pdf(path, workers=1, options=serial)
+        ocr_images(extras, serial)
+        rows.append(("subsystem, 1 worker, cold", time.perf_counter() - start))
+
+    pages = args.documents * args.pages
+    print(f"{args.documents} scanned PDFs x {args.pages} pages at 300 DPI, {len(extras)} logo/rule images, "
+          f"{'simulated OCR' if args.simulate else 'tesseract'}, {os.cpu_count()} CPUs")
+    print(f"{'run':>34} {'seconds':>8} {'pages/s':>8}")
+    for label, seconds in rows:
+        print(f"{label:>34} {seconds:>8.2f} {pages / seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Success rate and throughput of every parser backend per file type, and what the registry routes to.
+
+Usage:
+    python -m benchmarks.parsers --rows 2000 --repeat 5
+
+Writes one generated document per format (a DOCX with a table, a PPTX deck,
+an XLSX and CSV of ``--rows`` rows, a JSON list of records, a text file and
+a text PDF), then:
+
+    backends  calls each registered backend ``--repeat`` times per file and
+              reports whether it produced text, its median MB/s and chars;
+              every call is recorded in the registry's stats
+    routed    then parses each file ``--files`` times through that registry,
+              as ingestion does, and prints the order it settled on (known-bad
+              backends dropped) and the mean time per file
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+from backend.parsing import register_parsers
+from parsers.registry import ParserRegistry
+
+WORDS = ("invoice", "revenue", "region", "north", "south", "quarter", "customer", "order", "shipped", "pending")
+
+
+def sentence(n):
+    return " ".join(WORDS[(n * 7 + i * 3) % len(WORDS)] for i in range(12)) + f" {n}."
+
+
+def write_pdf(path, pages, lines_per_page=40):
+    """A minimal PDF with one Helvetica text stream per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        lines = [sentence(page * lines_per_page + n) for n in range(lines_per_page)]
+        stream = "BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def write_fixtures(directory, rows):
+    from docx import Document
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    frame = pd.DataFrame({
+        "order_id": range(rows),
+        "region": [WORDS[n % 4 + 2] for n in range(rows)],
+        "quantity": [n % 17 for n in range(rows)],
+        "note": [sentence(n) for n in range(rows)],
+    })
+    paths = {}
+    paths[".csv"] = os.path.join(directory, "orders.csv")
+    frame.to_csv(paths[".csv"], index=False)
+    paths[".xlsx"] = os.path.join(directory, "orders.xlsx")
+    frame.to_excel(paths[".xlsx"], index=False)
+    paths[".json"] = os.path.join(directory, "orders.json")
+    with open(paths[".json"], "w") as f:
+        json.dump(frame.to_dict(orient="records"), f)
+    paths[".txt"] = os.path.join(directory, "notes.txt")
+    with open(paths[".txt"], "w") as f:
+        f.write("\n".join(sentence(n) for n in range(rows * 2)))
+
+    doc = Document()
+    for n in range(rows // 4):
+        doc.add_paragraph(sentence(n))
+    table = doc.add_table(rows=50, cols=4)
+    for row in range(50):
+        for col in range(4):
+            table.cell(row, col).text = WORDS[(row + col) % len(WORDS)]
+    paths[".docx"] = os.path.join(directory, "report.docx")
+    doc.save(paths[".docx"])
+
+    deck = Presentation()
+    for n in range(max(1, rows // 50)):
+        slide = deck.slides.add_slide(deck.slide_layouts[5])
+        slide.shapes.title.text = f"Slide {n}"
+        box = slide.shapes.add_textbox(Inches(1), Inches(2), Inches(8), Inches(4))
+        box.text_frame.text = "\n".join(sentence(n * 5 + i) for i in range(5))
+    paths[".pptx"] = os.path.join(directory, "deck.pptx")
+    deck.save(paths[".pptx"])
+
+    paths[".pdf"] = os.path.join(directory, "report.pdf")
+    write_pdf(paths[".pdf"], pages=max(1, rows // 100))
+    return paths
+
+
+def run_backend(backend, path):
+    """(text length, seconds) of one call, or (error, seconds) if it raised."""
+    started = time.perf_counter()
+    try:
+        result = backend.parse_fn(path, os.path.basename(path))
+        text = "\n".join(result) if backend.streaming else result
+    except Exception as e:
+        return f"{type(e).__name__}: {str(e)[:60]}", time.perf_counter() - started
+    return len(text or ""), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000, help="Rows (and scale) of the generated documents")
+    parser.add_argument("--repeat", type=int, default=5, help="Calls per backend and file")
+    parser.add_argument("--files", type=int, default=10, help="Files per type parsed through the registry")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="parser-bench-") as directory:
+        paths = write_fixtures(directory, args.rows)
+        registry = register_parsers(ParserRegistry())
+
+        print(f"{'type':6} {'backend':20} {'result':>10} {'MB/s':>8} {'KB':>8}")
+        for extension, path in paths.items():
+            size = os.path.getsize(path)
+            for backend in registry.order(extension):
+                runs = [run_backend(backend, path) for _ in range(args.repeat)]
+                for text, seconds in runs:
+                    success = not isinstance(text, str) and text > 0
+                    registry.stats_store.record(extension, backend.name, success, isinstance(text, str),
+                                                size, seconds)
+                result = runs[-1][0]
+                if isinstance(result, str):
+                    print(f"{extension:6} {backend.name:20} {'error':>10} {'':>8} {size / 1024:8.0f}  {result}")
+                    continue
+                seconds = statistics.median(seconds for _, seconds in runs)
+                speed = size / seconds / 2 ** 20 if result else 0.0
+                print(f"{extension:6} {backend.name:20} {f'{result} ch':>10} {speed:8.2f} {size / 1024:8.0f}")
+
+        print()
+        for extension, path in paths.items():
+            started = time.perf_counter()
+            for _ in range(args.files):
+                registry.parse(path, os.path.basename(path))
+            mean = (time.perf_counter() - started) / args.files
+            order = ", ".join(backend.name for backend in registry.order(extension))
+            print(f"routed {extension:6} {mean * 1000:8.1f} ms/file  order: {order}")
+
+
+if __name__ == "__main__":
+    main()
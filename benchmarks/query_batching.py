@@ -0,0 +1,80 @@
+"""Query-embedding throughput with and without micro-batching, across concurrency levels.
+
+Usage:
+    python -m benchmarks.query_batching                 # all-MiniLM-L6-v2 via sentence-transformers
+    python -m benchmarks.query_batching --synthetic     # simulated model: fixed per-call cost + per-text cost
+
+Each level fires ``--queries`` embed requests with at most ``concurrency`` in
+flight. "direct" runs one embed_query per request in a worker thread, which is
+what the async query paths did before; "batched" goes through QueryBatcher.
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from models.query_batcher import QueryBatcher
+
+
+class SyntheticModel:
+    """Stands in for an encoder whose cost is dominated by per-call overhead.
+
+    Calls are serialized, like forward passes competing for the same cores.
+    """
+
+    def __init__(self, call_seconds=0.004, text_seconds=0.0002):
+        self.call_seconds = call_seconds
+        self.text_seconds = text_seconds
+        self.device = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.device:
+            time.sleep(self.call_seconds + self.text_seconds * len(texts))
+        return [[0.0] * 384 for _ in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_model(args):
+    if args.synthetic:
+        return SyntheticModel()
+    from models.embedder import SentenceTransformerEmbeddings
+    return SentenceTransformerEmbeddings(args.model)
+
+
+async def run_level(embed, concurrency, queries):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(n):
+        async with slots:
+            await embed(f"benchmark query number {n} about document contents")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(queries)))
+    return queries / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--levels", default="1,4,16,64")
+    args = parser.parse_args()
+
+    model = load_model(args)
+    model.embed_query("warm up")
+    print(f"{'concurrency':>11} {'direct q/s':>11} {'batched q/s':>12} {'speedup':>8} {'mean batch':>11}")
+    for concurrency in [int(level) for level in args.levels.split(",")]:
+        batcher = QueryBatcher(model.embed_documents, args.window_ms / 1000, args.max_batch)
+        direct = asyncio.run(run_level(lambda text: asyncio.to_thread(model.embed_query, text), concurrency, args.queries))
+        batched = asyncio.run(run_level(batcher.embed, concurrency, args.queries))
+        print(f"{concurrency:>11} {direct:>11.0f} {batched:>12.0f} {batched / direct:>7.1f}x "
+              f"{batcher.stats()['mean_batch_size']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
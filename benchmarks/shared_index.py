@@ -0,0 +1,148 @@
+"""Worker memory and catch-up time with INDEX_SHARED: one mapped index for all workers vs a private copy each.
+
+Usage:
+    python -m benchmarks.shared_index --chunks 50000 --workers 4
+
+Writes a snapshot of ``--chunks`` chunks (about 1000 characters of text and a
+``--dimension``-wide float32 vector each) to a temporary directory, then:
+
+    memory   starts ``--workers`` worker processes that each load it, with
+             and without shared_index, search every vector and read every
+             text once, and reports each worker's PSS (proportional set
+             size: pages shared with the other workers count 1/n). The BM25
+             index is built per worker in both modes
+    refresh  one shared pipeline uploads a ``--batch``-chunk document; the
+             time another worker takes to see it (QAPipeline.refresh, which
+             applies the new log records) vs loading the index again, as a
+             worker without shared_index would have to
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from models.index_store import IndexStore
+from models.qa_pipeline import QAPipeline
+from models.vector_store import VectorStore
+
+WORDS = ("invoice", "revenue", "region", "quarter", "customer", "order", "shipped", "pending", "contract",
+         "delivery", "warehouse", "payment", "supplier", "forecast", "budget", "north", "south", "report")
+OPTIONS = {"backend": "flat"}  # An ANN index would be built per worker in both modes
+
+CHILD = """
+import json, sys
+import numpy as np
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from models.qa_pipeline import QAPipeline
+pipeline = QAPipeline(llm=FakeListChatModel(responses=["summary"]), index_dir=sys.argv[1],
+                      shared_index=sys.argv[2] == "shared", index_options={"backend": "flat"})
+pipeline.ensure_loaded()
+pipeline.vector_store.search_ids(np.zeros(pipeline.vector_store.dimension, dtype=np.float32), k=10)
+sum(len(text) for text in pipeline.documents.texts(pipeline.documents.ids()))
+pipeline.summarizer.wait()  # Loading queued a (fake) summary per document
+print(json.dumps({"chunks": len(pipeline.documents)}), flush=True)
+sys.stdin.readline()
+pipeline.close()
+"""
+
+
+def chunk_texts(count, rng, chars=1000):
+    texts = []
+    for _ in range(count):
+        words = []
+        while sum(len(word) + 1 for word in words) < chars:
+            words.append(rng.choice(WORDS))
+        texts.append(" ".join(words))
+    return texts
+
+
+def write_index(directory, chunks, files, dimension):
+    rng = random.Random(0)
+    vectors = np.random.default_rng(0).standard_normal((chunks, dimension)).astype(np.float32)
+    filenames = [f"report-{n % files}.pdf" for n in range(chunks)]
+    store = VectorStore(dimension, backend="flat")
+    ids = store.add_chunks(vectors, chunk_texts(chunks, rng), filenames)
+    chunk_ids = {}
+    for chunk_id, filename in zip(ids, filenames):
+        chunk_ids.setdefault(filename, []).append(chunk_id)
+    IndexStore(directory, shared=True).snapshot(store, {"uploaded_filenames": list(chunk_ids), "chunk_ids": chunk_ids,
+                                                        "content_hashes": {}})
+
+
+def pss_mb(pid):
+    """Proportional set size of a process in MB, or its RSS where the kernel has no smaps_rollup."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r", encoding="utf-8") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["Pss"].split()[0]) / 1024
+    except (OSError, KeyError):
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) / 1024
+
+
+def worker_memory(directory, workers, mode):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    processes = [subprocess.Popen([sys.executable, "-c", CHILD, directory, mode], cwd=root, text=True,
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE) for _ in range(workers)]
+    try:
+        for process in processes:
+            json.loads(process.stdout.readline())  # Loaded and touched everything
+        return [pss_mb(process.pid) for process in processes]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="shared-index-") as directory:
+        write_index(directory, args.chunks, args.files, args.dimension)
+        print(f"{args.chunks} chunks of ~1000 characters, {args.dimension}-d float32 vectors, {args.workers} workers")
+        for mode in ("private", "shared"):
+            pss = worker_memory(directory, args.workers, mode)
+            print(f"{mode:8} {statistics.mean(pss):8.1f} MB PSS per worker  ({sum(pss):.1f} MB in all)")
+
+        llm = FakeListChatModel(responses=["summary"])
+        writer = QAPipeline(llm=llm, index_dir=directory, shared_index=True, index_options=OPTIONS)
+        reader = QAPipeline(llm=llm, index_dir=directory, shared_index=True, index_options=OPTIONS)
+        reader.ensure_loaded()
+        rng = random.Random(1)
+        refresh, reload = [], []
+        for run in range(args.runs):
+            vectors = np.random.default_rng(run).standard_normal((args.batch, args.dimension)).astype(np.float32)
+            writer.add_document(f"upload-{run}.pdf", chunk_texts(args.batch, rng), vectors)
+            started = time.perf_counter()
+            reader.ensure_loaded()
+            refresh.append(time.perf_counter() - started)
+            assert f"upload-{run}.pdf" in reader.uploaded_filenames
+            started = time.perf_counter()
+            reloaded = QAPipeline(llm=llm, index_dir=directory, index_options=OPTIONS)
+            reloaded.ensure_loaded()
+            reload.append(time.perf_counter() - started)
+            reloaded.close()
+        print(f"refresh  {statistics.median(refresh) * 1000:8.1f} ms to see a {args.batch}-chunk upload")
+        print(f"reload   {statistics.median(reload) * 1000:8.1f} ms to load the whole index again")
+        for pipeline in (writer, reader):
+            pipeline.close()
+
+
+if __name__ == "__main__":
+    main()
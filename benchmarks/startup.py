@@ -0,0 +1,83 @@
+"""Worker startup: time and memory until the API can serve /healthz, and until /readyz turns ready.
+
+Usage:
+    python -m benchmarks.startup --runs 3
+
+Each run starts a fresh interpreter (so nothing is already imported) in a
+temporary state directory and measures:
+
+    import   importing backend.api: what a worker pays before it can serve
+             /healthz. No models are loaded and the heavy libraries
+             (torch, the Gemini client, document loaders, unstructured)
+             are not imported
+    eager    the same import followed by those heavy imports, as the API
+             module did before models were loaded lazily
+    ready    the import followed by MODELS.warm_up(): every registered
+             model loaded, as the background warm-up does at startup
+
+Models that cannot be loaded here (no network access to the model hub, no
+GOOGLE_API_KEY) are reported with their error; the import numbers do not
+depend on them.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+import backend.api
+from models.model_registry import MODELS
+result = {"import": time.perf_counter() - started}
+if sys.argv[1] == "eager":
+    import sentence_transformers, langchain_google_genai, unstructured.partition.auto
+    import langchain_community.document_loaders as loaders
+    for name in ("PyPDFLoader", "Docx2txtLoader", "UnstructuredPowerPointLoader", "CSVLoader", "JSONLoader"):
+        getattr(loaders, name)
+if sys.argv[1] == "ready":
+    result["ready"] = MODELS.warm_up()
+    result["models"] = MODELS.status()
+result["seconds"] = time.perf_counter() - started
+result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps(result))
+"""
+
+
+def run(mode, directory):
+    env = {**os.environ, "INDEX_DIR": os.path.join(directory, "index"),
+           "COLLECTIONS_DIR": os.path.join(directory, "collections"),
+           "EMBEDDING_CACHE_PATH": os.path.join(directory, "embedding_cache.sqlite3"),
+           "OCR_CACHE_PATH": os.path.join(directory, "ocr_cache.sqlite3"),
+           "CRAWL_CACHE_PATH": os.path.join(directory, "crawl_cache.sqlite3"),
+           "PARSER_STATS_PATH": os.path.join(directory, "parser_stats.sqlite3")}
+    output = subprocess.run([sys.executable, "-c", CHILD, mode], capture_output=True, text=True, env=env,
+                            check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="startup-bench-") as directory:
+        for mode in ("import", "eager", "ready"):
+            results = [run(mode, directory) for _ in range(args.runs)]
+            seconds = statistics.median(result["seconds"] for result in results)
+            rss = statistics.median(result["peak_rss_mb"] for result in results)
+            print(f"{mode:7} {seconds:6.2f}s  peak RSS {rss:6.0f} MB")
+        for name, status in results[-1]["models"].items():
+            if status["loaded"]:
+                loaded = f"{status['load_seconds']:.2f}s"
+            else:
+                loaded = f"not loaded: {status['error'].splitlines()[0]}"
+            print(f"  {name:11} {'required' if status['required'] else 'optional':8}  {loaded}")
+        print(f"  ready: {results[-1]['ready']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Peak memory and time to first searchable chunk: whole-text ingestion vs page streaming.
+
+Usage:
+    python -m benchmarks.streaming_ingest --sizes-mb 10 40
+
+For each size a text file of random sentences is written to disk, then
+ingested in a fresh process (so peak RSS is comparable) two ways:
+
+    whole   extract_text, split_document, embed_chunks, add_document, as the
+            upload path did: the joined text, all chunks and all vectors are
+            in memory at once
+    stream  iter_sections through a StreamingSplitter, embedding and
+            indexing 64-chunk batches with add_chunks as they are complete
+
+Embeddings are hashed bags of words, so the cost of a model is left out.
+"Peak over final" is the transient memory ingestion needed on top of what the
+index keeps afterwards; with streaming it should not grow with the file.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def rss_bytes():
+    """Current resident set size (Linux), falling back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def write_corpus(path, megabytes):
+    rng = np.random.default_rng(0)
+    vocabulary = np.array([f"term{n}" for n in range(5000)])
+    written = 0
+    with open(path, "w") as f:
+        while written < megabytes * 1024 * 1024:
+            line = " ".join(rng.choice(vocabulary, size=14)) + ".\n"
+            f.write(line)
+            written += len(line)
+
+
+def ingest(mode, path):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from backend.parsing import extract_text, iter_sections
+    from benchmarks.context_tokens import HashingEmbeddings
+    from models.qa_pipeline import QAPipeline
+
+    pipeline = QAPipeline(embeddings=HashingEmbeddings(dimension=64), llm=FakeListChatModel(responses=["-"]))
+    baseline = rss_bytes()
+    start = time.perf_counter()
+    first_searchable = None
+    if mode == "whole":
+        chunks = pipeline.split_document(extract_text(path, "corpus.txt"))
+        pipeline.add_document("corpus.txt", chunks, pipeline.embed_chunks(chunks))
+        first_searchable = time.perf_counter() - start
+        del chunks
+    else:
+        splitter = pipeline.streaming_splitter()
+        pipeline.begin_document("corpus.txt")
+        for section in iter_sections(path, "corpus.txt"):
+            ready = splitter.feed(section)
+            for offset in range(0, len(ready), 64):
+                batch = ready[offset:offset + 64]
+                pipeline.add_chunks("corpus.txt", batch, pipeline.embed_chunks(batch))
+                if first_searchable is None:
+                    first_searchable = time.perf_counter() - start
+        last = splitter.flush()
+        pipeline.add_chunks("corpus.txt", last, pipeline.embed_chunks(last))
+        pipeline.finish_document("corpus.txt")
+    total = time.perf_counter() - start
+    print(json.dumps({
+        "chunks": len(pipeline.documents),
+        "peak_over_baseline": peak_rss_bytes() - baseline,
+        "final_over_baseline": rss_bytes() - baseline,
+        "first_searchable": first_searchable,
+        "total": total,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--mode", choices=["whole", "stream"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        ingest(args.mode, args.path)
+        return
+
+    print(f"{'file':>7} {'mode':>7} {'chunks':>7} {'peak over final':>16} {'final':>9} {'first hit':>10} {'total':>8}")
+    with tempfile.TemporaryDirectory(prefix="stream-bench-") as directory:
+        for megabytes in args.sizes_mb:
+            path = os.path.join(directory, f"corpus{megabytes}.txt")
+            write_corpus(path, megabytes)
+            for mode in ("whole", "stream"):
+                output = subprocess.run([sys.executable, "-m", "benchmarks.streaming_ingest", "--mode", mode,
+                                         "--path", path], capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                transient = result["peak_over_baseline"] - result["final_over_baseline"]
+                print(f"{megabytes:>5}MB {mode:>7} {result['chunks']:>7} {transient / 2 ** 20:>14.0f}MB "
+                      f"{result['final_over_baseline'] / 2 ** 20:>7.0f}MB {result['first_searchable']:>9.2f}s "
+                      f"{result['total']:>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
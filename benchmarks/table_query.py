@@ -0,0 +1,88 @@
+"""Text embedded per table and latency of the columnar table query engine.
+
+Usage:
+    python -m benchmarks.table_query --rows 100000 1000000
+
+For each size a synthetic sales CSV (region, product, quantity, price, date)
+is written, read into a Table and saved column by column. The report compares
+what the embedding index gets (the whole CSV as text, as the loaders produced
+it, vs the schema, statistics and sample rows of Table.describe), then times
+aggregate, grouped and filtered questions answered from the memory-mapped
+columns. Every answer is checked against pandas on the same data.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from models.table_query import TableQueryEngine
+from models.table_store import Table
+
+REGIONS = ["Europe", "Asia", "North America", "South America", "Africa", "Oceania"]
+PRODUCTS = [f"Product {n}" for n in range(200)]
+
+
+def write_sales(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "order_id": np.arange(1, rows + 1),
+        "region": rng.choice(REGIONS, size=rows),
+        "product": rng.choice(PRODUCTS, size=rows),
+        "quantity": rng.integers(1, 50, size=rows),
+        "unit_price": rng.integers(100, 100_000, size=rows) / 100,
+        "order_date": pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, size=rows), unit="D"),
+    })
+    frame.to_csv(path, index=False)
+    return frame
+
+
+def expected_answers(frame):
+    """(question, substring the answer must contain) pairs, computed with pandas."""
+    europe = frame[frame["region"] == "Europe"]
+    in_2022 = frame[frame["order_date"].dt.year == 2022]
+    by_region = frame.groupby("region")["quantity"].sum().sort_values(ascending=False)
+    return [
+        ("What is the total quantity in Europe?", f": {europe['quantity'].sum():,} "),
+        ("average unit price of orders in 2022", f": {in_2022['unit_price'].mean():,.4f}".rstrip("0").rstrip(".")),
+        ("How many orders with quantity at least 40 in Asia?",
+         f": {((frame['quantity'] >= 40) & (frame['region'] == 'Asia')).sum():,} "),
+        ("total quantity by region", f"- {by_region.index[0]}: {by_region.iloc[0]:,}"),
+        ("number of distinct products per region", f": {frame.groupby('region')['product'].nunique().iloc[0]:,}"),
+        ("max unit price in Oceania", f": {frame[frame['region'] == 'Oceania']['unit_price'].max():,.2f}".rstrip("0").rstrip(".")),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = TableQueryEngine()
+    with tempfile.TemporaryDirectory(prefix="table-bench-") as directory:
+        for rows in args.rows:
+            path = os.path.join(directory, f"sales{rows}.csv")
+            frame = write_sales(path, rows)
+            start = time.perf_counter()
+            table = Table.read(path, "sales.csv")
+            table.save(os.path.join(directory, f"sales{rows}"))
+            table = Table.load(os.path.join(directory, f"sales{rows}"))
+            ingest = time.perf_counter() - start
+            print(f"{rows:,} rows: read and saved in {ingest:.2f}s; embedded text {os.path.getsize(path) / 1024:,.0f} KB "
+                  f"as CSV vs {len(table.describe()) / 1024:,.1f} KB as schema and sample")
+            for question, expected in expected_answers(frame):
+                samples = []
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    result = engine.answer(question, [table])
+                    samples.append(time.perf_counter() - start)
+                if result is None or expected not in result[0]:
+                    raise SystemExit(f"Wrong answer to {question!r}: {result} (expected {expected!r})")
+                print(f"  {np.median(samples) * 1000:7.1f} ms  {question}")
+
+
+if __name__ == "__main__":
+    main()
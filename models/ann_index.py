@@ -0,0 +1,166 @@
+import logging
+import math
+
+import faiss
+import numpy as np
+
+BACKENDS = ("flat", "hnsw", "ivf", "ivfpq")
+TRAINING_POINTS_PER_CELL = 64
+
+
+class AnnIndex:
+    """Approximate search structure built over the exact vectors a VectorStore keeps.
+
+    The VectorStore stays the source of truth for vectors, IDs and deletions;
+    an AnnIndex only answers "which IDs are probably closest". Backends that
+    cannot delete (HNSW) keep stale IDs, which the store filters out.
+    """
+
+    name = None
+    supports_remove = True
+
+    def __init__(self, dimension):
+        self.dimension = dimension
+        self.backend = self.name  # The backend that was asked for; may differ after a fallback
+        self.index = None
+        self.trained_size = 0  # Number of vectors the index was built from
+
+    def build(self, vectors, ids):
+        self.trained_size = len(ids)
+        if len(ids):
+            self.index.add_with_ids(vectors, ids)
+
+    def add(self, vectors, ids):
+        self.index.add_with_ids(vectors, ids)
+
+    def remove(self, ids):
+        self.index.remove_ids(np.array(ids, dtype=np.int64))
+
+    def search(self, query, k):
+        return self.index.search(query, k)
+
+    def memory_bytes(self):
+        return len(self) * self.bytes_per_vector()
+
+    def bytes_per_vector(self):
+        return self.dimension * 4 + 8  # Vector plus its id
+
+    def __len__(self):
+        return self.index.ntotal
+
+
+class HNSWIndex(AnnIndex):
+    """Graph index: high recall at low latency, no training, no deletions."""
+
+    name = "hnsw"
+    supports_remove = False
+
+    def __init__(self, dimension, m=32, ef_construction=80, ef_search=64):
+        super().__init__(dimension)
+        self.hnsw = faiss.IndexHNSWFlat(dimension, m)  # Kept referenced: the ID map does not own it
+        self.hnsw.hnsw.efConstruction = ef_construction
+        self.hnsw.hnsw.efSearch = ef_search
+        self.index = faiss.IndexIDMap(self.hnsw)
+
+    def set_ef_search(self, ef_search):
+        self.hnsw.hnsw.efSearch = ef_search
+
+    def bytes_per_vector(self):
+        return super().bytes_per_vector() + self.hnsw.hnsw.nb_neighbors(0) * 4  # Level-0 int32 links dominate
+
+
+class IVFIndex(AnnIndex):
+    """Inverted lists over k-means cells; ``nprobe`` cells are scanned per query."""
+
+    name = "ivf"
+
+    def __init__(self, dimension, nlist, nprobe=8):
+        super().__init__(dimension)
+        self.quantizer = faiss.IndexFlatL2(dimension)
+        self.index = self.make_index(nlist)
+        self.index.nprobe = nprobe
+
+    def make_index(self, nlist):
+        return faiss.IndexIVFFlat(self.quantizer, self.dimension, nlist)
+
+    def build(self, vectors, ids):
+        # k-means converges on a sample of a few dozen points per cell; training on everything only costs time
+        sample = min(len(vectors), TRAINING_POINTS_PER_CELL * self.index.nlist)
+        if sample < len(vectors):
+            vectors_sample = vectors[np.random.default_rng(0).choice(len(vectors), sample, replace=False)]
+        else:
+            vectors_sample = vectors
+        self.index.train(vectors_sample)
+        super().build(vectors, ids)
+
+    def set_nprobe(self, nprobe):
+        self.index.nprobe = nprobe
+
+
+class IVFPQIndex(IVFIndex):
+    """IVF with product-quantized residuals: a few bytes per vector, approximate distances.
+
+    Callers should re-rank a larger candidate set with exact vectors.
+    """
+
+    name = "ivfpq"
+
+    def make_index(self, nlist):
+        return faiss.IndexIVFPQ(self.quantizer, self.dimension, nlist, pq_subquantizers(self.dimension), 8)
+
+    def bytes_per_vector(self):
+        return pq_subquantizers(self.dimension) + 8
+
+
+def pq_subquantizers(dimension):
+    """Largest divisor of ``dimension`` that gives sub-vectors of at least 4 dimensions."""
+    for m in range(max(1, dimension // 4), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def ivf_cells(count):
+    """Number of IVF cells for ``count`` vectors: about 4*sqrt(n), with ~39+ points per cell to train on."""
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+def choose_backend(count, hnsw_min=20_000, ivf_min=200_000, ivfpq_min=2_000_000):
+    """Pick the backend for a corpus of ``count`` chunks.
+
+    Exact search is fast enough below ``hnsw_min``; HNSW gives the best
+    recall/latency until its memory cost grows; IVF then trades a little recall
+    for cheaper builds, and IVF-PQ compresses vectors for the largest corpora.
+    """
+    if count >= ivfpq_min:
+        return "ivfpq"
+    if count >= ivf_min:
+        return "ivf"
+    if count >= hnsw_min:
+        return "hnsw"
+    return "flat"
+
+
+def make_index(backend, dimension, count, nprobe=8, ef_search=64, hnsw_m=32):
+    """Create an empty AnnIndex for ``count`` vectors, or None for exact (flat) search."""
+    if backend == "flat":
+        return None
+    if backend == "hnsw":
+        return HNSWIndex(dimension, m=hnsw_m, ef_search=ef_search)
+    if backend == "ivfpq" and count < 256:
+        backend = "ivf"  # 8-bit PQ codebooks need at least 256 training vectors
+    if backend == "ivf":
+        return IVFIndex(dimension, ivf_cells(count), nprobe=nprobe)
+    if backend == "ivfpq":
+        return IVFPQIndex(dimension, ivf_cells(count), nprobe=nprobe)
+    raise ValueError(f"Unknown index backend {backend!r}; expected one of {', '.join(BACKENDS)} or auto")
+
+
+def build_index(backend, vectors, ids, **options):
+    """Build an AnnIndex over the given float32 vectors and int64 IDs."""
+    index = make_index(backend, vectors.shape[1], len(ids), **options)
+    if index is not None:
+        index.backend = backend
+        index.build(vectors, ids)
+        logging.debug(f"Built {backend} index over {len(ids)} vectors")
+    return index
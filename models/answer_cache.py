@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Cache of LLM answers looked up by query-embedding similarity.
+
+    Each entry keeps the normalized query vector, the chunk IDs that were
+    retrieved for it, the answer and its references. A new query is served from
+    the cache when its cosine similarity to a cached query reaches ``threshold``.
+    Entries expire after ``ttl_seconds`` and the least recently used ones are
+    dropped beyond ``max_entries``. Adding documents can change any retrieval,
+    so it clears the cache; deleting a document only drops the entries whose
+    answers were built from its chunks.
+    """
+
+    def __init__(self, threshold=0.95, ttl_seconds=3600, max_entries=1000, clock=time.monotonic):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = OrderedDict()  # entry key -> dict
+        self.next_key = 0
+        self.matrix = None  # Stacked query vectors, rebuilt lazily after changes
+        self.matrix_keys = []
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, query_vector):
+        """Return (answer, references) for the most similar cached query, or None on a miss."""
+        with self.lock:
+            self.expire()
+            key = self.best_match(self.normalize(query_vector))
+            if key is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            entry = self.entries[key]
+            return entry["answer"], list(entry["references"])
+
+    def put(self, query_vector, chunk_ids, answer, references):
+        with self.lock:
+            self.entries[self.next_key] = {
+                "vector": self.normalize(query_vector),
+                "chunk_ids": set(chunk_ids),
+                "answer": answer,
+                "references": list(references),
+                "created_at": self.clock(),
+            }
+            self.next_key += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.matrix = None
+
+    def invalidate(self, chunk_ids=None):
+        """Drop the entries built from any of ``chunk_ids``, or every entry when it is None."""
+        with self.lock:
+            if chunk_ids is None:
+                stale = list(self.entries)
+            else:
+                chunk_ids = set(chunk_ids)
+                stale = [key for key, entry in self.entries.items() if entry["chunk_ids"] & chunk_ids]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+            if stale:
+                self.matrix = None
+
+    def best_match(self, vector):
+        """Key of the most similar fresh entry above the threshold. Caller holds the lock."""
+        if not self.entries:
+            return None
+        if self.matrix is None:
+            self.matrix_keys = list(self.entries)
+            self.matrix = np.stack([self.entries[key]["vector"] for key in self.matrix_keys])
+        similarities = self.matrix @ vector
+        for position in np.argsort(-similarities):
+            if similarities[position] < self.threshold:
+                return None
+            key = self.matrix_keys[position]
+            if key in self.entries:
+                return key
+        return None
+
+    def expire(self):
+        """Drop entries older than the TTL. Caller holds the lock."""
+        deadline = self.clock() - self.ttl_seconds
+        expired = [key for key, entry in self.entries.items() if entry["created_at"] < deadline]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self.matrix = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,264 @@
+import math
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+# Words, numbers and identifiers such as "AB-1234", "order_id" or "v2.1" stay whole
+TOKEN = re.compile(r"\w+(?:[-./]\w+)*")
+# Rough CPython overhead of one term: its dict entry, PostingList object and two array headers
+TERM_BYTES = 300
+POSTINGS_FILE = "bm25.npz"
+
+
+def tokenize(text):
+    """Lowercased tokens; compound identifiers also yield their parts so "AB-1234" matches "1234"."""
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-./_]", token) if part)
+    return tokens
+
+
+def grow(values, size):
+    """Return ``values`` with room for at least ``size`` entries, doubling so appends stay amortized O(1)."""
+    if size <= len(values):
+        return values
+    grown = np.zeros(max(size, 2 * len(values)), dtype=values.dtype)
+    grown[:len(values)] = values
+    return grown
+
+
+class PostingList:
+    """Chunk ids and term frequencies for one term, in insertion order.
+
+    Stored as compact typed arrays that numpy reads without copying. Removed
+    chunks stay in them as dead entries until they make up half of the list,
+    then the list is compacted in one vectorized pass.
+    """
+
+    __slots__ = ("term", "ids", "frequencies", "dead")
+
+    def __init__(self, term):
+        self.term = term
+        self.ids = array("q")
+        self.frequencies = array("f")
+        self.dead = 0
+
+    def append(self, chunk_id, frequency):
+        self.ids.append(chunk_id)
+        self.frequencies.append(frequency)
+
+    def arrays(self):
+        return np.frombuffer(self.ids, dtype=np.int64), np.frombuffer(self.frequencies, dtype=np.float32)
+
+    def compact(self, live):
+        ids, frequencies = self.arrays()
+        keep = live[ids]
+        self.ids = array("q", ids[keep].tobytes())
+        self.frequencies = array("f", frequencies[keep].tobytes())
+        self.dead = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class BM25Index:
+    """Inverted index scored with Okapi BM25, updated chunk by chunk.
+
+    Chunk ids are the vector store's non-negative integer ids; chunk lengths
+    and liveness live in arrays indexed by them, so a query scores a whole
+    posting list with a few numpy operations. Each chunk's posting lists are
+    kept so a delete only touches those; for chunks read back by ``load``
+    they are looked up in the saved chunk-to-term table when needed.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # Term -> PostingList
+        self.chunk_terms = {}  # Chunk id -> tuple of the PostingLists it appears in
+        self.lengths = np.zeros(1024, dtype=np.float32)  # Chunk id -> number of tokens
+        self.live = np.zeros(1024, dtype=bool)  # Chunk id -> still indexed
+        self.total_length = 0
+        self.posting_count = 0
+        self.count = 0
+        # Set by load: the saved PostingLists and, per chunk id, the slice of saved_term_ids listing its terms
+        self.saved_postings = None
+        self.saved_starts = self.saved_sizes = self.saved_term_ids = None
+
+    def chunk_postings(self, chunk_id):
+        """The PostingLists an indexed chunk appears in, or None if it is not indexed."""
+        postings = self.chunk_terms.get(chunk_id)
+        if postings is None and self.saved_postings is not None and chunk_id < len(self.live) and self.live[chunk_id]:
+            start = int(self.saved_starts[chunk_id])
+            term_ids = self.saved_term_ids[start:start + int(self.saved_sizes[chunk_id])]
+            postings = tuple(self.saved_postings[term_id] for term_id in term_ids.tolist())
+        return postings
+
+    def add(self, chunk_id, text):
+        old_postings = self.chunk_postings(chunk_id)
+        if old_postings is not None:
+            self.remove([chunk_id])
+            for posting in old_postings:  # The id is about to be live again; its old postings must not be
+                if posting.dead:
+                    posting.compact(self.live)
+        terms = Counter(tokenize(text))
+        self.lengths = grow(self.lengths, chunk_id + 1)
+        self.live = grow(self.live, chunk_id + 1)
+        length = sum(terms.values())
+        self.lengths[chunk_id] = length
+        self.live[chunk_id] = True
+        self.total_length += length
+        self.posting_count += len(terms)
+        self.count += 1
+        postings = []
+        for term, frequency in terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = PostingList(term)
+            posting.append(chunk_id, frequency)
+            postings.append(posting)
+        self.chunk_terms[chunk_id] = tuple(postings)
+
+    def remove(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            postings = self.chunk_postings(chunk_id)
+            if postings is None:
+                continue
+            self.chunk_terms.pop(chunk_id, None)
+            self.live[chunk_id] = False
+            self.total_length -= int(self.lengths[chunk_id])
+            self.posting_count -= len(postings)
+            self.count -= 1
+            for posting in postings:
+                posting.dead += 1
+                if posting.dead == len(posting):
+                    del self.postings[posting.term]
+                elif posting.dead * 2 > len(posting):
+                    posting.compact(self.live)
+
+    def search(self, query, k=20):
+        """Top-k (chunk id, score) pairs for the query, best first."""
+        if not self.count:
+            return []
+        count = self.count
+        norm = self.k1 * (1 - self.b)
+        slope = self.k1 * self.b / (self.total_length / count)
+        matched_ids, matched_scores = [], []
+        for term, query_frequency in Counter(tokenize(query)).items():
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            ids, frequencies = posting.arrays()
+            if posting.dead:
+                keep = self.live[ids]
+                ids, frequencies = ids[keep], frequencies[keep]
+            idf = math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+            weight = idf * query_frequency * (self.k1 + 1)
+            matched_ids.append(ids)
+            matched_scores.append(weight * frequencies / (frequencies + norm + slope * self.lengths[ids]))
+        if not matched_ids:
+            return []
+        if len(matched_ids) == 1:
+            ids, scores = matched_ids[0], matched_scores[0]
+        else:
+            # Sum each chunk's per-term scores; ids are unique within a posting list, not across them
+            totals = np.bincount(np.concatenate(matched_ids), weights=np.concatenate(matched_scores))
+            ids = np.flatnonzero(totals)
+            scores = totals[ids]
+        if len(ids) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.lexsort((ids, -scores))
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+    def ids(self):
+        return np.flatnonzero(self.live)
+
+    def save(self, directory):
+        """Write the live postings and each chunk's terms to ``directory``, so ``load`` need not re-tokenize."""
+        terms = list(self.postings)
+        ids, frequencies = [], []
+        for term in terms:
+            posting = self.postings[term]
+            posting_ids, posting_frequencies = posting.arrays()
+            if posting.dead:
+                keep = self.live[posting_ids]
+                posting_ids, posting_frequencies = posting_ids[keep], posting_frequencies[keep]
+            ids.append(posting_ids)
+            frequencies.append(posting_frequencies)
+        sizes = np.array([len(posting_ids) for posting_ids in ids], dtype=np.int64)
+        ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+        frequencies = np.concatenate(frequencies) if frequencies else np.zeros(0, dtype=np.float32)
+        chunk_ids = self.ids()
+        # The same entries grouped by chunk instead of by term; tokens never contain a newline
+        term_ids = np.repeat(np.arange(len(terms), dtype=np.int32), sizes)[np.argsort(ids, kind="stable")]
+        chunk_sizes = np.bincount(ids, minlength=len(self.live))[chunk_ids]
+        with open(os.path.join(directory, POSTINGS_FILE), "wb") as f:
+            np.savez(f, terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8), sizes=sizes,
+                     ids=ids, frequencies=frequencies, chunk_ids=chunk_ids, lengths=self.lengths[chunk_ids],
+                     chunk_sizes=chunk_sizes, term_ids=term_ids)
+
+    @classmethod
+    def load(cls, directory, **kwargs):
+        """Read postings written by ``save``, or return None if ``directory`` has none."""
+        path = os.path.join(directory, POSTINGS_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as saved:
+            terms = saved["terms"].tobytes().decode("utf-8")
+            sizes, ids, frequencies = saved["sizes"], saved["ids"], saved["frequencies"]
+            chunk_ids, lengths = saved["chunk_ids"], saved["lengths"]
+            chunk_sizes, term_ids = saved["chunk_sizes"], saved["term_ids"]
+        index = cls(**kwargs)
+        postings = []
+        start = 0
+        for term, size in zip(terms.split("\n") if terms else [], sizes.tolist()):
+            posting = index.postings[term] = PostingList(term)
+            posting.ids = array("q", ids[start:start + size].tobytes())
+            posting.frequencies = array("f", frequencies[start:start + size].tobytes())
+            postings.append(posting)
+            start += size
+        size = int(chunk_ids.max()) + 1 if len(chunk_ids) else 0
+        index.lengths = grow(index.lengths, size)
+        index.live = grow(index.live, size)
+        index.lengths[chunk_ids] = lengths
+        index.live[chunk_ids] = True
+        index.total_length = int(lengths.sum())
+        index.posting_count = len(ids)
+        index.count = len(chunk_ids)
+        index.saved_postings = postings
+        index.saved_starts = np.zeros(size, dtype=np.int64)
+        index.saved_sizes = np.zeros(size, dtype=np.int64)
+        index.saved_starts[chunk_ids] = np.cumsum(chunk_sizes) - chunk_sizes
+        index.saved_sizes[chunk_ids] = chunk_sizes
+        index.saved_term_ids = term_ids
+        return index
+
+    def memory_bytes(self):
+        # Each posting: int64 id, float32 frequency and its reference in chunk_terms
+        return self.posting_count * 20 + len(self.postings) * TERM_BYTES
+
+    def stats(self):
+        return {"chunks": self.count, "terms": len(self.postings)}
+
+    def __len__(self):
+        return self.count
+
+
+def reciprocal_rank_fusion(rankings, k=60, scores=None):
+    """Fuse ranked lists of ids: each list contributes 1 / (k + rank) per id. Returns ids, best first.
+
+    If ``scores`` is a dict, each id's fused score is stored in it.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    if scores is not None:
+        scores.update(fused)
+    return sorted(fused, key=lambda item: (-fused[item], item))
@@ -0,0 +1,218 @@
+import json
+import mmap
+import os
+from collections.abc import Mapping
+
+import numpy as np
+from langchain_core.documents import Document
+
+from models.bm25_index import grow
+
+# Per chunk id: int64 offset, int32 length and int32 filename id
+SLOT_BYTES = 16
+# Rough CPython overhead of one interned filename: its str, list slot and dict entry
+FILENAME_BYTES = 150
+TEXTS_FILE = "texts.bin"
+SLOTS_FILE = "chunks.npz"
+FILENAMES_FILE = "filenames.json"
+
+
+class ChunkStore(Mapping):
+    """Chunk texts and source filenames, packed so a chunk costs its UTF-8 bytes plus 16.
+
+    Texts sit back to back in one bytearray, addressed through offset and
+    length arrays indexed by chunk id (ids are small, dense integers handed out
+    by VectorStore). Filenames are interned: each chunk stores the integer id
+    of its filename. Removing a chunk only clears its slot; the dead bytes are
+    reclaimed in one pass once they outweigh the live ones.
+
+    A store opened with ``load`` reads the saved texts straight from a
+    read-only memory map, which worker processes opening the same snapshot
+    share; texts added afterwards go to a private buffer behind it.
+
+    As a mapping it reads like the dict it replaces, chunk id -> {"text",
+    "filename"}, with the dicts built on access.
+    """
+
+    def __init__(self, min_compact_bytes=1024 * 1024, base=b""):
+        self.base = base  # Saved texts (a read-only mmap after load); offsets below len(base) point into it
+        self.buffer = bytearray()
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.int32)
+        self.file_ids = np.zeros(0, dtype=np.int32)  # -1: no chunk with this id
+        self.filenames = []  # Filename id -> filename
+        self.filename_ids = {}  # Filename -> filename id
+        self.count = 0
+        self.dead_bytes = 0  # In the private buffer
+        self.dead_base_bytes = 0
+        self.min_compact_bytes = min_compact_bytes
+
+    def intern(self, filename):
+        filename_id = self.filename_ids.get(filename)
+        if filename_id is None:
+            filename_id = self.filename_ids[filename] = len(self.filenames)
+            self.filenames.append(filename)
+        return filename_id
+
+    def add(self, ids, texts, filenames):
+        """Store one text and filename per chunk id; an id already present is replaced."""
+        ids = [int(chunk_id) for chunk_id in ids]
+        if not ids:
+            return
+        self.remove([chunk_id for chunk_id in ids if chunk_id in self])
+        size = max(ids) + 1
+        if size > len(self.file_ids):
+            self.offsets = grow(self.offsets, size)
+            self.lengths = grow(self.lengths, size)
+            grown = np.full(len(self.offsets), -1, dtype=np.int32)
+            grown[:len(self.file_ids)] = self.file_ids
+            self.file_ids = grown
+        for chunk_id, text, filename in zip(ids, texts, filenames):
+            encoded = text.encode("utf-8", "surrogatepass")  # Lone surrogates round-trip
+            self.offsets[chunk_id] = len(self.base) + len(self.buffer)
+            self.lengths[chunk_id] = len(encoded)
+            self.file_ids[chunk_id] = self.intern(filename)
+            self.buffer += encoded
+        self.count += len(ids)
+
+    def remove(self, ids):
+        """Drop chunks by id; unknown ids are ignored. Returns how many were removed."""
+        removed = 0
+        for chunk_id in ids:
+            if chunk_id in self:
+                self.file_ids[chunk_id] = -1
+                if self.offsets[chunk_id] < len(self.base):
+                    self.dead_base_bytes += int(self.lengths[chunk_id])
+                else:
+                    self.dead_bytes += int(self.lengths[chunk_id])
+                removed += 1
+        self.count -= removed
+        if self.dead_bytes > max(self.min_compact_bytes, len(self.buffer) - self.dead_bytes):
+            self.compact()
+        return removed
+
+    def compact(self):
+        """Rewrite the private buffer without the texts of removed chunks; the saved texts cannot change."""
+        ids = self.ids()
+        ids = ids[self.offsets[ids] >= len(self.base)]
+        buffer = bytearray()
+        offsets = self.offsets.copy()
+        for chunk_id in ids.tolist():
+            start = int(self.offsets[chunk_id]) - len(self.base)
+            offsets[chunk_id] = len(self.base) + len(buffer)
+            buffer += self.buffer[start:start + int(self.lengths[chunk_id])]
+        self.buffer, self.offsets, self.dead_bytes = buffer, offsets, 0
+
+    def ids(self):
+        """Ids of the stored chunks, ascending, as an int64 array."""
+        return np.flatnonzero(self.file_ids >= 0).astype(np.int64)
+
+    def text(self, chunk_id):
+        start = int(self.offsets[chunk_id])
+        if start < len(self.base):
+            return self.base[start:start + int(self.lengths[chunk_id])].decode("utf-8", "surrogatepass")
+        start -= len(self.base)
+        return self.buffer[start:start + int(self.lengths[chunk_id])].decode("utf-8", "surrogatepass")
+
+    def texts(self, ids):
+        return [self.text(chunk_id) for chunk_id in ids]
+
+    def filename(self, chunk_id):
+        return self.filenames[self.file_ids[chunk_id]]
+
+    def memory_bytes(self):
+        """Bytes held: the texts (with any dead bytes), the per-id slots and the interned filenames."""
+        return (len(self.base) + len(self.buffer) + len(self.file_ids) * SLOT_BYTES
+                + sum(len(filename or "") for filename in self.filenames) + len(self.filenames) * FILENAME_BYTES)
+
+    def stats(self):
+        memory = self.memory_bytes()
+        return {
+            "chunks": self.count,
+            "filenames": len(self.filenames),
+            "text_bytes": len(self.base) - self.dead_base_bytes + len(self.buffer) - self.dead_bytes,
+            "mapped_bytes": len(self.base),
+            "bytes": memory,
+            "bytes_per_chunk": memory / self.count if self.count else 0.0,
+        }
+
+    def save(self, directory):
+        """Write the live chunks to ``directory``: their texts back to back, then their ids, lengths and filenames."""
+        ids = self.ids()
+        with open(os.path.join(directory, TEXTS_FILE), "wb") as f:
+            for chunk_id in ids.tolist():
+                start = int(self.offsets[chunk_id])
+                length = int(self.lengths[chunk_id])
+                if start < len(self.base):
+                    f.write(self.base[start:start + length])
+                else:
+                    f.write(self.buffer[start - len(self.base):start - len(self.base) + length])
+        with open(os.path.join(directory, SLOTS_FILE), "wb") as f:
+            np.savez(f, ids=ids, lengths=self.lengths[ids], file_ids=self.file_ids[ids])
+        with open(os.path.join(directory, FILENAMES_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.filenames, f)
+
+    @classmethod
+    def load(cls, directory, mmap_texts=True):
+        """Open chunks written by ``save``; with ``mmap_texts`` the texts are paged in from disk as they are read."""
+        with open(os.path.join(directory, TEXTS_FILE), "rb") as f:
+            if mmap_texts and os.fstat(f.fileno()).st_size:
+                base = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # Stays valid after the file is closed
+            else:
+                base = f.read()
+        with np.load(os.path.join(directory, SLOTS_FILE)) as slots:
+            ids, lengths, file_ids = slots["ids"], slots["lengths"], slots["file_ids"]
+        with open(os.path.join(directory, FILENAMES_FILE), "r", encoding="utf-8") as f:
+            filenames = json.load(f)
+        store = cls(base=base)
+        size = int(ids.max()) + 1 if len(ids) else 0
+        store.offsets = np.zeros(size, dtype=np.int64)
+        store.lengths = np.zeros(size, dtype=np.int32)
+        store.file_ids = np.full(size, -1, dtype=np.int32)
+        store.offsets[ids] = np.cumsum(lengths, dtype=np.int64) - lengths
+        store.lengths[ids] = lengths
+        store.file_ids[ids] = file_ids
+        store.filenames = filenames
+        store.filename_ids = {filename: filename_id for filename_id, filename in enumerate(filenames)}
+        store.count = len(ids)
+        return store
+
+    def __contains__(self, chunk_id):
+        try:
+            return 0 <= chunk_id < len(self.file_ids) and self.file_ids[chunk_id] >= 0
+        except TypeError:
+            return False
+
+    def __getitem__(self, chunk_id):
+        if chunk_id not in self:
+            raise KeyError(chunk_id)
+        return {"text": self.text(chunk_id), "filename": self.filename(chunk_id)}
+
+    def __iter__(self):
+        return iter(self.ids().tolist())
+
+    def __len__(self):
+        return self.count
+
+
+class ChunkDocuments(Mapping):
+    """Read-only view of a ChunkStore as chunk id -> LangChain Document, built on access."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __getitem__(self, chunk_id):
+        if chunk_id not in self.chunks:
+            raise KeyError(chunk_id)
+        filename = self.chunks.filename(chunk_id)
+        return Document(page_content=self.chunks.text(chunk_id),
+                        metadata={"filename": filename} if filename is not None else {})
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.chunks
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __len__(self):
+        return len(self.chunks)
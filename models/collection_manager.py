@@ -0,0 +1,127 @@
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+class CollectionBudgetExceeded(ValueError):
+    pass
+
+
+class CollectionManager:
+    """Named collections, each a QAPipeline with its own index directory under ``root``.
+
+    Collections are loaded from disk on first use and kept in memory in LRU
+    order. When the resident collections together take more than
+    ``max_resident_bytes`` the least recently used idle ones are dropped; their
+    state is already on disk, so the next request reloads them. A collection is
+    idle when no request or ingestion holds it (see ``use``) and it has no
+    summaries pending. Each collection may grow to ``collection_max_bytes``.
+    """
+
+    def __init__(self, root, make_pipeline, max_resident_bytes=2 * 1024 ** 3, collection_max_bytes=512 * 1024 ** 2):
+        self.root = root
+        self.make_pipeline = make_pipeline  # (name, directory) -> QAPipeline
+        self.max_resident_bytes = max_resident_bytes
+        self.collection_max_bytes = collection_max_bytes
+        self.resident = OrderedDict()  # Name -> QAPipeline, least recently used first
+        self.users = {}  # Name -> number of requests currently holding it
+        self.loads = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def validate(name):
+        if not COLLECTION_NAME.match(name or ""):
+            raise ValueError(
+                f"Invalid collection name {name!r}: use 1-64 letters, digits, '-' or '_', starting with a letter or digit"
+            )
+
+    def directory(self, name):
+        return os.path.join(self.root, name)
+
+    def adopt(self, name, legacy_directory):
+        """Move a pre-collections index directory into place as collection ``name``, once."""
+        directory = self.directory(name)
+        if os.path.exists(directory) or not os.path.exists(os.path.join(legacy_directory, "CURRENT")):
+            return False
+        os.replace(legacy_directory, directory)
+        logging.info(f"Moved the index at {legacy_directory} into collection {name}")
+        return True
+
+    def names(self):
+        """Every collection that exists on disk or in memory."""
+        on_disk = [name for name in os.listdir(self.root) if os.path.isdir(self.directory(name))]
+        return sorted(set(on_disk) | set(self.resident))
+
+    def get(self, name):
+        """Return the pipeline for ``name``, loading (or creating) it if it is not resident."""
+        self.validate(name)
+        with self.lock:
+            pipeline = self.resident.get(name)
+            if pipeline is None:
+                directory = self.directory(name)
+                os.makedirs(directory, exist_ok=True)
+                pipeline = self.make_pipeline(name, directory)
+                self.resident[name] = pipeline
+                self.loads += 1
+                logging.debug(f"Opened collection {name} from {directory}")
+            self.resident.move_to_end(name)
+        return pipeline
+
+    @contextmanager
+    def use(self, name):
+        """Hold a collection for the duration of a request so it cannot be evicted mid-way."""
+        pipeline = self.get(name)
+        with self.lock:
+            self.users[name] = self.users.get(name, 0) + 1
+        try:
+            yield pipeline
+        finally:
+            with self.lock:
+                self.users[name] -= 1
+                if not self.users[name]:
+                    del self.users[name]
+            self.evict()
+
+    def check_budget(self, name, pipeline, extra_bytes):
+        """Raise CollectionBudgetExceeded if adding ``extra_bytes`` would take the collection over its budget."""
+        used = pipeline.memory_bytes()
+        if used + extra_bytes > self.collection_max_bytes:
+            raise CollectionBudgetExceeded(
+                f"Collection {name} would use {used + extra_bytes} bytes, over its {self.collection_max_bytes} byte budget"
+            )
+
+    def evict(self):
+        """Drop least recently used idle collections until the resident ones fit in max_resident_bytes."""
+        with self.lock:
+            sizes = {name: pipeline.memory_bytes() for name, pipeline in self.resident.items()}
+            total = sum(sizes.values())
+            for name in list(self.resident):
+                if total <= self.max_resident_bytes:
+                    break
+                pipeline = self.resident[name]
+                if name in self.users or pipeline.summarizer.pending:
+                    continue
+                del self.resident[name]
+                pipeline.close()
+                total -= sizes[name]
+                self.evictions += 1
+                logging.debug(f"Evicted collection {name} ({sizes[name]} bytes) from memory")
+
+    def stats(self):
+        with self.lock:
+            resident = {name: pipeline.memory_bytes() for name, pipeline in self.resident.items()}
+        return {
+            "resident": resident,
+            "resident_bytes": sum(resident.values()),
+            "max_resident_bytes": self.max_resident_bytes,
+            "collection_max_bytes": self.collection_max_bytes,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
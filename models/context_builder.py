@@ -0,0 +1,159 @@
+import logging
+import threading
+
+import numpy as np
+
+
+def approximate_tokens(texts):
+    """About four characters per token: a stand-in for when no tokenizer is available."""
+    return [(len(text) + 3) // 4 for text in texts]
+
+
+class HuggingFaceTokenCounter:
+    """Counts tokens with a Hugging Face ``tokenizers`` tokenizer, loaded on first use.
+
+    Falls back to ``approximate_tokens`` (with a warning) if the tokenizer
+    cannot be loaded, e.g. on a machine without access to the model hub.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.tokenizer = None
+        self.unavailable = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.tokenizer is None and not self.unavailable:
+                try:
+                    from tokenizers import Tokenizer
+                    tokenizer = Tokenizer.from_pretrained(self.name)
+                    tokenizer.no_truncation()  # Embedding tokenizers ship with truncation at their input limit
+                    tokenizer.no_padding()
+                    self.tokenizer = tokenizer
+                except Exception as e:
+                    self.unavailable = True
+                    logging.warning(f"Could not load tokenizer {self.name}; estimating tokens from length: {str(e)}")
+        return self.tokenizer
+
+    def __call__(self, texts):
+        tokenizer = self.load()
+        if tokenizer is None:
+            return approximate_tokens(texts)
+        return [len(encoding.ids) for encoding in tokenizer.encode_batch(list(texts), add_special_tokens=False)]
+
+
+def merge_overlapping(first, second, max_overlap=200, min_overlap=10):
+    """Join consecutive chunks of one file, dropping the text the splitter repeated at the boundary."""
+    for size in range(min(len(first), len(second), max_overlap), min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + "\n" + second
+
+
+class ContextBuilder:
+    """Assembles the LLM context from retrieved chunks within a token budget.
+
+    Chunks are considered in maximal marginal relevance order: relevance is
+    the retrieval score rescaled to [0, 1] (or, without scores, the rank),
+    redundancy the highest cosine similarity to a chunk already taken,
+    weighted by ``mmr_lambda``. Chunks at least
+    ``duplicate_similarity`` similar to a taken one are dropped outright.
+    Taken chunks from the same file with consecutive chunk ids (neighbours in
+    split order, since a file's chunks get their ids in one add) are merged
+    into one section without their overlapping text. A chunk is taken only if
+    the merged sections still fit in ``max_tokens``, counted with
+    ``count_tokens`` (a callable mapping texts to token counts); the most
+    relevant chunk is always kept so the context is never empty. When
+    ``count_tokens`` is not the LLM's own tokenizer, ``token_headroom`` (a
+    fraction of ``max_tokens``) is left unused for the difference.
+    """
+
+    def __init__(self, max_tokens=1500, mmr_lambda=0.7, duplicate_similarity=0.95, max_overlap=200,
+                 count_tokens=approximate_tokens, token_headroom=0.0):
+        self.max_tokens = max_tokens
+        self.budget = int(max_tokens * (1 - token_headroom))
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_similarity = duplicate_similarity
+        self.max_overlap = max_overlap
+        self.count_tokens = count_tokens
+        self.requests = 0
+        self.chunks_offered = 0
+        self.chunks_used = 0
+        self.duplicates_dropped = 0
+        self.context_tokens = 0
+
+    def sections(self, chunks, selected):
+        """Merge the selected chunks into sections, most relevant section first."""
+        runs = []
+        for i in sorted(selected, key=lambda i: (chunks[i]["filename"], chunks[i]["id"])):
+            previous = runs[-1][-1] if runs else None
+            if previous is not None and chunks[previous]["filename"] == chunks[i]["filename"] \
+                    and chunks[i]["id"] == chunks[previous]["id"] + 1:
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+        runs.sort(key=min)  # Chunk indices are retrieval ranks
+        texts = []
+        for run in runs:
+            text = chunks[run[0]]["text"]
+            for i in run[1:]:
+                text = merge_overlapping(text, chunks[i]["text"], self.max_overlap)
+            texts.append(text)
+        return texts
+
+    def tokens(self, texts, counts):
+        missing = [text for text in texts if text not in counts]
+        if missing:
+            counts.update(zip(missing, self.count_tokens(missing)))
+        return sum(counts[text] for text in texts) + max(0, len(texts) - 1)  # About one token per separator
+
+    def build(self, chunks, vectors, scores=None):
+        """Return (context, ids of the chunks used) for chunks in relevance order.
+
+        ``chunks`` are dicts with "id", "text" and "filename"; ``vectors`` holds
+        their embeddings, one row per chunk, and ``scores`` their fused or
+        rerank scores (higher is more relevant), if known.
+        """
+        if not chunks:
+            return "", []
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        similarity = vectors @ vectors.T
+        if scores is None:
+            relevance = 1 - np.arange(len(chunks)) / len(chunks)
+        else:
+            scores = np.asarray(scores, dtype=np.float64)
+            spread = scores.max() - scores.min()
+            relevance = (scores - scores.min()) / spread if spread > 0 else np.ones(len(chunks))
+        counts = {}  # Text -> token count, so tentative sections are only tokenized once
+        selected, remaining = [], list(range(len(chunks)))
+        while remaining:
+            if selected:
+                redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining))
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            best = int(np.argmax(scores))
+            candidate = remaining.pop(best)
+            if redundancy[best] >= self.duplicate_similarity:
+                self.duplicates_dropped += 1
+                continue
+            if not selected or self.tokens(self.sections(chunks, selected + [candidate]), counts) <= self.budget:
+                selected.append(candidate)
+        texts = self.sections(chunks, selected)
+        self.requests += 1
+        self.chunks_offered += len(chunks)
+        self.chunks_used += len(selected)
+        self.context_tokens += self.tokens(texts, counts)
+        return "\n\n".join(texts), [chunks[i]["id"] for i in sorted(selected)]
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "chunks_offered": self.chunks_offered,
+            "chunks_used": self.chunks_used,
+            "duplicates_dropped": self.duplicates_dropped,
+            "mean_context_tokens": self.context_tokens / self.requests if self.requests else 0.0,
+        }
@@ -1,23 +1,37 @@
-from sentence_transformers import SentenceTransformer
+import numpy as np
 from langchain_core.embeddings import Embeddings
 from typing import List
+from models.embedding_cache import CachedEmbeddings
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
 
 class SentenceTransformerEmbeddings(Embeddings):
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str = EMBEDDING_MODEL, model=None):
+        self.model_name = model_name
+        if model is None:
+            from sentence_transformers import SentenceTransformer  # Imports torch; only when a model is loaded
+            model = SentenceTransformer(model_name)
+        self.model = model
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Embed a list of documents using SentenceTransformer."""
-        return self.model.encode(texts, convert_to_numpy=True).tolist()
+        return self.embed_array(texts).tolist()
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of documents into a float32 matrix, skipping the Python float lists."""
+        return self.model.encode(texts, convert_to_numpy=True).astype(np.float32, copy=False)
 
     def embed_query(self, text: str) -> List[float]:
         """Embed a single query using SentenceTransformer."""
         return self.model.encode([text], convert_to_numpy=True)[0].tolist()
 
 class Embedder:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str = EMBEDDING_MODEL, cache=None):
         self.embeddings = SentenceTransformerEmbeddings(model_name)
+        self.model = self.embeddings.model  # One copy of the model for both interfaces
+        if cache is not None:
+            self.embeddings = CachedEmbeddings(self.embeddings, cache, model_name)
 
     def encode(self, texts):
         """Encode texts into embeddings (legacy method for VectorStore)."""
@@ -25,4 +39,4 @@ class Embedder:
 
     def embedding_function(self):
         """Return LangChain-compatible Embeddings object."""
-        return self.embeddings
\ No newline at end of file
+        return self.embeddings
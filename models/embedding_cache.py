@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from typing import List
+
+SQLITE_MAX_VARIABLES = 500
+
+
+def embed_array(embeddings, texts):
+    """Embed texts into a float32 matrix, one row per text.
+
+    Models with an ``embed_array`` method hand over their NumPy output as is;
+    for any other LangChain Embeddings the float lists are converted once.
+    """
+    if hasattr(embeddings, "embed_array"):
+        return embeddings.embed_array(texts)
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    return vectors.reshape(len(texts), -1) if len(texts) else np.empty((0, 0), dtype=np.float32)
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed store of embedding vectors.
+
+    Entries are keyed by model name plus a SHA-256 of the chunk text, so the same
+    boilerplate is embedded once no matter how many files or re-uploads it shows
+    up in. The cache lives in a SQLite file and is kept under ``max_bytes`` of
+    vector data by evicting the least recently used entries.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.conn.commit()
+        total_bytes, clock = self.conn.execute("SELECT COALESCE(SUM(size), 0), COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()
+        self.total_bytes = total_bytes
+        self.clock = clock
+
+    @staticmethod
+    def make_key(model_name, text):
+        return f"{model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get_many(self, model_name, texts):
+        """Return a list with the cached vector (np.float32) or None for every text."""
+        keys = [self.make_key(model_name, text) for text in texts]
+        found = {}
+        with self.lock:
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), SQLITE_MAX_VARIABLES):
+                batch = unique_keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                self.tick()
+                self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(self.clock, key) for key in found])
+                self.conn.commit()
+            vectors = [found.get(key) for key in keys]
+            hits = sum(vector is not None for vector in vectors)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, model_name, texts, vectors):
+        """Store vectors for the given texts, evicting old entries to stay within the byte budget."""
+        with self.lock:
+            self.tick()
+            rows = {}
+            for text, vector in zip(texts, vectors):
+                blob = np.asarray(vector, dtype=np.float32).tobytes()
+                rows[self.make_key(model_name, text)] = (blob, len(blob), self.clock)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)",
+                [(key, blob, size, last_used) for key, (blob, size, last_used) in rows.items()],
+            )
+            self.evict()
+            self.conn.commit()
+
+    def tick(self):
+        """Advance the LRU clock past anything another process sharing the file has written. Caller holds the lock."""
+        latest = self.conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()[0]
+        self.clock = max(self.clock, latest) + 1
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes. Caller holds the lock.
+
+        The total is re-read from the table because other worker processes may share the file.
+        """
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if self.total_bytes <= self.max_bytes:
+            return
+        excess = self.total_bytes - self.max_bytes
+        victims = []
+        for key, size in self.conn.execute("SELECT key, size FROM embeddings ORDER BY last_used ASC"):
+            victims.append((key,))
+            excess -= size
+            self.total_bytes -= size
+            if excess <= 0:
+                break
+        self.conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+        logging.debug(f"Evicted {len(victims)} embeddings from cache ({self.total_bytes} bytes left)")
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, cache, model_name: str = None):
+        """Wrap any LangChain Embeddings with a content-addressed EmbeddingCache."""
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name or getattr(embeddings, "model_name", type(embeddings).__name__)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_array(self, texts):
+        """Embed only the texts missing from the cache, in one batch, and store them; returns a float32 matrix."""
+        vectors = self.cache.get_many(self.model_name, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, embed_array(self.embeddings, missing)))
+            self.cache.put_many(self.model_name, missing, [computed[text] for text in missing])
+            vectors = [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return np.vstack(vectors).astype(np.float32, copy=False) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query directly; one-off queries would only churn the document cache and skew its counters."""
+        return self.embeddings.embed_query(text)
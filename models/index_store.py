@@ -0,0 +1,363 @@
+import base64
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+
+from models.bm25_index import BM25Index
+from models.chunk_store import SLOTS_FILE, ChunkStore
+from models.vector_store import VectorStore
+
+CURRENT_FILE = "CURRENT"
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.jsonl"  # Chunk texts of snapshots written before the ChunkStore files
+METADATA_FILE = "metadata.json"
+LOG_FILE = "log.jsonl"
+LOCK_FILE = "LOCK"
+
+
+def process_token(pid=None):
+    """"<pid>:<start time>" of a process, which a later process reusing the pid does not share."""
+    pid = os.getpid() if pid is None else pid
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="utf-8") as f:
+            return f"{pid}:{f.read().rsplit(')', 1)[1].split()[19]}"
+    except (OSError, IndexError):
+        return f"{pid}:"
+
+
+def process_alive(token):
+    """True while the process that wrote ``token`` (see process_token) is running."""
+    pid = int(token.split(":", 1)[0])
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return process_token(pid) == token
+
+
+class IndexStore:
+    """On-disk copy of a QAPipeline: a snapshot generation plus an append-only change log.
+
+    A generation directory ``gen-<n>`` holds a full snapshot (FAISS index, chunk
+    texts, BM25 postings, metadata) and ``log.jsonl``, to which every upload appends its chunks
+    and vectors and every delete appends a tombstone. Writes therefore cost the
+    size of the change, not of the corpus. A document streamed in batch by batch
+    appends "partial" adds and then a commit record; on load, documents whose
+    commit never made it to the log are dropped. Once the log outgrows the snapshot it
+    is compacted: the next generation is written in full under a temporary name,
+    renamed into place, and made current by atomically replacing ``CURRENT``. A
+    crash at any point leaves the previous generation and its log intact.
+
+    With ``shared`` several processes (uvicorn workers) serve one directory.
+    Snapshots are memory-mapped, so the workers share one copy of the vectors
+    and texts in the page cache. Writers take an exclusive file lock and
+    first catch up with the log (see ``read_log``). Readers take no lock: they
+    read only complete log lines and keep the previous generation on disk, so
+    a worker can still read the end of its log after another one compacted.
+    Partial adds carry their writer's process token, and a loading worker only
+    drops unfinished documents whose writer has exited.
+    """
+
+    def __init__(self, directory, min_compact_bytes=1024 * 1024, shared=False):
+        self.directory = directory
+        self.min_compact_bytes = min_compact_bytes
+        self.shared = shared
+        self.generation = None
+        self.current_stat = None  # (inode, mtime) of CURRENT when the generation was read
+        self.snapshot_bytes = 0
+        self.log_bytes = 0  # Of the generation's log, applied to the loaded state
+        self.pending = {}  # Filename -> process token of its writer, for streamed documents not yet committed
+        self.token = process_token()
+        self.thread_lock = threading.RLock()  # flock does not exclude the threads of one process
+        self.lock_file = None
+        self.lock_depth = 0
+
+    def path(self, *names):
+        return os.path.join(self.directory, *names)
+
+    def generation_dir(self, generation=None):
+        return self.path(f"gen-{self.generation if generation is None else generation}")
+
+    def exists(self):
+        return os.path.exists(self.path(CURRENT_FILE))
+
+    def load(self):
+        """Load (vector_store, metadata) from the current snapshot plus its log, or None if nothing was saved.
+
+        Raises ValueError when the snapshot and the log do not agree, rather than
+        returning a partial corpus that the next write would make permanent.
+        """
+        if not self.exists():
+            return None
+        vector_store, state = self.open_snapshot()
+        self.pending = {}
+        vector_store = self.apply(self.read_log() or [], vector_store, state)
+        for filename, writer in list(self.pending.items()):
+            if self.shared and writer and process_alive(writer):
+                continue  # Another worker is still streaming it in
+            # Streaming stopped (e.g. a crash) before the document was complete
+            del self.pending[filename]
+            ids = state["chunk_ids"].pop(filename)
+            vector_store.remove(ids)
+            logging.warning(f"Dropping {len(ids)} chunks of {filename}: its upload never finished")
+        logging.debug(f"Loaded index store generation {self.generation} from {self.directory}")
+        return vector_store, state
+
+    def open_snapshot(self):
+        """Open the current generation's snapshot as (vector_store, state), without its log.
+
+        In shared mode the vectors and texts stay memory-mapped; later adds go to private memory.
+        """
+        self.current_stat = self.stat_current()
+        with open(self.path(CURRENT_FILE), "r", encoding="utf-8") as f:
+            self.generation = int(f.read().strip())
+        directory = self.generation_dir()
+        with open(os.path.join(directory, METADATA_FILE), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+
+        vector_store = None
+        if metadata["dimension"] is not None:
+            vector_store = VectorStore(dimension=metadata["dimension"], backend="flat")  # Until the owner configures it
+            if os.path.exists(os.path.join(directory, SLOTS_FILE)):
+                vector_store.chunks = ChunkStore.load(directory, mmap_texts=self.shared)
+            else:
+                with open(os.path.join(directory, CHUNKS_FILE), "r", encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f]
+                vector_store.chunks.add([record["id"] for record in records], [record["text"] for record in records],
+                                        [record["filename"] for record in records])
+            vector_store.documents.chunks = vector_store.chunks
+            vector_store.next_id = metadata["next_id"]
+            if self.shared:
+                vector_store.attach_base(faiss.read_index(os.path.join(directory, INDEX_FILE), faiss.IO_FLAG_MMAP_IFC))
+            else:
+                vector_store.index = faiss.read_index(os.path.join(directory, INDEX_FILE))
+                if vector_store.index.sa_code_size() == 2 * vector_store.dimension:
+                    vector_store.vector_dtype = "float16"
+            expected = {chunk_id for ids in metadata["chunk_ids"].values() for chunk_id in ids}
+            if set(vector_store.chunks) != expected or len(vector_store) != len(expected):
+                raise ValueError(f"Snapshot {directory} is inconsistent: chunk ids do not match the index")
+        self.snapshot_bytes = sum(
+            os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory) if name != LOG_FILE
+        )
+        self.log_bytes = 0
+        state = {
+            "uploaded_filenames": metadata["uploaded_filenames"],
+            "chunk_ids": metadata["chunk_ids"],
+            "content_hashes": metadata["content_hashes"],
+        }
+        return vector_store, state
+
+    def stat_current(self):
+        try:
+            stat = os.stat(self.path(CURRENT_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def changed(self):
+        """What other processes changed since this one last read the store: None, "log" or "generation"."""
+        if self.stat_current() != self.current_stat:
+            return "generation"
+        try:
+            size = os.path.getsize(os.path.join(self.generation_dir(), LOG_FILE))
+        except FileNotFoundError:
+            return None
+        return "log" if size > self.log_bytes else None
+
+    def read_log(self):
+        """The generation's log records past those already applied, or None if its directory is gone.
+
+        Only complete lines are read: a line without its newline is either
+        being appended right now or was torn by a crash and is never applied.
+        """
+        log_path = os.path.join(self.generation_dir(), LOG_FILE)
+        if not os.path.isdir(self.generation_dir()):
+            return None
+        if not os.path.exists(log_path):
+            return []
+        with open(log_path, "rb") as f:
+            f.seek(self.log_bytes)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        if len(complete) < len(data) and not self.shared:
+            # The last append was torn by a crash; it was never acknowledged, so drop it
+            logging.warning(f"Ignoring incomplete trailing record in {log_path}")
+        records = []
+        for line in complete.decode("utf-8").split("\n")[:-1]:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Corrupt record at byte {self.log_bytes} of {log_path}: {str(e)}")
+            self.log_bytes += len(line.encode("utf-8")) + 1
+        return records
+
+    def apply(self, records, vector_store, state, added=None, removed=None):
+        """Apply log records to a loaded vector store and state; returns the vector store (created by a first add).
+
+        ``added(ids, texts)`` is told about every add; deleted chunks go to
+        ``removed(ids)`` if given, else they are removed from the vector store.
+        """
+        for record in records:
+            if record["op"] == "add":
+                vectors = np.frombuffer(base64.b64decode(record["vectors"]), dtype=np.float32)
+                if vector_store is None:
+                    vector_store = VectorStore(dimension=len(vectors) // len(record["ids"]), backend="flat")
+                vector_store.add_chunks(vectors, record["texts"], [record["filename"]] * len(record["ids"]),
+                                        ids=record["ids"])
+                if added is not None:
+                    added(record["ids"], record["texts"])
+                if record.get("partial"):
+                    state["chunk_ids"].setdefault(record["filename"], []).extend(record["ids"])
+                    self.pending[record["filename"]] = record.get("writer")
+                    continue
+                state["uploaded_filenames"].append(record["filename"])
+                state["chunk_ids"][record["filename"]] = record["ids"]
+                if record["content_hash"]:
+                    state["content_hashes"][record["filename"]] = record["content_hash"]
+            elif record["op"] == "commit":
+                self.pending.pop(record["filename"], None)
+                state["uploaded_filenames"].append(record["filename"])
+                state["chunk_ids"].setdefault(record["filename"], [])
+                if record["content_hash"]:
+                    state["content_hashes"][record["filename"]] = record["content_hash"]
+            elif record["op"] == "delete":
+                ids = state["chunk_ids"].pop(record["filename"], [])
+                if removed is not None:
+                    removed(ids)
+                elif vector_store is not None:
+                    vector_store.remove(ids)
+                self.pending.pop(record["filename"], None)
+                if record["filename"] in state["uploaded_filenames"]:
+                    state["uploaded_filenames"].remove(record["filename"])
+                state["content_hashes"].pop(record["filename"], None)
+        return vector_store
+
+    def abandoned(self):
+        """Streamed documents whose writer exited before committing them."""
+        return [filename for filename, writer in self.pending.items()
+                if writer != self.token and not (writer and process_alive(writer))]
+
+    @contextmanager
+    def lock(self):
+        """Hold the directory's exclusive write lock (a no-op unless shared); re-entrant within the process."""
+        if not self.shared:
+            yield
+            return
+        with self.thread_lock:
+            if not self.lock_depth:
+                os.makedirs(self.directory, exist_ok=True)
+                self.lock_file = open(self.path(LOCK_FILE), "a+b")
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            self.lock_depth += 1
+            try:
+                yield
+            finally:
+                self.lock_depth -= 1
+                if not self.lock_depth:
+                    fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+                    self.lock_file.close()
+                    self.lock_file = None
+
+    def append_add(self, filename, content_hash, ids, texts, vectors, partial=False):
+        """Record a newly indexed document, including its vectors, so a restart needs no embeddings.
+
+        With ``partial`` the record is one batch of a document that only counts once append_commit follows.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        record = {
+            "op": "add",
+            "filename": filename,
+            "content_hash": content_hash,
+            "ids": list(ids),
+            "texts": list(texts),
+            "vectors": base64.b64encode(vectors.tobytes()).decode("ascii"),
+        }
+        if partial:
+            record["partial"] = True
+            if self.shared:
+                record["writer"] = self.token
+            self.pending[filename] = self.token
+        self.append(record)
+
+    def append_commit(self, filename, content_hash):
+        """Record that every batch of a streamed document has been appended."""
+        self.pending.pop(filename, None)
+        self.append({"op": "commit", "filename": filename, "content_hash": content_hash})
+
+    def append_delete(self, filename):
+        """Record a tombstone for a deleted document."""
+        self.pending.pop(filename, None)
+        self.append({"op": "delete", "filename": filename})
+
+    def append(self, record):
+        if self.generation is None:
+            self.snapshot(None, {"uploaded_filenames": [], "chunk_ids": {}, "content_hashes": {}})
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        with open(os.path.join(self.generation_dir(), LOG_FILE), "ab") as f:
+            if f.tell() > self.log_bytes:
+                # A record torn by a crash was never acknowledged; cut it off so this one starts on its own line
+                f.truncate(self.log_bytes)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self.log_bytes += len(line)
+
+    def should_compact(self):
+        """True once the log is larger than the snapshot it applies to (amortized O(1) per written byte)."""
+        return self.log_bytes > max(self.min_compact_bytes, self.snapshot_bytes)
+
+    def load_lexical_index(self):
+        """The BM25 index saved with the current generation's snapshot, or None if it has none."""
+        return BM25Index.load(self.generation_dir())
+
+    def snapshot(self, vector_store, state, lexical_index=None):
+        """Write a full new generation and atomically make it current."""
+        os.makedirs(self.directory, exist_ok=True)
+        generation = (self.generation or 0) + 1
+        final_dir = self.generation_dir(generation)
+        tmp_dir = final_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        metadata = {
+            "dimension": vector_store.dimension if vector_store is not None else None,
+            "next_id": vector_store.next_id if vector_store is not None else 0,
+            **state,
+        }
+        if vector_store is not None:
+            faiss.write_index(vector_store.owned_index(), os.path.join(tmp_dir, INDEX_FILE))
+            vector_store.chunks.save(tmp_dir)
+        if lexical_index is not None:
+            lexical_index.save(tmp_dir)
+        with open(os.path.join(tmp_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        for name in os.listdir(tmp_dir):
+            with open(os.path.join(tmp_dir, name), "rb") as f:
+                os.fsync(f.fileno())
+        os.replace(tmp_dir, final_dir)
+
+        current_tmp = self.path(CURRENT_FILE + ".tmp")
+        with open(current_tmp, "w", encoding="utf-8") as f:
+            f.write(str(generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_tmp, self.path(CURRENT_FILE))
+        self.current_stat = self.stat_current()
+
+        previous, self.generation = self.generation, generation
+        # Other workers may still need the end of the previous log; one that missed two compactions reloads in full
+        obsolete = previous if not self.shared else (previous - 1 if previous else None)
+        if obsolete:
+            shutil.rmtree(self.generation_dir(obsolete), ignore_errors=True)
+        self.snapshot_bytes = sum(os.path.getsize(os.path.join(final_dir, name)) for name in os.listdir(final_dir))
+        self.log_bytes = 0
+        logging.debug(f"Wrote index store generation {generation} to {self.directory}")
@@ -0,0 +1,112 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+
+class IndexVersion:
+    """An immutable view of a pipeline's index: the chunks it held when the version was published.
+
+    Versions share the vector store and BM25 index rather than copying them.
+    Chunks added later get ids at or above ``limit`` and are not in the view.
+    Chunks removed later are listed in ``deleted`` by newer versions and stay
+    stored until no query holds an older version (see IndexVersions).
+    """
+
+    __slots__ = ("number", "vector_store", "lexical_index", "limit", "deleted", "count")
+
+    def __init__(self, number, vector_store, lexical_index, limit, deleted, count):
+        self.number = number
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.limit = limit  # Chunk ids below this existed when the version was published
+        self.deleted = deleted  # Retired chunk ids that are still stored
+        self.count = count  # Chunks in the view
+
+    def __contains__(self, chunk_id):
+        return (self.vector_store is not None and chunk_id < self.limit and chunk_id not in self.deleted
+                and chunk_id in self.vector_store.chunks)
+
+    def __len__(self):
+        return self.count
+
+
+class IndexVersions:
+    """Publishes IndexVersions; a query pins the current one and reads only it.
+
+    Writers change the index in place, then publish the next version. Removed
+    chunks are retired, not dropped, so a query pinned to an older version
+    still finds their texts and vectors. ``purge(ids)`` drops them for real
+    once every version older than their retirement has been released; it
+    runs under ``write_lock``, so a query releasing its version while a
+    writer holds that lock leaves the purge to the writer's next publish.
+    """
+
+    def __init__(self, purge, write_lock=None):
+        self.purge = purge
+        self.write_lock = write_lock if write_lock is not None else threading.RLock()
+        self.lock = threading.Lock()
+        self.current = IndexVersion(0, None, None, 0, frozenset(), 0)
+        self.readers = Counter()  # Version number -> queries holding it
+        self.retired = []  # (version number that stopped showing them, chunk ids), oldest first
+
+    def publish(self, vector_store, lexical_index, retired_ids=()):
+        """Make the index as it is now the current version; ``retired_ids`` leave the view but are kept for now."""
+        with self.lock:
+            number = self.current.number + 1
+            if retired_ids:
+                self.retired.append((number, list(retired_ids)))
+            deleted = frozenset(chunk_id for _, ids in self.retired for chunk_id in ids)
+            stored = len(vector_store.chunks) if vector_store is not None else 0
+            if vector_store is not None and deleted:
+                stored -= sum(1 for chunk_id in deleted if chunk_id in vector_store.chunks)
+            limit = vector_store.next_id if vector_store is not None else 0
+            self.current = IndexVersion(number, vector_store, lexical_index, limit, deleted, stored)
+        self.reclaim()
+        return self.current
+
+    @contextmanager
+    def pin(self):
+        """Hold the current version for the duration of a query."""
+        with self.lock:
+            version = self.current
+            self.readers[version.number] += 1
+        try:
+            yield version
+        finally:
+            with self.lock:
+                self.readers[version.number] -= 1
+                if not self.readers[version.number]:
+                    del self.readers[version.number]
+            self.reclaim()
+
+    def reclaim(self):
+        """Purge retired chunks that no pinned version can see any more, unless another thread is writing."""
+        if not self.write_lock.acquire(blocking=False):
+            return
+        try:
+            self.purge_reclaimable()
+        finally:
+            self.write_lock.release()
+
+    def purge_reclaimable(self):
+        with self.lock:  # Held while purging, so no query pins a version that still lists them as deleted
+            oldest = min(self.readers, default=self.current.number)
+            reclaimable = [ids for number, ids in self.retired if number <= oldest]
+            if not reclaimable:
+                return
+            for ids in reclaimable:
+                self.purge(ids)
+            self.retired = [(number, ids) for number, ids in self.retired if number > oldest]
+            deleted = frozenset(chunk_id for _, ids in self.retired for chunk_id in ids)
+            current = self.current
+            self.current = IndexVersion(current.number, current.vector_store, current.lexical_index,
+                                        current.limit, deleted, current.count)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "version": self.current.number,
+                "pinned_versions": len(self.readers),
+                "queries": sum(self.readers.values()),
+                "retired_chunks": sum(len(ids) for _, ids in self.retired),
+            }
@@ -0,0 +1,118 @@
+"""Process-wide models, each loaded once: on first use, or up front by warm_up.
+
+Collections, the summarizer and the query batcher all hold the same lazy
+handle (LazyEmbeddings, LazyModel), so a process keeps one copy of each
+model however many collections it serves, and importing the API loads
+nothing: the factories import their heavy libraries when they run. The
+process is ready once every required model has loaded.
+"""
+import logging
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from models.embedding_cache import embed_array
+
+
+class ModelRegistry:
+    """Named model factories and the models they built."""
+
+    def __init__(self):
+        self.factories = {}  # Name -> (factory, required)
+        self.models = {}
+        self.load_seconds = {}
+        self.errors = {}  # Name -> message of the last failed load
+        self.locks = {}  # Name -> lock held while the model loads
+        self.lock = threading.Lock()
+
+    def register(self, name, factory, required=True):
+        """Set the factory for ``name``, dropping a model it already built; ``required`` models gate readiness."""
+        with self.lock:
+            self.factories[name] = (factory, required)
+            self.locks.setdefault(name, threading.Lock())
+            self.models.pop(name, None)
+            self.load_seconds.pop(name, None)
+            self.errors.pop(name, None)
+
+    def get(self, name):
+        """The model, loading it on first use; concurrent callers wait for the one load."""
+        model = self.models.get(name)
+        if model is not None:
+            return model
+        if name not in self.factories:
+            raise KeyError(f"No model registered as {name}")
+        with self.locks[name]:
+            if name not in self.models:
+                started = time.perf_counter()
+                try:
+                    model = self.factories[name][0]()
+                except Exception as e:
+                    self.errors[name] = str(e) or type(e).__name__
+                    raise
+                self.models[name] = model
+                self.load_seconds[name] = time.perf_counter() - started
+                self.errors.pop(name, None)
+                logging.info(f"Loaded model {name} in {self.load_seconds[name]:.1f}s")
+            return self.models[name]
+
+    def warm_up(self, names=None):
+        """Load ``names`` (default: every registered model); returns readiness. Failures are logged, not raised."""
+        for name in names or list(self.factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                logging.error(f"Could not load model {name}: {str(e)}")
+        return self.ready()
+
+    def ready(self):
+        return all(name in self.models for name, (_, required) in list(self.factories.items()) if required)
+
+    def status(self):
+        """Per model: whether it is required and loaded, its load time and the last load error."""
+        return {
+            name: {
+                "required": required,
+                "loaded": name in self.models,
+                "load_seconds": self.load_seconds.get(name),
+                "error": self.errors.get(name),
+            }
+            for name, (_, required) in list(self.factories.items())
+        }
+
+
+class LazyEmbeddings(Embeddings):
+    """LangChain embeddings that load the registry's model on the first embed call.
+
+    ``model_name`` is known up front, so embedding cache keys need no model.
+    """
+
+    def __init__(self, registry, name, model_name):
+        self.registry = registry
+        self.name = name
+        self.model_name = model_name
+
+    def embed_documents(self, texts):
+        return self.registry.get(self.name).embed_documents(texts)
+
+    def embed_array(self, texts):
+        return embed_array(self.registry.get(self.name), texts)
+
+    def embed_query(self, text):
+        return self.registry.get(self.name).embed_query(text)
+
+
+class LazyModel:
+    """Forwards attribute access (invoke, ainvoke, astream, batch, ...) to the registry's model, loading it first."""
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __getattr__(self, attribute):
+        if attribute in ("registry", "name"):  # Not set yet, e.g. while copying
+            raise AttributeError(attribute)
+        return getattr(self.registry.get(self.name), attribute)
+
+
+MODELS = ModelRegistry()
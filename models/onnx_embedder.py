@@ -0,0 +1,147 @@
+"""Sentence embeddings from an int8-quantized ONNX export, run on onnxruntime's CPU provider.
+
+The sentence-transformers pipeline for all-MiniLM-L6-v2 is BERT, mean pooling
+over the attention mask, then L2 normalization. OnnxEmbeddings runs the same
+steps with onnxruntime and the model's fast tokenizer, so inference needs
+neither torch nor transformers, and the int8 matrix products are cheaper
+than float32 PyTorch's. Its vectors agree with the PyTorch ones to a cosine
+similarity above 0.99; measure both with python -m benchmarks.embedding_backends.
+
+The graph comes from the model's Hugging Face repository, which ships int8
+exports (onnx/model_quint8_avx2.onnx for x86 with AVX2,
+onnx/model_qint8_arm64.onnx for ARM), or from a directory written by
+export_onnx, which exports and quantizes a sentence-transformers model locally.
+"""
+import logging
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+HUB_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+EXPORTED_FILE = "model_int8.onnx"  # Written by export_onnx, next to the float32 model.onnx and tokenizer.json
+MAX_LENGTH = 256  # all-MiniLM-L6-v2's max_seq_length: longer texts are truncated, as sentence-transformers does
+INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+
+
+def onnx_model_name(model_name):
+    """The name vectors of ``model_name``'s ONNX backend are cached under, apart from the PyTorch ones."""
+    return f"{model_name}:onnx-int8"
+
+
+class OnnxEmbeddings(Embeddings):
+    """LangChain embeddings from an ONNX sentence-transformers model; see the module docstring.
+
+    ``path`` is a directory from export_onnx; without it the graph and
+    tokenizer are downloaded from the model's repository. Texts are embedded
+    ``batch_size`` at a time, sorted by length so a batch pads to similar lengths.
+    """
+
+    def __init__(self, model_name="all-MiniLM-L6-v2", path=None, onnx_file=None, batch_size=32, threads=None,
+                 max_length=MAX_LENGTH):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        if path is None:
+            from huggingface_hub import hf_hub_download
+
+            repository = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+            model_path = hf_hub_download(repository, onnx_file or HUB_ONNX_FILE)
+            tokenizer_path = hf_hub_download(repository, "tokenizer.json")
+        else:
+            model_path = os.path.join(path, onnx_file or EXPORTED_FILE)
+            tokenizer_path = os.path.join(path, "tokenizer.json")
+        self.model_name = onnx_model_name(model_name)
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length)
+        pad_token = "[PAD]" if self.tokenizer.token_to_id("[PAD]") is not None else "<pad>"
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.inputs = [node.name for node in self.session.get_inputs() if node.name in INPUTS]
+        outputs = [node.name for node in self.session.get_outputs()]
+        self.output = "last_hidden_state" if "last_hidden_state" in outputs else outputs[0]
+        logging.info(f"Loaded ONNX embedding model {model_path}")
+
+    def encode(self, texts):
+        """Unit-length float32 vectors, one row per text."""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        rows = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch])
+            feed = {
+                "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+                "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run([self.output], {name: feed[name] for name in self.inputs})[0]
+            mask = feed["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            for i, vector in zip(batch, pooled.astype(np.float32)):
+                rows[i] = vector
+        return np.vstack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+
+    def embed_array(self, texts):
+        return self.encode(list(texts))
+
+    def embed_documents(self, texts):
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+
+def export_onnx(model_name, directory, opset=17):
+    """Export a sentence-transformers model to ``directory`` for OnnxEmbeddings(path=directory).
+
+    Writes the transformer as float32 model.onnx with onnxruntime's BERT
+    fusions applied (attention, LayerNorm and GELU become single kernels), its
+    dynamically int8-quantized copy model_int8.onnx and tokenizer.json. For
+    machines that cannot download the repository's exports, and for models
+    that have none.
+    """
+    import onnx
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from onnxruntime.transformers.optimizer import optimize_model
+    from sentence_transformers import SentenceTransformer
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(input_ids=input_ids, attention_mask=attention_mask,
+                                    token_type_ids=token_type_ids).last_hidden_state
+
+    os.makedirs(directory, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    transformer.set_attn_implementation("eager")  # The attention fusion matches the eager graph, not SDPA's
+    sample = model.tokenizer(["An example sentence to trace the graph with."], return_tensors="pt")
+    float_path = os.path.join(directory, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer),
+            (sample["input_ids"], sample["attention_mask"], torch.zeros_like(sample["input_ids"])),
+            float_path,
+            input_names=list(INPUTS),
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in (*INPUTS, "last_hidden_state")},
+            opset_version=opset,
+            dynamo=False,
+        )
+    config = transformer.config
+    optimize_model(float_path, model_type="bert", num_heads=config.num_attention_heads,
+                   hidden_size=config.hidden_size).save_model_to_file(float_path)
+    quantize_dynamic(float_path, os.path.join(directory, EXPORTED_FILE), weight_type=QuantType.QInt8,
+                     extra_options={"DefaultTensorType": onnx.TensorProto.FLOAT})  # Fused ops lack type inference
+    model.tokenizer.backend_tokenizer.save(os.path.join(directory, "tokenizer.json"))
+    return directory
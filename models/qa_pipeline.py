@@ -1,90 +1,748 @@
+import asyncio
 import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import FAISS
-from langchain.embeddings import SentenceTransformerEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.documents import Document
+from models.vector_store import VectorStore
+from models.chunk_store import ChunkStore
+from models.index_store import IndexStore
+from models.index_version import IndexVersions
+from models.embedding_cache import CachedEmbeddings, embed_array
+from models.summarizer import DocumentSummarizer
+from models.query_batcher import QueryBatcher
+from models.bm25_index import BM25Index, reciprocal_rank_fusion
+from models.stage_timings import StageTimings, timed
+from models.context_builder import ContextBuilder
+from models.streaming_splitter import StreamingSplitter
+from models.table_store import TableStore
+from models.table_query import TableQueryEngine
+from models.model_registry import MODELS, LazyEmbeddings, LazyModel
+from models.embedder import EMBEDDING_MODEL, SentenceTransformerEmbeddings
+from models.onnx_embedder import OnnxEmbeddings, onnx_model_name
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, or onnx for the int8-quantized ONNX export
+EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH") or None  # A directory from export_onnx; default: the model hub
+
+
+def load_embeddings():
+    if EMBEDDING_BACKEND == "onnx":
+        return OnnxEmbeddings(EMBEDDING_MODEL, path=EMBEDDING_ONNX_PATH)
+    return SentenceTransformerEmbeddings(EMBEDDING_MODEL)
+
+
+def load_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model="gemini-1.5-pro", google_api_key=GOOGLE_API_KEY)
+
+
+MODELS.register("embeddings", load_embeddings)
+MODELS.register("llm", load_llm)
+
+
+def default_embeddings():
+    """The process-wide embedding model, loaded on first use."""
+    model_name = onnx_model_name(EMBEDDING_MODEL) if EMBEDDING_BACKEND == "onnx" else EMBEDDING_MODEL
+    return LazyEmbeddings(MODELS, "embeddings", model_name)
+
+
+def default_llm():
+    """The process-wide LLM client, created on first use."""
+    return LazyModel(MODELS, "llm")
+
 
 class QAPipeline:
-    def __init__(self):
-        self.documents = []  # List of dicts: {"text": str, "filename": str}
+    def __init__(self, embeddings=None, llm=None, index_dir=None, embedding_cache=None, answer_cache=None,
+                 query_batch_window=0.005, query_batch_size=32, index_options=None, retrieval_k=5,
+                 reranker=None, rerank_candidates=30, rerank_top_k=3, context_builder=None, shared_index=False):
+        self.documents = ChunkStore()  # Chunk id -> {"text", "filename"}; the vector store's, once there is one
         self.uploaded_filenames = []
-        self.embeddings = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.chunk_ids = {}  # Filename -> list of chunk ids in the vector store
+        self.content_hashes = {}  # Filename -> SHA-256 of the uploaded file
+        self.streaming = {}  # Filename -> content hash of documents being added batch by batch (see begin_document)
+        self.embeddings = embeddings or default_embeddings()
+        # Concurrent async queries share one encode call; they skip the embedding cache like embed_query does
+        self.query_batcher = QueryBatcher(self.embeddings.embed_documents, query_batch_window, query_batch_size)
+        self.embedding_cache = embedding_cache
+        if embedding_cache is not None:
+            self.embeddings = CachedEmbeddings(self.embeddings, embedding_cache)
         self.vector_store = None
-        self.llm = ChatGoogleGenerativeAI(model="gemini-1.5-pro", google_api_key=GOOGLE_API_KEY)
+        # VectorStore backend and knobs (backend, nprobe, ef_search, vector_dtype). ANN rebuilds always run on the
+        # builder thread, so a write holding index_lock never waits for one
+        self.index_options = {"background_build_min": 0, **(index_options or {})}
+        self.lexical_index = BM25Index()  # Kept in step with the vector store; saved with each snapshot
+        # Writers hold write_lock throughout (they may run on worker threads); index_lock only while they change
+        # the in-memory indexes, which queries hold while they read them, so queries never wait on disk I/O
+        self.write_lock = threading.RLock()
+        self.index_lock = threading.RLock()
+        # Queries pin the current version and read only it, while writers change the index and publish the next
+        self.versions = IndexVersions(self.purge_chunks, self.write_lock)
+        self.retrieval_k = retrieval_k
+        self.reranker = reranker  # CrossEncoderReranker narrowing rerank_candidates down to rerank_top_k, or None
+        self.rerank_candidates = rerank_candidates
+        self.rerank_top_k = rerank_top_k
+        self.context_builder = context_builder or ContextBuilder()  # Token budget, overlap merging and MMR
+        self.stage_timings = StageTimings()
+        self.answer_cache = answer_cache
+        self.corpus_version = 0
+        self.llm = llm or default_llm()
         self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        # With shared_index, worker processes serving index_dir map one snapshot and follow each other's writes
+        self.index_store = IndexStore(index_dir, shared=shared_index) if index_dir else None
+        self.summarizer = DocumentSummarizer(self.llm, directory=os.path.join(index_dir, "summaries") if index_dir else None)
+        # Columnar copies of tabular uploads; aggregate and filter questions about them skip retrieval and the LLM
+        self.tables = TableStore(os.path.join(index_dir, "tables") if index_dir else None)
+        self.table_engine = TableQueryEngine()
+        self.loaded = self.index_store is None
+
+    def ensure_loaded(self):
+        """Load the persisted index on first use so startup never waits on disk I/O.
+
+        A failed load is re-raised and retried on the next call; until a load
+        succeeds nothing is written, so a bad read can never overwrite the store.
+        A shared index is then refreshed on every call (see refresh).
+        """
+        if self.loaded:
+            self.refresh()
+            return
+        with self.write_lock:
+            if not self.loaded:  # Unless another thread loaded it meanwhile
+                self.load()
+
+    def load(self):
+        """Read the persisted index and make it the current version (see ensure_loaded)."""
+        state = self.index_store.load()
+        self.loaded = True
+        if state is None:
+            return
+        self.vector_store, metadata = state
+        if self.vector_store is not None:
+            self.vector_store.configure(**self.index_options)
+        self.uploaded_filenames = metadata["uploaded_filenames"]
+        self.chunk_ids = metadata["chunk_ids"]
+        self.content_hashes = metadata["content_hashes"]
+        # A new one: queries pinned before a reload keep reading the old one
+        self.lexical_index = self.index_store.load_lexical_index() or BM25Index()
+        if self.vector_store is not None:
+            self.documents = self.vector_store.chunks
+        # The saved postings are the snapshot's; only chunks the log added or deleted since are re-tokenized
+        indexed, stored = self.lexical_index.ids(), self.documents.ids()
+        self.lexical_index.remove(np.setdiff1d(indexed, stored).tolist())
+        for chunk_id in np.setdiff1d(stored, indexed).tolist():
+            self.lexical_index.add(chunk_id, self.documents.text(chunk_id))
+        self.publish()
+        self.tables.load(self.uploaded_filenames, prune=not self.index_store.shared)
+        self.summarizer.load()
+        self.summarizer.retain(self.uploaded_filenames, prune=not self.index_store.shared)
+        for filename in self.summarizer.missing(self.uploaded_filenames):
+            self.summarizer.submit(filename, self.get_chunk_texts(filename))
+        logging.debug(f"Restored {len(self.uploaded_filenames)} documents from {self.index_store.directory}")
+
+    def refresh(self):
+        """Catch up with what other worker processes wrote to a shared index; two stat calls when nothing changed.
+
+        New log records are applied in place, like this process's own writes.
+        After another worker compacts, the rest of the old log is applied and
+        the vectors and texts are then mapped from the new snapshot, keeping
+        the BM25 index. Only if that fails is everything reloaded.
+        """
+        if not self.loaded or self.index_store is None or not self.index_store.shared:
+            return
+        # Threads of this process must not apply the same records twice; a writer catches up before writing anyway
+        if not self.write_lock.acquire(blocking=False):
+            return
+        try:
+            change = self.index_store.changed()
+            if change is None:
+                return
+            records = self.index_store.read_log()
+            if records is None:  # Another worker compacted twice, removing this generation's log
+                return self.reload()
+            self.apply_records(records)
+            if change == "generation":
+                self.open_snapshot()
+        finally:
+            self.write_lock.release()
+
+    def reload(self):
+        """Load the shared index from scratch, with the BM25 postings saved in its snapshot."""
+        logging.debug(f"Reloading {self.index_store.directory}: it changed too much to catch up")
+        self.loaded = False
+        self.vector_store, self.documents = None, ChunkStore()
+        self.uploaded_filenames, self.chunk_ids, self.content_hashes = [], {}, {}
+        self.ensure_loaded()
+        self.corpus_changed()
+
+    def apply_records(self, records):
+        """Apply log records another worker appended: its adds, commits and deletes."""
+        if not records:
+            return
+        before = set(self.uploaded_filenames)
+        removed = []
+        state = {"uploaded_filenames": self.uploaded_filenames, "chunk_ids": self.chunk_ids,
+                 "content_hashes": self.content_hashes}
+
+        def added(ids, texts):
+            for chunk_id, text in zip(ids, texts):
+                self.lexical_index.add(chunk_id, text)
+
+        with self.index_lock:
+            vector_store = self.index_store.apply(records, self.vector_store, state, added=added, removed=removed.extend)
+        if self.vector_store is None and vector_store is not None:
+            vector_store.configure(**self.index_options)
+            self.vector_store, self.documents = vector_store, vector_store.chunks
+        after = set(self.uploaded_filenames)
+        for filename in before - after:
+            self.summarizer.remove(filename)
+        if before != after:
+            self.tables.load(self.uploaded_filenames, prune=False)
+        if after - before:
+            self.summarizer.load()
+        self.publish(retired_ids=removed)
+        if any(record["op"] == "add" for record in records):
+            self.corpus_changed()
+        elif removed:
+            self.corpus_changed(removed_ids=removed)
 
-    def index_documents(self, texts, filenames):
+    def open_snapshot(self):
+        """Map the current generation's snapshot in place of the chunks this process holds, then apply its log."""
+        retired = {chunk_id for _, ids in self.versions.retired for chunk_id in ids}
+        vector_store, _ = self.index_store.open_snapshot()
+        mapped = set(vector_store.chunks) if vector_store is not None else set()
+        if mapped != {chunk_id for chunk_id in self.documents if chunk_id not in retired}:
+            return self.reload()
+        if vector_store is not None:
+            vector_store.configure(**self.index_options)
+            self.vector_store, self.documents = vector_store, vector_store.chunks
+            self.publish()
+        self.apply_records(self.index_store.read_log() or [])
+
+    @contextmanager
+    def writing(self):
+        """Hold the write locks, with the index loaded and caught up with other workers' writes."""
+        with self.write_lock, self.index_store.lock() if self.index_store is not None else nullcontext():
+            self.ensure_loaded()
+            yield
+
+    def publish(self, retired_ids=()):
+        """Make the index as it is now what new queries read; ``retired_ids`` leave it once no query reads them."""
+        self.versions.publish(self.vector_store, self.lexical_index, retired_ids)
+
+    def persist_added(self, filename, content_hash, ids):
+        """Append a newly indexed document to the on-disk log, if persistence is enabled."""
+        if self.index_store is None:
+            return
+        if not self.loaded:
+            raise RuntimeError(f"Refusing to write to {self.index_store.directory}: it has not been loaded")
+        vectors = self.vector_store.vectors(ids) if ids else []
+        self.index_store.append_add(filename, content_hash, ids, self.get_chunk_texts(filename), vectors)
+        self.compact_if_needed()
+
+    def persist_batch(self, filename, content_hash, ids, texts, vectors):
+        """Append one batch of a streamed document to the on-disk log, uncommitted."""
+        if self.index_store is None:
+            return
+        if not self.loaded:
+            raise RuntimeError(f"Refusing to write to {self.index_store.directory}: it has not been loaded")
+        self.index_store.append_add(filename, content_hash, ids, texts, vectors, partial=True)
+
+    def persist_deleted(self, filename):
+        """Append a deletion tombstone to the on-disk log, if persistence is enabled."""
+        if self.index_store is None:
+            return
+        if not self.loaded:
+            raise RuntimeError(f"Refusing to write to {self.index_store.directory}: it has not been loaded")
+        self.index_store.append_delete(filename)
+        self.compact_if_needed()
+
+    def compact_if_needed(self):
+        if not self.index_store.should_compact():
+            return
+        for filename in self.index_store.abandoned():
+            # Streamed in by a worker that has exited since
+            ids = self.chunk_ids.pop(filename, [])
+            self.remove_chunks(ids)
+            self.corpus_changed(removed_ids=ids)
+            self.index_store.append_delete(filename)
+            logging.warning(f"Dropped {len(ids)} chunks of {filename}: its upload never finished")
+        # A snapshot would make a half-streamed document permanent; compact once it has been committed.
+        # Nor may it keep deleted chunks that queries still read.
+        if not self.streaming and not self.index_store.pending and not self.versions.retired:
+            self.index_store.snapshot(self.vector_store, {
+                "uploaded_filenames": self.uploaded_filenames,
+                "chunk_ids": self.chunk_ids,
+                "content_hashes": self.content_hashes,
+            }, lexical_index=self.lexical_index)
+            if self.index_store.shared:
+                self.open_snapshot()  # Map the new snapshot like the other workers will
+
+    def index_documents(self, texts, filenames, content_hashes=None):
         """Index documents with deduplication by filename."""
         logging.debug(f"Indexing {len(texts)} documents with filenames: {filenames}")
-        indexed_docs = []
-        for text, filename in zip(texts, filenames):
+        self.ensure_loaded()
+        content_hashes = content_hashes or [None] * len(texts)
+        for text, filename, content_hash in zip(texts, filenames, content_hashes):
             if filename not in self.uploaded_filenames:
-                chunks = self.text_splitter.split_text(text)
-                for chunk in chunks:
-                    doc = {"text": chunk, "filename": filename}
-                    indexed_docs.append(doc)
-                self.uploaded_filenames.append(filename)
-        self.documents.extend(indexed_docs)
-        self.rebuild_vector_store()
+                chunks = self.split_document(text)
+                self.add_document(filename, chunks, self.embed_chunks(chunks), content_hash)
         logging.debug(f"Indexed {len(self.uploaded_filenames)} unique filenames: {self.uploaded_filenames}")
 
-    def rebuild_vector_store(self):
-        """Rebuild the FAISS vector store."""
-        if self.documents:
-            langchain_docs = [
-                Document(page_content=doc["text"], metadata={"filename": doc["filename"]})
-                for doc in self.documents
-            ]
-            self.vector_store = FAISS.from_documents(langchain_docs, self.embeddings)
-        else:
-            self.vector_store = None
-        logging.debug(f"Vector store rebuilt with {len(self.documents)} documents")
+    def split_document(self, text):
+        return self.text_splitter.split_text(text)
+
+    def embed_chunks(self, chunks, on_progress=None, batch_size=64):
+        """Embed chunks in batches into one float32 matrix, reporting the number embedded so far after each batch."""
+        batches = []
+        for start in range(0, len(chunks), batch_size):
+            batches.append(embed_array(self.embeddings, chunks[start:start + batch_size]))
+            if on_progress is not None:
+                on_progress(start + len(batches[-1]))
+        return np.vstack(batches) if batches else np.empty((0, 0), dtype=np.float32)
+
+    def add_document(self, filename, chunks, vectors, content_hash=None):
+        """Make one embedded document queryable and persist it; False if the filename is already indexed."""
+        with self.writing():
+            if filename in self.uploaded_filenames or filename in self.chunk_ids:
+                return False
+            self.chunk_ids[filename] = self.add_to_vector_store(filename, chunks, vectors)
+            self.uploaded_filenames.append(filename)
+            if chunks:
+                self.summarizer.submit(filename, chunks)
+            if content_hash:
+                self.content_hashes[filename] = content_hash
+            self.persist_added(filename, content_hash, self.chunk_ids[filename])
+            self.corpus_changed()
+            return True
+
+    def streaming_splitter(self):
+        """A splitter for a document that arrives section by section, with this pipeline's chunking."""
+        return StreamingSplitter(self.text_splitter)
+
+    def begin_document(self, filename, content_hash=None):
+        """Start adding a document batch by batch; False if the filename is already indexed or being added.
+
+        Each add_chunks batch is searchable (and logged) immediately, while the
+        document only appears in the document list, and counts as a duplicate,
+        once finish_document commits it. abort_document removes a partial one.
+        """
+        with self.writing():
+            # chunk_ids also lists the documents other workers of a shared index are streaming in
+            if filename in self.uploaded_filenames or filename in self.streaming or filename in self.chunk_ids:
+                return False
+            self.streaming[filename] = content_hash
+            self.chunk_ids[filename] = []
+            return True
+
+    def add_chunks(self, filename, chunks, vectors):
+        """Make one embedded batch of a document started with begin_document queryable."""
+        if filename not in self.streaming:
+            raise ValueError(f"{filename} is not being added")
+        with self.writing():
+            ids = self.add_to_vector_store(filename, chunks, vectors)
+            self.chunk_ids[filename].extend(ids)
+            self.persist_batch(filename, self.streaming[filename], ids, chunks, vectors)
+            self.corpus_changed()
+            return ids
+
+    def finish_document(self, filename):
+        """Commit a document added with begin_document/add_chunks."""
+        with self.writing():
+            content_hash = self.streaming.pop(filename)
+            self.uploaded_filenames.append(filename)
+            if content_hash:
+                self.content_hashes[filename] = content_hash
+            chunks = self.get_chunk_texts(filename)
+            if chunks:
+                self.summarizer.submit(filename, chunks)
+            if self.index_store is not None:
+                self.index_store.append_commit(filename, content_hash)
+                self.compact_if_needed()
+
+    def abort_document(self, filename):
+        """Remove the batches of a document that will not be finished."""
+        if filename not in self.streaming:
+            return
+        with self.writing():
+            del self.streaming[filename]
+            self.tables.remove(filename)
+            ids = self.chunk_ids.pop(filename, [])
+            self.remove_chunks(ids)
+            self.corpus_changed(removed_ids=ids)
+            if ids:
+                self.persist_deleted(filename)
+        logging.debug(f"Discarded {len(ids)} chunks of unfinished upload {filename}")
+
+    def add_table(self, filename, directory):
+        """Take over the columnar copy a parser saved for a tabular upload (see backend.parsing.table_directory)."""
+        self.ensure_loaded()
+        self.tables.add(filename, directory)
+
+    def answer_from_tables(self, query):
+        """Answer an aggregate or filter question from the uploaded tables; None to fall back to retrieval."""
+        if not self.tables.tables:
+            return None
+        result = self.table_engine.answer(query, list(self.tables.tables.values()))
+        if result is None:
+            return None
+        response, references = result
+        return response.replace("\n", "<br>"), references
+
+    def add_to_vector_store(self, filename, chunks, vectors):
+        """Append one file's already-embedded chunks to the vector store and return their chunk ids."""
+        if not chunks:
+            return []
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.vector_store is None:
+            self.vector_store = VectorStore(dimension=vectors.shape[1], chunks=self.documents, **self.index_options)
+        with self.index_lock:
+            ids = self.vector_store.add_chunks(vectors, chunks, [filename] * len(chunks))
+            for chunk_id, chunk in zip(ids, chunks):
+                self.lexical_index.add(chunk_id, chunk)
+        self.publish()
+        logging.debug(f"Vector store extended with {len(chunks)} new chunks ({len(self.documents)} total)")
+        return ids
+
+    def has_index(self):
+        self.ensure_loaded()
+        return len(self.versions.current) > 0
+
+    def candidates(self, query_vector, query=None, timings=None, version=None, scores=None):
+        """Return candidate chunk ids for the query, best first.
+
+        The top dense (vector) and BM25 (keyword) hits are fused by reciprocal
+        rank, so exact identifiers and part numbers the embedding model blurs
+        still rank. A reranker gets ``rerank_candidates`` of them to narrow down.
+        Only chunks of ``version`` (default: the current one) are returned.
+        If ``scores`` is a dict, it receives each id's fused score (higher is
+        better; without a query, the negated vector distance).
+        """
+        timings = {} if timings is None else timings
+        version = self.versions.current if version is None else version
+        if not version.count:
+            return []
+        k = self.rerank_candidates if self.reranker is not None and query else self.retrieval_k
+        with timed(timings, "dense"), self.index_lock:
+            dense_ids, distances = version.vector_store.search_ids(query_vector, k=max(k, 20) if query else k,
+                                                                   version=version)
+        if not query:
+            if scores is not None:
+                scores.update(zip(dense_ids, (-distance for distance in distances)))
+            return dense_ids
+        with timed(timings, "lexical"), self.index_lock:
+            hidden = len(version.lexical_index) - version.count  # Indexed but not in the version
+            hits = version.lexical_index.search(query, max(k, 20) + max(hidden, 0))
+            lexical_ids = [chunk_id for chunk_id, _ in hits if chunk_id in version][:max(k, 20)]
+        return reciprocal_rank_fusion([dense_ids, lexical_ids], scores=scores)[:k]
+
+    def rerank(self, query, chunk_ids, texts, scores=None):
+        """Keep the reranker's top ``rerank_top_k`` chunk ids, or the first ``retrieval_k`` if it ran out of time.
+
+        The reranker's scores of the kept ids replace their entries in ``scores``, if given.
+        """
+        if self.reranker is None or not query:
+            return chunk_ids[:self.retrieval_k]
+        rerank_scores = []
+        order = self.reranker.rerank(query, texts, self.rerank_top_k, scores=rerank_scores)
+        if order is None:
+            return chunk_ids[:self.retrieval_k]
+        chunk_ids = [chunk_ids[i] for i in order]
+        if scores is not None:
+            scores.clear()
+            scores.update(zip(chunk_ids, rerank_scores))
+        return chunk_ids
+
+    def select(self, chunk_ids, version=None):
+        """Return the chunk ids in the version, their chunks and de-duplicated source filenames."""
+        version = self.versions.current if version is None else version
+        with self.index_lock:
+            chunk_ids = [chunk_id for chunk_id in chunk_ids if chunk_id in version]
+            docs = [version.vector_store.documents[chunk_id] for chunk_id in chunk_ids]
+        references = list(dict.fromkeys([doc.metadata.get("filename", "Unknown") for doc in docs]))  # Remove duplicates
+        return chunk_ids, docs, references
+
+    def retrieve(self, query_vector, query=None, timings=None, version=None, scores=None):
+        """Return the chunk ids, chunks and de-duplicated source filenames that best match the query.
+
+        ``scores``, if a dict, receives the retrieval score of each returned id: the reranker's, else the fused one.
+        """
+        timings = {} if timings is None else timings
+        version = self.versions.current if version is None else version
+        chunk_ids = self.candidates(query_vector, query, timings, version, scores)
+        with self.index_lock:
+            texts = version.vector_store.chunks.texts(chunk_ids) if chunk_ids else []
+        with timed(timings, "rerank"):
+            chunk_ids = self.rerank(query, chunk_ids, texts, scores)
+        return self.select(chunk_ids, version)
+
+    async def aretrieve(self, query_vector, query, timings, version=None, scores=None):
+        """Async retrieve: the cross-encoder scores in a worker thread instead of on the event loop."""
+        version = self.versions.current if version is None else version
+        chunk_ids = self.candidates(query_vector, query, timings, version, scores)
+        with self.index_lock:
+            texts = version.vector_store.chunks.texts(chunk_ids) if chunk_ids else []
+        with timed(timings, "rerank"):
+            if self.reranker is not None:
+                chunk_ids = await asyncio.to_thread(self.rerank, query, chunk_ids, texts, scores)
+            else:
+                chunk_ids = self.rerank(query, chunk_ids, texts, scores)
+        return self.select(chunk_ids, version)  # Chunks deleted meanwhile are still readable: the version is pinned
+
+    def record_timings(self, timings):
+        self.stage_timings.record(timings)
+        logging.debug("Query stage timings: " + ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in timings.items()))
+
+    def build_context(self, chunk_ids, docs, version=None, scores=None):
+        """Return the prompt context, the chunk ids it uses and their de-duplicated source filenames.
+
+        ``scores`` (chunk id -> retrieval score, as filled in by ``retrieve``) rank the chunks by relevance.
+        """
+        chunks = [
+            {"id": chunk_id, "text": doc.page_content, "filename": doc.metadata.get("filename", "Unknown")}
+            for chunk_id, doc in zip(chunk_ids, docs)
+        ]
+        if not chunks:
+            return "", [], []
+        vector_store = (self.versions.current if version is None else version).vector_store
+        with self.index_lock:
+            vectors = vector_store.vectors([chunk["id"] for chunk in chunks])
+        relevance = [scores[chunk["id"]] for chunk in chunks] if scores and all(
+            chunk["id"] in scores for chunk in chunks) else None
+        context, used_ids = self.context_builder.build(chunks, vectors, relevance)
+        used = set(used_ids)
+        references = list(dict.fromkeys(chunk["filename"] for chunk in chunks if chunk["id"] in used))
+        return context, used_ids, references
+
+    @staticmethod
+    def build_prompt(context, query):
+        return f"Answer based on this context:\n{context}\nQuery: {query}"
+
+    def cached_answer(self, query_vector):
+        """Return a cached (response, references) for a similar query on the current corpus, or None."""
+        if self.answer_cache is None:
+            return None
+        return self.answer_cache.get(query_vector)
+
+    def cache_answer(self, query_vector, chunk_ids, response, references):
+        if self.answer_cache is not None:
+            self.answer_cache.put(query_vector, chunk_ids, response, references)
+
+    def corpus_changed(self, removed_ids=None):
+        """Invalidate cached answers the change may affect.
+
+        New chunks can enter any query's top-k, so additions clear the answer
+        cache; removals only drop answers that were built from ``removed_ids``.
+        The version bump stops in-flight async answers from being cached.
+        """
+        self.corpus_version += 1
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate(removed_ids)
 
     def answer_query(self, query):
         """Answer a query based on indexed documents."""
-        if not self.vector_store:
+        if not self.has_index():
             return "No documents indexed.", []
-        docs = self.vector_store.similarity_search(query, k=5)  # Increased from 3 to 5
-        context = "\n".join([doc.page_content for doc in docs])
-        response = self.llm.invoke(f"Answer based on this context:\n{context}\nQuery: {query}").content
+        timings = {}
+        with timed(timings, "table"):
+            table_answer = self.answer_from_tables(query)
+        if table_answer is not None:
+            self.record_timings(timings)
+            return table_answer
+        with timed(timings, "embed"):
+            query_vector = self.embeddings.embed_query(query)
+        with timed(timings, "answer_cache"):
+            cached = self.cached_answer(query_vector)
+        if cached is not None:
+            self.record_timings(timings)
+            return cached
+        scores = {}
+        with self.versions.pin():  # Chunks of the pinned and any later version stay readable until it is released
+            chunk_ids, docs, references = self.retrieve(query_vector, query, timings, scores=scores)
+            with timed(timings, "context"):
+                context, chunk_ids, references = self.build_context(chunk_ids, docs, scores=scores)
+        with timed(timings, "llm"):
+            response = self.llm.invoke(self.build_prompt(context, query)).content
         # Format response with line breaks
         response = response.replace("\n", "<br>")
-        references = list(dict.fromkeys([doc.metadata.get("filename", "Unknown") for doc in docs]))  # Remove duplicates
+        self.cache_answer(query_vector, chunk_ids, response, references)
+        self.record_timings(timings)
+        return response, references
+
+    async def aanswer_query(self, query):
+        """Answer a query without blocking the event loop while the LLM generates."""
+        if not self.has_index():
+            return "No documents indexed.", []
+        timings = {}
+        with timed(timings, "table"):
+            table_answer = await asyncio.to_thread(self.answer_from_tables, query)
+        if table_answer is not None:
+            self.record_timings(timings)
+            return table_answer
+        with timed(timings, "embed"):
+            query_vector = await self.query_batcher.embed(query)
+        with timed(timings, "answer_cache"):
+            cached = self.cached_answer(query_vector)
+        if cached is not None:
+            self.record_timings(timings)
+            return cached
+        version = self.corpus_version
+        scores = {}
+        with self.versions.pin() as index_version:  # Writes meanwhile go to later versions
+            chunk_ids, docs, references = await self.aretrieve(query_vector, query, timings, index_version, scores)
+            with timed(timings, "context"):
+                context, chunk_ids, references = self.build_context(chunk_ids, docs, index_version, scores)
+        with timed(timings, "llm"):
+            response = (await self.llm.ainvoke(self.build_prompt(context, query))).content
+        response = response.replace("\n", "<br>")
+        if version == self.corpus_version:  # The corpus may have changed while we awaited the reranker or LLM
+            self.cache_answer(query_vector, chunk_ids, response, references)
+        self.record_timings(timings)
         return response, references
 
+    async def astream_answer(self, query):
+        """Stream an answer as ("token", text) events followed by one ("references", filenames) event."""
+        if not self.has_index():
+            yield "token", "No documents indexed."
+            yield "references", []
+            return
+        timings = {}
+        with timed(timings, "table"):
+            table_answer = await asyncio.to_thread(self.answer_from_tables, query)
+        if table_answer is not None:
+            self.record_timings(timings)
+            yield "token", table_answer[0]
+            yield "references", table_answer[1]
+            return
+        with timed(timings, "embed"):
+            query_vector = await self.query_batcher.embed(query)
+        with timed(timings, "answer_cache"):
+            cached = self.cached_answer(query_vector)
+        if cached is not None:
+            self.record_timings(timings)
+            yield "token", cached[0]
+            yield "references", cached[1]
+            return
+        version = self.corpus_version
+        scores = {}
+        with self.versions.pin() as index_version:  # Writes meanwhile go to later versions
+            chunk_ids, docs, references = await self.aretrieve(query_vector, query, timings, index_version, scores)
+            with timed(timings, "context"):
+                context, chunk_ids, references = self.build_context(chunk_ids, docs, index_version, scores)
+        tokens = []
+        started = time.perf_counter()
+        async for chunk in self.llm.astream(self.build_prompt(context, query)):
+            if chunk.content:
+                if not tokens:
+                    timings["llm_first_token"] = (time.perf_counter() - started) * 1000
+                tokens.append(chunk.content.replace("\n", "<br>"))
+                yield "token", tokens[-1]
+        timings["llm"] = (time.perf_counter() - started) * 1000  # Includes time the client took to read tokens
+        if version == self.corpus_version:
+            self.cache_answer(query_vector, chunk_ids, "".join(tokens), references)
+        self.record_timings(timings)
+        yield "references", references
+
+    def get_chunk_texts(self, filename):
+        return self.documents.texts(self.chunk_ids.get(filename, []))
+
     def summarize_documents(self):
-        """Summarize all indexed documents."""
+        """Summarize all indexed documents by combining their cached per-document summaries."""
+        self.ensure_loaded()
         if not self.documents:
             return "No documents to summarize."
-        all_text = "\n".join([doc["text"] for doc in self.documents])
-        summary = self.llm.invoke(f"Summarize this text:\n{all_text}").content
+        summary = self.summarizer.summarize(self.uploaded_filenames)
         return summary.replace("\n", "<br>")  # Format with line breaks
 
+    async def asummarize_documents(self):
+        """Async variant of summarize_documents for the event loop."""
+        self.ensure_loaded()
+        if not self.documents:
+            return "No documents to summarize."
+        summary = await self.summarizer.asummarize(self.uploaded_filenames)
+        return summary.replace("\n", "<br>")
+
+    def get_cache_stats(self):
+        """Return hit/miss counters for the caches in front of the models and the vector and lexical index layout."""
+        stats = {}
+        if self.embedding_cache is not None:
+            stats["embedding_cache"] = self.embedding_cache.stats()
+        if self.answer_cache is not None:
+            stats["answer_cache"] = self.answer_cache.stats()
+        if self.vector_store is not None:
+            stats["vector_index"] = self.vector_store.stats()
+        stats["chunks"] = self.documents.stats()
+        if self.documents:
+            stats["chunks"]["index_bytes_per_chunk"] = self.memory_bytes() / len(self.documents)
+        stats["lexical_index"] = self.lexical_index.stats()
+        stats["index_versions"] = self.versions.stats()
+        if self.reranker is not None:
+            stats["reranker"] = self.reranker.stats()
+        stats["context"] = self.context_builder.stats()
+        stats["tables"] = {**self.tables.stats(), **self.table_engine.stats()}
+        stats["stage_timings"] = self.stage_timings.stats()
+        return stats
+
+    def memory_bytes(self):
+        """Approximate memory held by this pipeline's index and chunk store."""
+        if self.vector_store is None:
+            return self.documents.memory_bytes() + self.tables.memory_bytes()
+        # The vector store's share includes the chunk store
+        return self.vector_store.memory_bytes() + self.lexical_index.memory_bytes() + self.tables.memory_bytes()
+
+    def close(self):
+        """Release background resources; the persisted index is left as is."""
+        self.summarizer.shutdown()
+
+    def find_duplicate(self, content_hash):
+        """Return the filename already indexed with this content hash, or None."""
+        self.ensure_loaded()
+        for filename, existing_hash in self.content_hashes.items():
+            if existing_hash == content_hash:
+                return filename
+        return None
+
     def get_document_count(self):
         """Return the number of unique documents."""
+        self.ensure_loaded()
         return len(self.uploaded_filenames)
 
     def get_uploaded_filenames(self):
         """Return the list of uploaded filenames."""
+        self.ensure_loaded()
         return self.uploaded_filenames.copy()
 
+    def remove_chunks(self, ids):
+        """Take chunks out of the index for new queries; they are purged once no running query reads them."""
+        self.publish(retired_ids=ids)
+
+    def purge_chunks(self, ids):
+        """Drop chunks from the vector store with their texts, and from the lexical index."""
+        with self.index_lock:
+            if self.vector_store is not None:
+                self.vector_store.remove(ids)
+            self.lexical_index.remove(ids)
+
     def delete_document(self, filename):
-        """Delete a document by filename."""
-        if filename in self.uploaded_filenames:
-            try:
-                self.documents = [doc for doc in self.documents if doc["filename"] != filename]
-                self.uploaded_filenames.remove(filename)
-                self.rebuild_vector_store()
-                logging.debug(f"Successfully deleted {filename} from index")
-                return True
-            except Exception as e:
-                logging.error(f"Error deleting {filename}: {str(e)}")
-                return False
+        """Delete a document by filename, removing only its own chunks from the index."""
+        with self.writing():
+            if filename in self.uploaded_filenames:
+                try:
+                    ids = self.chunk_ids.pop(filename, [])
+                    self.remove_chunks(ids)
+                    self.uploaded_filenames.remove(filename)
+                    self.content_hashes.pop(filename, None)
+                    self.summarizer.remove(filename)
+                    self.tables.remove(filename)
+                    self.corpus_changed(removed_ids=ids)
+                    self.persist_deleted(filename)
+                    logging.debug(f"Successfully deleted {filename} ({len(ids)} chunks) from index")
+                    return True
+                except Exception as e:
+                    logging.error(f"Error deleting {filename}: {str(e)}")
+                    return False
         logging.warning(f"Filename {filename} not found for deletion")
-        return False
\ No newline at end of file
+        return False
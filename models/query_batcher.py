@@ -0,0 +1,68 @@
+import asyncio
+import logging
+
+
+class QueryBatcher:
+    """Coalesces concurrent query embeddings into one batched model call.
+
+    The first query to arrive opens a batch; the batch is encoded when
+    ``window_seconds`` have passed or ``max_batch_size`` queries have joined,
+    whichever comes first. While no batch is encoding the window is skipped and
+    only queries arriving in the same event-loop pass are coalesced, so a lone
+    query never waits. ``embed_batch`` runs in a worker thread and must map a
+    list of texts to one vector per text, so each caller gets its own vector back.
+    """
+
+    def __init__(self, embed_batch, window_seconds=0.005, max_batch_size=32):
+        self.embed_batch = embed_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.pending = []  # (text, future) pairs waiting for the next flush
+        self.timer = None
+        self.running = 0  # Batches currently being encoded
+        self.batches = 0
+        self.queries = 0
+
+    async def embed(self, text):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((text, future))
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.timer is None:
+            delay = self.window_seconds if self.running else 0
+            self.timer = asyncio.get_running_loop().call_later(delay, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            self.running += 1
+            asyncio.ensure_future(self.run(batch))
+
+    async def run(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await asyncio.to_thread(self.embed_batch, texts)
+        except Exception as e:
+            logging.error(f"Error embedding a batch of {len(texts)} queries: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.running -= 1
+        self.batches += 1
+        self.queries += len(texts)
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():  # The caller may have been cancelled while we encoded
+                future.set_result(vector)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
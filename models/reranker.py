@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class CrossEncoderReranker:
+    """Re-scores retrieved chunks against the query with a small cross-encoder on CPU.
+
+    Pairs are scored ``batch_size`` at a time and every (query, chunk text)
+    score is kept in an LRU cache, so repeated queries only pay for chunks they
+    have not seen. Scoring stops before a batch that would run past
+    ``budget_seconds``; ``rerank`` then returns None and the caller keeps its
+    retrieval order. The model is loaded on first use, outside the budget.
+    """
+
+    def __init__(self, model_name=DEFAULT_RERANKER_MODEL, model=None, batch_size=16, budget_seconds=0.15,
+                 cache_entries=10_000, clock=time.perf_counter):
+        self.model_name = model_name
+        self.model = model
+        self.batch_size = batch_size
+        self.budget_seconds = budget_seconds
+        self.cache_entries = cache_entries
+        self.clock = clock
+        self.scores = OrderedDict()  # (query, chunk text) -> score, least recently used first
+        self.lock = threading.Lock()  # Reranking runs in worker threads
+        self.load_lock = threading.Lock()
+        self.requests = 0
+        self.fallbacks = 0
+        self.pairs_scored = 0
+        self.cache_hits = 0
+
+    def load(self):
+        with self.load_lock:
+            if self.model is None:
+                from sentence_transformers import CrossEncoder
+                self.model = CrossEncoder(self.model_name, device="cpu")
+                logging.info(f"Loaded reranker {self.model_name}")
+        return self.model
+
+    def rerank(self, query, texts, top_k, scores=None):
+        """Return the indices of the ``top_k`` best texts, best first, or None if the budget ran out.
+
+        If ``scores`` is a list, the cross-encoder scores of those texts are appended to it.
+        """
+        model = self.load()
+        deadline = self.clock() + self.budget_seconds
+        pair_scores = [None] * len(texts)
+        with self.lock:
+            self.requests += 1
+            for i, text in enumerate(texts):
+                score = self.scores.get((query, text))
+                if score is not None:
+                    self.scores.move_to_end((query, text))
+                    pair_scores[i] = score
+                    self.cache_hits += 1
+        missing = [i for i, score in enumerate(pair_scores) if score is None]
+        batch_seconds = 0.0
+        for start in range(0, len(missing), self.batch_size):
+            # Assume the next batch takes as long as the last one; stop rather than overrun the budget
+            if self.clock() + batch_seconds > deadline:
+                with self.lock:
+                    self.fallbacks += 1
+                logging.debug(f"Reranking ran out of budget after {start} of {len(missing)} uncached pairs")
+                return None
+            batch = missing[start:start + self.batch_size]
+            started = self.clock()
+            batch_scores = model.predict([(query, texts[i]) for i in batch], batch_size=len(batch),
+                                         show_progress_bar=False)
+            batch_seconds = self.clock() - started
+            with self.lock:
+                for i, score in zip(batch, batch_scores):
+                    pair_scores[i] = float(score)
+                    self.scores[(query, texts[i])] = pair_scores[i]
+                self.pairs_scored += len(batch)
+                while len(self.scores) > self.cache_entries:
+                    self.scores.popitem(last=False)
+        order = sorted(range(len(texts)), key=lambda i: -pair_scores[i])[:top_k]
+        if scores is not None:
+            scores.extend(pair_scores[i] for i in order)
+        return order
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "fallbacks": self.fallbacks,
+                "pairs_scored": self.pairs_scored,
+                "cache_hits": self.cache_hits,
+                "cache_entries": len(self.scores),
+            }
@@ -1,23 +1,20 @@
-import faiss
-import numpy as np
+from models.vector_store import VectorStore
 
 
 class Retriever:
-    def __init__(self, dimension=384):
-        self.index = faiss.IndexFlatL2(dimension)
-        self.documents = []
-        self.embeddings = []
+    def __init__(self, dimension=384, **index_options):
+        """Document retriever on a VectorStore, so it gets the same ANN backend selection and chunk store."""
+        self.store = VectorStore(dimension, **index_options)
 
     def add_documents(self, embeddings, documents):
         """Add documents and their embeddings to the index."""
-        self.documents.extend(documents)
-        self.embeddings.extend(embeddings)
-        if embeddings:
-            self.index.add(np.array(embeddings).astype('float32'))
+        if len(embeddings):
+            self.store.add_chunks(embeddings, [doc.text for doc in documents],
+                                  [doc.metadata["filename"] for doc in documents])
 
     def search(self, query_embedding, k=3):
         """Search for top-k relevant documents."""
-        if not self.embeddings:
+        if not len(self.store):
             return [], []
-        D, I = self.index.search(np.array([query_embedding]), k)
-        return [(self.documents[i].text, self.documents[i].metadata["filename"]) for i in I[0] if i >= 0]
\ No newline at end of file
+        ids, _ = self.store.search_ids(query_embedding, k)
+        return [(self.store.chunks.text(chunk_id), self.store.chunks.filename(chunk_id)) for chunk_id in ids]
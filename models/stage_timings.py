@@ -0,0 +1,38 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+@contextmanager
+def timed(timings, stage):
+    """Add the wall-clock milliseconds spent in the block to ``timings[stage]``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000
+
+
+class StageTimings:
+    """Rolling window of per-stage query latencies (embed, retrieval, rerank, LLM, ...)."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = {}  # Stage -> deque of milliseconds
+
+    def record(self, timings):
+        for stage, milliseconds in timings.items():
+            self.samples.setdefault(stage, deque(maxlen=self.window)).append(milliseconds)
+
+    def stats(self):
+        return {
+            stage: {
+                "count": len(samples),
+                "mean_ms": round(float(np.mean(samples)), 3),
+                "p50_ms": round(float(np.percentile(samples, 50)), 3),
+                "p95_ms": round(float(np.percentile(samples, 95)), 3),
+            }
+            for stage, samples in self.samples.items()
+        }
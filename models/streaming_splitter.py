@@ -0,0 +1,31 @@
+class StreamingSplitter:
+    """Splits a document that arrives section by section (pages, blocks of lines) into chunks.
+
+    Sections are joined with newlines, as the whole-text parsers join pages,
+    and split once about ``buffer_chars`` have accumulated. Every chunk but
+    the last is released; the last one may continue into the next section, so
+    it stays in the buffer and is split again with what follows. Memory is
+    bounded by the buffer and the largest section, not the document.
+    """
+
+    def __init__(self, text_splitter, buffer_chars=64 * 1024):
+        self.text_splitter = text_splitter
+        self.buffer_chars = buffer_chars
+        self.buffer = ""
+
+    def feed(self, section):
+        """Add a section; return the chunks that are now complete (possibly none)."""
+        self.buffer = self.buffer + "\n" + section if self.buffer else section
+        if len(self.buffer) < self.buffer_chars:
+            return []
+        chunks = self.text_splitter.split_text(self.buffer)
+        if len(chunks) < 2:
+            return []
+        self.buffer = chunks[-1]
+        return chunks[:-1]
+
+    def flush(self):
+        """Return the chunks left in the buffer once the document has ended."""
+        chunks = self.text_splitter.split_text(self.buffer) if self.buffer.strip() else []
+        self.buffer = ""
+        return chunks
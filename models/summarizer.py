@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAP_PROMPT = "Summarize this text:\n{text}"
+REDUCE_PROMPT = "Combine these summaries into one concise summary:\n{summaries}"
+
+
+class DocumentSummarizer:
+    """Map-reduce summarizer that keeps one summary per document up to date.
+
+    The map step runs in a background thread pool as soon as a document is
+    indexed: its chunks are grouped into prompts of at most ``max_chars`` and
+    summarized in parallel with ``llm.batch``, and the partial summaries are
+    combined until a single summary is left. ``summarize`` then only has to run
+    the reduce step over the cached per-document summaries, and its result is
+    reused until the set of summaries changes.
+
+    Each summary is saved to its own file under ``directory``, so worker
+    processes sharing an index never overwrite each other's summaries.
+    """
+
+    def __init__(self, llm, directory=None, max_chars=12000, max_workers=4):
+        self.llm = llm
+        self.directory = directory
+        self.max_chars = max_chars
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summarizer")
+        self.lock = threading.Lock()
+        self.summaries = {}  # Filename -> summary
+        self.pending = {}  # Filename -> Future of its summary
+        self.generations = {}  # Filename -> submission number of its pending summary
+        self.generation = 0
+        self.combined = None  # (summaries key, combined summary)
+
+    def path(self, filename):
+        return os.path.join(self.directory, hashlib.sha1(filename.encode("utf-8")).hexdigest()[:16] + ".json")
+
+    def load(self):
+        """Read the persisted per-document summaries, if any."""
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        summaries = {}
+        for entry in os.listdir(self.directory):
+            if not entry.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, entry), "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                continue  # Deleted by another worker meanwhile; a torn write never replaces the file
+            summaries[saved["filename"]] = saved["summary"]
+        with self.lock:
+            self.summaries.update(summaries)
+
+    def submit(self, filename, chunks):
+        """Start summarizing a newly indexed document in the background."""
+        with self.lock:
+            self.generation += 1
+            self.generations[filename] = self.generation
+            future = self.executor.submit(self.run, filename, chunks, self.generation)
+            self.pending[filename] = future
+        return future
+
+    def run(self, filename, chunks, generation):
+        """Worker body: summarize, then store the result, so a finished future means a stored summary."""
+        try:
+            summary = self.summarize_chunks(chunks)
+        except Exception as e:
+            logging.error(f"Summarizing {filename} failed: {str(e)}")
+            with self.lock:
+                if self.generations.get(filename) == generation:
+                    del self.pending[filename], self.generations[filename]
+            raise
+        with self.lock:
+            if self.generations.get(filename) != generation:
+                return summary  # Deleted (or re-indexed) while it was being summarized
+            del self.pending[filename], self.generations[filename]
+            self.summaries[filename] = summary
+            self.save(filename)
+        logging.debug(f"Cached summary for {filename}")
+        return summary
+
+    def remove(self, filename):
+        """Forget a deleted document; only the reduce step has to run again."""
+        with self.lock:
+            future = self.pending.pop(filename, None)
+            self.generations.pop(filename, None)
+            if future is not None:
+                future.cancel()
+            if self.summaries.pop(filename, None) is not None:
+                self.delete(filename)
+
+    def retain(self, filenames, prune=True):
+        """Drop summaries of documents that are no longer indexed.
+
+        Without ``prune`` their files are left alone: in a shared index they may belong to another worker's upload.
+        """
+        with self.lock:
+            stale = [filename for filename in self.summaries if filename not in filenames]
+            for filename in stale:
+                del self.summaries[filename]
+                if prune:
+                    self.delete(filename)
+
+    def missing(self, filenames):
+        """Filenames that have neither a cached nor an in-flight summary."""
+        with self.lock:
+            return [filename for filename in filenames if filename not in self.summaries and filename not in self.pending]
+
+    def wait(self, timeout=None):
+        """Block until every in-flight document summary is done."""
+        with self.lock:
+            futures = list(self.pending.values())
+        for future in futures:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass  # Logged by run()
+
+    def summarize_chunks(self, chunks):
+        """Map step: summarize groups of chunks in parallel, then combine until one summary is left."""
+        prompts = [MAP_PROMPT.format(text=group) for group in self.group(chunks)]
+        summaries = [message.content for message in self.llm.batch(prompts)]
+        while len(summaries) > 1:
+            groups = self.group(summaries)
+            if len(groups) == len(summaries):
+                # Every summary is already near max_chars: combine them pairwise so the loop always shrinks
+                groups = ["\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+            prompts = [REDUCE_PROMPT.format(summaries=group) for group in groups]
+            summaries = [message.content for message in self.llm.batch(prompts)]
+        return summaries[0]
+
+    def group(self, texts):
+        """Pack consecutive texts into newline-joined groups of at most max_chars."""
+        groups, current, size = [], [], 0
+        for text in texts:
+            if current and size + len(text) > self.max_chars:
+                groups.append("\n".join(current))
+                current, size = [], 0
+            current.append(text)
+            size += len(text) + 1
+        if current:
+            groups.append("\n".join(current))
+        return groups
+
+    def prepare_reduce(self, filenames):
+        """Return (key, prompt, summary) for the reduce step; summary is set when no LLM call is needed."""
+        with self.lock:
+            summaries = [(filename, self.summaries[filename]) for filename in filenames if filename in self.summaries]
+            key = tuple(summaries)
+            if self.combined is not None and self.combined[0] == key:
+                return key, None, self.combined[1]
+        if not summaries:
+            return key, None, "No documents to summarize."  # Every map step failed; nothing to reduce
+        if len(summaries) == 1:
+            return key, None, summaries[0][1]
+        joined = "\n\n".join(f"{filename}:\n{summary}" for filename, summary in summaries)
+        return key, REDUCE_PROMPT.format(summaries=joined), None
+
+    def remember(self, key, summary):
+        with self.lock:
+            self.combined = (key, summary)
+
+    def summarize(self, filenames):
+        """Reduce step: combine the cached per-document summaries of ``filenames``."""
+        self.wait()
+        key, prompt, summary = self.prepare_reduce(filenames)
+        if summary is None:
+            summary = self.llm.invoke(prompt).content
+            self.remember(key, summary)
+        return summary
+
+    async def asummarize(self, filenames):
+        """Async reduce step; waits for in-flight document summaries without blocking the loop."""
+        with self.lock:
+            futures = [asyncio.wrap_future(future) for future in self.pending.values()]
+        await asyncio.gather(*futures, return_exceptions=True)
+        key, prompt, summary = self.prepare_reduce(filenames)
+        if summary is None:
+            summary = (await self.llm.ainvoke(prompt)).content
+            self.remember(key, summary)
+        return summary
+
+    def save(self, filename):
+        """Persist one document's summary. Caller holds the lock."""
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(filename)
+        tmp = f"{path}.{os.getpid()}.tmp"  # Another worker may be saving the same document
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"filename": filename, "summary": self.summaries[filename]}, f)
+        os.replace(tmp, path)
+
+    def delete(self, filename):
+        """Remove one document's saved summary. Caller holds the lock."""
+        if self.directory is None:
+            return
+        try:
+            os.remove(self.path(filename))
+        except FileNotFoundError:
+            pass
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,426 @@
+import re
+import threading
+import time
+
+import numpy as np
+
+from models.table_store import BOOLEAN, DATE, NUMBER, TEXT, format_value
+
+AGGREGATES = [  # (operation, pattern); the earliest match in the question wins
+    ("mean", r"average|avg|mean"),
+    ("median", r"median"),
+    ("sum", r"sum|total"),
+    ("max", r"max|maximum|highest|largest|biggest|greatest|most expensive|latest|most recent"),
+    ("min", r"min|minimum|lowest|smallest|least|cheapest|earliest|oldest"),
+    ("distinct", r"distinct|unique|different"),
+    ("count", r"how many|count|number of"),
+]
+ROWS_INTENT = re.compile(r"\b(show|list|which|what|find|filter|rows?|records?|entries|display|give me)\b")
+COMPARISONS = [  # Longest phrases first so "greater than or equal to" is not read as "greater than"
+    (">=", r">=|greater than or equal to|at least|no less than|not less than"),
+    ("<=", r"<=|less than or equal to|at most|no more than|not more than"),
+    ("!=", r"!=|<>|is not|isn't|not equal to|other than|not"),
+    (">", r">|greater than|more than|higher than|larger than|above|over|exceeds|exceeding|after|later than|since"),
+    ("<", r"<|less than|lower than|smaller than|fewer than|below|under|before|earlier than"),
+    ("=", r"==|=|equals|equal to|is|of|in|for|at"),
+]
+COMPARISON = re.compile(r"\s*(?:is\s+|was\s+|are\s+)?(" + "|".join(
+    phrase + (r"\b" if phrase[-1].isalpha() else "") for _, pattern in COMPARISONS for phrase in pattern.split("|")
+) + r")\s*", re.IGNORECASE)
+NUMBER_VALUE = re.compile(r"-?\$?\d[\d,]*(?:\.\d+)?%?(?![\w-])")
+DATE_VALUE = re.compile(r"\d{4}-\d{1,2}-\d{1,2}|\d{4}(?![\d-])")
+QUOTED_VALUE = re.compile(r"\"([^\"]+)\"|'([^']+)'")
+GROUP_BY = re.compile(r"\b(?:grouped by|broken down by|for each|for every|by|per|each)\s+$")
+STOPWORDS = {"a", "an", "the", "of", "in", "for", "and", "or", "to", "is", "are", "what", "which", "by", "per", "with",
+             "all", "each", "on", "at", "from", "how", "many", "much", "me", "show", "list", "rows", "total"}
+# Words a table question may contain that say nothing about which table it is about
+QUESTION_WORDS = STOPWORDS | {"do", "does", "did", "has", "have", "had", "was", "were", "be", "where", "that", "there",
+                              "please", "tell", "get", "give", "find", "i", "we", "you", "value", "values"}
+
+
+def aliases(name):
+    """Lower-cased ways a question may refer to a column: as written, with spaces, and singular/plural."""
+    base = {name.lower(), re.sub(r"[_\-.]+", " ", name.lower()).strip()}
+    forms = set(base)
+    for alias in base:
+        forms.add(alias[:-1] if alias.endswith("s") else alias + "s")
+    return {alias for alias in forms if len(alias) > 1}
+
+
+def table_names(table):
+    """Ways a question may refer to a table's rows: its file name ("sales") and the entity of an id column ("orders")."""
+    names = aliases(re.sub(r"[_\-.]+", " ", table.name.rsplit(".", 1)[0].lower()).strip())
+    for column in table.columns:
+        entity = re.fullmatch(r"(.+?)[ _\-.]?id", column.name.lower())
+        if entity:
+            names |= aliases(entity.group(1))
+    return names
+
+
+def overlaps(span, spans):
+    return any(span[0] < other[1] and other[0] < span[1] for other in spans)
+
+
+def operation_name(operation):
+    return {"mean": "Average", "median": "Median", "sum": "Sum", "max": "Maximum", "min": "Minimum",
+            "distinct": "Distinct values", "count": "Count"}[operation]
+
+
+class Plan:
+    """A parsed table question: an operation over a target column, filters and an optional grouping."""
+
+    def __init__(self, table):
+        self.table = table
+        self.operation = None  # An AGGREGATES operation, "rows" or None
+        self.target = None  # Column the operation applies to
+        self.subject = None  # Text column to report for the row holding the min/max ("which product ...")
+        self.group = None
+        self.filters = []  # (column, comparison, value); equality filters on one column are OR-ed
+        self.mentions = []  # (start, end, column) in the question
+        self.score = 0
+        self.confidence = 0.0  # Share of the question's words the plan accounts for
+
+
+class TableQueryEngine:
+    """Answers aggregate, filter and lookup questions about uploaded tables with vectorized numpy operations.
+
+    A question is routed here when it names an aggregate (sum, average,
+    how many, ...) or asks for filtered rows, names the table or one of its
+    columns, and at least ``min_confidence`` of its words are explained by
+    the table (columns, values, aggregates and comparisons). A document
+    question that merely contains a category value ("what does the travel
+    policy say about Europe?") falls short of that. Questions it cannot plan
+    return None and go to retrieval.
+    """
+
+    def __init__(self, max_groups=20, max_rows=20, max_categories=100_000, min_confidence=0.5):
+        self.min_confidence = min_confidence
+        self.max_groups = max_groups
+        self.max_rows = max_rows
+        self.max_categories = max_categories  # Text columns with more distinct values are not scanned for mentions
+        self.lock = threading.Lock()
+        self.answered = 0
+        self.declined = 0
+        self.total_seconds = 0.0
+
+    def answer(self, query, tables):
+        """Return (answer, [filename]) for the best matching table, or None."""
+        start = time.perf_counter()
+        text = " " + re.sub(r"\s+", " ", query.lower().replace("?", " ")).strip() + " "
+        plans = [plan for plan in (self.plan(text, table) for table in tables) if plan is not None]
+        result = None
+        if plans:
+            plan = max(plans, key=lambda plan: plan.score)
+            answer = self.execute(plan)
+            if answer is not None:
+                result = answer, [plan.table.name]
+        with self.lock:
+            if result is None:
+                self.declined += 1
+            else:
+                self.answered += 1
+                self.total_seconds += time.perf_counter() - start
+        return result
+
+    def find_mentions(self, text, table):
+        mentions = []
+        for column in table.columns:
+            for alias in aliases(column.name):
+                for match in re.finditer(r"(?<![\w])" + re.escape(alias) + r"(?![\w])", text):
+                    mentions.append((match.start(), match.end(), column))
+        mentions.sort(key=lambda mention: (mention[0], -(mention[1] - mention[0])))
+        kept = []
+        for mention in mentions:
+            if not kept or mention[0] >= kept[-1][1]:
+                kept.append(mention)
+        return kept
+
+    def parse_value(self, column, text):
+        """Read a comparison value for ``column`` at the start of ``text``; returns (value, length) or None."""
+        quoted = QUOTED_VALUE.match(text)
+        if column.kind == TEXT:
+            if quoted:
+                code = column.code_of(quoted.group(1) or quoted.group(2))
+                return (code, quoted.end()) if code is not None else None
+            words = text.split(" ")
+            for length in range(min(6, len(words)), 0, -1):  # Longest category that starts here
+                phrase = " ".join(words[:length])
+                code = column.code_of(phrase)
+                if code is not None:
+                    return code, len(phrase)
+            return None
+        if column.kind == NUMBER:
+            match = NUMBER_VALUE.match(text)
+            if match:
+                return float(re.sub(r"[$,%]", "", match.group())), match.end()
+            return None
+        if column.kind == DATE:
+            match = DATE_VALUE.match(text)
+            if match:
+                value = match.group()
+                # A bare year stays a year, so "in 2023" covers all of it
+                return np.datetime64(value, "ns" if "-" in value else "Y"), match.end()
+            return None
+        if column.kind == BOOLEAN:
+            match = re.match(r"(true|false|yes|no)\b", text)
+            if match:
+                return match.group(1) in ("true", "yes"), match.end()
+        return None
+
+    def plan(self, text, table):
+        plan = Plan(table)
+        plan.mentions = self.find_mentions(text, table)
+        aggregates = [(match.span(), operation) for operation, pattern in AGGREGATES
+                      for match in re.finditer(r"\b(?:" + pattern + r")\b", text)]
+        if aggregates:
+            plan.operation = min(aggregates)[1]
+            if plan.operation == "count" and any(operation == "distinct" for _, operation in aggregates):
+                plan.operation = "distinct"  # "number of distinct products"
+        elif ROWS_INTENT.search(text):
+            plan.operation = "rows"
+        else:
+            return None
+        named = [match.span() for name in table_names(table)
+                 for match in re.finditer(r"(?<![\w])" + re.escape(name) + r"(?![\w])", text)]
+        if not named and not plan.mentions:
+            return None  # Values alone ("... about Europe") do not make a question about the table
+        if named:
+            plan.score += 3
+        explained = named + [span for span, _ in aggregates] + [match.span() for match in ROWS_INTENT.finditer(text)]
+
+        consumed = []  # Spans of the question already explained by filters or the grouping
+        for start, end, column in plan.mentions:
+            grouping = GROUP_BY.search(text[:start])
+            if grouping and plan.group is None and column.kind in (TEXT, BOOLEAN, DATE, NUMBER):
+                plan.group = column
+                consumed.append((start, end))
+                explained.append(grouping.span())
+                continue
+            rest = text[end:]
+            comparison = COMPARISON.match(rest)
+            if comparison is None:
+                continue
+            operator = next(op for op, pattern in COMPARISONS
+                            if re.fullmatch(pattern, comparison.group(1), re.IGNORECASE))
+            value = self.parse_value(column, rest[comparison.end():])
+            if value is None or (column.kind == TEXT and operator not in ("=", "!=")):
+                continue
+            plan.filters.append((column, operator, value[0]))
+            consumed.append((start, end + comparison.end() + value[1]))
+        # Bare category values ("sales in europe") filter their column
+        for column in table.columns:
+            if column.kind != TEXT or len(column.categories) > self.max_categories:
+                continue
+            for words in range(4, 0, -1):
+                for match in re.finditer(r"(?=(?<![\w])((?:[\w&'.-]+ ){%d}))" % words, text[1:] + " "):
+                    phrase = match.group(1).strip()
+                    begin = match.start() + 1
+                    span = (begin, begin + len(phrase))
+                    if phrase in STOPWORDS or phrase.replace(".", "").isdigit() or overlaps(span, consumed):
+                        continue
+                    if overlaps(span, [(start, end) for start, end, _ in plan.mentions]):
+                        continue
+                    code = column.code_of(phrase)
+                    if code is not None:
+                        plan.filters.append((column, "=", code))
+                        consumed.append(span)
+        # A bare year filters the table's only date column ("orders in 2023")
+        dates = [column for column in table.columns if column.kind == DATE]
+        if len(dates) == 1 and not any(column is dates[0] for column, _, _ in plan.filters):
+            for match in re.finditer(r"(?<![\w$.,-])(1[89]\d\d|2\d\d\d)(?![\w.,-])", text):
+                if not overlaps(match.span(), consumed):
+                    plan.filters.append((dates[0], "=", np.datetime64(match.group(1), "Y")))
+                    consumed.append(match.span())
+                    break
+        filtered = {id(column) for column, _, _ in plan.filters}
+        free = list(dict.fromkeys(column for start, end, column in plan.mentions
+                                  if not any(start >= span[0] and end <= span[1] for span in consumed)))
+        if plan.operation == "rows":
+            plan.target = free
+            if not plan.filters:
+                return None  # Listing a whole table is a retrieval question
+        elif plan.operation == "count":
+            counted = [column for column in free if id(column) not in filtered and column is not plan.group]
+            plan.target = counted[0] if counted and counted[0].kind != TEXT else None
+        else:
+            numeric = [column for column in free if column.kind in (NUMBER, DATE) and column is not plan.group]
+            if plan.operation == "distinct":
+                numeric = [column for column in free if column is not plan.group]
+            if not numeric:
+                return None
+            plan.target = numeric[0]
+            if plan.operation in ("max", "min") and plan.group is None:
+                subjects = [column for column in free if column.kind == TEXT and id(column) not in filtered]
+                plan.subject = subjects[0] if subjects else None
+        plan.score += 2 * len(plan.mentions) + len(plan.filters)
+        explained += consumed + [(start, end) for start, end, _ in plan.mentions]
+        words = [match.span() for match in re.finditer(r"\S+", text)
+                 if match.group().strip(",.;:!'\"") not in QUESTION_WORDS]
+        plan.confidence = sum(overlaps(word, explained) for word in words) / len(words) if words else 1.0
+        if plan.confidence < self.min_confidence:
+            return None  # Mostly about something else: a document question that happens to hit the table
+        return plan
+
+    @staticmethod
+    def year_bounds(value):
+        """(start, end) instants of a year-precision date, or None for a full date."""
+        if np.datetime_data(value.dtype)[0] != "Y":
+            return None
+        return value.astype("datetime64[ns]"), (value + 1).astype("datetime64[ns]")
+
+    def mask(self, plan):
+        table = plan.table
+        mask = np.ones(table.rows, dtype=bool)
+        equal = {}  # Column id -> (column, [values]) for OR-ed equality filters
+        for column, operator, value in plan.filters:
+            values = np.asarray(column.values)
+            year = self.year_bounds(value) if column.kind == DATE else None
+            if year is not None:
+                # Compare against the start or the end of the year, whichever the operator means
+                value = year[1] if operator in (">", "<=") else year[0]
+                operator = {">": ">=", "<=": "<"}.get(operator, operator)
+                if operator in ("=", "!="):
+                    within = (values >= year[0]) & (values < year[1])
+                    mask &= within if operator == "=" else ~within
+                    continue
+            if operator == "=":
+                equal.setdefault(id(column), (column, []))[1].append(value)
+                continue
+            with np.errstate(invalid="ignore"):
+                if operator == "!=":
+                    mask &= values != value
+                elif operator == ">":
+                    mask &= values > value
+                elif operator == "<":
+                    mask &= values < value
+                elif operator == ">=":
+                    mask &= values >= value
+                elif operator == "<=":
+                    mask &= values <= value
+        for column, values in equal.values():
+            mask &= np.isin(np.asarray(column.values), values)
+        return mask
+
+    def describe_filters(self, plan):
+        parts, equal = [], {}
+        for column, operator, value in plan.filters:
+            shown = column.categories[value] if column.kind == TEXT else format_value(value)
+            if operator == "=":
+                if id(column) not in equal:
+                    equal[id(column)] = [column.name, []]
+                    parts.append(equal[id(column)])
+                equal[id(column)][1].append(shown)
+            else:
+                parts.append(f"{column.name} {operator} {shown}")
+        return " and ".join(
+            part if isinstance(part, str) else
+            f"{part[0]} = {part[1][0]}" if len(part[1]) == 1 else f"{part[0]} in ({', '.join(part[1])})"
+            for part in parts
+        )
+
+    def execute(self, plan):
+        table = plan.table
+        mask = self.mask(plan)
+        matched = int(mask.sum())
+        scope = f" where {self.describe_filters(plan)}" if plan.filters else ""
+        footer = f"({matched:,} of {table.rows:,} rows in {table.name})"
+        if plan.operation == "rows":
+            return self.list_rows(plan, mask, scope, footer)
+        if plan.group is not None:
+            return self.grouped(plan, mask, scope, footer)
+        target = plan.target
+        if plan.operation == "count":
+            if target is not None:
+                matched = int((mask & ~target.missing()).sum())
+                return f"Count of {target.name}{scope}: {matched:,} {footer}"
+            return f"Number of rows{scope}: {matched:,} {footer}"
+        values = np.asarray(target.values)[mask & ~target.missing()]
+        if plan.operation == "distinct":
+            distinct = len(np.unique(values))
+            return f"Distinct values of {target.name}{scope}: {distinct:,} {footer}"
+        if not len(values):
+            return f"No rows with a {target.name} value{scope} {footer}"
+        if plan.operation in ("sum", "mean", "median") and target.kind != NUMBER:
+            return None
+        if plan.operation == "sum":
+            result = values.sum()
+        elif plan.operation == "mean":
+            result = values.astype(np.float64).mean()
+        elif plan.operation == "median":
+            result = np.median(values)
+        else:
+            result = values.max() if plan.operation == "max" else values.min()
+        answer = f"{operation_name(plan.operation)} of {target.name}{scope}: {format_value(result)}"
+        if plan.subject is not None:
+            rows = np.flatnonzero(mask & (np.asarray(target.values) == result))[:5]
+            holders = ", ".join(dict.fromkeys(plan.subject.cell(row) for row in rows))
+            answer += f" ({plan.subject.name}: {holders})"
+        return f"{answer} {footer}"
+
+    def grouped(self, plan, mask, scope, footer):
+        group, target = plan.group, plan.target
+        keys = np.asarray(group.values)
+        valid = mask & ~group.missing()
+        if target is not None:
+            valid &= ~target.missing()
+        if group.kind == TEXT:
+            codes, uniques = keys[valid], None
+            groups = len(group.categories)
+        else:
+            uniques, codes = np.unique(keys[valid], return_inverse=True)
+            groups = len(uniques)
+        counts = np.bincount(codes, minlength=groups)
+        operation = plan.operation
+        if operation == "count" or target is None:
+            results, operation = counts.astype(np.float64), "count"
+        else:
+            values = np.asarray(target.values)[valid]
+            if operation in ("sum", "mean"):
+                if target.kind != NUMBER:
+                    return None
+                results = np.bincount(codes, weights=values.astype(np.float64), minlength=groups)
+                if operation == "mean":
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        results = results / counts
+            elif operation in ("max", "min") and target.kind == NUMBER:
+                results = np.full(groups, -np.inf if operation == "max" else np.inf)
+                (np.maximum if operation == "max" else np.minimum).at(results, codes, values.astype(np.float64))
+            elif operation == "distinct":
+                value_codes = values if target.kind == TEXT else np.unique(values, return_inverse=True)[1]
+                width = int(value_codes.max()) + 1 if len(value_codes) else 1
+                pairs = np.unique(codes.astype(np.int64) * width + value_codes)  # One entry per (group, value)
+                results = np.bincount(pairs // width, minlength=groups).astype(np.float64)
+            else:
+                return None  # Median or date extremes per group
+        present = np.flatnonzero(counts)
+        order = present[np.argsort(-results[present], kind="stable")]
+        label = operation_name(operation) if operation != "count" else "Rows"
+        title = f"{label} of {target.name}" if target is not None and operation != "count" else label
+        lines = [f"{title} by {group.name}{scope} {footer}:"]
+        for code in order[:self.max_groups]:
+            name = group.categories[code] if uniques is None else format_value(uniques[code])
+            lines.append(f"- {name}: {format_value(results[code])}")
+        if len(order) > self.max_groups:
+            lines.append(f"... and {len(order) - self.max_groups:,} more groups")
+        return "\n".join(lines)
+
+    def list_rows(self, plan, mask, scope, footer):
+        table = plan.table
+        columns = plan.target or table.columns
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return f"No rows{scope} {footer}"
+        lines = [f"Rows{scope} {footer}:"]
+        for row in rows[:self.max_rows]:
+            lines.append("- " + "; ".join(f"{column.name}: {column.cell(row)}" for column in columns))
+        if len(rows) > self.max_rows:
+            lines.append(f"... and {len(rows) - self.max_rows:,} more rows")
+        return "\n".join(lines)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "answered": self.answered,
+                "declined": self.declined,
+                "mean_ms": 1000 * self.total_seconds / self.answered if self.answered else 0.0,
+            }
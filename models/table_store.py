@@ -0,0 +1,302 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+TEXT, NUMBER, DATE, BOOLEAN = "text", "number", "date", "boolean"
+SCHEMA_FILE = "schema.json"
+TABLE_EXTENSIONS = (".csv", ".xlsx", ".xls", ".json")
+NUMBER_NOISE = re.compile(r"[,\s$€£¥%]")  # Thousands separators, currency and percent signs around numbers
+DATE_LIKE = re.compile(r"^\s*(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{2,4})")
+COERCE_SHARE = 0.9  # Share of a text column's values that must parse for it to become a number or date column
+
+
+def format_value(value):
+    """A cell or aggregate as text: integers without decimals, floats to at most 4 decimals, dates as ISO dates."""
+    if value is None:
+        return ""
+    if isinstance(value, np.datetime64):
+        if np.isnat(value):
+            return ""
+        if np.datetime_data(value.dtype)[0] == "Y":
+            return str(value)  # A bare year from a question
+        return str(value.astype("datetime64[s]")).replace("T00:00:00", "")
+    if isinstance(value, (bool, np.bool_)):
+        return "true" if value else "false"
+    if isinstance(value, (int, np.integer)):
+        return f"{int(value):,}"
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return ""
+        if float(value).is_integer() and abs(value) < 2 ** 53:
+            return f"{int(value):,}"
+        return f"{value:,.4f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+class Column:
+    """One typed column of a table: a numpy array plus precomputed statistics.
+
+    Numbers are int64 (integers without gaps) or float64 with NaN for missing
+    cells, dates datetime64[ns] with NaT, booleans bool. Text is dictionary
+    encoded: ``values`` holds int32 codes into ``categories``, -1 when missing.
+    """
+
+    def __init__(self, name, kind, values, categories=None, stats=None):
+        self.name = name
+        self.kind = kind
+        self.values = values
+        self.categories = categories
+        self.lookup = None  # Lower-cased category -> code, built on first use
+        self.stats = stats if stats is not None else self.compute_stats()
+
+    @classmethod
+    def from_series(cls, name, series):
+        series = series.reset_index(drop=True)
+        if pd.api.types.is_bool_dtype(series) and not series.isna().any():
+            return cls(name, BOOLEAN, series.to_numpy(dtype=bool))
+        if pd.api.types.is_datetime64_any_dtype(series):
+            if getattr(series.dt, "tz", None) is not None:
+                series = series.dt.tz_localize(None)
+            return cls(name, DATE, series.to_numpy(dtype="datetime64[ns]"))
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            if pd.api.types.is_integer_dtype(series) and not series.isna().any():
+                return cls(name, NUMBER, series.to_numpy(dtype=np.int64))
+            return cls(name, NUMBER, series.to_numpy(dtype=np.float64, na_value=np.nan))
+        present = series.dropna()
+        if len(present):
+            as_text = present.astype(str)
+            numbers = pd.to_numeric(as_text.str.replace(NUMBER_NOISE, "", regex=True), errors="coerce")
+            if numbers.notna().sum() >= COERCE_SHARE * len(present):
+                cleaned = pd.to_numeric(series.astype(str).str.replace(NUMBER_NOISE, "", regex=True), errors="coerce")
+                return cls(name, NUMBER, cleaned.to_numpy(dtype=np.float64, na_value=np.nan))
+            if as_text.head(20).str.match(DATE_LIKE).all():
+                dates = pd.to_datetime(series, errors="coerce", format="mixed")
+                if dates.notna().sum() >= COERCE_SHARE * len(present):
+                    return cls(name, DATE, dates.to_numpy(dtype="datetime64[ns]"))
+        codes, uniques = pd.factorize(series)
+        return cls(name, TEXT, codes.astype(np.int32), [str(value) for value in uniques])
+
+    def missing(self):
+        """Boolean mask of missing cells."""
+        if self.kind == TEXT:
+            return self.values < 0
+        if self.kind == DATE:
+            return np.isnat(self.values)
+        if self.kind == NUMBER and self.values.dtype.kind == "f":
+            return np.isnan(self.values)
+        return np.zeros(len(self.values), dtype=bool)
+
+    def compute_stats(self):
+        present = ~self.missing()
+        count = int(present.sum())
+        stats = {"count": count, "missing": len(self.values) - count}
+        if self.kind == TEXT:
+            frequencies = np.bincount(self.values[present], minlength=len(self.categories))
+            stats["distinct"] = int((frequencies > 0).sum())
+            top = np.argsort(-frequencies, kind="stable")[:5]
+            stats["top"] = [[self.categories[code], int(frequencies[code])] for code in top if frequencies[code]]
+        elif self.kind == BOOLEAN:
+            stats["true"] = int(self.values.sum())
+        elif count:
+            values = self.values[present]
+            stats["min"], stats["max"] = format_value(values.min()), format_value(values.max())
+            if self.kind == NUMBER:
+                stats["sum"] = format_value(values.sum())
+                stats["mean"] = format_value(values.mean())
+        return stats
+
+    def code_of(self, text):
+        """Code of the category equal to ``text`` ignoring case, or None."""
+        if self.lookup is None:
+            self.lookup = {}
+            for code, category in enumerate(self.categories):
+                self.lookup.setdefault(category.strip().lower(), code)
+        return self.lookup.get(text.strip().lower())
+
+    def cell(self, row):
+        if self.kind == TEXT:
+            code = self.values[row]
+            return self.categories[code] if code >= 0 else ""
+        return format_value(self.values[row])
+
+    def describe(self):
+        """One schema line: name, type and statistics."""
+        stats = self.stats
+        details = [f"{stats['count']:,} values"]
+        if stats["missing"]:
+            details.append(f"{stats['missing']:,} missing")
+        if self.kind == TEXT:
+            details.append(f"{stats['distinct']:,} distinct")
+            if stats["top"]:
+                details.append("most common " + ", ".join(f"{value} ({count:,})" for value, count in stats["top"]))
+        elif self.kind == BOOLEAN:
+            details.append(f"{stats['true']:,} true")
+        elif "min" in stats:
+            details.append(f"from {stats['min']} to {stats['max']}")
+            if "mean" in stats:
+                details.append(f"mean {stats['mean']}, sum {stats['sum']}")
+        return f"- {self.name} ({self.kind}): " + "; ".join(details)
+
+    def nbytes(self):
+        return self.values.nbytes + sum(len(category) for category in self.categories or ())
+
+
+class Table:
+    """An uploaded table stored column by column."""
+
+    def __init__(self, name, columns, rows):
+        self.name = name  # Filename of the upload
+        self.columns = columns  # Ordered list of Column
+        self.rows = rows
+
+    @classmethod
+    def from_frame(cls, name, frame):
+        frame = frame.loc[:, [not str(column).startswith("Unnamed:") or frame[column].notna().any()
+                              for column in frame.columns]]
+        columns, seen = [], set()
+        for position, column in enumerate(frame.columns):
+            column_name = str(column).strip() or f"column{position + 1}"
+            while column_name in seen:
+                column_name += "_"
+            seen.add(column_name)
+            columns.append(Column.from_series(column_name, frame.iloc[:, position]))
+        return cls(name, columns, len(frame))
+
+    @classmethod
+    def read(cls, file_path, filename):
+        """Read an uploaded CSV, Excel sheet or JSON array of records; None if the file is not a table."""
+        file_ext = os.path.splitext(filename)[1].lower()
+        if file_ext == ".csv":
+            frame = pd.read_csv(file_path)
+        elif file_ext in (".xlsx", ".xls"):
+            frame = pd.read_excel(file_path)
+        elif file_ext == ".json":
+            with open(file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and len(data) == 1 and isinstance(next(iter(data.values())), list):
+                data = next(iter(data.values()))  # {"records": [...]}
+            if not (isinstance(data, list) and data and all(isinstance(record, dict) for record in data)):
+                return None
+            frame = pd.json_normalize(data)
+        else:
+            return None
+        if frame.empty or not len(frame.columns):
+            return None
+        return cls.from_frame(filename, frame)
+
+    def column(self, name):
+        for column in self.columns:
+            if column.name == name:
+                return column
+        raise KeyError(name)
+
+    def describe(self, sample_rows=5):
+        """Compact text for the embedding index: schema with typed statistics and a few sample rows."""
+        lines = [f"Table {self.name}: {self.rows:,} rows, {len(self.columns)} columns.", "Columns:"]
+        lines.extend(column.describe() for column in self.columns)
+        if self.rows:
+            lines.append(f"First {min(sample_rows, self.rows)} rows:")
+            lines.append(" | ".join(column.name for column in self.columns))
+            for row in range(min(sample_rows, self.rows)):
+                lines.append(" | ".join(column.cell(row) for column in self.columns))
+        return "\n".join(lines)
+
+    def save(self, directory):
+        """Write one .npy file per column plus a schema with the statistics and text categories."""
+        os.makedirs(directory, exist_ok=True)
+        schema = {"name": self.name, "rows": self.rows, "columns": []}
+        for position, column in enumerate(self.columns):
+            np.save(os.path.join(directory, f"{position}.npy"), column.values, allow_pickle=False)
+            schema["columns"].append({"name": column.name, "kind": column.kind, "stats": column.stats,
+                                      "categories": column.categories})
+        with open(os.path.join(directory, SCHEMA_FILE), "w", encoding="utf-8") as f:
+            json.dump(schema, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Open a saved table; with ``mmap`` the columns are paged in from disk as queries touch them."""
+        with open(os.path.join(directory, SCHEMA_FILE), "r", encoding="utf-8") as f:
+            schema = json.load(f)
+        columns = [
+            Column(spec["name"], spec["kind"],
+                   np.load(os.path.join(directory, f"{position}.npy"), mmap_mode="r" if mmap else None),
+                   spec["categories"], spec["stats"])
+            for position, spec in enumerate(schema["columns"])
+        ]
+        return cls(schema["name"], columns, schema["rows"])
+
+    def nbytes(self):
+        return sum(column.nbytes() for column in self.columns)
+
+
+class TableStore:
+    """The tables of one collection by filename, saved under ``directory`` (kept in memory when it is None)."""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.tables = {}  # Filename -> Table
+        self.lock = threading.Lock()
+
+    def path(self, filename):
+        return os.path.join(self.directory, hashlib.sha1(filename.encode("utf-8")).hexdigest()[:16])
+
+    def load(self, filenames, prune=True):
+        """Open the saved tables of ``filenames``; tables of any other file are left over from a crash and removed.
+
+        Without ``prune`` they are left alone: in a shared index they may belong to another worker's upload.
+        """
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        keep = set(filenames)
+        tables = {}
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            try:
+                table = Table.load(path)
+            except Exception as e:
+                if prune:
+                    logging.warning(f"Removing unreadable table {path}: {str(e)}")
+                table = None
+            if table is not None and table.name in keep:
+                tables[table.name] = table
+            elif prune:
+                shutil.rmtree(path, ignore_errors=True)
+        self.tables = tables
+
+    def add(self, filename, source):
+        """Take over a table a parser saved in directory ``source``."""
+        with self.lock:
+            if self.directory is None:
+                table = Table.load(source, mmap=False)
+                shutil.rmtree(source, ignore_errors=True)
+            else:
+                target = self.path(filename)
+                shutil.rmtree(target, ignore_errors=True)
+                os.makedirs(self.directory, exist_ok=True)
+                shutil.move(source, target)
+                table = Table.load(target)
+            table.name = filename
+            self.tables[filename] = table
+        logging.debug(f"Stored table {filename}: {table.rows} rows, {len(table.columns)} columns")
+
+    def remove(self, filename):
+        with self.lock:
+            if self.tables.pop(filename, None) is not None and self.directory is not None:
+                shutil.rmtree(self.path(filename), ignore_errors=True)
+
+    def memory_bytes(self):
+        return sum(table.nbytes() for table in self.tables.values())
+
+    def stats(self):
+        return {
+            "tables": len(self.tables),
+            "rows": sum(table.rows for table in self.tables.values()),
+            "bytes": self.memory_bytes(),
+        }
@@ -1,23 +1,325 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import faiss
 import numpy as np
 
+from models.ann_index import build_index, choose_backend
+from models.chunk_store import ChunkDocuments, ChunkStore
+
+# One shared builder thread: faiss releases the GIL, so training never stalls the event loop
+BUILD_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ann-build")
+VECTOR_DTYPES = ("float32", "float16")
+
+
+def exact_index(dimension, vector_dtype):
+    """An empty ID-mapped flat index storing vectors as float32, or as float16 at half the size."""
+    if vector_dtype == "float16":
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16,
+                                                            faiss.METRIC_L2))
+    if vector_dtype != "float32":
+        raise ValueError(f"Unknown vector dtype {vector_dtype!r}; expected one of {', '.join(VECTOR_DTYPES)}")
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+
 class VectorStore:
-    def __init__(self, dimension=384):
-        """Initialize FAISS index with dimension from sentence-transformers."""
+    def __init__(self, dimension=384, backend="auto", nprobe=8, ef_search=64, refine=4, background_build_min=50_000,
+                 vector_dtype="float32", chunks=None):
+        """Initialize an ID-mapped FAISS index with dimension from sentence-transformers.
+
+        The flat ID-mapped index always holds the exact vectors, as float32 or,
+        with ``vector_dtype="float16"``, at half the size; the chunk texts and
+        filenames live in ``chunks``, a ChunkStore. Searches go
+        through an approximate index (see models.ann_index) once ``backend``,
+        or the chunk count when it is "auto", calls for one. The ANN index is
+        kept up to date incrementally and rebuilt when a write (or ``configure``)
+        leaves it unfit for the corpus, never by a search. Rebuilds of
+        ``background_build_min`` vectors or more run on a builder thread, which
+        swaps the new index in when it is done; until then searches keep using
+        the current index (or exact search). Smaller ones finish before the write returns.
+
+        With ``attach_base`` the vectors of a saved snapshot stay in a
+        read-only memory-mapped index that worker processes share; ``index``
+        then only holds the vectors added since.
+        """
         self.dimension = dimension
-        self.index = faiss.IndexFlatL2(dimension)
-        self.documents = []
+        self.vector_dtype = vector_dtype
+        self.index = exact_index(dimension, vector_dtype)
+        self.base = None  # Read-only memory-mapped snapshot index (see attach_base), or None
+        self.base_limit = 0  # Chunk ids below this live in base
+        self.base_removed = 0  # Removed chunks still in base, which cannot change
+        self.chunks = chunks if chunks is not None else ChunkStore()
+        self.documents = ChunkDocuments(self.chunks)  # Chunk id -> LangChain Document, built on access
+        self.next_id = 0
+        self.ann = None  # AnnIndex, or None for exact search
+        self.ann_stale = False
+        self.tombstones = 0  # Removed ids still present in an ANN index that cannot delete
+        self.background_build_min = background_build_min
+        self.build = None  # Future of a background rebuild
+        self.build_log = []  # ("add", vectors, ids) / ("remove", ids) applied since the rebuild's snapshot
+        self.lock = threading.RLock()  # Guards ann, build and build_log, which the builder thread swaps
+        self.backend = None
+        self.configure(backend=backend, nprobe=nprobe, ef_search=ef_search, refine=refine)
+
+    def configure(self, backend="auto", nprobe=8, ef_search=64, refine=4, vector_dtype=None,
+                  background_build_min=None):
+        """Set the search backend and its knobs; ``refine`` is the IVF-PQ re-rank candidate multiplier.
+
+        A new ``vector_dtype`` re-encodes the exact vectors (e.g. an index saved as float32 loaded as float16).
+        """
+        if vector_dtype is not None and vector_dtype != self.vector_dtype:
+            self.convert(vector_dtype)
+        if background_build_min is not None:
+            self.background_build_min = background_build_min
+        if backend != self.backend:
+            self.ann_stale = True
+        self.backend = backend
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.refine = refine
+        if self.ann is not None:
+            self.apply_knobs(self.ann)
+        self.update_ann()
+
+    def apply_knobs(self, ann):
+        if hasattr(ann, "set_nprobe"):
+            ann.set_nprobe(self.nprobe)
+        if hasattr(ann, "set_ef_search"):
+            ann.set_ef_search(self.ef_search)
+
+    def attach_base(self, index):
+        """Search ``index``, a snapshot memory-mapped with faiss.IO_FLAG_MMAP_IFC, as the exact vectors below next_id.
+
+        faiss aborts the process on any write to a memory-mapped index, so
+        later adds go to ``self.index`` and removals from the base only hide its vectors.
+        """
+        self.base, self.base_limit, self.base_removed = index, self.next_id, 0
+        self.vector_dtype = "float16" if index.sa_code_size() == 2 * self.dimension else "float32"
+        self.index = exact_index(self.dimension, self.vector_dtype)
+
+    def holder(self, chunk_id):
+        """The exact index holding a chunk's vector."""
+        return self.base if self.base is not None and chunk_id < self.base_limit else self.index
+
+    def exact_vectors(self):
+        """(ids, float32 vectors) of every chunk still stored, as copies."""
+        ids = faiss.vector_to_array(self.index.id_map).astype(np.int64)
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        if self.base is not None and self.base.ntotal:
+            base_ids = faiss.vector_to_array(self.base.id_map).astype(np.int64)
+            live = np.isin(base_ids, self.chunks.ids())
+            ids = np.concatenate([base_ids[live], ids])
+            vectors = np.vstack([self.base.index.reconstruct_n(0, self.base.ntotal)[live], vectors])
+        return ids, vectors
+
+    def owned_index(self):
+        """The exact vectors as one writable index: ``index`` itself, or a merged copy while a base is attached."""
+        if self.base is None:
+            return self.index
+        index = exact_index(self.dimension, self.vector_dtype)
+        ids, vectors = self.exact_vectors()
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+        return index
+
+    def convert(self, vector_dtype):
+        """Re-encode the exact vectors with another dtype (detaching any base); the ANN index is left as is."""
+        index = exact_index(self.dimension, vector_dtype)
+        ids, vectors = self.exact_vectors()
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+        self.index, self.vector_dtype = index, vector_dtype
+        self.base, self.base_limit, self.base_removed = None, 0, 0
+
+    def add(self, embeddings, documents, ids=None):
+        """Add embeddings and LangChain documents (None: vector only) and return their stable chunk IDs."""
+        texts = [doc.page_content if doc is not None else "" for doc in documents]
+        filenames = [doc.metadata.get("filename") if doc is not None else None for doc in documents]
+        return self.add_chunks(embeddings, texts, filenames, ids)
+
+    def add_chunks(self, embeddings, texts, filenames, ids=None):
+        """Add embeddings with their chunk texts and filenames and return their stable chunk IDs.
 
-    def add(self, embeddings, documents):
-        """Add embeddings and documents to the vector store."""
-        embeddings = np.array(embeddings, dtype=np.float32)
-        self.index.add(embeddings)
-        self.documents.extend(documents)
+        New IDs are assigned unless ``ids`` is given (e.g. when replaying a persisted log).
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        if ids is None:
+            ids = np.arange(self.next_id, self.next_id + len(texts), dtype=np.int64)
+        else:
+            ids = np.array(ids, dtype=np.int64)
+        if len(ids):
+            self.next_id = max(self.next_id, int(ids.max()) + 1)
+            self.index.add_with_ids(embeddings, ids)
+            self.chunks.add(ids, texts, filenames)
+            with self.lock:
+                if self.ann is not None:
+                    self.ann.add(embeddings, ids)
+                if self.build is not None:
+                    self.build_log.append(("add", embeddings, ids))
+                self.check_ann()
+            self.update_ann()
+        return ids.tolist()
+
+    def vectors(self, ids):
+        """Return the stored vectors for the given chunk IDs as a float32 matrix."""
+        return np.vstack([self.holder(chunk_id).reconstruct(int(chunk_id)) for chunk_id in ids]).astype(np.float32)
+
+    def remove(self, ids):
+        """Remove chunks by ID without touching any other vector."""
+        ids = [chunk_id for chunk_id in ids if chunk_id in self.chunks]
+        if not ids:
+            return 0
+        owned = [chunk_id for chunk_id in ids if self.holder(chunk_id) is self.index]
+        removed = self.index.remove_ids(np.array(owned, dtype=np.int64)) if owned else 0
+        self.base_removed += len(ids) - len(owned)
+        removed += len(ids) - len(owned)
+        self.chunks.remove(ids)
+        with self.lock:
+            if self.ann is not None:
+                self.tombstones += self.remove_from(self.ann, ids)
+            if self.build is not None:
+                self.build_log.append(("remove", ids))
+            self.check_ann()
+        self.update_ann()
+        return removed
+
+    @staticmethod
+    def remove_from(ann, ids):
+        """Remove ids from an ANN index; returns how many are left behind as tombstones."""
+        if ann.supports_remove:
+            ann.remove(ids)
+            return 0
+        return len(ids)
+
+    def target_backend(self):
+        return choose_backend(len(self.chunks)) if self.backend == "auto" else self.backend
+
+    def check_ann(self):
+        """Mark the ANN index for a rebuild when the corpus no longer fits it."""
+        current = self.ann.backend if self.ann is not None else "flat"
+        count = len(self.chunks)
+        if self.target_backend() != current:
+            self.ann_stale = True
+        elif self.ann is not None and self.ann.name in ("ivf", "ivfpq") and not (
+                self.ann.trained_size / 4 <= count <= self.ann.trained_size * 4):
+            self.ann_stale = True  # Cells were trained for a very different corpus size
+        elif self.ann is not None and self.tombstones > len(self.ann) // 5:
+            self.ann_stale = True
+
+    def update_ann(self):
+        """Start rebuilding a stale ANN index; one of fewer than background_build_min vectors is waited for."""
+        if self.ann_stale and self.build is None:
+            self.rebuild_ann(wait=len(self.chunks) < self.background_build_min)
+
+    def rebuild_ann(self, wait=True):
+        """Rebuild the ANN index from the exact vectors on the builder thread, waiting for it if ``wait``."""
+        with self.lock:
+            backend = self.target_backend()
+            self.ann_stale = False
+            if backend == "flat" or not self.chunks:
+                self.ann, self.tombstones, self.build = None, 0, None
+                return
+            ids, vectors = self.exact_vectors()  # Copies: later adds cannot race the build
+            options = {"nprobe": self.nprobe, "ef_search": self.ef_search}
+            build = self.build = BUILD_EXECUTOR.submit(build_index, backend, vectors, ids, **options)
+            self.build_log = []
+        build.add_done_callback(self.finish_build)
+        if wait:
+            self.wait_for_build()
+
+    def wait_for_build(self):
+        """Block until a running rebuild has been swapped in."""
+        build = self.build
+        if build is not None:
+            wait([build])
+            self.finish_build(build)
+
+    def finish_build(self, build):
+        """Swap in a completed rebuild, replaying the changes made while it ran; called on the builder thread."""
+        with self.lock:
+            if build is not self.build:
+                return  # Already swapped in
+            self.build = None
+            try:
+                ann = build.result()
+            except Exception as e:
+                logging.error(f"Rebuilding the {self.target_backend()} index failed; keeping the current one: {str(e)}")
+                self.build_log = []
+                return
+            tombstones = 0
+            for operation in self.build_log:
+                if operation[0] == "add":
+                    ann.add(operation[1], operation[2])
+                else:
+                    tombstones += self.remove_from(ann, operation[1])
+            self.build_log = []
+            self.apply_knobs(ann)
+            self.ann, self.tombstones = ann, tombstones
+            self.ann_stale = False
+            self.check_ann()  # The corpus or configuration may have moved on: the next write rebuilds again
+
+    def exact_search(self, query_embedding, k):
+        """Flat search over the exact vectors, merging the base's hits with the newer ones by distance."""
+        distances, ids = self.index.search(query_embedding, k)
+        if self.base is None or not self.base.ntotal:
+            return distances[0], ids[0]
+        # Removed base vectors cannot be deleted from the mapping, so fetch past them
+        base_distances, base_ids = self.base.search(query_embedding, min(k + self.base_removed, self.base.ntotal))
+        distances, ids = np.concatenate([distances[0], base_distances[0]]), np.concatenate([ids[0], base_ids[0]])
+        order = np.argsort(np.where(ids >= 0, distances, np.inf), kind="stable")
+        return distances[order], ids[order]
+
+    def search_ids(self, query_embedding, k=3, version=None):
+        """Search for the top-k most similar chunk IDs and their distances.
+
+        With ``version`` (an IndexVersion) only the chunks it contains are
+        returned: chunks added after it was published are skipped, and chunks
+        it retired are still found until they are purged.
+        """
+        query_embedding = np.array([query_embedding], dtype=np.float32)
+        visible = version.__contains__ if version is not None else self.chunks.__contains__
+        hidden = len(self.chunks) - version.count if version is not None else 0  # Stored but not in the version
+        ann, tombstones = self.ann, self.tombstones  # The builder thread may swap in a new one meanwhile
+        if ann is None or len(ann) == 0:
+            distances, ids = self.exact_search(query_embedding, k + max(hidden, 0))
+            hits = [(int(idx), float(dist)) for idx, dist in zip(ids, distances) if visible(idx)][:k]
+            return [idx for idx, _ in hits], [dist for _, dist in hits]
+
+        fetch = k * self.refine if ann.name == "ivfpq" else k
+        if tombstones:
+            fetch *= 2
+        distances, ids = ann.search(query_embedding, min(fetch + max(hidden, 0), len(ann)))
+        hits = [(int(idx), float(dist)) for idx, dist in zip(ids[0], distances[0]) if visible(idx)]
+        if ann.name == "ivfpq" and hits:
+            # PQ distances are approximate; re-rank the candidates with the exact vectors
+            candidates = [idx for idx, _ in hits]
+            exact = ((self.vectors(candidates) - query_embedding) ** 2).sum(axis=1)
+            hits = sorted(zip(candidates, exact.tolist()), key=lambda hit: hit[1])
+        hits = hits[:k]
+        return [idx for idx, _ in hits], [dist for _, dist in hits]
 
     def search(self, query_embedding, k=3):
         """Search for top-k similar documents."""
-        query_embedding = np.array([query_embedding], dtype=np.float32)
-        distances, indices = self.index.search(query_embedding, k)
-        top_k_docs = [self.documents[idx] for idx in indices[0] if idx < len(self.documents)]
-        scores = [float(dist) for dist in distances[0]]
-        return top_k_docs, scores
\ No newline at end of file
+        ids, scores = self.search_ids(query_embedding, k)
+        return [self.documents[idx] for idx in ids], scores
+
+    def memory_bytes(self):
+        """Approximate size of the exact vectors, the ANN index and the chunk store, counting mapped bytes too."""
+        exact = len(self) * (self.index.sa_code_size() + 8)
+        return exact + (self.ann.memory_bytes() if self.ann is not None else 0) + self.chunks.memory_bytes()
+
+    def stats(self):
+        return {
+            "backend": self.ann.name if self.ann is not None else "flat",
+            "target_backend": self.target_backend(),
+            "rebuilding": self.build is not None,
+            "vectors": len(self.chunks),
+            "vector_dtype": self.vector_dtype,
+            "tombstones": self.tombstones,
+            "mapped_vectors": self.base.ntotal if self.base is not None else 0,
+            "trained_size": self.ann.trained_size if self.ann is not None else 0,
+        }
+
+    def __len__(self):
+        return self.index.ntotal + (self.base.ntotal - self.base_removed if self.base is not None else 0)
@@ -0,0 +1,231 @@
+"""Fetch the pages a document links to: concurrently, deduplicated, within a time budget and cached.
+
+All links of a document are fetched at once over one pooled HTTP client,
+with at most ``per_host`` requests in flight to any one host. Each URL is
+fetched once per crawl, however often the document repeats it. The whole
+crawl gets ``budget_seconds``; links still pending then are reported as
+errors instead of holding up ingestion. Extracted page text is cached in
+SQLite with the response's ETag and Last-Modified, so a link seen before
+costs a conditional request (a 304 with no body), or nothing at all while
+its Cache-Control max-age lasts.
+"""
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urldefrag, urlsplit
+
+import httpx
+from bs4 import BeautifulSoup
+
+URL_PATTERN = re.compile(r'https?://[^\s<>"]+|www\.[^\s<>"]+')
+TRAILING_PUNCTUATION = ".,;:!?)]}'"  # Sentence punctuation the URL pattern picks up after a link
+MAX_AGE = re.compile(r"max-age=(\d+)")
+NO_CONTENT = "No content found on page."
+
+
+def normalize_url(url):
+    """The URL a link points to: with a scheme, without a fragment or trailing punctuation."""
+    url = url.rstrip(TRAILING_PUNCTUATION)
+    if url.startswith("www."):
+        url = "http://" + url
+    url = urldefrag(url)[0]
+    parts = urlsplit(url)
+    return parts._replace(scheme=parts.scheme.lower(), netloc=parts.netloc.lower()).geturl()
+
+
+def page_text(html):
+    """Paragraph text of an HTML page, as the crawler has always indexed it."""
+    soup = BeautifulSoup(html, "html.parser")
+    text = " ".join(p.get_text() for p in soup.find_all("p"))
+    return text if text.strip() else NO_CONTENT
+
+
+class HttpCache:
+    """SQLite store of extracted page text by URL with its validators, kept under ``max_bytes`` by LRU eviction."""
+
+    def __init__(self, path, max_bytes=32 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, text TEXT NOT NULL, etag TEXT, "
+            "last_modified TEXT, expires REAL NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+        self.conn.commit()
+
+    def get(self, url):
+        """(text, etag, last_modified, expires) for a cached URL, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT text, etag, last_modified, expires FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is not None:
+                self.conn.execute("UPDATE pages SET last_used = ? WHERE url = ?", (time.time(), url))
+                self.conn.commit()
+            return row
+
+    def put(self, url, text, etag, last_modified, expires):
+        with self.lock:
+            now = time.time()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, text, etag, last_modified, expires, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, text, etag, last_modified, expires, len(text.encode("utf-8")), now),
+            )
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if total > self.max_bytes:
+                victims = []
+                for victim, size in self.conn.execute("SELECT url, size FROM pages ORDER BY last_used ASC"):
+                    victims.append((victim,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+                self.conn.executemany("DELETE FROM pages WHERE url = ?", victims)
+            self.conn.commit()
+
+    def refresh(self, url, expires):
+        """Extend a cached page's freshness after the server answered 304 Not Modified."""
+        with self.lock:
+            self.conn.execute("UPDATE pages SET expires = ? WHERE url = ?", (expires, url))
+            self.conn.commit()
+
+
+_caches = {}  # Path -> HttpCache, one connection per process
+
+
+def open_cache(path, max_bytes):
+    if path is None:
+        return None
+    if path not in _caches:
+        _caches[path] = HttpCache(path, max_bytes)
+    return _caches[path]
+
+
+class CrawlOptions:
+    """Crawl limits and cache settings."""
+
+    def __init__(self, max_connections=16, per_host=4, timeout=5.0, budget_seconds=30.0, max_urls=100,
+                 max_page_bytes=2 * 1024 * 1024, cache_path=None, cache_max_bytes=32 * 1024 * 1024):
+        self.max_connections = max_connections  # Pooled connections shared by all hosts
+        self.per_host = per_host  # Requests in flight to one host
+        self.timeout = timeout  # Seconds per request
+        self.budget_seconds = budget_seconds  # Seconds for all links of a document
+        self.max_urls = max_urls  # Distinct links fetched per document; the rest are skipped
+        self.max_page_bytes = max_page_bytes  # Longer bodies are cut off
+        self.cache_path = cache_path
+        self.cache_max_bytes = cache_max_bytes
+
+
+def expiry(response):
+    """Epoch seconds until which the response may be reused without asking the server (0 if it must revalidate)."""
+    cache_control = response.headers.get("cache-control", "").lower()
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return 0.0
+    match = MAX_AGE.search(cache_control)
+    return time.time() + int(match.group(1)) if match else 0.0
+
+
+class Crawler:
+    """Fetches page text for many links at once; see the module docstring."""
+
+    def __init__(self, options=None):
+        self.options = options or CrawlOptions()
+        self.cache = open_cache(self.options.cache_path, self.options.cache_max_bytes)
+        self.counts = {"fetched": 0, "not_modified": 0, "fresh": 0, "failed": 0, "skipped": 0}
+
+    async def crawl(self, urls):
+        """Return {normalized url: page text or an error message} for the distinct links, in first-seen order."""
+        options = self.options
+        targets = list(dict.fromkeys(normalize_url(url) for url in urls))
+        results = {url: None for url in targets}
+        if len(targets) > options.max_urls:
+            for url in targets[options.max_urls:]:
+                results[url] = "Web Crawling Error: link limit reached"
+            self.counts["skipped"] += len(targets) - options.max_urls
+            targets = targets[:options.max_urls]
+        if not targets:
+            return results
+
+        hosts = {}  # Host -> semaphore limiting requests in flight to it
+        limits = httpx.Limits(max_connections=options.max_connections,
+                              max_keepalive_connections=options.max_connections)
+        async with httpx.AsyncClient(limits=limits, timeout=options.timeout, follow_redirects=True) as client:
+            async def fetch(url):
+                host = hosts.setdefault(urlsplit(url).netloc, asyncio.Semaphore(options.per_host))
+                async with host:
+                    results[url] = await self.fetch(client, url)
+
+            tasks = [asyncio.ensure_future(fetch(url)) for url in targets]
+            done, pending = await asyncio.wait(tasks, timeout=options.budget_seconds)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        for url in targets:
+            if results[url] is None:
+                results[url] = f"Web Crawling Error: crawl budget of {options.budget_seconds:g}s exceeded"
+                self.counts["skipped"] += 1
+        return results
+
+    async def fetch(self, client, url):
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and cached[3] > time.time():
+            self.counts["fresh"] += 1
+            return cached[0]
+        headers = {}
+        if cached is not None:
+            if cached[1]:
+                headers["If-None-Match"] = cached[1]
+            if cached[2]:
+                headers["If-Modified-Since"] = cached[2]
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached is not None:
+                    self.counts["not_modified"] += 1
+                    self.cache.refresh(url, expiry(response))
+                    return cached[0]
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "text/html")
+                if not content_type.startswith(("text/", "application/xhtml")):
+                    text = NO_CONTENT  # PDFs, images and the like have no paragraphs to index
+                else:
+                    body = bytearray()
+                    async for data in response.aiter_bytes():
+                        body.extend(data)
+                        if len(body) >= self.options.max_page_bytes:
+                            break
+                    html = bytes(body[:self.options.max_page_bytes]).decode(response.encoding or "utf-8",
+                                                                            errors="replace")
+                    text = await asyncio.to_thread(page_text, html)  # Parsing is CPU work; keep the loop fetching
+        except Exception as e:
+            self.counts["failed"] += 1
+            return f"Web Crawling Error: {str(e) or type(e).__name__}"
+        self.counts["fetched"] += 1
+        if self.cache is not None and "no-store" not in response.headers.get("cache-control", "").lower():
+            self.cache.put(url, text, response.headers.get("etag"), response.headers.get("last-modified"),
+                           expiry(response))
+        return text
+
+    def stats(self):
+        return dict(self.counts)
+
+
+def extract_hyperlinks(text):
+    """Extract URLs from text."""
+    return URL_PATTERN.findall(text)
+
+
+def crawl_urls(urls, options=None):
+    """Blocking crawl of ``urls`` for synchronous callers; see Crawler.crawl."""
+    crawler = Crawler(options)
+    results = asyncio.run(crawler.crawl(urls))
+    logging.debug(f"Crawled {len(results)} links: {crawler.stats()}")
+    return results
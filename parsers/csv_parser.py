@@ -1,5 +1,9 @@
 import pandas as pd
 
+def csv_text(file_path):
+    """A CSV file as a text table; raises if pandas cannot read it."""
+    return pd.read_csv(file_path).to_string()
+
 def parse_csv(file_path):
     """Extract data from CSV files."""
     try:
@@ -1,10 +1,18 @@
 from docx import Document
 
+def docx_text(file_path: str) -> str:
+       """Paragraph and table text of a DOCX file; raises if the file cannot be read."""
+       doc = Document(file_path)
+       text = [para.text for para in doc.paragraphs if para.text.strip()]
+       for table in doc.tables:
+           for row in table.rows:
+               text.append(' | '.join(cell.text.strip() for cell in row.cells))
+       return '\n'.join(text)
+
 def parse_docx(file_path: str) -> str:
        """Parse text from a DOCX file."""
        try:
-           doc = Document(file_path)
-           text = [para.text for para in doc.paragraphs if para.text.strip()]
-           return '\n'.join(text) if text else "No text extracted from DOCX."
+           text = docx_text(file_path)
+           return text if text else "No text extracted from DOCX."
        except Exception as e:
            return f"Error parsing DOCX: {str(e)}"
\ No newline at end of file
@@ -1,11 +1,9 @@
-import pytesseract
-from PIL import Image
+from .ocr import ocr_image_file
 
 def parse_image(file_path: str) -> str:
        """Parse text from an image using OCR."""
        try:
-           image = Image.open(file_path)
-           text = pytesseract.image_to_string(image)
+           text = ocr_image_file(file_path)
            return text if text.strip() else "No text extracted from image."
        except Exception as e:
-           return f"Error parsing image: {str(e)}"
\ No newline at end of file
+           return f"Error parsing image: {str(e)}"
@@ -1,6 +1,11 @@
 import pandas as pd
 import json
 
+def json_text(file_path):
+    """A JSON file re-indented for reading; raises if it is not valid JSON."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.dumps(json.load(f), indent=2)
+
 def parse_json(file_path):
     """Extract data from JSON files."""
     try:
@@ -0,0 +1,285 @@
+"""OCR for scanned PDFs and images: filter, normalize, cache, batch and parallelize.
+
+Every call to pytesseract starts a tesseract process, so images are OCRed in
+batches (one tesseract run over a list file) and PDF pages are spread across a
+process pool. Tiny and near-blank images (rules, bullets, logos) are skipped;
+the rest are converted to grayscale, downsampled to about 300 DPI and
+binarized with Otsu's threshold before OCR. Results are cached in SQLite by a
+SHA-256 of the normalized pixels, so a stamp or logo repeated on every page, or
+a re-uploaded scan, is read once. (A perceptual hash would also match
+different pages of similar-looking text, returning the wrong page's words.)
+"""
+import hashlib
+import io
+import logging
+import math
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pdfplumber
+import pytesseract
+from PIL import Image
+
+WINDOWS_TESSERACT = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+if os.name == "nt" and os.path.exists(WINDOWS_TESSERACT):
+    pytesseract.pytesseract.tesseract_cmd = WINDOWS_TESSERACT
+
+MIN_SIDE = 32  # Pixels; narrower images are rules, bullets or icons
+MIN_AREA = 100 * 100
+MIN_CONTRAST = 8.0  # Grayscale standard deviation below which an image is blank or a flat fill
+RENDER_RESOLUTION = 300  # DPI for PDF images PIL cannot decode directly
+
+
+def is_decorative(image):
+    """True for images too small or too uniform to hold readable text."""
+    width, height = image.size
+    if min(width, height) < MIN_SIDE or width * height < MIN_AREA:
+        return True
+    thumbnail = image.convert("L")
+    thumbnail.thumbnail((256, 256))
+    return float(np.asarray(thumbnail, dtype=np.float32).std()) < MIN_CONTRAST
+
+
+def otsu_threshold(pixels):
+    """Gray level that best separates ink from paper (Otsu's method)."""
+    histogram = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    weights = np.cumsum(histogram)
+    means = np.cumsum(histogram * np.arange(256))
+    total_weight, total_mean = weights[-1], means[-1]
+    background = weights
+    foreground = total_weight - weights
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (total_mean * background - means * total_weight) ** 2 / (background * foreground)
+    return int(np.nanargmax(between[:-1]))
+
+
+def prepare(image, max_side=3500):
+    """Grayscale, downsample so the longer side is at most ``max_side`` pixels, and binarize."""
+    image = image.convert("L")
+    if max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                             Image.Resampling.LANCZOS)
+    pixels = np.asarray(image)
+    return Image.fromarray(np.where(pixels > otsu_threshold(pixels), 255, 0).astype(np.uint8))
+
+
+def image_key(prepared, lang):
+    digest = hashlib.sha256(f"{prepared.size}:{lang}:".encode())
+    digest.update(prepared.tobytes())
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """SQLite store of OCR text by normalized-image hash, kept under ``max_bytes`` by LRU eviction.
+
+    Parser and OCR worker processes open the same file; SQLite serializes their writes.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr (key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ocr_last_used ON ocr (last_used)")
+        self.conn.commit()
+
+    def get_many(self, keys):
+        with self.lock:
+            found = {}
+            for key in dict.fromkeys(keys):
+                row = self.conn.execute("SELECT text FROM ocr WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    found[key] = row[0]
+            if found:
+                now = time.time()
+                self.conn.executemany("UPDATE ocr SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                self.conn.commit()
+            return found
+
+    def put_many(self, items):
+        with self.lock:
+            now = time.time()
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO ocr (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                [(key, text, len(text.encode("utf-8")), now) for key, text in items],
+            )
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr").fetchone()[0]
+            if total > self.max_bytes:
+                victims = []
+                for key, size in self.conn.execute("SELECT key, size FROM ocr ORDER BY last_used ASC"):
+                    victims.append((key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+                self.conn.executemany("DELETE FROM ocr WHERE key = ?", victims)
+            self.conn.commit()
+
+
+_caches = {}  # Path -> OcrCache, one connection per process
+
+
+def open_cache(path, max_bytes):
+    if path is None:
+        return None
+    if path not in _caches:
+        _caches[path] = OcrCache(path, max_bytes)
+    return _caches[path]
+
+
+def run_tesseract(images, lang="eng"):
+    """OCR prepared images with one tesseract process for the whole batch."""
+    if len(images) == 1:
+        return [pytesseract.image_to_string(images[0], lang=lang)]
+    with tempfile.TemporaryDirectory(prefix="ocr-") as directory:
+        paths = []
+        for i, image in enumerate(images):
+            paths.append(os.path.join(directory, f"{i}.png"))
+            image.convert("1").save(paths[-1])
+        listing = os.path.join(directory, "images.txt")
+        with open(listing, "w") as f:
+            f.write("\n".join(paths) + "\n")
+        output = pytesseract.image_to_string(listing, lang=lang)
+    texts = output.split("\f")  # Tesseract ends every page with a form feed
+    if len(texts) == len(images) + 1 and not texts[-1].strip():
+        return texts[:-1]
+    logging.warning(f"Batched OCR returned {len(texts) - 1} pages for {len(images)} images; retrying one by one")
+    return [pytesseract.image_to_string(image, lang=lang) for image in images]
+
+
+class OcrOptions:
+    """Picklable OCR settings handed to page workers."""
+
+    def __init__(self, lang="eng", max_side=3500, cache_path=None, cache_max_bytes=64 * 1024 * 1024,
+                 ocr_fn=run_tesseract):
+        self.lang = lang
+        self.max_side = max_side
+        self.cache_path = cache_path
+        self.cache_max_bytes = cache_max_bytes
+        self.ocr_fn = ocr_fn  # (prepared images, lang) -> texts; must be a module-level function
+
+
+def ocr_images(images, options):
+    """Return the OCR text of each image ("" for skipped ones), using and filling the cache."""
+    texts = [""] * len(images)
+    prepared, keys = {}, {}
+    for i, image in enumerate(images):
+        if not is_decorative(image):
+            prepared[i] = prepare(image, options.max_side)
+            keys[i] = image_key(prepared[i], options.lang)
+    cache = open_cache(options.cache_path, options.cache_max_bytes)
+    cached = cache.get_many(list(keys.values())) if cache is not None and keys else {}
+    missing = {}  # Key -> image index, so identical images in one batch are read once
+    for i, key in keys.items():
+        if key in cached:
+            texts[i] = cached[key]
+        else:
+            missing.setdefault(key, i)
+    if missing:
+        results = dict(zip(missing, options.ocr_fn([prepared[i] for i in missing.values()], options.lang)))
+        if cache is not None:
+            cache.put_many(results.items())
+        for i, key in keys.items():
+            if key in results:
+                texts[i] = results[key]
+    logging.debug(f"OCR: {len(images)} images, {len(images) - len(keys)} skipped, "
+                  f"{len(keys) - sum(key in missing for key in keys.values())} cached, {len(missing)} read")
+    return texts
+
+
+def page_images(page):
+    """Embedded images of a pdfplumber page as PIL images, rendering those PIL cannot decode."""
+    images = []
+    for image in page.images:
+        try:
+            decoded = Image.open(io.BytesIO(image["stream"].get_data()))
+            decoded.load()
+        except Exception:
+            # Raw (e.g. Flate-encoded) pixel streams have no image header; render that part of the page instead
+            bbox = (max(image["x0"], 0), max(image["top"], 0),
+                    min(image["x1"], page.width), min(image["bottom"], page.height))
+            if bbox[2] <= bbox[0] or bbox[3] <= bbox[1]:
+                continue
+            decoded = page.crop(bbox).to_image(resolution=RENDER_RESOLUTION).original
+        images.append(decoded)
+    return images
+
+
+def ocr_pdf_pages(file_path, page_numbers, options):
+    """Worker entry point: OCR text of each listed page (0-based), images joined by blank lines."""
+    if options.ocr_fn is run_tesseract:
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")  # Parallel tesseracts should not each spawn a thread per core
+    page_of, images = [], []
+    with pdfplumber.open(file_path) as pdf:
+        for number in page_numbers:
+            for image in page_images(pdf.pages[number]):
+                page_of.append(number)
+                images.append(image)
+    texts = {number: [] for number in page_numbers}
+    for number, text in zip(page_of, ocr_images(images, options)):
+        if text.strip():
+            texts[number].append(text.strip())
+    return ["\n\n".join(texts[number]) for number in page_numbers]
+
+
+_pool = None
+_pool_workers = 0
+
+
+def page_pool(workers):
+    """A process pool shared by this process's OCR calls, created on first use and replaced only if ``workers`` changes.
+
+    Spawned rather than forked from the process-wide forkserver: starting that
+    server here would freeze its preload list before ParserPool sets it.
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        context = multiprocessing.get_context("spawn")
+        _pool, _pool_workers = ProcessPoolExecutor(max_workers=workers, mp_context=context), workers
+    return _pool
+
+
+def ocr_pdf(file_path, pages=None, workers=1, options=None):
+    """OCR text for the given 0-based pages (all by default), as a list in page order.
+
+    Pages are split into at most ``workers`` contiguous ranges, so each
+    worker starts a single tesseract run for its images. The pool is sized by
+    ``workers`` alone: documents with fewer scanned pages submit fewer ranges
+    to the same pool instead of starting a smaller one.
+    """
+    options = options or OcrOptions()
+    if pages is None:
+        with pdfplumber.open(file_path) as pdf:
+            pages = list(range(len(pdf.pages)))
+    pages = list(pages)
+    if not pages:
+        return []
+    workers = max(1, workers)
+    if workers == 1 or len(pages) == 1:
+        return ocr_pdf_pages(file_path, pages, options)
+    size = math.ceil(len(pages) / min(workers, len(pages)))
+    ranges = [pages[start:start + size] for start in range(0, len(pages), size)]
+    pool = page_pool(workers)
+    return [text for texts in pool.map(ocr_pdf_pages, [file_path] * len(ranges), ranges, [options] * len(ranges))
+            for text in texts]
+
+
+def ocr_image_file(file_path, options=None):
+    """OCR text of an image file."""
+    with Image.open(file_path) as image:
+        image.load()
+        return ocr_images([image], options or OcrOptions())[0]
@@ -1,25 +1,20 @@
+import os
 import pdfplumber
-import pytesseract
-from PIL import Image
-import io
+from .ocr import ocr_pdf
 
 def parse_pdf(file_path: str) -> str:
        """Parse text and images from a PDF file."""
        try:
            text = []
            with pdfplumber.open(file_path) as pdf:
-               for page in pdf.pages:
-                   # Extract text
-                   page_text = page.extract_text()
-                   if page_text:
-                       text.append(page_text)
-                   # Extract images for OCR
-                   for img in page.images:
-                       img_data = img['stream'].get_data()
-                       image = Image.open(io.BytesIO(img_data))
-                       ocr_text = pytesseract.image_to_string(image)
-                       if ocr_text.strip():
-                           text.append(ocr_text)
+               page_texts = [page.extract_text() for page in pdf.pages]
+           # OCR embedded images (skipping decorative ones) with pages spread across processes
+           ocr_texts = ocr_pdf(file_path, workers=min(4, os.cpu_count() or 1))
+           for page_text, ocr_text in zip(page_texts, ocr_texts):
+               if page_text:
+                   text.append(page_text)
+               if ocr_text.strip():
+                   text.append(ocr_text)
            return '\n'.join(text) if text else "No text extracted from PDF."
        except Exception as e:
-           return f"Error parsing PDF: {str(e)}"
\ No newline at end of file
+           return f"Error parsing PDF: {str(e)}"
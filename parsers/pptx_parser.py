@@ -1,14 +1,19 @@
 from pptx import Presentation
 
+def pptx_text(file_path: str) -> str:
+       """Text of the shapes on every slide of a PPTX file; raises if the file cannot be read."""
+       prs = Presentation(file_path)
+       text = []
+       for slide in prs.slides:
+           for shape in slide.shapes:
+               if hasattr(shape, 'text') and shape.text.strip():
+                   text.append(shape.text)
+       return '\n'.join(text)
+
 def parse_pptx(file_path: str) -> str:
        """Parse text from a PPTX file."""
        try:
-           prs = Presentation(file_path)
-           text = []
-           for slide in prs.slides:
-               for shape in slide.shapes:
-                   if hasattr(shape, 'text') and shape.text.strip():
-                       text.append(shape.text)
-           return '\n'.join(text) if text else "No text extracted from PPTX."
+           text = pptx_text(file_path)
+           return text if text else "No text extracted from PPTX."
        except Exception as e:
            return f"Error parsing PPTX: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""Route each upload to the parser backend that has proven fastest for its file type.
+
+Every extension has backends in a default order (fast pure-Python parsers,
+then LangChain loaders, then unstructured). Each attempt is recorded per
+(extension, backend): whether it produced text and, if so, the bytes per
+second it parsed. Backends with MIN_SAMPLES successes are tried fastest
+first; a backend that keeps failing (BAD_SUCCESS_RATE after BAD_AFTER
+attempts, e.g. a loader whose optional dependency is missing) is skipped.
+Every EXPLORE_EVERY-th file of a type tries an unmeasured or skipped
+backend first, so new or repaired backends get measured. The counts live in
+SQLite, so every parser worker process learns from all of them.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+MIN_SAMPLES = 3  # Successes before a backend's throughput is trusted
+BAD_AFTER = 5  # Attempts before a low success rate marks a backend as known-bad
+BAD_SUCCESS_RATE = 0.2
+EXPLORE_EVERY = 20  # Every n-th file of a type tries an unmeasured or known-bad backend first
+FIELDS = ("attempts", "successes", "failures", "bytes", "seconds")
+
+
+class ParserStats:
+    """Attempt counters and timings per (extension, backend); in SQLite at ``path``, or in memory if it is None."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.memory = {}  # (extension, backend) -> dict of FIELDS, when path is None
+        self.conn = None
+        self.pid = None
+
+    def connection(self):
+        # One connection per process: parser workers are forked from a parent that may have opened one
+        if self.conn is None or self.pid != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS parser_stats (extension TEXT NOT NULL, backend TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL, successes INTEGER NOT NULL, failures INTEGER NOT NULL, "
+                "bytes INTEGER NOT NULL, seconds REAL NOT NULL, PRIMARY KEY (extension, backend))"
+            )
+            self.conn.commit()
+            self.pid = os.getpid()
+        return self.conn
+
+    def get(self, extension):
+        """{backend: {field: value}} for one extension."""
+        with self.lock:
+            if self.path is None:
+                return {backend: dict(counts) for (ext, backend), counts in self.memory.items() if ext == extension}
+            rows = self.connection().execute(
+                f"SELECT backend, {', '.join(FIELDS)} FROM parser_stats WHERE extension = ?", (extension,)
+            ).fetchall()
+            return {row[0]: dict(zip(FIELDS, row[1:])) for row in rows}
+
+    def all(self):
+        with self.lock:
+            if self.path is None:
+                return {key: dict(counts) for key, counts in self.memory.items()}
+            rows = self.connection().execute(
+                f"SELECT extension, backend, {', '.join(FIELDS)} FROM parser_stats"
+            ).fetchall()
+            return {(row[0], row[1]): dict(zip(FIELDS, row[2:])) for row in rows}
+
+    def record(self, extension, backend, success, failure, size, seconds):
+        """Count one attempt; ``size`` and ``seconds`` only count for successes."""
+        delta = {"attempts": 1, "successes": int(success), "failures": int(failure),
+                 "bytes": size if success else 0, "seconds": seconds if success else 0.0}
+        with self.lock:
+            if self.path is None:
+                counts = self.memory.setdefault((extension, backend), dict.fromkeys(FIELDS, 0))
+                for field in FIELDS:
+                    counts[field] += delta[field]
+                return
+            conn = self.connection()
+            conn.execute(
+                f"INSERT INTO parser_stats (extension, backend, {', '.join(FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (extension, backend) DO UPDATE SET "
+                + ", ".join(f"{field} = {field} + excluded.{field}" for field in FIELDS),
+                (extension, backend, *(delta[field] for field in FIELDS)),
+            )
+            conn.commit()
+
+
+def known_bad(counts):
+    return counts is not None and counts["attempts"] >= BAD_AFTER and \
+        counts["successes"] < BAD_SUCCESS_RATE * counts["attempts"]
+
+
+def throughput(counts):
+    """Bytes per second over a backend's successful parses, or None until it has MIN_SAMPLES of them."""
+    if counts is None or counts["successes"] < MIN_SAMPLES or counts["seconds"] <= 0:
+        return None
+    return counts["bytes"] / counts["seconds"]
+
+
+class Backend:
+    def __init__(self, name, parse_fn, streaming=False):
+        self.name = name
+        self.parse_fn = parse_fn  # (file_path, filename) -> text, or an iterator of sections if streaming
+        self.streaming = streaming
+
+
+class ParserRegistry:
+    """Parser backends per file extension, chosen by measured success rate and throughput."""
+
+    def __init__(self, stats_path=None, fatal_errors=()):
+        self.backends = {}  # Extension -> [Backend] in default order
+        self.fallback = []  # Last-resort backends for every extension
+        self.stats_store = ParserStats(stats_path)
+        self.fatal_errors = fatal_errors  # Raised as is (e.g. a parse deadline) instead of trying the next backend
+
+    def register(self, extensions, name, parse_fn, streaming=False):
+        """Add a backend for ``extensions`` after those already there; None adds a last resort for every extension."""
+        backend = Backend(name, parse_fn, streaming)
+        if extensions is None:
+            self.fallback.append(backend)
+        for extension in extensions or ():
+            self.backends.setdefault(extension, []).append(backend)
+
+    def order(self, extension):
+        """Backends for ``extension`` in the order to try them."""
+        backends = self.backends.get(extension, []) + [backend for backend in self.fallback
+                                                      if backend not in self.backends.get(extension, [])]
+        stats = self.stats_store.get(extension)
+        bad = [backend for backend in backends if known_bad(stats.get(backend.name))]
+        measured = sorted((backend for backend in backends if backend not in bad
+                           and throughput(stats.get(backend.name)) is not None),
+                          key=lambda backend: -throughput(stats[backend.name]))
+        unmeasured = [backend for backend in backends if backend not in bad and backend not in measured]
+        attempts = sum(counts["attempts"] for counts in stats.values())
+        if measured and (unmeasured or bad) and attempts % EXPLORE_EVERY == EXPLORE_EVERY - 1:
+            explore = (unmeasured or bad)[0]
+            return [explore] + [backend for backend in measured + unmeasured if backend is not explore]
+        return measured + unmeasured or bad  # Everything known-bad: still try rather than parse nothing
+
+    def parse(self, file_path, filename):
+        """Text of the file from the first backend that returns some; "" if none does.
+
+        Raises the last error if every backend raised one.
+        """
+        return "\n".join(self.sections(file_path, filename))
+
+    def sections(self, file_path, filename):
+        """Yield the file's text from the chosen backend: one section, or a streaming backend's sections.
+
+        A backend that raises before its first section, or returns blank text,
+        hands over to the next one; an error after a streaming backend has
+        yielded is raised, as its sections have already been consumed.
+        """
+        extension = os.path.splitext(filename)[1].lower()
+        size = os.path.getsize(file_path)
+        error, blank = None, False
+        for backend in self.order(extension):
+            started, produced, elapsed = time.perf_counter(), False, 0.0
+            try:
+                if not backend.streaming:
+                    text = backend.parse_fn(file_path, filename)
+                    elapsed = time.perf_counter() - started
+                    if not text or not text.strip():
+                        self.stats_store.record(extension, backend.name, False, False, size, elapsed)
+                        logging.debug(f"{backend.name} extracted no text from {filename}")
+                        blank = True
+                        continue
+                    self.stats_store.record(extension, backend.name, True, False, size, elapsed)
+                    logging.debug(f"{backend.name} extracted {len(text)} characters from {filename} "
+                                  f"in {elapsed * 1000:.0f} ms")
+                    yield text
+                    return
+                sections = iter(backend.parse_fn(file_path, filename))
+                while True:
+                    # Only time spent inside the backend counts, not what the consumer does between sections
+                    started = time.perf_counter()
+                    try:
+                        section = next(sections)
+                    except StopIteration:
+                        elapsed += time.perf_counter() - started
+                        break
+                    elapsed += time.perf_counter() - started
+                    produced = True
+                    yield section
+                self.stats_store.record(extension, backend.name, True, False, size, elapsed)
+                logging.debug(f"{backend.name} streamed {filename} in {elapsed * 1000:.0f} ms")
+                return
+            except (GeneratorExit, *self.fatal_errors):
+                raise
+            except Exception as e:
+                self.stats_store.record(extension, backend.name, False, True, size, 0.0)
+                if produced:
+                    raise
+                logging.debug(f"{backend.name} failed for {filename}: {str(e)}")
+                error = e
+        if error is not None and not blank:
+            raise error
+
+    def stats(self):
+        """Per extension and backend: attempts, success rate, MB/s and whether it is skipped as known-bad."""
+        report = {}
+        for (extension, backend), counts in sorted(self.stats_store.all().items()):
+            speed = throughput(counts)
+            report.setdefault(extension, {})[backend] = {
+                "attempts": counts["attempts"],
+                "success_rate": counts["successes"] / counts["attempts"] if counts["attempts"] else 0.0,
+                "mb_per_second": speed / 2 ** 20 if speed is not None else None,
+                "skipped": known_bad(counts),
+            }
+        return report
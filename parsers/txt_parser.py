@@ -1,8 +1,12 @@
+def txt_text(file_path):
+    """Text of a UTF-8 file; raises if it cannot be decoded."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
 def parse_txt(file_path):
     """Extract text from TXT files."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
+        text = txt_text(file_path)
         return text if text.strip() else "No text found in TXT."
     except Exception as e:
         return f"TXT Extraction Error: {str(e)}"
\ No newline at end of file
@@ -1,5 +1,10 @@
 import pandas as pd
 
+def xlsx_text(file_path):
+    """Every sheet of a workbook as a text table under its name; raises if pandas cannot read it."""
+    sheets = pd.read_excel(file_path, sheet_name=None)
+    return "\n\n".join(f"{name}\n{df.to_string()}" for name, df in sheets.items() if not df.empty)
+
 def parse_xlsx(file_path):
     """Extract data from XLSX files."""
     try:
@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import os
+import time
+import tempfile
+
+# Keep anything the backend persists at import time out of the working tree
+_state_dir = tempfile.mkdtemp(prefix="qa-tests-")
+os.environ.setdefault("INDEX_DIR", os.path.join(_state_dir, "index"))
+os.environ.setdefault("COLLECTIONS_DIR", os.path.join(_state_dir, "collections"))
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(_state_dir, "embedding_cache.sqlite3"))
+os.environ.setdefault("OCR_CACHE_PATH", os.path.join(_state_dir, "ocr_cache.sqlite3"))
+os.environ.setdefault("CRAWL_CACHE_PATH", os.path.join(_state_dir, "crawl_cache.sqlite3"))
+os.environ.setdefault("PARSER_STATS_PATH", os.path.join(_state_dir, "parser_stats.sqlite3"))
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic fake embeddings that count how many texts they embed."""
+
+    def __init__(self, dimension: int = 32):
+        self.dimension = dimension
+        self.embedded_texts = 0
+        self.calls = 0
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype("float32")
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.embedded_texts += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        self.embedded_texts += 1
+        return self._vector(text)
+
+
+class DelayedTokenChatModel(BaseChatModel):
+    """Local fake chat model that produces ``tokens`` one by one, sleeping ``token_delay`` before each."""
+
+    tokens: list = ["fake", " answer"]
+    token_delay: float = 0.0
+    prompts: list = []
+
+    @property
+    def _llm_type(self):
+        return "delayed-token-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages[-1].content)
+        time.sleep(self.token_delay * len(self.tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self.tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages[-1].content)
+        await asyncio.sleep(self.token_delay * len(self.tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self.tokens)))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages[-1].content)
+        for token in self.tokens:
+            await asyncio.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+@pytest.fixture
+def fake_embeddings():
+    return CountingEmbeddings()
+
+
+@pytest.fixture
+def fake_llm():
+    return FakeListChatModel(responses=["fake answer"])
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path_factory, fake_embeddings, fake_llm):
+    """The backend.api module with fake-model collections in a temp dir, importable without model downloads."""
+    import models.qa_pipeline
+    from models.model_registry import MODELS
+    # Importing the API loads no models; anything that asks the registry for one gets a fake
+    MODELS.register("embeddings", CountingEmbeddings)
+    MODELS.register("llm", lambda: fake_llm)
+    import backend.api
+    from backend.ingestion import IngestionQueue
+    from models.collection_manager import CollectionManager
+
+    def open_collection(name, directory):
+        return models.qa_pipeline.QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=directory)
+
+    monkeypatch.setattr(backend.api, "collections", CollectionManager(str(tmp_path_factory.mktemp("collections")), open_collection))
+    # A fresh queue per test: its worker semaphore belongs to the test's event loop
+    monkeypatch.setattr(backend.api, "ingestion_queue", IngestionQueue(backend.api.ingest_file, workers=2))
+    return backend.api
+
+
+def default_pipeline(api):
+    """The QAPipeline behind the unscoped routes."""
+    return api.collections.get(api.DEFAULT_COLLECTION)
+
+
+@pytest.fixture
+def app(api):
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    app.include_router(api.router)
+    return app
@@ -0,0 +1,123 @@
+import asyncio
+
+import numpy as np
+
+from conftest import DelayedTokenChatModel
+from models.answer_cache import SemanticAnswerCache
+from models.qa_pipeline import QAPipeline
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def answer_prompts(llm):
+    # Background document summaries share the LLM; only count answer prompts
+    return [prompt for prompt in llm.prompts if prompt.startswith("Answer based on")]
+
+
+def make_pipeline(fake_embeddings, **cache_kwargs):
+    llm = DelayedTokenChatModel(tokens=["Paris"], prompts=[])
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=llm, answer_cache=SemanticAnswerCache(**cache_kwargs))
+    pipeline.index_documents(["The capital of France is Paris."], ["france.txt"])
+    return pipeline, llm
+
+
+def test_similar_query_is_served_from_cache():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put([1.0, 0.0], [3], "cached", ["a.txt"])
+
+    assert cache.get([1.0, 0.1]) == ("cached", ["a.txt"])  # cosine ~0.995
+    assert cache.get([0.5, 0.5]) is None  # cosine ~0.71
+    assert cache.stats()["hit_rate"] == 1 / 2
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = SemanticAnswerCache(ttl_seconds=10, clock=clock)
+    cache.put([1.0, 0.0], [1], "answer", [])
+    clock.now = 9
+    assert cache.get([1.0, 0.0]) is not None
+    clock.now = 11
+    assert cache.get([1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidating_chunks_drops_only_entries_built_from_them():
+    cache = SemanticAnswerCache()
+    vectors = np.eye(3)
+    cache.put(vectors[0], [1, 2], "first", ["a.txt"])
+    cache.put(vectors[1], [2, 3], "second", ["a.txt", "b.txt"])
+    cache.put(vectors[2], [4], "third", ["c.txt"])
+
+    cache.invalidate([3, 5])
+    assert cache.get(vectors[1]) is None
+    assert cache.get(vectors[0])[0] == "first"
+    assert cache.get(vectors[2])[0] == "third"
+
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["invalidations"] == 3
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    vectors = np.eye(3)
+    cache.put(vectors[0], [], "first", [])
+    cache.put(vectors[1], [], "second", [])
+    cache.get(vectors[0])
+    cache.put(vectors[2], [], "third", [])
+
+    assert cache.get(vectors[1]) is None
+    assert cache.get(vectors[0])[0] == "first"
+    assert cache.get(vectors[2])[0] == "third"
+
+
+def test_repeated_query_skips_llm(fake_embeddings):
+    pipeline, llm = make_pipeline(fake_embeddings)
+
+    assert pipeline.answer_query("What is the capital of France?") == ("Paris", ["france.txt"])
+    assert asyncio.run(pipeline.aanswer_query("What is the capital of France?")) == ("Paris", ["france.txt"])
+
+    async def stream():
+        return [event async for event in pipeline.astream_answer("What is the capital of France?")]
+
+    assert asyncio.run(stream()) == [("token", "Paris"), ("references", ["france.txt"])]
+    assert len(answer_prompts(llm)) == 1
+    assert pipeline.get_cache_stats()["answer_cache"]["hits"] == 2
+
+
+def test_corpus_changes_invalidate_cached_answers(fake_embeddings):
+    pipeline, llm = make_pipeline(fake_embeddings)
+    pipeline.answer_query("capital?")
+
+    pipeline.index_documents(["The capital of Italy is Rome."], ["italy.txt"])
+    pipeline.answer_query("capital?")
+    assert len(answer_prompts(llm)) == 2
+
+    pipeline.delete_document("italy.txt")
+    pipeline.answer_query("capital?")
+    assert len(answer_prompts(llm)) == 3
+    assert pipeline.get_cache_stats()["answer_cache"]["invalidations"] == 2
+
+
+def test_deleting_a_document_keeps_answers_that_did_not_use_it(fake_embeddings):
+    pipeline, llm = make_pipeline(fake_embeddings)
+    pipeline.index_documents(["The capital of Italy is Rome."], ["italy.txt"])
+    pipeline.index_documents(["Spain's capital is Madrid."], ["spain.txt"])
+    pipeline.answer_query("capital?")  # Retrieves chunks from all three files
+    france_id = pipeline.chunk_ids["france.txt"][0]
+    pipeline.retrieve = lambda vector, query, timings=None, scores=None: (
+        [france_id], [pipeline.vector_store.documents[france_id]], ["france.txt"])
+    pipeline.answer_query("Where is Paris?")
+    assert len(answer_prompts(llm)) == 2
+
+    pipeline.delete_document("spain.txt")
+    pipeline.answer_query("Where is Paris?")
+    assert len(answer_prompts(llm)) == 2  # Built only from france.txt, still served
+    pipeline.answer_query("capital?")
+    assert len(answer_prompts(llm)) == 3
@@ -0,0 +1,126 @@
+from models.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+from models.qa_pipeline import QAPipeline
+
+
+def test_tokenizer_keeps_identifiers_whole_and_split():
+    assert tokenize("Part AB-1234 in order_id v2.1") == [
+        "part", "ab-1234", "ab", "1234", "in", "order_id", "order", "id", "v2.1", "v2", "1",
+    ]
+
+
+def test_exact_identifier_outranks_common_words():
+    index = BM25Index()
+    index.add(0, "The pump housing is made of cast iron.")
+    index.add(1, "Replacement part PN-88213 fits the pump housing.")
+    index.add(2, "The pump is made of cast iron and the housing of steel.")
+
+    assert index.search("pump PN-88213", k=3)[0][0] == 1
+    assert [chunk_id for chunk_id, _ in index.search("88213")] == [1]
+
+
+def test_removed_chunks_are_never_returned():
+    index = BM25Index()
+    for chunk_id in range(10):
+        index.add(chunk_id, f"shared words chunk{chunk_id}")
+    index.remove([0, 1, 2, 3, 4, 5])  # More than half: the posting lists get compacted
+
+    assert sorted(chunk_id for chunk_id, _ in index.search("shared", k=10)) == [6, 7, 8, 9]
+    assert index.search("chunk3") == []
+    assert "chunk3" not in index.postings
+    assert len(index) == 4
+
+
+def test_scores_match_an_index_built_from_scratch():
+    texts = {chunk_id: f"alpha beta {'gamma ' * (chunk_id % 3)}delta{chunk_id % 4}" for chunk_id in range(20)}
+    incremental = BM25Index()
+    for chunk_id, text in texts.items():
+        incremental.add(chunk_id, text)
+    incremental.remove(range(0, 20, 3))
+    incremental.add(5, "alpha replaced")  # Re-adding an id replaces its old postings
+
+    fresh = BM25Index()
+    for chunk_id, text in texts.items():
+        if chunk_id % 3 and chunk_id != 5:
+            fresh.add(chunk_id, text)
+    fresh.add(5, "alpha replaced")
+
+    for query in ("alpha", "gamma delta1", "replaced beta"):
+        assert incremental.search(query, k=20) == fresh.search(query, k=20)
+
+
+def test_saved_postings_load_without_retokenizing(tmp_path, monkeypatch):
+    texts = {chunk_id: f"alpha beta {'gamma ' * (chunk_id % 3)}delta{chunk_id % 4}" for chunk_id in range(20)}
+    index = BM25Index()
+    for chunk_id, text in texts.items():
+        index.add(chunk_id, text)
+    index.remove(range(0, 20, 3))
+    index.save(str(tmp_path))
+
+    monkeypatch.setattr("models.bm25_index.tokenize", None)  # Loading must not tokenize a single chunk
+    loaded = BM25Index.load(str(tmp_path))
+    monkeypatch.undo()
+    for query in ("alpha", "gamma delta1", "delta3 beta"):
+        assert loaded.search(query, k=20) == index.search(query, k=20)
+    assert len(loaded) == len(index) and loaded.stats() == index.stats()
+
+    # Saved chunks can be deleted and replaced like added ones
+    for changed in (index, loaded):
+        changed.remove([1, 2, 4])
+        changed.add(5, "alpha replaced")
+        changed.add(20, "delta3 new")
+    for query in ("alpha", "replaced beta", "delta1", "delta3"):
+        assert loaded.search(query, k=20) == index.search(query, k=20)
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+
+def test_reciprocal_rank_fusion_favours_ids_ranked_by_both():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 4, 1]]) == [1, 3, 2, 4]
+
+
+def test_pipeline_finds_identifier_the_embeddings_miss(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, retrieval_k=1)
+    pipeline.index_documents(["Order 7731-B shipped on Monday."], ["orders.txt"])
+    for n in range(31):
+        pipeline.index_documents([f"Filler paragraph {n} about logistics."], [f"filler{n}.txt"])
+
+    # The fake embeddings are random, so only the lexical side can find the order number
+    _, _, references = pipeline.retrieve(fake_embeddings.embed_query("7731-B"), "When did 7731-B ship?")
+    assert references == ["orders.txt"]
+
+    pipeline.delete_document("orders.txt")
+    _, docs, _ = pipeline.retrieve(fake_embeddings.embed_query("7731-B"), "When did 7731-B ship?")
+    assert "7731-B" not in docs[0].page_content
+    assert pipeline.get_cache_stats()["lexical_index"]["chunks"] == 31
+
+
+def test_restored_pipeline_rebuilds_the_lexical_index(tmp_path, fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(tmp_path))
+    pipeline.index_documents(["Valve V-204 is rated for 16 bar."], ["valves.txt"])
+
+    restored = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(tmp_path))
+    restored.ensure_loaded()
+
+    assert [chunk_id for chunk_id, _ in restored.lexical_index.search("V-204")] == pipeline.chunk_ids["valves.txt"]
+
+
+def test_restored_pipeline_reads_the_postings_saved_with_its_snapshot(tmp_path, monkeypatch, fake_embeddings,
+                                                                     fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(tmp_path))
+    pipeline.index_store.min_compact_bytes = 0  # Every write compacts, saving the postings
+    pipeline.index_documents(["Valve V-204 is rated for 16 bar.", "Pump P-7 moves 40 litres."],
+                             ["valves.txt", "pumps.txt"])
+    pipeline.index_store.min_compact_bytes = 10 ** 9
+    pipeline.index_documents(["Seal S-9 fits valve V-204."], ["seals.txt"])  # Only in the log
+    pipeline.delete_document("pumps.txt")
+
+    tokenized = []
+    add = BM25Index.add
+    monkeypatch.setattr(BM25Index, "add", lambda self, chunk_id, text: (tokenized.append(chunk_id),
+                                                                          add(self, chunk_id, text)))
+    restored = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(tmp_path))
+    restored.ensure_loaded()
+
+    assert tokenized == pipeline.chunk_ids["seals.txt"]
+    assert sorted(chunk_id for chunk_id, _ in restored.lexical_index.search("V-204")) == sorted(
+        pipeline.chunk_ids["valves.txt"] + pipeline.chunk_ids["seals.txt"])
+    assert restored.lexical_index.search("P-7") == []
@@ -0,0 +1,90 @@
+import json
+import os
+
+import numpy as np
+
+from models.chunk_store import ChunkStore
+from models.qa_pipeline import QAPipeline
+
+
+def test_chunks_read_back_like_the_dict_they_replace():
+    store = ChunkStore()
+    store.add([0, 1, 5], ["first", "zweite Übersetzung", "third"], ["a.txt", "b.txt", "a.txt"])
+
+    assert store == {0: {"text": "first", "filename": "a.txt"},
+                     1: {"text": "zweite Übersetzung", "filename": "b.txt"},
+                     5: {"text": "third", "filename": "a.txt"}}
+    assert 5 in store and 2 not in store and -1 not in store and "5" not in store
+    assert store.filenames == ["a.txt", "b.txt"]  # Interned: one copy per file, not per chunk
+    assert store.texts([5, 0]) == ["third", "first"]
+
+
+def test_removed_texts_are_reclaimed_once_they_outweigh_the_live_ones():
+    store = ChunkStore(min_compact_bytes=0)
+    store.add(range(4), ["a" * 100, "b" * 100, "c" * 100, "d" * 100], ["f.txt"] * 4)
+
+    store.remove([0, 2, 7])
+    assert len(store.buffer) == 400 and sorted(store) == [1, 3]
+    store.remove([1])
+
+    assert len(store.buffer) == 100
+    assert dict(store) == {3: {"text": "d" * 100, "filename": "f.txt"}}
+
+
+def test_pipeline_keeps_each_chunk_once(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm)
+    pipeline.index_documents(["Paris is the capital of France.", "Rome is the capital of Italy."],
+                             ["france.txt", "italy.txt"])
+
+    assert pipeline.documents is pipeline.vector_store.chunks
+    assert pipeline.vector_store.documents[0].page_content == "Paris is the capital of France."
+    stats = pipeline.get_cache_stats()["chunks"]
+    assert stats["chunks"] == 2 and stats["text_bytes"] == 60
+    assert stats["index_bytes_per_chunk"] == pipeline.memory_bytes() / 2
+
+
+def test_float16_vectors_halve_the_exact_index_and_survive_a_restart(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    texts = [f"Document {n} is about topic {n}." for n in range(20)]
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    pipeline.index_documents(texts, [f"doc{n}.txt" for n in range(20)])
+    pipeline.index_store.snapshot(pipeline.vector_store, {"uploaded_filenames": pipeline.uploaded_filenames,
+                                                          "chunk_ids": pipeline.chunk_ids,
+                                                          "content_hashes": pipeline.content_hashes})
+    full = pipeline.vector_store.memory_bytes() - pipeline.documents.memory_bytes()
+
+    restarted = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir,
+                           index_options={"vector_dtype": "float16"})
+    assert restarted.get_document_count() == 20
+    half = restarted.vector_store.memory_bytes() - restarted.documents.memory_bytes()
+
+    assert restarted.vector_store.stats()["vector_dtype"] == "float16"
+    assert half - 20 * 8 == (full - 20 * 8) // 2
+    query = np.asarray(fake_embeddings.embed_query(texts[7]))
+    assert restarted.vector_store.search_ids(query, k=1)[0] == [pipeline.chunk_ids["doc7.txt"][0]]
+    assert np.abs(restarted.vector_store.vectors([3]) - pipeline.vector_store.vectors([3])).max() < 1e-3
+
+
+def test_snapshot_texts_load_mapped_and_from_the_older_jsonl_layout(tmp_path, fake_embeddings, fake_llm):
+    index_dir = tmp_path / "index"
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(index_dir))
+    pipeline.index_documents(["Paris is the capital of France.", "Rome ist die Hauptstadt Italiens."],
+                             ["france.txt", "italy.txt"])
+    pipeline.index_store.snapshot(pipeline.vector_store, {"uploaded_filenames": pipeline.uploaded_filenames,
+                                                          "chunk_ids": pipeline.chunk_ids,
+                                                          "content_hashes": pipeline.content_hashes})
+    generation = index_dir / f"gen-{pipeline.index_store.generation}"
+
+    mapped = ChunkStore.load(str(generation))
+    assert dict(mapped) == dict(pipeline.documents) and mapped.stats()["mapped_bytes"] == mapped.stats()["text_bytes"]
+    mapped.add([7], ["added later"], ["france.txt"])
+    mapped.remove([0])
+    assert mapped.texts([1, 7]) == ["Rome ist die Hauptstadt Italiens.", "added later"] and 0 not in mapped
+
+    with open(generation / "chunks.jsonl", "w", encoding="utf-8") as f:
+        for chunk_id in pipeline.documents:
+            f.write(json.dumps({"id": chunk_id, **pipeline.documents[chunk_id]}) + "\n")
+    for name in ("texts.bin", "chunks.npz", "filenames.json"):
+        os.remove(generation / name)
+    restarted = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(index_dir))
+    assert restarted.get_document_count() == 2 and dict(restarted.documents) == dict(pipeline.documents)
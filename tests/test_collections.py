@@ -0,0 +1,139 @@
+import asyncio
+
+import httpx
+import pytest
+
+from models.collection_manager import CollectionBudgetExceeded, CollectionManager
+from models.qa_pipeline import QAPipeline
+
+
+@pytest.fixture
+def upload_api(api, monkeypatch, tmp_path):
+    from test_upload import InlineParserPool
+
+    monkeypatch.setattr(api, "parser_pool", InlineParserPool())
+    monkeypatch.setattr(api, "UPLOAD_DIR", str(tmp_path))
+    return api
+
+
+def make_manager(tmp_path, fake_embeddings, fake_llm, **kwargs):
+    def open_collection(name, directory):
+        return QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=directory)
+
+    return CollectionManager(str(tmp_path), open_collection, **kwargs)
+
+
+def run_requests(app, api, steps):
+    """Run (method, path, kwargs) requests in order, waiting for each accepted upload job to finish."""
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = []
+            for method, path, kwargs in steps:
+                response = await client.request(method, path, **kwargs)
+                if response.status_code == 202:
+                    await api.ingestion_queue.wait(response.json()["job_id"])
+                responses.append(response)
+            return responses
+
+    return asyncio.run(run())
+
+
+def files(*pairs):
+    return {"files": [("files", (name, text.encode(), "text/plain")) for name, text in pairs]}
+
+
+def test_routes_are_scoped_by_collection_without_a_document_cap(upload_api, app):
+    many = [(f"doc{n}.txt", f"Document number {n} is about topic {n}.") for n in range(12)]
+    responses = run_requests(app, upload_api, [
+        ("POST", "/collections/team-a/upload", files(*many)),
+        ("POST", "/collections/team-b/upload", files(("france.txt", "The capital of France is Paris."))),
+        ("GET", "/collections/team-a/documents", {}),
+        ("GET", "/collections/team-b/documents", {}),
+        ("POST", "/collections/team-b/query", {"data": {"query": "capital?"}}),
+        ("POST", "/collections/team-a/delete", {"data": {"filename": "doc0.txt"}}),
+        ("GET", "/documents", {}),
+        ("GET", "/collections", {}),
+        ("POST", "/collections/bad name/query", {"data": {"query": "capital?"}}),
+    ])
+
+    assert responses[0].status_code == 202
+    assert len(responses[2].json()) == 12
+    assert responses[3].json() == ["france.txt"]
+    assert responses[4].json()["references"] == ["france.txt"]
+    assert responses[5].json()["document_count"] == 11
+    assert responses[6].json() == []  # The unscoped routes use the default collection
+    assert {"team-a", "team-b"} <= set(responses[7].json()["collections"])
+    assert responses[8].status_code == 400
+
+
+def test_same_content_may_be_uploaded_to_different_collections(upload_api, app):
+    responses = run_requests(app, upload_api, [
+        ("POST", "/collections/a/upload", files(("one.txt", "shared text"))),
+        ("POST", "/collections/b/upload", files(("two.txt", "shared text"))),
+        ("POST", "/collections/b/upload", files(("three.txt", "shared text"))),
+    ])
+
+    assert [response.status_code for response in responses] == [202, 202, 400]
+
+
+def test_idle_collections_are_evicted_and_reloaded_from_disk(tmp_path, fake_embeddings, fake_llm):
+    manager = make_manager(tmp_path, fake_embeddings, fake_llm, max_resident_bytes=1)
+
+    with manager.use("a") as pipeline:
+        pipeline.index_documents(["The capital of France is Paris."], ["france.txt"])
+        pipeline.summarizer.wait()
+    with manager.use("b") as pipeline:
+        pipeline.index_documents(["The capital of Italy is Rome."], ["italy.txt"])
+        pipeline.summarizer.wait()
+        assert "a" not in manager.resident  # Over budget: the idle collection went first
+
+    with manager.use("a") as pipeline:
+        assert pipeline.get_uploaded_filenames() == ["france.txt"]
+        assert pipeline.answer_query("capital?")[1] == ["france.txt"]
+    assert manager.stats()["loads"] == 3
+    assert manager.stats()["evictions"] >= 2
+
+
+def test_collections_in_use_are_not_evicted(tmp_path, fake_embeddings, fake_llm):
+    manager = make_manager(tmp_path, fake_embeddings, fake_llm, max_resident_bytes=1)
+
+    with manager.use("a") as held:
+        held.index_documents(["The capital of France is Paris."], ["france.txt"])
+        held.summarizer.wait()
+        with manager.use("b"):
+            pass
+        assert manager.resident["a"] is held
+
+
+def test_collection_budget_is_enforced(tmp_path, fake_embeddings, fake_llm):
+    manager = make_manager(tmp_path, fake_embeddings, fake_llm, collection_max_bytes=1000)
+    pipeline = manager.get("small")
+
+    manager.check_budget("small", pipeline, 999)
+    with pytest.raises(CollectionBudgetExceeded):
+        manager.check_budget("small", pipeline, 1001)
+
+
+def test_upload_over_collection_budget_fails_the_file(upload_api, app, monkeypatch):
+    monkeypatch.setattr(upload_api.collections, "collection_max_bytes", 100)
+
+    responses = run_requests(app, upload_api, [
+        ("POST", "/collections/tiny/upload", files(("big.txt", "x" * 200))),
+    ])
+    status = upload_api.ingestion_queue.get(responses[0].json()["job_id"]).status()
+
+    assert status["files"][0]["stage"] == "failed"
+    assert "budget" in status["files"][0]["error"]
+    assert upload_api.collections.get("tiny").get_document_count() == 0
+
+
+def test_legacy_index_is_adopted_as_default_collection(tmp_path, fake_embeddings, fake_llm):
+    legacy = tmp_path / "index"
+    QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(legacy)).index_documents(
+        ["The capital of France is Paris."], ["france.txt"])
+    manager = make_manager(tmp_path / "collections", fake_embeddings, fake_llm)
+
+    assert manager.adopt("default", str(legacy))
+    assert not manager.adopt("default", str(legacy))
+    assert manager.get("default").get_uploaded_filenames() == ["france.txt"]
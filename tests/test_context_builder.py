@@ -0,0 +1,103 @@
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from models.context_builder import ContextBuilder, approximate_tokens, merge_overlapping
+from models.qa_pipeline import QAPipeline
+
+
+def words(count, start=0):
+    return " ".join(f"word{n}" for n in range(start, start + count))
+
+
+def test_merge_drops_the_splitter_overlap():
+    text = words(400)
+    first, second = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_text(text)[:2]
+
+    merged = merge_overlapping(first, second)
+
+    assert text.startswith(merged)
+    assert len(merged) < len(first) + len(second)
+
+
+def test_unrelated_neighbours_are_joined_not_spliced():
+    assert merge_overlapping("ends with e", "e starts here") == "ends with e\ne starts here"
+
+
+def test_adjacent_chunks_of_a_file_become_one_section():
+    chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_text(words(400))
+    retrieved = [
+        {"id": 11, "text": chunks[1], "filename": "a.txt"},
+        {"id": 10, "text": chunks[0], "filename": "a.txt"},
+        {"id": 30, "text": "Unrelated note.", "filename": "b.txt"},
+    ]
+    builder = ContextBuilder(max_tokens=10_000)
+
+    context, used = builder.build(retrieved, np.eye(3))
+
+    assert used == [11, 10, 30]
+    assert context.split("\n\n") == [merge_overlapping(chunks[0], chunks[1]), "Unrelated note."]
+
+
+def test_near_duplicates_are_dropped_and_budget_is_respected():
+    vectors = np.array([[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    retrieved = [
+        {"id": 1, "text": words(50, 1000), "filename": "a.txt"},
+        {"id": 5, "text": words(50, 1000), "filename": "copy.txt"},  # Same content as id 1
+        {"id": 9, "text": words(50, 2000), "filename": "b.txt"},
+        {"id": 20, "text": words(50, 3000), "filename": "c.txt"},
+    ]
+    tokens_per_chunk = approximate_tokens([retrieved[0]["text"]])[0]
+    builder = ContextBuilder(max_tokens=2 * tokens_per_chunk + 1)
+
+    context, used = builder.build(retrieved, vectors)
+
+    assert used == [1, 9]
+    assert approximate_tokens([context])[0] <= builder.max_tokens
+    assert builder.stats()["duplicates_dropped"] == 1
+
+
+def test_relevance_follows_retrieval_scores_not_just_rank():
+    vectors = np.array([[1.0, 0.0, 0.0], [0.6, 0.8, 0.0], [0.0, 0.0, 1.0]])  # The second is 0.6 similar to the first
+    retrieved = [{"id": i, "text": words(50, 1000 * (i + 1)), "filename": f"{i}.txt"} for i in range(3)]
+    tokens_per_chunk = approximate_tokens([retrieved[0]["text"]])[0]
+    builder = ContextBuilder(max_tokens=2 * tokens_per_chunk + 1)
+
+    assert builder.build(retrieved, vectors)[1] == [0, 1]  # By rank the second is clearly ahead of the third
+    # The scores show both trail the first by far and each other barely, so the one unlike the first wins
+    assert builder.build(retrieved, vectors, [10.0, 2.0, 1.9])[1] == [0, 2]
+    assert builder.build(retrieved, vectors, [10.0, 9.9, 1.0])[1] == [0, 1]
+
+
+def test_headroom_is_left_unused():
+    retrieved = [{"id": i, "text": words(50, 1000 * (i + 1)), "filename": f"{i}.txt"} for i in range(2)]
+    tokens_per_chunk = approximate_tokens([retrieved[0]["text"]])[0]
+
+    assert ContextBuilder(max_tokens=2 * tokens_per_chunk + 1).build(retrieved, np.eye(2))[1] == [0, 1]
+    assert ContextBuilder(max_tokens=2 * tokens_per_chunk + 1, token_headroom=0.2).build(retrieved, np.eye(2))[1] == [0]
+
+
+def test_best_chunk_is_kept_even_over_budget():
+    context, used = ContextBuilder(max_tokens=1).build([{"id": 0, "text": words(100), "filename": "a.txt"}], [[1.0]])
+
+    assert used == [0]
+    assert context == words(100)
+
+
+def test_pipeline_prompt_skips_repeated_overlap(fake_embeddings, fake_llm):
+    counted = []
+
+    def count_tokens(texts):
+        counted.extend(texts)
+        return approximate_tokens(texts)
+
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, context_builder=ContextBuilder(count_tokens=count_tokens))
+    text = words(400)
+    pipeline.index_documents([text], ["long.txt"])
+    chunk_ids = pipeline.chunk_ids["long.txt"]
+
+    context, used, references = pipeline.build_context(chunk_ids, [pipeline.vector_store.documents[i] for i in chunk_ids])
+
+    assert context == text
+    assert references == ["long.txt"]
+    assert sorted(used) == chunk_ids
+    assert counted  # Budget checks went through the configured counter
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from parsers.crawler import CrawlOptions, Crawler, crawl_urls, normalize_url
+
+
+class LinkServer(ThreadingHTTPServer):
+    """Serves /page/<n> (with an ETag) and /slow/<n> after ``delay`` seconds, recording requests."""
+
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, delay=0.0):
+        super().__init__(("127.0.0.1", 0), LinkHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = []  # (path, If-None-Match header)
+        self.active = 0
+        self.max_active = 0
+        self.version = "v1"
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class LinkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so the client can reuse connections
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.headers.get("If-None-Match")))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path.startswith("/slow/"):
+                time.sleep(server.delay)
+            etag = f'"{server.version}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = f"<html><body><p>Page {self.path} {server.version}</p></body></html>".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = LinkServer(delay=0.3)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_normalize_url_adds_scheme_and_drops_fragment_and_punctuation():
+    assert normalize_url("www.Example.com/a#top") == "http://www.example.com/a"
+    assert normalize_url("https://example.com/docs/page.html).") == "https://example.com/docs/page.html"
+
+
+def test_links_are_fetched_concurrently_within_the_per_host_limit(server):
+    urls = [server.url(f"/slow/{n}") for n in range(8)]
+    options = CrawlOptions(per_host=4)
+
+    start = time.perf_counter()
+    results = crawl_urls(urls, options)
+    elapsed = time.perf_counter() - start
+
+    assert list(results) == urls
+    assert results[urls[3]] == "Page /slow/3 v1"
+    assert server.max_active == 4
+    assert elapsed < 8 * server.delay / 2  # Two rounds of four, not eight requests in a row
+
+
+def test_repeated_links_are_fetched_once(server):
+    page = server.url("/page/1")
+    results = crawl_urls([page, page + "#section", page + ".", server.url("/page/2")])
+
+    assert list(results) == [page, server.url("/page/2")]
+    assert sorted(path for path, _ in server.requests) == ["/page/1", "/page/2"]
+
+
+def test_cached_pages_are_revalidated_with_their_etag(server, tmp_path):
+    options = CrawlOptions(cache_path=str(tmp_path / "crawl.sqlite3"))
+    page = server.url("/page/1")
+
+    first = Crawler(options)
+    assert asyncio.run(first.crawl([page]))[page] == "Page /page/1 v1"
+    second = Crawler(options)
+    assert asyncio.run(second.crawl([page]))[page] == "Page /page/1 v1"
+    assert second.stats()["not_modified"] == 1
+    assert server.requests == [("/page/1", None), ("/page/1", '"v1"')]
+
+    server.version = "v2"
+    assert crawl_urls([page], options)[page] == "Page /page/1 v2"  # A changed page is downloaded again
+
+
+def test_crawl_stops_at_its_budget(server):
+    server.delay = 5
+    urls = [server.url("/page/1"), server.url("/slow/1")]
+
+    start = time.perf_counter()
+    results = crawl_urls(urls, CrawlOptions(budget_seconds=0.5))
+
+    assert time.perf_counter() - start < 2
+    assert results[urls[0]] == "Page /page/1 v1"
+    assert results[urls[1]].startswith("Web Crawling Error: crawl budget")
+
+
+def test_unreachable_and_excess_links_become_errors(server):
+    results = crawl_urls(["http://127.0.0.1:9/missing", server.url("/page/1"), server.url("/page/2")],
+                         CrawlOptions(max_urls=2, timeout=1))
+
+    assert results["http://127.0.0.1:9/missing"].startswith("Web Crawling Error")
+    assert results[server.url("/page/2")] == "Web Crawling Error: link limit reached"
+
+
+def test_process_file_appends_each_linked_page_once(server, tmp_path, monkeypatch):
+    import utils.file_processor
+
+    monkeypatch.setattr(utils.file_processor, "CRAWL_OPTIONS", CrawlOptions())
+    path = tmp_path / "links.txt"
+    path.write_text(f"See {server.url('/page/1')} and {server.url('/page/2')}, then {server.url('/page/1')} again.")
+
+    text, _, filename = utils.file_processor.process_file(str(path))
+
+    assert text.count("Content from") == 2
+    assert f"Content from {server.url('/page/2')}:\nPage /page/2 v1" in text
@@ -0,0 +1,83 @@
+import numpy as np
+
+from models.embedding_cache import CachedEmbeddings, EmbeddingCache
+from models.qa_pipeline import QAPipeline
+
+
+def test_cached_embeddings_only_embed_misses(tmp_path, fake_embeddings):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    embeddings = CachedEmbeddings(fake_embeddings, cache, model_name="fake")
+
+    first = embeddings.embed_documents(["a", "b", "a"])
+    assert fake_embeddings.embedded_texts == 2  # Duplicates inside a batch are embedded once
+    second = embeddings.embed_documents(["b", "c"])
+    assert fake_embeddings.embedded_texts == 3
+    assert second[0] == first[1]
+    assert np.allclose(first[0], fake_embeddings.embed_documents(["a"])[0])
+    assert cache.hits == 1
+    assert cache.misses == 4
+
+
+def test_cache_is_keyed_by_model_name(tmp_path, fake_embeddings):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    CachedEmbeddings(fake_embeddings, cache, model_name="one").embed_documents(["same text"])
+    CachedEmbeddings(fake_embeddings, cache, model_name="two").embed_documents(["same text"])
+    assert fake_embeddings.embedded_texts == 2
+    assert len(cache) == 2
+
+
+def test_cache_persists_across_reopen(tmp_path, fake_embeddings):
+    path = str(tmp_path / "cache.sqlite3")
+    CachedEmbeddings(fake_embeddings, EmbeddingCache(path), model_name="fake").embed_documents(["x", "y"])
+
+    reopened = EmbeddingCache(path)
+    assert reopened.total_bytes == 2 * 32 * 4
+    CachedEmbeddings(fake_embeddings, reopened, model_name="fake").embed_documents(["x", "y"])
+    assert fake_embeddings.embedded_texts == 2
+    assert reopened.stats()["hit_rate"] == 1.0
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    vector_bytes = 4 * 4
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=3 * vector_bytes)
+    cache.put_many("m", ["a", "b", "c"], [np.ones(4)] * 3)
+    cache.get_many("m", ["a"])  # "b" is now the least recently used entry
+    cache.put_many("m", ["d"], [np.ones(4)])
+
+    assert len(cache) == 3
+    assert cache.total_bytes == 3 * vector_bytes
+    hits = [vector is not None for vector in cache.get_many("m", ["a", "b", "c", "d"])]
+    assert hits == [True, False, True, True]
+
+
+def test_reupload_after_delete_is_served_from_cache(tmp_path, fake_embeddings, fake_llm):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, embedding_cache=cache)
+    pipeline.index_documents(["Shared boilerplate."], ["a.txt"])
+    pipeline.delete_document("a.txt")
+    pipeline.index_documents(["Shared boilerplate."], ["a.txt"])
+
+    assert fake_embeddings.embedded_texts == 1
+    assert pipeline.get_cache_stats()["embedding_cache"]["hits"] == 1
+
+
+def test_queries_bypass_the_document_cache(tmp_path, fake_embeddings):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    embeddings = CachedEmbeddings(fake_embeddings, cache, model_name="fake")
+
+    assert embeddings.embed_query("question?") == fake_embeddings.embed_query("question?")
+    assert len(cache) == 0
+    assert cache.hits == cache.misses == 0
+
+
+def test_eviction_accounts_for_entries_written_by_other_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    vector_bytes = 4 * 4
+    first = EmbeddingCache(path, max_bytes=2 * vector_bytes)
+    second = EmbeddingCache(path, max_bytes=2 * vector_bytes)
+    first.put_many("m", ["a"], [np.ones(4)])
+    second.put_many("m", ["b"], [np.ones(4)])
+    first.put_many("m", ["c"], [np.ones(4)])
+
+    assert len(first) == 2
+    assert first.total_bytes == 2 * vector_bytes
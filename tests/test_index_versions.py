@@ -0,0 +1,178 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from models.index_version import IndexVersions
+from models.qa_pipeline import QAPipeline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXTS = {
+    "france.txt": "Paris is the capital of France.",
+    "italy.txt": "Rome is the capital of Italy.",
+    "germany.txt": "Berlin is the capital of Germany.",
+}
+
+
+def shared(index_dir, fake_embeddings, fake_llm, **options):
+    return QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir, shared_index=True, **options)
+
+
+def test_retired_chunks_are_purged_once_the_versions_reading_them_are_released():
+    purged = []
+    versions = IndexVersions(purged.append)
+
+    with versions.pin() as pinned:
+        versions.publish(None, None, retired_ids=[1, 2])
+        with versions.pin():
+            versions.publish(None, None, retired_ids=[3])
+        assert purged == [] and versions.current.deleted == {1, 2, 3}
+
+    assert purged == [[1, 2], [3]] and pinned.number == 0
+    assert versions.current.deleted == frozenset() and versions.stats()["retired_chunks"] == 0
+
+
+def test_pinned_query_reads_its_version_through_a_delete_and_an_upload(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm)
+    pipeline.index_documents([TEXTS["france.txt"], TEXTS["italy.txt"]], ["france.txt", "italy.txt"])
+    france = pipeline.chunk_ids["france.txt"]
+
+    with pipeline.versions.pin() as version:
+        pipeline.delete_document("france.txt")
+        pipeline.index_documents([TEXTS["germany.txt"]], ["germany.txt"])
+
+        _, docs, references = pipeline.retrieve(fake_embeddings.embed_query(TEXTS["france.txt"]), version=version)
+        assert references[0] == "france.txt" and docs[0].page_content == TEXTS["france.txt"]
+        assert "germany.txt" not in references  # Added after the version was published
+        assert "france.txt" not in pipeline.retrieve(fake_embeddings.embed_query(TEXTS["france.txt"]))[2]
+        assert all(chunk_id in pipeline.documents for chunk_id in france)  # Kept for the pinned query
+
+    assert not any(chunk_id in pipeline.documents for chunk_id in france)
+    assert pipeline.lexical_index.search("Paris", 5) == []
+    assert pipeline.get_cache_stats()["index_versions"]["retired_chunks"] == 0
+
+
+class DeletingReranker:
+    """Reranker stand-in that deletes a document while the query awaits it, as a concurrent /delete would."""
+
+    def __init__(self, pipeline, filename):
+        self.pipeline, self.filename = pipeline, filename
+
+    def rerank(self, query, texts, top_k, scores=None):
+        self.pipeline.delete_document(self.filename)
+        order = list(range(min(top_k, len(texts))))
+        if scores is not None:
+            scores.extend(-float(i) for i in order)
+        return order
+
+    def stats(self):
+        return {}
+
+
+def test_delete_during_an_async_query_does_not_change_what_it_reads(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, rerank_top_k=2)
+    pipeline.index_documents([TEXTS["france.txt"], TEXTS["italy.txt"]], ["france.txt", "italy.txt"])
+    pipeline.reranker = DeletingReranker(pipeline, "france.txt")
+
+    response, references = asyncio.run(pipeline.aanswer_query("Paris is the capital of France."))
+
+    assert sorted(references) == ["france.txt", "italy.txt"]
+    assert pipeline.get_uploaded_filenames() == ["italy.txt"] and len(pipeline.documents) == 1
+
+
+def test_shared_workers_follow_each_others_log_in_place(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    first = shared(index_dir, fake_embeddings, fake_llm)
+    first.index_documents([TEXTS["france.txt"]], ["france.txt"])
+    second = shared(index_dir, fake_embeddings, fake_llm)
+    assert second.get_uploaded_filenames() == ["france.txt"]
+    vector_store, lexical_index = second.vector_store, second.lexical_index
+
+    first.index_documents([TEXTS["italy.txt"]], ["italy.txt"])
+    second.index_documents([TEXTS["germany.txt"]], ["germany.txt"])
+    first.delete_document("france.txt")
+
+    assert second.get_uploaded_filenames() == first.get_uploaded_filenames() == ["italy.txt", "germany.txt"]
+    assert second.vector_store is vector_store and second.lexical_index is lexical_index  # Applied, not reloaded
+    assert second.chunk_ids == first.chunk_ids and sorted(first.documents) == sorted(second.documents)
+    assert second.answer_query(TEXTS["italy.txt"])[1][0] == "italy.txt"
+    assert first.answer_query(TEXTS["germany.txt"])[1][0] == "germany.txt"
+
+
+def test_shared_workers_map_the_snapshot_after_a_compaction(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    first = shared(index_dir, fake_embeddings, fake_llm)
+    first.index_documents([TEXTS["france.txt"], TEXTS["italy.txt"]], ["france.txt", "italy.txt"])
+    second = shared(index_dir, fake_embeddings, fake_llm)
+    assert second.get_document_count() == 2
+    lexical_index = second.lexical_index
+
+    first.index_store.min_compact_bytes = 0
+    first.delete_document("italy.txt")
+    first.index_documents([TEXTS["germany.txt"]], ["germany.txt"])
+
+    assert second.get_uploaded_filenames() == ["france.txt", "germany.txt"]
+    assert second.index_store.generation == first.index_store.generation
+    for pipeline in (first, second):
+        # France is mapped from the snapshot the delete compacted to; Germany was added after it, from the log
+        assert pipeline.vector_store.base.ntotal == 1 and pipeline.vector_store.index.ntotal == 1
+        assert pipeline.documents.stats()["mapped_bytes"] > 0
+    assert second.lexical_index is lexical_index  # Caught up with the old log rather than rebuilt
+    assert second.answer_query(TEXTS["germany.txt"])[1][0] == "germany.txt"
+    query = np.asarray(fake_embeddings.embed_query(TEXTS["france.txt"]))
+    assert second.vector_store.search_ids(query, k=1)[0] == first.chunk_ids["france.txt"]
+    generations = [name for name in os.listdir(index_dir) if name.startswith("gen-")]
+    assert len(generations) == 2  # The previous one stays for workers that have not caught up yet
+
+    second.delete_document("france.txt")  # Hides a mapped vector; the mapping itself is never written to
+    assert first.get_uploaded_filenames() == ["germany.txt"] and len(first.vector_store) == 1
+    assert shared(index_dir, fake_embeddings, fake_llm).get_uploaded_filenames() == ["germany.txt"]
+
+
+WRITER = """
+import sys
+sys.path.insert(0, "tests")
+from conftest import CountingEmbeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from models.qa_pipeline import QAPipeline
+
+index_dir, name, mode = sys.argv[1:]
+pipeline = QAPipeline(embeddings=CountingEmbeddings(), llm=FakeListChatModel(responses=["-"]), index_dir=index_dir,
+                      shared_index=True)
+if mode == "crash":
+    pipeline.begin_document(name)
+    pipeline.add_chunks(name, ["Half of an upload."], pipeline.embed_chunks(["Half of an upload."]))
+    raise SystemExit(0)  # Without finish_document
+for n in range(10):
+    pipeline.index_documents([f"{name} document {n} text."], [f"{name}-{n}.txt"])
+"""
+
+
+def run_writers(index_dir, *workers):
+    processes = [subprocess.Popen([sys.executable, "-c", WRITER, index_dir, name, mode], cwd=ROOT,
+                                  stderr=subprocess.PIPE, text=True) for name, mode in workers]
+    for process in processes:
+        assert process.wait(timeout=120) == 0, process.stderr.read()[-2000:]
+
+
+def test_concurrent_worker_processes_write_one_consistent_index(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    reader = shared(index_dir, fake_embeddings, fake_llm)
+    reader.index_documents([TEXTS["france.txt"]], ["france.txt"])
+
+    run_writers(index_dir, ("alpha", "write"), ("beta", "write"), ("gamma", "crash"))
+
+    assert reader.get_document_count() == 21
+    ids = [chunk_id for chunk_ids in reader.chunk_ids.values() for chunk_id in chunk_ids]
+    assert len(ids) == len(set(ids)) == 22  # The exited writer's half upload is still there, unlisted
+    assert "gamma" in reader.index_store.abandoned()
+
+    reader.index_store.min_compact_bytes = 0
+    reader.index_documents([TEXTS["italy.txt"]], ["italy.txt"])
+
+    assert "gamma" not in reader.chunk_ids and not reader.index_store.pending
+    restarted = shared(index_dir, fake_embeddings, fake_llm)
+    assert sorted(restarted.get_uploaded_filenames()) == sorted(reader.get_uploaded_filenames())
+    assert restarted.chunk_ids == reader.chunk_ids and len(restarted.vector_store) == 22
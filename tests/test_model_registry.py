@@ -0,0 +1,109 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from conftest import CountingEmbeddings
+from models.embedding_cache import CachedEmbeddings, EmbeddingCache
+from models.model_registry import LazyEmbeddings, LazyModel, ModelRegistry
+from models.qa_pipeline import QAPipeline
+
+
+class CountingFactory:
+    def __init__(self, delay=0.0, failures=0):
+        self.delay = delay
+        self.failures = failures  # Calls that raise before one succeeds
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.calls <= self.failures:
+            raise OSError("model hub unreachable")
+        return CountingEmbeddings()
+
+
+def test_concurrent_first_uses_load_the_model_once():
+    registry = ModelRegistry()
+    factory = CountingFactory(delay=0.1)
+    registry.register("embeddings", factory)
+    models = []
+
+    threads = [threading.Thread(target=lambda: models.append(registry.get("embeddings"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert factory.calls == 1
+    assert all(model is models[0] for model in models)
+    assert registry.status()["embeddings"]["load_seconds"] >= 0.1
+
+
+def test_readiness_waits_for_required_models_and_reports_failures():
+    registry = ModelRegistry()
+    registry.register("embeddings", CountingFactory(failures=1))
+    registry.register("reranker", CountingFactory(failures=5), required=False)
+
+    assert not registry.warm_up()
+    assert registry.status()["embeddings"] == {"required": True, "loaded": False, "load_seconds": None,
+                                               "error": "model hub unreachable"}
+    assert registry.warm_up()  # A later attempt succeeds; the optional model does not hold readiness back
+    assert registry.status()["embeddings"]["error"] is None
+    assert not registry.status()["reranker"]["loaded"]
+
+
+def test_pipelines_share_lazy_models_loaded_on_first_use(tmp_path):
+    registry = ModelRegistry()
+    embedding_factory = CountingFactory()
+    registry.register("embeddings", embedding_factory)
+    registry.register("llm", lambda: FakeListChatModel(responses=["summary"] * 3))
+    embeddings = LazyEmbeddings(registry, "embeddings", "all-MiniLM-L6-v2")
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    pipelines = [QAPipeline(embeddings=embeddings, llm=LazyModel(registry, "llm"), embedding_cache=cache)
+                 for _ in range(3)]
+    assert embedding_factory.calls == 0 and registry.status()["llm"]["loaded"] is False
+    assert CachedEmbeddings(embeddings, cache).model_name == "all-MiniLM-L6-v2"
+
+    for n, pipeline in enumerate(pipelines):
+        pipeline.index_documents([f"Document {n} text."], [f"doc{n}.txt"])
+
+    assert embedding_factory.calls == 1
+    assert registry.get("embeddings").embedded_texts == 3  # One model instance served every collection
+
+
+def test_importing_the_api_loads_no_models_or_heavy_libraries(tmp_path):
+    code = ("import sys, backend.api\n"
+            "from models.model_registry import MODELS\n"
+            "heavy = ['sentence_transformers', 'torch', 'langchain_google_genai', 'unstructured.partition.auto']\n"
+            "print([name for name in heavy if name in sys.modules], [n for n, s in MODELS.status().items() "
+            "if s['loaded']])")
+    env = {**os.environ, "INDEX_DIR": str(tmp_path / "index"), "COLLECTIONS_DIR": str(tmp_path / "collections")}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, timeout=120,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert result.stdout.strip().splitlines()[-1] == "[] []"
+
+
+def test_readyz_turns_ready_once_the_required_models_are_loaded(api, app):
+    from models.model_registry import MODELS
+
+    async def probe(path):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path)
+
+    assert asyncio.run(probe("/healthz")).json() == {"status": "ok"}
+    response = asyncio.run(probe("/readyz"))
+    assert response.status_code == 503
+    assert response.json()["models"]["embeddings"]["loaded"] is False
+
+    MODELS.warm_up(["embeddings", "llm"])
+    response = asyncio.run(probe("/readyz"))
+    assert response.status_code == 200 and response.json()["ready"] is True
@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import backend.parsing
+import parsers.ocr
+from parsers.ocr import OcrOptions, is_decorative, ocr_images, ocr_pdf, prepare
+
+CALLS_FILE = "OCR_TEST_CALLS"  # Environment variable naming a file the fake OCR appends to, across processes
+
+
+def fake_ocr(images, lang):
+    """Stands in for tesseract: 'reads' the share of ink on each prepared image."""
+    if os.environ.get(CALLS_FILE):
+        with open(os.environ[CALLS_FILE], "a") as f:
+            f.write(f"{len(images)}\n")
+    return [f"ink {np.mean(np.asarray(image) == 0):.3f}" for image in images]
+
+
+def calls(path):
+    return [int(line) for line in path.read_text().split()] if path.exists() else []
+
+
+def scanned_page(ink_width, size=(850, 1100)):
+    """A white page with a block of 'text' whose width encodes which page it is."""
+    page = Image.new("L", size, 235)
+    draw = ImageDraw.Draw(page)
+    for row in range(100, 700, 30):
+        draw.rectangle((80, row, 80 + ink_width, row + 12), fill=20)
+    return page
+
+
+def write_scanned_pdf(path, pages):
+    images = [scanned_page(100 + 60 * n) for n in range(pages)]
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=100)
+
+
+def test_tiny_and_blank_images_are_decorative():
+    assert is_decorative(Image.new("L", (400, 10), 0))  # A horizontal rule
+    assert is_decorative(Image.new("RGB", (500, 500), (200, 30, 30)))  # A flat fill
+    assert not is_decorative(scanned_page(200))
+
+
+def test_prepare_downsamples_and_binarizes():
+    prepared = prepare(scanned_page(200, size=(2000, 4000)), max_side=1000)
+
+    assert prepared.size == (500, 1000)
+    assert set(np.unique(np.asarray(prepared))) == {0, 255}
+
+
+def test_repeated_images_are_read_once_and_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv(CALLS_FILE, str(tmp_path / "calls"))
+    options = OcrOptions(cache_path=str(tmp_path / "ocr.sqlite3"), ocr_fn=fake_ocr)
+    logo, body = scanned_page(50), scanned_page(300)
+
+    first = ocr_images([logo, body, logo.copy(), Image.new("L", (5, 5))], options)
+    second = ocr_images([body], options)
+
+    assert first[0] == first[2] and first[1] == second[0]
+    assert first[3] == ""  # Skipped as decorative
+    assert calls(tmp_path / "calls") == [2]  # One batch of the two distinct images; the rerun hit the cache
+
+
+def test_pdf_pages_are_read_in_parallel_in_page_order(tmp_path, monkeypatch):
+    monkeypatch.setenv(CALLS_FILE, str(tmp_path / "calls"))
+    path = str(tmp_path / "scan.pdf")
+    write_scanned_pdf(path, pages=5)
+    options = OcrOptions(ocr_fn=fake_ocr)
+
+    serial = ocr_pdf(path, workers=1, options=options)
+    parallel = ocr_pdf(path, workers=2, options=options)
+
+    ink = [float(text.split()[-1]) for text in serial]
+    assert ink == sorted(ink) and len(set(ink)) == 5
+    assert parallel == serial
+    serial_calls, parallel_calls = calls(tmp_path / "calls")[0], calls(tmp_path / "calls")[1:]
+    assert serial_calls == 5 and sorted(parallel_calls) == [2, 3]  # One OCR batch per worker's page range
+
+
+def test_pdfs_with_different_page_counts_share_one_page_pool(tmp_path, monkeypatch):
+    monkeypatch.setenv(CALLS_FILE, str(tmp_path / "calls"))
+    short, long = str(tmp_path / "short.pdf"), str(tmp_path / "long.pdf")
+    write_scanned_pdf(short, pages=2)
+    write_scanned_pdf(long, pages=5)
+    options = OcrOptions(ocr_fn=fake_ocr)
+
+    assert len(ocr_pdf(long, workers=3, options=options)) == 5
+    pool = parsers.ocr._pool
+    assert len(ocr_pdf(short, workers=3, options=options)) == 2
+
+    assert parsers.ocr._pool is pool and parsers.ocr._pool_workers == 3
+    assert sorted(calls(tmp_path / "calls")) == [1, 1, 1, 2, 2]  # Ranges of 2, 2 and 1 pages, then 1 and 1
+
+
+def test_extract_text_ocrs_only_pages_without_text(tmp_path, monkeypatch):
+    path = str(tmp_path / "scan.pdf")
+    write_scanned_pdf(path, pages=2)
+    monkeypatch.setattr(backend.parsing, "OCR_OPTIONS", OcrOptions(ocr_fn=fake_ocr))
+    monkeypatch.setattr(backend.parsing, "OCR_WORKERS_PER_PARSER", 1)
+
+    text = backend.parsing.extract_text(path, "scan.pdf")
+
+    assert text.count("ink ") == 2
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+
+from models.embedder import SentenceTransformerEmbeddings
+from models.onnx_embedder import HUB_ONNX_FILE, OnnxEmbeddings, export_onnx, onnx_model_name
+
+TEXTS = [
+    "Quarterly revenue grew in the north region.",
+    "The customer asked when the pending order will be shipped.",
+    "Invoices are due thirty days after the end of the quarter.",
+    "Shipping",
+    "Revenue by region: north 120, south 95, east 80, west 110. The south region missed its target again "
+    "because two large orders were shipped late.",
+    "",
+]
+
+
+def cosines(first, second):
+    first, second = np.asarray(first), np.asarray(second)
+    return (first * second).sum(axis=1) / np.linalg.norm(first, axis=1) / np.linalg.norm(second, axis=1)
+
+
+@pytest.fixture(scope="module")
+def small_model(tmp_path_factory):
+    """A randomly initialized 2-layer BERT with its own WordPiece vocabulary, saved as a sentence-transformers model."""
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from tokenizers import Tokenizer, normalizers, pre_tokenizers, processors, trainers
+    from tokenizers.models import WordPiece
+    from transformers import BertConfig, BertModel, PreTrainedTokenizerFast
+
+    directory = tmp_path_factory.mktemp("small-bert")
+    tokenizer = Tokenizer(WordPiece(unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.train_from_iterator(TEXTS * 10, trainers.WordPieceTrainer(
+        vocab_size=400, special_tokens=["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]))
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", tokenizer.token_to_id("[CLS]")), ("[SEP]", tokenizer.token_to_id("[SEP]"))])
+    fast = PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]", pad_token="[PAD]",
+                                   cls_token="[CLS]", sep_token="[SEP]", mask_token="[MASK]")
+    torch.manual_seed(0)
+    BertModel(BertConfig(vocab_size=len(fast), hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+                         intermediate_size=128)).save_pretrained(directory / "bert")
+    fast.save_pretrained(directory / "bert")
+    transformer = models.Transformer(str(directory / "bert"), max_seq_length=256)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), "mean")
+    model = SentenceTransformer(modules=[transformer, pooling, models.Normalize()], device="cpu")
+    model.save(str(directory / "sentence-transformer"))
+    export_onnx(str(directory / "sentence-transformer"), str(directory / "onnx"))
+    return model, str(directory / "onnx")
+
+
+def test_exported_float_graph_matches_pytorch(small_model):
+    model, directory = small_model
+    expected = SentenceTransformerEmbeddings("small", model=model).embed_documents(TEXTS)
+
+    vectors = OnnxEmbeddings("small", path=directory, onnx_file="model.onnx", batch_size=4).embed_documents(TEXTS)
+
+    assert cosines(vectors, expected).min() > 0.9999
+
+
+def test_int8_vectors_agree_with_pytorch(small_model):
+    model, directory = small_model
+    expected = np.asarray(SentenceTransformerEmbeddings("small", model=model).embed_documents(TEXTS))
+    embeddings = OnnxEmbeddings("small", path=directory, batch_size=4)
+
+    vectors = np.asarray(embeddings.embed_documents(TEXTS))
+
+    assert embeddings.model_name == onnx_model_name("small")  # Cached apart from the PyTorch vectors
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1, atol=1e-5)
+    assert cosines(vectors, expected).min() > 0.99
+    assert np.abs(vectors @ vectors.T - expected @ expected.T).max() < 0.02  # Similarities, so rankings, hold
+    # Activations are quantized per batch, so a lone query differs from the same text in a batch by ~1e-4
+    assert embeddings.embed_query(TEXTS[1]) == pytest.approx(vectors[1].tolist(), abs=1e-3)
+
+
+def test_all_minilm_int8_agrees_with_pytorch():
+    from huggingface_hub import try_to_load_from_cache
+
+    repository = "sentence-transformers/all-MiniLM-L6-v2"
+    if not all(isinstance(try_to_load_from_cache(repository, name), str)
+               for name in ("config.json", "tokenizer.json", HUB_ONNX_FILE)):
+        pytest.skip("all-MiniLM-L6-v2 and its ONNX export are not in the local model cache")
+    expected = SentenceTransformerEmbeddings("all-MiniLM-L6-v2").embed_documents(TEXTS)
+    embeddings = OnnxEmbeddings("all-MiniLM-L6-v2")
+
+    assert cosines(embeddings.embed_documents(TEXTS), expected).min() > 0.99
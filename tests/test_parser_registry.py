@@ -0,0 +1,152 @@
+import pytest
+
+import parsers.registry
+from parsers.registry import BAD_AFTER, MIN_SAMPLES, ParserRegistry
+
+
+class FakeBackend:
+    """Counts calls; returns ``text`` or raises ``error``."""
+
+    def __init__(self, text="parsed", error=None):
+        self.text = text
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, file_path, filename):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+
+@pytest.fixture
+def upload(tmp_path):
+    path = tmp_path / "upload.docx"
+    path.write_bytes(b"x" * 1000)
+    return str(path)
+
+
+def names(registry, extension=".docx"):
+    return [backend.name for backend in registry.order(extension)]
+
+
+def test_measured_backends_are_tried_fastest_first():
+    registry = ParserRegistry()
+    for name in ("slow", "fast", "new"):
+        registry.register([".docx"], name, FakeBackend())
+    for _ in range(MIN_SAMPLES):
+        registry.stats_store.record(".docx", "slow", True, False, 1000, 0.01)
+        registry.stats_store.record(".docx", "fast", True, False, 1000, 0.001)
+
+    assert names(registry) == ["fast", "slow", "new"]  # Unmeasured backends keep their default order after
+    assert registry.stats()[".docx"]["fast"]["mb_per_second"] == pytest.approx(1000 / 0.001 / 2 ** 20)
+
+
+def test_failing_backend_falls_through_and_is_skipped_once_known_bad(upload):
+    registry = ParserRegistry()
+    broken, working = FakeBackend(error=ImportError("jq is not installed")), FakeBackend("text")
+    registry.register([".docx"], "broken", broken)
+    registry.register([".docx"], "working", working)
+
+    results = [registry.parse(upload, "upload.docx") for _ in range(MIN_SAMPLES + 3)]
+
+    assert results == ["text"] * (MIN_SAMPLES + 3)
+    assert broken.calls == MIN_SAMPLES  # Once measured, the working backend is tried first
+    for _ in range(BAD_AFTER - MIN_SAMPLES):
+        registry.stats_store.record(".docx", "broken", False, True, 1000, 0.0)
+    assert names(registry) == ["working"]
+    assert registry.stats()[".docx"]["broken"]["skipped"]
+
+
+def test_every_nth_file_explores_an_unmeasured_backend(upload, monkeypatch):
+    monkeypatch.setattr(parsers.registry, "EXPLORE_EVERY", 5)
+    registry = ParserRegistry()
+    first, second = FakeBackend("first"), FakeBackend("second")
+    registry.register([".docx"], "first", first)
+    registry.register([".docx"], "second", second)
+
+    results = [registry.parse(upload, "upload.docx") for _ in range(10)]
+
+    assert results.count("second") == 2 and results[4] == "second" and results[9] == "second"
+
+
+def test_blank_text_tries_the_next_backend_and_errors_surface_only_when_all_fail(upload):
+    registry = ParserRegistry()
+    registry.register([".docx"], "blank", FakeBackend("  \n"))
+    registry.register(None, "last-resort", FakeBackend("from the last resort"))
+    assert registry.parse(upload, "upload.docx") == "from the last resort"
+
+    failing = ParserRegistry()
+    failing.register([".docx"], "broken", FakeBackend(error=ValueError("corrupt")))
+    failing.register(None, "blank", FakeBackend(""))
+    assert failing.parse(upload, "upload.docx") == ""  # One backend read it and found no text
+
+    broken_only = ParserRegistry()
+    broken_only.register([".docx"], "broken", FakeBackend(error=ValueError("corrupt")))
+    with pytest.raises(ValueError, match="corrupt"):
+        broken_only.parse(upload, "upload.docx")
+
+
+def test_fatal_errors_are_not_retried_with_another_backend(upload):
+    class Deadline(Exception):
+        pass
+
+    registry = ParserRegistry(fatal_errors=(Deadline,))
+    fallback = FakeBackend()
+    registry.register([".docx"], "slow", FakeBackend(error=Deadline()))
+    registry.register([".docx"], "fallback", fallback)
+
+    with pytest.raises(Deadline):
+        registry.parse(upload, "upload.docx")
+    assert fallback.calls == 0
+
+
+def test_streaming_backend_errors_after_its_first_section_are_raised(upload):
+    def pages(file_path, filename):
+        yield "page 1"
+        raise ValueError("truncated file")
+
+    registry = ParserRegistry()
+    fallback = FakeBackend()
+    registry.register([".pdf"], "pages", pages, streaming=True)
+    registry.register([".pdf"], "fallback", fallback)
+
+    sections = registry.sections(upload, "upload.pdf")
+    assert next(sections) == "page 1"
+    with pytest.raises(ValueError, match="truncated"):
+        next(sections)
+    assert fallback.calls == 0  # Its text would repeat the page already consumed
+
+
+def test_counts_are_shared_through_the_stats_file(upload, tmp_path):
+    path = str(tmp_path / "parser_stats.sqlite3")
+    first = ParserRegistry(path)
+    first.register([".docx"], "broken", FakeBackend(error=ValueError("corrupt")))
+    first.register([".docx"], "working", FakeBackend())
+    for _ in range(BAD_AFTER):
+        first.parse(upload, "upload.docx")
+    for _ in range(BAD_AFTER - MIN_SAMPLES):
+        first.stats_store.record(".docx", "broken", False, True, 1000, 0.0)
+
+    second = ParserRegistry(path)  # e.g. another parser worker process
+    second.register([".docx"], "broken", FakeBackend(error=ValueError("corrupt")))
+    second.register([".docx"], "working", FakeBackend())
+    assert names(second) == ["working"]
+    assert second.stats()[".docx"]["working"]["attempts"] == BAD_AFTER
+
+
+def test_extract_text_uses_the_direct_parsers(tmp_path):
+    from docx import Document
+
+    from backend.parsing import extract_text
+
+    path = tmp_path / "report.docx"
+    doc = Document()
+    doc.add_paragraph("Quarterly report")
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text, table.cell(0, 1).text = "Revenue", "12"
+    doc.save(path)
+    (tmp_path / "data.json").write_text('{"name": "Test"}')
+
+    assert extract_text(str(path), "report.docx") == "Quarterly report\nRevenue | 12"
+    assert extract_text(str(tmp_path / "data.json"), "data.json") == '{\n  "name": "Test"\n}'
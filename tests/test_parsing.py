@@ -0,0 +1,156 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+
+from backend.parsing import ParserPool, extract_text, iter_sections
+from conftest import default_pipeline
+
+
+def slow_parse(file_path, filename):
+    """Stand-in for a CPU-bound parser: burns CPU in the worker process, not in the event loop."""
+    deadline = time.monotonic() + float(os.path.splitext(filename)[0].split("_")[-1])
+    while time.monotonic() < deadline:
+        pass
+    return f"{filename} parsed in process {os.getpid()}"
+
+
+def paged_parse(file_path, filename):
+    """Stand-in for a slow multi-page parser: yields a page every 0.3s."""
+    for page in range(4):
+        time.sleep(0.3)
+        yield f"page {page} of {filename}"
+
+
+def test_extract_text_reads_txt(tmp_path):
+    path = tmp_path / "upload.txt"
+    path.write_text("Plain text content")
+    assert extract_text(str(path), "notes.txt") == "Plain text content"
+
+
+def test_large_text_is_streamed_in_sections(tmp_path):
+    path = tmp_path / "upload.txt"
+    path.write_text("\n".join(f"line {i} " + "y" * 90 for i in range(3000)))
+
+    sections = list(iter_sections(str(path), "big.txt"))
+
+    assert len(sections) > 3
+    assert "\n".join(sections) == extract_text(str(path), "big.txt")
+
+
+def test_parser_pool_streams_pages_while_parsing():
+    pool = ParserPool(max_workers=1, timeout=10, parse_fn=paged_parse)
+
+    async def run():
+        await pool.parse("unused", "warm.pdf")
+        start, arrivals = time.monotonic(), []
+        async for section in pool.stream("unused", "manual.pdf"):
+            arrivals.append((section, time.monotonic() - start))
+        return arrivals
+
+    try:
+        arrivals = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    assert [section for section, _ in arrivals] == [f"page {page} of manual.pdf" for page in range(4)]
+    assert arrivals[0][1] < arrivals[-1][1] - 0.6  # The first page arrived long before the parse finished
+
+
+def test_parser_pool_parses_files_in_parallel():
+    pool = ParserPool(max_workers=3, timeout=10, parse_fn=slow_parse)
+
+    async def run():
+        # Warm the workers up first so process start-up is not part of the measurement
+        await asyncio.gather(*(pool.parse("unused", f"warm{i}_0.2.txt") for i in range(3)))
+        start = time.monotonic()
+        results = await asyncio.gather(*(pool.parse("unused", f"file{i}_0.5.txt") for i in range(3)))
+        return results, time.monotonic() - start
+
+    try:
+        results, elapsed = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    worker_pids = {int(result.split()[-1]) for result in results}
+    assert len(worker_pids) == 3
+    assert os.getpid() not in worker_pids
+    assert elapsed < 1.4  # Serial parsing would take at least 1.5s
+
+
+def test_parser_pool_times_out_without_disturbing_other_parses():
+    pool = ParserPool(max_workers=2, timeout=1.5, parse_fn=slow_parse)
+
+    async def run():
+        sibling = asyncio.ensure_future(pool.parse("unused", "sibling_1.0.txt"))
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.parse("unused", "stuck_30.txt")
+        executor = pool.executor
+        after = await pool.parse("unused", "quick_0.txt")
+        return await sibling, after, executor
+
+    try:
+        start = time.monotonic()
+        sibling, after, executor = asyncio.run(run())
+        assert time.monotonic() - start < 15
+    finally:
+        pool.shutdown()
+
+    assert sibling.startswith("sibling_1.0.txt parsed")
+    assert after.startswith("quick_0.txt parsed")
+    assert executor is not None  # The deadline fired inside the worker; the pool was kept
+
+
+def test_cancelled_parse_does_not_reset_the_pool():
+    pool = ParserPool(max_workers=2, timeout=10, parse_fn=slow_parse)
+
+    async def run():
+        other_client = asyncio.ensure_future(pool.parse("unused", "other_0.8.txt"))
+        cancelled = asyncio.ensure_future(pool.parse("unused", "cancelled_0.8.txt"))
+        await asyncio.sleep(0.3)
+        executor = pool.executor
+        cancelled.cancel()
+        result = await other_client
+        return result, executor is pool.executor
+
+    try:
+        result, same_pool = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    assert result.startswith("other_0.8.txt parsed")
+    assert same_pool
+
+
+def test_query_stays_responsive_during_upload(api, app, monkeypatch):
+    pool = ParserPool(max_workers=2, timeout=10, parse_fn=slow_parse)
+    monkeypatch.setattr(api, "parser_pool", pool)
+    default_pipeline(api).index_documents(["The capital of France is Paris."], ["france.txt"])
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            files = [("files", (f"big{i}_1.5.txt", f"data {i}".encode(), "text/plain")) for i in range(2)]
+            upload = await client.post("/upload", files=files)
+            await asyncio.sleep(0.3)
+
+            start = time.monotonic()
+            response = await client.post("/query", data={"query": "capital of France?"})
+            query_latency = time.monotonic() - start
+            job_id = upload.json()["job_id"]
+            assert (await client.get(f"/jobs/{job_id}")).json()["state"] == "running"
+            await api.ingestion_queue.wait(job_id)
+            return query_latency, response, upload
+
+    try:
+        query_latency, query_response, upload_response = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    assert query_response.status_code == 200
+    assert query_response.json()["references"] == ["france.txt"]
+    assert query_latency < 0.5
+    assert upload_response.status_code == 202
+    assert default_pipeline(api).get_document_count() == 3
@@ -0,0 +1,237 @@
+import os
+
+import pytest
+
+from models.qa_pipeline import QAPipeline
+from models.streaming_splitter import StreamingSplitter
+
+
+def make_text(word, chunks):
+    # Each paragraph is just under the splitter's chunk_size, so one paragraph == one chunk
+    return "\n\n".join(f"{word} {i} " + "x" * 900 for i in range(chunks))
+
+
+def test_index_documents_embeds_only_new_chunks(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm)
+    embedded_per_upload = []
+    for i in range(5):
+        before = fake_embeddings.embedded_texts
+        pipeline.index_documents([make_text(f"doc{i}", 3)], [f"doc{i}.txt"])
+        embedded_per_upload.append(fake_embeddings.embedded_texts - before)
+
+    # Every upload has the same size, so it must cost the same regardless of corpus size
+    assert embedded_per_upload == [3] * 5
+    assert len(pipeline.documents) == 15
+    assert pipeline.vector_store.index.ntotal == 15
+
+
+def test_index_documents_skips_already_uploaded_filenames(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm)
+    pipeline.index_documents([make_text("alpha", 2)], ["a.txt"])
+    before = fake_embeddings.embedded_texts
+    pipeline.index_documents([make_text("alpha", 2), make_text("beta", 1)], ["a.txt", "b.txt"])
+
+    assert fake_embeddings.embedded_texts - before == 1
+    assert pipeline.get_uploaded_filenames() == ["a.txt", "b.txt"]
+    assert pipeline.vector_store.index.ntotal == 3
+
+
+def test_answer_query_searches_appended_chunks(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm)
+    pipeline.index_documents(["The capital of France is Paris."], ["france.txt"])
+    pipeline.index_documents(["The capital of Italy is Rome."], ["italy.txt"])
+
+    response, references = pipeline.answer_query("What is the capital of Italy?")
+    assert response == "fake answer"
+    assert set(references) == {"france.txt", "italy.txt"}
+
+
+def test_delete_document_does_not_embed(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm)
+    pipeline.index_documents([make_text("alpha", 3), make_text("beta", 2)], ["a.txt", "b.txt"])
+    kept_ids = list(pipeline.chunk_ids["b.txt"])
+    before = fake_embeddings.embedded_texts
+
+    assert pipeline.delete_document("a.txt")
+
+    assert fake_embeddings.embedded_texts == before
+    assert pipeline.vector_store.index.ntotal == 2
+    assert pipeline.chunk_ids == {"b.txt": kept_ids}
+    assert sorted(pipeline.documents) == sorted(kept_ids)
+    assert sorted(pipeline.vector_store.documents) == sorted(kept_ids)
+
+
+def test_delete_document_keeps_other_files_searchable(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm)
+    pipeline.index_documents(["The capital of France is Paris."], ["france.txt"])
+    pipeline.index_documents(["The capital of Italy is Rome."], ["italy.txt"])
+
+    assert pipeline.delete_document("france.txt")
+    assert not pipeline.delete_document("france.txt")
+
+    _, references = pipeline.answer_query("What is the capital of Italy?")
+    assert references == ["italy.txt"]
+
+    assert pipeline.delete_document("italy.txt")
+    assert pipeline.answer_query("anything") == ("No documents indexed.", [])
+
+
+def test_restart_restores_index_without_embedding(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    pipeline.index_documents([make_text("alpha", 3), make_text("beta", 2)], ["a.txt", "b.txt"])
+    pipeline.delete_document("a.txt")
+
+    restarted_embeddings = type(fake_embeddings)()
+    restarted = QAPipeline(embeddings=restarted_embeddings, llm=fake_llm, index_dir=index_dir)
+    assert restarted.vector_store is None  # Nothing is read until first use
+
+    assert restarted.get_uploaded_filenames() == ["b.txt"]
+    assert restarted.chunk_ids == pipeline.chunk_ids
+    assert restarted.documents == pipeline.documents
+    assert restarted.vector_store.index.ntotal == 2
+    assert restarted_embeddings.embedded_texts == 0
+
+    _, references = restarted.answer_query("beta")
+    assert references == ["b.txt"]
+    assert restarted_embeddings.embedded_texts == 1
+
+
+def test_restart_continues_chunk_ids(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    pipeline.index_documents([make_text("alpha", 2)], ["a.txt"])
+
+    restarted = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    restarted.index_documents([make_text("beta", 2)], ["b.txt"])
+
+    assert restarted.chunk_ids == {"a.txt": [0, 1], "b.txt": [2, 3]}
+    assert QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir).get_document_count() == 2
+
+
+def test_upload_appends_only_its_own_chunks_to_disk(tmp_path, fake_embeddings, fake_llm):
+    index_dir = tmp_path / "index"
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(index_dir))
+    pipeline.index_store.min_compact_bytes = 10 ** 9
+    written = []
+    for i in range(5):
+        before = pipeline.index_store.log_bytes
+        pipeline.index_documents([make_text(f"d{i}", 2)], [f"d{i}.txt"])
+        written.append(pipeline.index_store.log_bytes - before)
+
+    assert max(written) - min(written) < 50  # Same-sized uploads cost the same however big the corpus is
+    assert QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(index_dir)).get_document_count() == 5
+
+
+def test_compaction_switches_generation_and_keeps_state(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    pipeline.index_store.min_compact_bytes = 0
+    pipeline.index_documents([make_text("alpha", 2), make_text("beta", 2)], ["a.txt", "b.txt"])
+    pipeline.delete_document("a.txt")
+
+    generations = [name for name in os.listdir(index_dir) if name.startswith("gen-")]
+    assert generations == [f"gen-{pipeline.index_store.generation}"]
+    restarted = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    assert restarted.get_uploaded_filenames() == ["b.txt"]
+    assert restarted.chunk_ids == pipeline.chunk_ids
+    assert restarted.vector_store.index.ntotal == 2
+
+
+def test_interrupted_compaction_leaves_previous_generation_current(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    pipeline.index_documents([make_text("alpha", 2)], ["a.txt"])
+    os.makedirs(os.path.join(index_dir, "gen-2.tmp"))  # A crash mid-snapshot
+
+    restarted = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    restarted.index_documents([make_text("beta", 1)], ["b.txt"])
+    assert restarted.chunk_ids == {"a.txt": [0, 1], "b.txt": [2]}
+
+
+def test_failed_load_is_retried_and_never_overwrites_store(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    pipeline.index_documents([make_text("alpha", 1), make_text("beta", 1)], ["a.txt", "b.txt"])
+    log_path = os.path.join(index_dir, f"gen-{pipeline.index_store.generation}", "log.jsonl")
+    with open(log_path, "rb") as f:
+        log = f.read()
+    with open(log_path, "wb") as f:
+        f.write(b"{corrupt\n" + log)
+
+    broken = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    with pytest.raises(ValueError):
+        broken.index_documents([make_text("gamma", 1)], ["c.txt"])
+    with pytest.raises(ValueError):
+        broken.has_index()
+    with open(log_path, "rb") as f:
+        assert f.read() == b"{corrupt\n" + log
+
+    with open(log_path, "wb") as f:
+        f.write(log)
+    broken.index_documents([make_text("gamma", 1)], ["c.txt"])
+    assert broken.get_uploaded_filenames() == ["a.txt", "b.txt", "c.txt"]
+
+
+def add_streamed(pipeline, filename, sections, splitter=None):
+    """Stream sections into a pipeline the way the upload path does."""
+    splitter = splitter or pipeline.streaming_splitter()
+    assert pipeline.begin_document(filename)
+    for chunks in [splitter.feed(section) for section in sections] + [splitter.flush()]:
+        if chunks:
+            pipeline.add_chunks(filename, chunks, pipeline.embed_chunks(chunks))
+
+
+def test_streamed_document_is_searchable_before_it_is_listed(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm)
+    pipeline.begin_document("manual.txt")
+    pipeline.add_chunks("manual.txt", ["The first page mentions the torque spec."], [fake_embeddings.embed_query("torque")])
+
+    assert pipeline.answer_query("torque")[1] == ["manual.txt"]
+    assert pipeline.get_uploaded_filenames() == []
+    assert not pipeline.begin_document("manual.txt")
+
+    pipeline.finish_document("manual.txt")
+
+    assert pipeline.get_uploaded_filenames() == ["manual.txt"]
+
+
+def test_streamed_chunks_match_the_whole_text_split(fake_embeddings, fake_llm):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm)
+    pages = [" ".join(f"page{page}word{word}" for word in range(800)) for page in range(40)]
+
+    add_streamed(pipeline, "book.txt", pages, StreamingSplitter(pipeline.text_splitter, buffer_chars=20_000))
+
+    streamed = pipeline.get_chunk_texts("book.txt")
+    whole = pipeline.split_document("\n".join(pages))
+    assert all(len(chunk) <= 1000 for chunk in streamed)
+    assert abs(len(streamed) - len(whole)) <= len(whole) // 20
+    words = {word for page in pages for word in page.split()}
+    assert words == {word for chunk in streamed for word in chunk.split()}
+
+
+def test_unfinished_streamed_document_is_dropped_on_restart(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    add_streamed(pipeline, "done.txt", [make_text("alpha", 3)])
+    pipeline.finish_document("done.txt")
+    add_streamed(pipeline, "crashed.txt", [make_text("beta", 3)])  # The process dies before finish_document
+
+    restarted = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+
+    assert restarted.get_uploaded_filenames() == ["done.txt"]
+    assert set(restarted.chunk_ids) == {"done.txt"}
+    assert restarted.vector_store.index.ntotal == 3
+    assert restarted.begin_document("crashed.txt")
+
+
+def test_aborted_streamed_document_leaves_no_chunks(tmp_path, fake_embeddings, fake_llm):
+    index_dir = str(tmp_path / "index")
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    add_streamed(pipeline, "broken.txt", [make_text("gamma", 2)])
+
+    pipeline.abort_document("broken.txt")
+
+    assert pipeline.documents == {} and pipeline.chunk_ids == {}
+    restarted = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    assert restarted.get_uploaded_filenames() == [] and restarted.chunk_ids == {}
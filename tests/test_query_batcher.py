@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from models.query_batcher import QueryBatcher
+
+
+class RecordingModel:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+        self.threads = set()
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        return [[float(len(text)), float(index)] for index, text in enumerate(texts)]
+
+
+def test_concurrent_queries_share_one_batch_and_get_their_own_vectors():
+    model = RecordingModel()
+    batcher = QueryBatcher(model.embed_documents, window_seconds=0.05, max_batch_size=32)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed("q" * n) for n in range(1, 6)))
+
+    vectors = asyncio.run(run())
+
+    assert model.batches == [["q", "qq", "qqq", "qqqq", "qqqqq"]]
+    assert [vector[0] for vector in vectors] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert threading.get_ident() not in model.threads  # Encoded off the event loop
+    assert batcher.stats() == {"batches": 1, "queries": 5, "mean_batch_size": 5.0}
+
+
+def test_full_batch_is_flushed_without_waiting_for_the_window():
+    model = RecordingModel()
+    batcher = QueryBatcher(model.embed_documents, window_seconds=10, max_batch_size=3)
+
+    async def run():
+        start = time.monotonic()
+        vectors = await asyncio.gather(*(batcher.embed(str(n)) for n in range(3)))
+        return vectors, time.monotonic() - start
+
+    vectors, elapsed = asyncio.run(run())
+
+    assert len(vectors) == 3
+    assert elapsed < 1
+    assert model.batches == [["0", "1", "2"]]
+
+
+def test_lone_query_does_not_wait_for_the_window():
+    model = RecordingModel()
+    batcher = QueryBatcher(model.embed_documents, window_seconds=10)
+
+    async def run():
+        start = time.monotonic()
+        await batcher.embed("alone")
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 1
+    assert model.batches == [["alone"]]
+
+
+def test_queries_arriving_during_an_encode_form_the_next_batch():
+    model = RecordingModel(delay=0.1)
+    batcher = QueryBatcher(model.embed_documents, window_seconds=0.01, max_batch_size=32)
+
+    async def run():
+        first = asyncio.ensure_future(batcher.embed("a"))
+        await asyncio.sleep(0.05)
+        rest = await asyncio.gather(batcher.embed("b"), batcher.embed("c"))
+        return [await first] + rest
+
+    vectors = asyncio.run(run())
+
+    assert model.batches == [["a"], ["b", "c"]]
+    assert [vector[1] for vector in vectors] == [0.0, 0.0, 1.0]
+
+
+def test_model_errors_reach_every_caller_in_the_batch():
+    def broken(texts):
+        raise RuntimeError("model unavailable")
+
+    batcher = QueryBatcher(broken, window_seconds=0.01)
+
+    async def run():
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert [str(result) for result in results] == ["model unavailable", "model unavailable"]
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.embed("c"))
@@ -0,0 +1,107 @@
+import asyncio
+
+from conftest import DelayedTokenChatModel
+from models.qa_pipeline import QAPipeline
+from models.reranker import CrossEncoderReranker
+
+
+class OverlapCrossEncoder:
+    """Fake cross-encoder: scores a pair by how many query words the text contains."""
+
+    def __init__(self, clock=None, seconds_per_batch=0.0):
+        self.batches = []
+        self.clock = clock
+        self.seconds_per_batch = seconds_per_batch
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=None):
+        self.batches.append(len(pairs))
+        if self.clock is not None:
+            self.clock.now += self.seconds_per_batch
+        return [len(set(query.lower().split()) & set(text.lower().split())) for query, text in pairs]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rerank_orders_by_score_in_batches():
+    model = OverlapCrossEncoder()
+    reranker = CrossEncoderReranker(model=model, batch_size=2)
+    texts = ["nothing here", "red apple pie", "an apple", "red apple"]
+
+    assert reranker.rerank("red apple pie", texts, top_k=2) == [1, 3]
+    assert model.batches == [2, 2]
+
+
+def test_scores_are_cached_per_query_and_text():
+    model = OverlapCrossEncoder()
+    reranker = CrossEncoderReranker(model=model, batch_size=8)
+    reranker.rerank("apple", ["an apple", "a pear"], top_k=2)
+    reranker.rerank("apple", ["a pear", "an apple", "apple tart"], top_k=2)
+
+    assert model.batches == [2, 1]  # Only "apple tart" was new
+    assert reranker.stats()["cache_hits"] == 2
+
+
+def test_budget_exhaustion_returns_none_and_keeps_partial_scores():
+    clock = FakeClock()
+    model = OverlapCrossEncoder(clock, seconds_per_batch=0.1)
+    reranker = CrossEncoderReranker(model=model, batch_size=2, budget_seconds=0.15, clock=clock)
+    texts = [f"apple {n}" for n in range(6)]
+
+    assert reranker.rerank("apple", texts, top_k=3) is None  # A second 0.1 s batch would overrun 0.15 s
+    assert model.batches == [2]
+    assert reranker.stats()["fallbacks"] == 1
+
+    # The next identical query starts from the cached scores and finishes within budget
+    assert reranker.rerank("apple", texts[:4], top_k=3) is not None
+
+
+def make_pipeline(fake_embeddings, reranker):
+    llm = DelayedTokenChatModel(tokens=["ok"], prompts=[])
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=llm, reranker=reranker, rerank_candidates=10,
+                          rerank_top_k=1, retrieval_k=2)
+    for n in range(8):
+        pipeline.index_documents([f"Filler chunk number {n}."], [f"filler{n}.txt"])
+    pipeline.index_documents(["The boiler pressure limit is 3 bar."], ["boiler.txt"])
+    return pipeline, llm
+
+
+def test_pipeline_sends_only_the_reranked_top_chunks(fake_embeddings):
+    pipeline, llm = make_pipeline(fake_embeddings, CrossEncoderReranker(model=OverlapCrossEncoder()))
+
+    response, references = asyncio.run(pipeline.aanswer_query("what is the boiler pressure limit"))
+
+    assert references == ["boiler.txt"]
+    assert "3 bar" in llm.prompts[-1]
+    timings = pipeline.get_cache_stats()["stage_timings"]
+    assert {"embed", "dense", "lexical", "rerank", "llm"} <= set(timings)
+
+
+def test_pipeline_falls_back_to_retrieval_order_when_out_of_budget(fake_embeddings):
+    reranker = CrossEncoderReranker(model=OverlapCrossEncoder(), budget_seconds=-1)
+    pipeline, _ = make_pipeline(fake_embeddings, reranker)
+
+    chunk_ids, docs, _ = pipeline.retrieve(fake_embeddings.embed_query("boiler"), "boiler pressure")
+
+    expected = pipeline.candidates(fake_embeddings.embed_query("boiler"), "boiler pressure")[:2]
+    assert chunk_ids == expected
+    assert reranker.stats()["fallbacks"] == 1
+
+
+def test_retrieve_reports_the_scores_it_ranked_by(fake_embeddings):
+    pipeline, _ = make_pipeline(fake_embeddings, CrossEncoderReranker(model=OverlapCrossEncoder()))
+    query = "what is the boiler pressure limit"
+
+    scores = {}
+    chunk_ids, _, _ = pipeline.retrieve(fake_embeddings.embed_query(query), query, scores=scores)
+    assert scores == {chunk_ids[0]: 5.0}  # The cross-encoder's: five of the query words are in the chunk
+
+    pipeline.reranker.budget_seconds = -1  # Out of budget: the fused scores are kept
+    scores = {}
+    chunk_ids, _, _ = pipeline.retrieve(fake_embeddings.embed_query(query), query, scores=scores)
+    assert [scores[chunk_id] for chunk_id in chunk_ids] == sorted(scores.values(), reverse=True)[:2]
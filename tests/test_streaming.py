@@ -0,0 +1,112 @@
+import asyncio
+import json
+import time
+
+from conftest import DelayedTokenChatModel
+from models.qa_pipeline import QAPipeline
+
+
+def make_pipeline(fake_embeddings, **llm_kwargs):
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=DelayedTokenChatModel(**llm_kwargs))
+    pipeline.index_documents(["The capital of France is Paris."], ["france.txt"])
+    return pipeline
+
+
+def test_aanswer_query_does_not_block_event_loop(fake_embeddings):
+    pipeline = make_pipeline(fake_embeddings, tokens=["Paris", "\n", "."], token_delay=0.1)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await pipeline.aanswer_query("What is the capital of France?")
+        task.cancel()
+        return result, ticks
+
+    (response, references), ticks = asyncio.run(run())
+    assert response == "Paris<br>."
+    assert references == ["france.txt"]
+    assert ticks >= 10  # The loop kept running during the 0.3s generation
+
+
+def test_query_embedding_runs_off_the_event_loop(fake_embeddings):
+    pipeline = make_pipeline(fake_embeddings, tokens=["Paris"], token_delay=0)
+    embed_batch = pipeline.query_batcher.embed_batch
+
+    def slow_embed_batch(texts):
+        time.sleep(0.2)
+        return embed_batch(texts)
+
+    pipeline.query_batcher.embed_batch = slow_embed_batch
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await pipeline.aanswer_query("What is the capital of France?")
+        events = [event async for event in pipeline.astream_answer("And of Spain?")]
+        task.cancel()
+        return events, ticks
+
+    events, ticks = asyncio.run(run())
+    assert events[-1] == ("references", ["france.txt"])
+    assert ticks >= 20  # The loop kept running during both 0.2s embeddings
+
+
+def test_astream_answer_yields_tokens_then_references(fake_embeddings):
+    pipeline = make_pipeline(fake_embeddings, tokens=["Pa", "ris"], token_delay=0)
+
+    async def run():
+        return [event async for event in pipeline.astream_answer("capital?")]
+
+    assert asyncio.run(run()) == [("token", "Pa"), ("token", "ris"), ("references", ["france.txt"])]
+
+
+def test_query_stream_sends_first_token_before_answer_completes(api, monkeypatch, fake_embeddings):
+    pipeline = make_pipeline(fake_embeddings, tokens=["tok"] * 10, token_delay=0.1)
+    monkeypatch.setitem(api.collections.resident, api.DEFAULT_COLLECTION, pipeline)
+
+    async def run():
+        response = await api.query_stream(query="capital?", collection=api.DEFAULT_COLLECTION)
+        start = time.monotonic()
+        chunks, first_chunk_at = [], None
+        async for chunk in response.body_iterator:
+            if first_chunk_at is None:
+                first_chunk_at = time.monotonic() - start
+            chunks.append(chunk)
+        return response, first_chunk_at, time.monotonic() - start, "".join(chunks)
+
+    response, first_chunk_at, total, body = asyncio.run(run())
+
+    assert response.media_type == "text/event-stream"
+    assert first_chunk_at < 0.3
+    assert total >= 1.0
+    events = [block.split("\n") for block in body.strip().split("\n\n")]
+    assert [lines[0] for lines in events] == ["event: token"] * 10 + ["event: references", "event: done"]
+    assert json.loads(events[10][1][len("data: "):]) == ["france.txt"]
+
+
+def test_query_endpoint_uses_async_answer(api, app, monkeypatch, fake_embeddings):
+    import httpx
+
+    monkeypatch.setitem(api.collections.resident, api.DEFAULT_COLLECTION, make_pipeline(fake_embeddings, tokens=["Paris"]))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/query", data={"query": "capital?"})
+
+    response = asyncio.run(run())
+    assert response.json() == {"response": "Paris", "references": ["france.txt"]}
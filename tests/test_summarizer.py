@@ -0,0 +1,104 @@
+import asyncio
+
+from conftest import DelayedTokenChatModel
+from models.qa_pipeline import QAPipeline
+from models.summarizer import DocumentSummarizer
+
+
+def count_prompts(llm, prefix):
+    return sum(prompt.startswith(prefix) for prompt in llm.prompts)
+
+
+def make_pipeline(fake_embeddings, index_dir=None):
+    llm = DelayedTokenChatModel(tokens=["short summary"], prompts=[])
+    return QAPipeline(embeddings=fake_embeddings, llm=llm, index_dir=index_dir), llm
+
+
+def test_documents_are_summarized_in_background_on_index(fake_embeddings):
+    pipeline, llm = make_pipeline(fake_embeddings)
+    pipeline.index_documents(["Alpha text.", "Beta text.", "Gamma text."], ["a.txt", "b.txt", "c.txt"])
+    pipeline.summarizer.wait()
+
+    assert count_prompts(llm, "Summarize this text") == 3
+    assert set(pipeline.summarizer.summaries) == {"a.txt", "b.txt", "c.txt"}
+
+
+def test_summarize_runs_one_reduce_call_and_caches_it(fake_embeddings):
+    pipeline, llm = make_pipeline(fake_embeddings)
+    pipeline.index_documents(["Alpha text.", "Beta text."], ["a.txt", "b.txt"])
+    pipeline.summarizer.wait()
+    map_calls = len(llm.prompts)
+
+    assert pipeline.summarize_documents() == "short summary"
+    assert asyncio.run(pipeline.asummarize_documents()) == "short summary"
+
+    assert len(llm.prompts) == map_calls + 1
+    assert "a.txt:\nshort summary" in llm.prompts[-1]
+
+
+def test_delete_recomputes_only_the_reduce_step(fake_embeddings):
+    pipeline, llm = make_pipeline(fake_embeddings)
+    pipeline.index_documents(["Alpha text.", "Beta text.", "Gamma text."], ["a.txt", "b.txt", "c.txt"])
+    pipeline.summarize_documents()
+    calls = len(llm.prompts)
+
+    pipeline.delete_document("c.txt")
+    pipeline.summarize_documents()
+
+    assert llm.prompts[calls:] == [llm.prompts[-1]]
+    assert llm.prompts[-1].startswith("Combine these summaries")
+    assert "c.txt" not in llm.prompts[-1]
+
+
+def test_large_document_is_mapped_in_parallel_groups():
+    llm = DelayedTokenChatModel(tokens=["s"], prompts=[])
+    summarizer = DocumentSummarizer(llm, max_chars=100)
+    chunks = ["x" * 40] * 10  # Two chunks per group -> five map prompts
+
+    assert summarizer.submit("big.txt", chunks).result(timeout=10) == "s"
+    assert count_prompts(llm, "Summarize this text") == 5
+    assert count_prompts(llm, "Combine these summaries") == 1
+    summarizer.shutdown()
+
+
+def test_summaries_survive_restart(tmp_path, fake_embeddings):
+    index_dir = str(tmp_path / "index")
+    pipeline, _ = make_pipeline(fake_embeddings, index_dir)
+    pipeline.index_documents(["Alpha text.", "Beta text."], ["a.txt", "b.txt"])
+    pipeline.summarizer.wait()
+
+    restarted, llm = make_pipeline(fake_embeddings, index_dir)
+    assert restarted.summarize_documents() == "short summary"
+    assert count_prompts(llm, "Summarize this text") == 0
+    assert count_prompts(llm, "Combine these summaries") == 1
+
+
+def test_workers_sharing_a_directory_keep_each_others_summaries(tmp_path):
+    directory = str(tmp_path / "summaries")
+    first = DocumentSummarizer(DelayedTokenChatModel(tokens=["first"], prompts=[]), directory=directory)
+    second = DocumentSummarizer(DelayedTokenChatModel(tokens=["second"], prompts=[]), directory=directory)
+    first.load()
+    second.load()  # Neither has seen the other's document when it saves its own
+
+    first.submit("a.txt", ["Alpha text."]).result(timeout=10)
+    second.submit("b.txt", ["Beta text."]).result(timeout=10)
+    second.retain(["b.txt"], prune=False)  # a.txt is another worker's upload it has not seen yet
+
+    restarted = DocumentSummarizer(DelayedTokenChatModel(tokens=["s"], prompts=[]), directory=directory)
+    restarted.load()
+    assert restarted.summaries == {"a.txt": "first", "b.txt": "second"}
+
+    first.remove("a.txt")
+    restarted = DocumentSummarizer(DelayedTokenChatModel(tokens=["s"], prompts=[]), directory=directory)
+    restarted.load()
+    assert restarted.summaries == {"b.txt": "second"}
+    for summarizer in (first, second, restarted):
+        summarizer.shutdown()
+
+
+def test_summarize_without_any_document_summary_skips_llm():
+    llm = DelayedTokenChatModel(tokens=["s"], prompts=[])
+    summarizer = DocumentSummarizer(llm)
+
+    assert summarizer.summarize(["failed.txt"]) == "No documents to summarize."
+    assert llm.prompts == []
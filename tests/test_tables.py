@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+
+import httpx
+import numpy as np
+import pytest
+
+from backend.parsing import iter_sections, table_directory
+from conftest import default_pipeline
+from models.qa_pipeline import QAPipeline
+from models.table_query import TableQueryEngine
+from models.table_store import DATE, NUMBER, TEXT, Table
+
+SALES_CSV = """order_id,region,product,quantity,unit_price,order_date
+1,Europe,Widget,10,"$1,200.50",2022-03-01
+2,Asia,Gadget,5,$99.99,2022-07-15
+3,Europe,Gadget,7,$99.99,2023-01-10
+4,North America,Widget,3,"$1,200.50",2023-02-20
+5,Asia,Widget,12,"$1,150.00",2023-05-05
+6,Europe,Gizmo,1,$15.00,
+"""
+
+
+@pytest.fixture
+def sales_path(tmp_path):
+    path = tmp_path / "sales.csv"
+    path.write_text(SALES_CSV)
+    return str(path)
+
+
+def answer(table, query):
+    result = TableQueryEngine().answer(query, [table])
+    return result[0] if result is not None else None
+
+
+def test_read_types_columns_and_survives_save_and_load(sales_path, tmp_path):
+    table = Table.read(sales_path, "sales.csv")
+    kinds = {column.name: column.kind for column in table.columns}
+    assert kinds == {"order_id": NUMBER, "region": TEXT, "product": TEXT, "quantity": NUMBER,
+                     "unit_price": NUMBER, "order_date": DATE}
+    assert table.column("unit_price").values[0] == 1200.5  # Currency and thousands separators stripped
+    assert table.column("order_date").stats["missing"] == 1
+
+    table.save(str(tmp_path / "saved"))
+    loaded = Table.load(str(tmp_path / "saved"))
+    assert isinstance(loaded.column("quantity").values, np.memmap)
+    assert loaded.rows == 6
+    assert loaded.column("region").categories == table.column("region").categories
+    assert loaded.describe() == table.describe()
+
+
+def test_engine_answers_aggregates_filters_and_groups_exactly(sales_path):
+    table = Table.read(sales_path, "sales.csv")
+
+    assert answer(table, "What is the total quantity in Europe?").startswith(
+        "Sum of quantity where region = Europe: 18 (3 of 6 rows")
+    assert answer(table, "average unit price of widgets").startswith("Average of unit_price")
+    assert answer(table, "How many orders in 2023?").startswith("Number of rows where order_date = 2023: 3 ")
+    assert answer(table, "count orders with quantity at least 7").startswith(
+        "Number of rows where quantity >= 7: 3 ")
+    assert answer(table, "Which product has the highest unit price?").startswith(
+        "Maximum of unit_price: 1,200.5 (product: Widget)")
+    grouped = answer(table, "total quantity by region")
+    assert grouped.splitlines()[1:] == ["- Europe: 18", "- Asia: 17", "- North America: 3"]
+    assert "order_id: 4" in answer(table, "show rows where region is north america")
+
+
+def test_engine_declines_questions_that_are_not_about_the_table(sales_path):
+    table = Table.read(sales_path, "sales.csv")
+    engine = TableQueryEngine()
+
+    assert engine.answer("What is the capital of France?", [table]) is None
+    assert engine.answer("Summarize the quarterly report", [table]) is None
+    assert engine.stats()["declined"] == 2
+
+
+def test_engine_leaves_document_questions_that_mention_a_table_value_to_retrieval(sales_path, tmp_path):
+    roadmap = tmp_path / "roadmap.csv"
+    roadmap.write_text("item,status,notes\nSearch,new,fast\nExport,shipped,\nLogin,new,\n")
+    tables = [Table.read(sales_path, "sales.csv"), Table.read(str(roadmap), "roadmap.csv")]
+    engine = TableQueryEngine()
+
+    assert engine.answer("What does the travel policy say about Europe?", tables) is None
+    assert engine.answer("Which new features were announced in the release notes?", tables) is None
+    assert engine.answer("How many new features were announced?", tables) is None
+    assert engine.answer("What is the total budget for Europe?", tables) is None
+    assert engine.answer("Find the section about Asia in the handbook", tables) is None
+    assert engine.answer("Which items have status new?", tables)[1] == ["roadmap.csv"]
+    assert engine.answer("show orders in europe", tables)[0].startswith("Rows where region = Europe (3 of 6 rows")
+
+
+def test_json_records_are_read_as_a_table(tmp_path):
+    path = tmp_path / "people.json"
+    path.write_text(json.dumps({"people": [{"name": "Ann", "age": 31}, {"name": "Bo", "age": 45}]}))
+    table = Table.read(str(path), "people.json")
+    assert answer(table, "What is the average age?").startswith("Average of age: 38 ")
+
+    path.write_text(json.dumps({"title": "not a table"}))
+    assert Table.read(str(path), "people.json") is None
+
+
+def test_iter_sections_saves_columns_and_yields_only_schema_and_sample(sales_path):
+    sections = list(iter_sections(sales_path, "sales.csv"))
+
+    assert len(sections) == 1
+    assert sections[0].startswith("Table sales.csv: 6 rows, 6 columns.")
+    assert "- unit_price (number): 6 values; from 15 to 1,200.5" in sections[0]
+    assert Table.load(table_directory(sales_path)).rows == 6
+
+
+def index_table(pipeline, path, filename):
+    sections = list(iter_sections(path, filename))
+    chunks = pipeline.split_document("\n".join(sections))
+    pipeline.begin_document(filename)
+    pipeline.add_chunks(filename, chunks, pipeline.embed_chunks(chunks))
+    pipeline.add_table(filename, table_directory(path))
+    pipeline.finish_document(filename)
+
+
+def test_pipeline_answers_from_tables_without_the_llm_and_keeps_them_across_restarts(
+        fake_embeddings, fake_llm, sales_path, tmp_path):
+    index_dir = str(tmp_path / "index")
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    index_table(pipeline, sales_path, "sales.csv")
+    assert not os.path.exists(table_directory(sales_path))  # Moved into the collection
+
+    embedded = fake_embeddings.embedded_texts
+    response, references = pipeline.answer_query("total quantity by region")
+    assert response.startswith("Sum of quantity by region") and "<br>- Europe: 18" in response
+    assert references == ["sales.csv"]
+    assert fake_embeddings.embedded_texts == embedded  # No embedding, retrieval or LLM call
+    assert pipeline.answer_query("What is the capital of France?")[0] == "fake answer"
+    assert pipeline.answer_query("What does the travel policy say about Europe?")[0] == "fake answer"
+    assert pipeline.get_cache_stats()["tables"]["tables"] == 1
+
+    restarted = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=index_dir)
+    response, _ = asyncio.run(restarted.aanswer_query("How many orders in 2023?"))
+    assert response.startswith("Number of rows where order_date = 2023: 3 ")
+
+    assert restarted.delete_document("sales.csv")
+    assert restarted.tables.tables == {}
+    assert os.listdir(os.path.join(index_dir, "tables")) == []
+
+
+def test_upload_of_a_csv_routes_aggregate_questions_to_the_table(api, app, monkeypatch, tmp_path):
+    class InlineTableParserPool:
+        timeout = 10
+
+        async def stream(self, file_path, filename):
+            for section in iter_sections(file_path, filename):
+                yield section
+
+    monkeypatch.setattr(api, "parser_pool", InlineTableParserPool())
+    monkeypatch.setattr(api, "UPLOAD_DIR", str(tmp_path))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/upload", files=[("files", ("sales.csv", SALES_CSV.encode(), "text/csv"))])
+            while (await client.get(f"/jobs/{response.json()['job_id']}")).json()["state"] != "completed":
+                await asyncio.sleep(0.01)
+            return (await client.post("/query", data={"query": "sum of quantity in Asia"})).json()
+
+    result = asyncio.run(run())
+    assert result["response"].startswith("Sum of quantity where region = Asia: 17 ")
+    assert result["references"] == ["sales.csv"]
+    assert "sales.csv" in default_pipeline(api).tables.tables
+    assert os.listdir(str(tmp_path)) == []  # Neither the upload nor its table directory is left behind
@@ -0,0 +1,341 @@
+import asyncio
+import hashlib
+import os
+import threading
+
+import httpx
+import pytest
+from starlette.datastructures import UploadFile as StarletteUploadFile
+
+from conftest import default_pipeline
+
+
+class InlineParserPool:
+    """Parses .txt uploads in-process and records which files reached the parser."""
+
+    timeout = 10
+
+    def __init__(self):
+        self.parsed = []
+
+    async def parse(self, file_path, filename):
+        self.parsed.append(filename)
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    async def stream(self, file_path, filename):
+        yield await self.parse(file_path, filename)
+
+
+@pytest.fixture
+def upload_api(api, monkeypatch, tmp_path):
+    monkeypatch.setattr(api, "parser_pool", InlineParserPool())
+    monkeypatch.setattr(api, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(api, "UPLOAD_CHUNK_BYTES", 8)
+    return api
+
+
+def post_files(app, files):
+    """POST files to /upload and, if a job was accepted, wait for it and return its final status too."""
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/upload", files=[("files", (name, data, "text/plain")) for name, data in files])
+            if response.status_code != 202:
+                return response, None
+            while True:
+                status = (await client.get(f"/jobs/{response.json()['job_id']}")).json()
+                if status["state"] == "completed":
+                    return response, status
+                await asyncio.sleep(0.01)
+
+    return asyncio.run(run())
+
+
+def test_upload_streams_file_to_disk_in_chunks(upload_api, app, monkeypatch):
+    read_sizes = []
+    original_read = StarletteUploadFile.read
+
+    async def spy_read(self, size=-1):
+        read_sizes.append(size)
+        return await original_read(self, size)
+
+    monkeypatch.setattr(StarletteUploadFile, "read", spy_read)
+    content = b"The capital of France is Paris. " * 10
+
+    response, status = post_files(app, [("france.txt", content)])
+
+    assert response.status_code == 202
+    assert status["files"][0]["stage"] == "done"
+    assert set(read_sizes) == {8}  # Never a whole-file read
+    assert len(read_sizes) == len(content) // 8 + 1
+    assert default_pipeline(upload_api).content_hashes == {"france.txt": hashlib.sha256(content).hexdigest()}
+    assert default_pipeline(upload_api).documents[0]["text"] == content.decode().strip()
+
+
+def test_upload_rejects_file_over_per_file_limit(upload_api, app, monkeypatch, tmp_path):
+    monkeypatch.setattr(upload_api, "MAX_FILE_BYTES", 20)
+
+    response, _ = post_files(app, [("small.txt", b"ok"), ("big.txt", b"x" * 21)])
+
+    assert response.status_code == 413
+    assert "per-file" in response.json()["detail"]["error"]
+    assert default_pipeline(upload_api).get_document_count() == 0
+    assert os.listdir(tmp_path) == []  # Partial uploads are removed
+
+
+def test_upload_rejects_request_over_per_request_limit(upload_api, app, monkeypatch):
+    monkeypatch.setattr(upload_api, "MAX_REQUEST_BYTES", 30)
+
+    response, _ = post_files(app, [("a.txt", b"a" * 16), ("b.txt", b"b" * 16)])
+
+    assert response.status_code == 413
+    assert "per-request" in response.json()["detail"]["error"]
+    assert default_pipeline(upload_api).get_document_count() == 0
+
+
+def test_duplicate_content_is_skipped_before_parsing(upload_api, app):
+    response, status = post_files(app, [("a.txt", b"same content"), ("copy.txt", b"same content"), ("b.txt", b"other")])
+
+    assert response.status_code == 202
+    assert response.json()["filenames"] == ["a.txt", "b.txt"]
+    assert response.json()["duplicates"] == ["copy.txt"]
+    assert status["duplicates"] == ["copy.txt"]
+    assert sorted(default_pipeline(upload_api).get_uploaded_filenames()) == ["a.txt", "b.txt"]  # Workers finish in any order
+    assert sorted(upload_api.parser_pool.parsed) == ["a.txt", "b.txt"]
+
+    response, _ = post_files(app, [("renamed.txt", b"other")])
+
+    assert response.status_code == 400
+    assert "renamed.txt" in response.json()["detail"]["error"]
+    assert sorted(upload_api.parser_pool.parsed) == ["a.txt", "b.txt"]
+
+
+class GatedParserPool(InlineParserPool):
+    """Holds every parse until the test releases the named file."""
+
+    def __init__(self):
+        super().__init__()
+        self.gates = {}
+
+    async def parse(self, file_path, filename):
+        gate = self.gates.setdefault(filename, asyncio.Event())
+        await gate.wait()
+        return await super().parse(file_path, filename)
+
+
+def test_upload_returns_a_job_and_files_become_queryable_one_by_one(upload_api, app, monkeypatch):
+    pool = GatedParserPool()
+    monkeypatch.setattr(upload_api, "parser_pool", pool)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            files = [("files", (name, data, "text/plain")) for name, data in
+                     [("france.txt", b"The capital of France is Paris."), ("italy.txt", b"The capital of Italy is Rome.")]]
+            response = await client.post("/upload", files=files)
+            job_id = response.json()["job_id"]
+            await asyncio.sleep(0.05)
+            parsing = (await client.get(f"/jobs/{job_id}")).json()
+
+            pool.gates["france.txt"].set()
+            while default_pipeline(upload_api).get_document_count() < 1:
+                await asyncio.sleep(0.01)
+            partial = (await client.get(f"/jobs/{job_id}")).json()
+            answer = await client.post("/query", data={"query": "capital of France?"})
+
+            pool.gates["italy.txt"].set()
+            await upload_api.ingestion_queue.wait(job_id)
+            final = (await client.get(f"/jobs/{job_id}")).json()
+            missing = await client.get("/jobs/unknown")
+            return response, parsing, partial, answer, final, missing
+
+    response, parsing, partial, answer, final, missing = asyncio.run(run())
+
+    assert response.status_code == 202
+    assert parsing["state"] == "running"
+    assert [entry["stage"] for entry in parsing["files"]] == ["parsing", "parsing"]
+    assert [entry["stage"] for entry in partial["files"]] == ["done", "parsing"]
+    assert partial["completed_files"] == 1
+    assert answer.json()["references"] == ["france.txt"]  # Queryable before the batch finished
+    assert final["state"] == "completed"
+    assert final["progress"] == 1.0
+    assert all(entry["embedded_chunks"] == entry["chunks"] == 1 for entry in final["files"])
+    assert missing.status_code == 404
+
+
+def test_failed_file_does_not_stop_the_rest_of_the_job(upload_api, app, monkeypatch):
+    original = default_pipeline(upload_api).embed_chunks
+
+    def embed_chunks(chunks, on_progress=None):
+        if "broken" in chunks[0]:
+            raise RuntimeError("embedding backend unavailable")
+        return original(chunks, on_progress)
+
+    monkeypatch.setattr(default_pipeline(upload_api), "embed_chunks", embed_chunks)
+
+    response, status = post_files(app, [("broken.txt", b"broken text"), ("empty.txt", b"   "), ("ok.txt", b"fine")])
+
+    stages = {entry["filename"]: (entry["stage"], entry["error"]) for entry in status["files"]}
+    assert stages == {
+        "broken.txt": ("failed", "embedding backend unavailable"),
+        "empty.txt": ("skipped", "No text extracted"),
+        "ok.txt": ("done", None),
+    }
+    assert default_pipeline(upload_api).get_uploaded_filenames() == ["ok.txt"]
+
+
+def test_queries_are_answered_while_an_upload_writes_its_log(upload_api, app):
+    pipeline = default_pipeline(upload_api)
+    pipeline.index_documents(["The capital of France is Paris."], ["france.txt"])
+    append = pipeline.index_store.append
+    appending, release = threading.Event(), threading.Event()
+    waits = []
+
+    def slow_append(record):  # Stands in for a slow fsync or a compaction
+        appending.set()
+        waits.append(release.wait(5))  # Times out if the query could not run meanwhile
+        return append(record)
+
+    pipeline.index_store.append = slow_append
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/upload", files=[("files", ("italy.txt", b"Rome is in Italy.", "text/plain"))])
+            await asyncio.to_thread(appending.wait, 5)
+            answer = (await client.post("/query", data={"query": "capital of France?"})).json()
+            release.set()
+            while (await client.get(f"/jobs/{response.json()['job_id']}")).json()["state"] != "completed":
+                await asyncio.sleep(0.01)
+            return answer
+
+    answer = asyncio.run(run())
+    assert "france.txt" in answer["references"]
+    assert waits and all(waits)
+    assert pipeline.get_uploaded_filenames() == ["france.txt", "italy.txt"]
+
+
+def test_queries_are_answered_while_a_delete_writes_its_log(upload_api, app):
+    pipeline = default_pipeline(upload_api)
+    pipeline.index_documents(["The capital of France is Paris.", "Rome is in Italy."], ["france.txt", "italy.txt"])
+    append = pipeline.index_store.append
+    appending, release = threading.Event(), threading.Event()
+    waits = []
+
+    def slow_append(record):
+        appending.set()
+        waits.append(release.wait(5))  # Times out if the query could not run meanwhile
+        return append(record)
+
+    pipeline.index_store.append = slow_append
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            deleted = asyncio.ensure_future(client.post("/delete", data={"filename": "italy.txt"}))
+            await asyncio.to_thread(appending.wait, 5)
+            answer = (await client.post("/query", data={"query": "capital of France?"})).json()
+            release.set()
+            return answer, (await deleted).json()
+
+    answer, deleted = asyncio.run(run())
+    assert answer["references"] == ["france.txt"]  # The delete was published before its log append
+    assert deleted["filenames"] == ["france.txt"] and waits == [True]
+
+
+def limited_app(api, max_bytes):
+    from fastapi import FastAPI
+
+    from backend.middleware import RequestSizeLimitMiddleware
+
+    app = FastAPI()
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=max_bytes)
+    app.include_router(api.router)
+    return app
+
+
+def test_oversized_content_length_is_rejected_before_the_body_is_read(upload_api):
+    app = limited_app(upload_api, max_bytes=100)
+    body_reads = 0
+
+    async def body():
+        nonlocal body_reads
+        for _ in range(10):
+            body_reads += 1
+            yield b"x" * 50
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/upload", content=body(), headers={
+                "content-type": "multipart/form-data; boundary=xyz", "content-length": "500"})
+
+    response = asyncio.run(run())
+    assert response.status_code == 413
+    assert "per-request" in response.json()["detail"]["error"]
+    assert upload_api.parser_pool.parsed == []
+
+
+def test_chunked_upload_is_cut_off_while_receiving(upload_api):
+    app = limited_app(upload_api, max_bytes=100)
+    sent = 0
+
+    async def body():
+        nonlocal sent
+        yield b"--xyz\r\nContent-Disposition: form-data; name=\"files\"; filename=\"a.txt\"\r\n\r\n"
+        for _ in range(100):
+            sent += 1
+            yield b"x" * 50
+        yield b"\r\n--xyz--\r\n"
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/upload", content=body(), headers={
+                "content-type": "multipart/form-data; boundary=xyz"})
+
+    response = asyncio.run(run())
+    assert response.status_code == 413
+    assert sent < 100  # The rest of the body was never pulled
+    assert upload_api.parser_pool.parsed == []
+
+
+def test_collection_upload_is_capped_too(upload_api):
+    app = limited_app(upload_api, max_bytes=100)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/collections/reports/upload",
+                                     files=[("files", ("big.txt", b"x" * 500, "text/plain"))])
+
+    response = asyncio.run(run())
+    assert response.status_code == 413
+    assert "per-request" in response.json()["detail"]["error"]
+    assert upload_api.parser_pool.parsed == []
+
+
+def test_jobs_are_reported_by_every_worker_sharing_the_job_store(upload_api, app, monkeypatch, tmp_path):
+    from backend.ingestion import IngestionJob, IngestionQueue, JobStore, SavedUpload
+
+    path = str(tmp_path / "jobs.sqlite3")
+    monkeypatch.setattr(upload_api, "ingestion_queue", IngestionQueue(upload_api.ingest_file, store=JobStore(path)))
+    response, final = post_files(app, [("france.txt", b"The capital of France is Paris.")])
+
+    other = IngestionQueue(upload_api.ingest_file, store=JobStore(path))  # Another worker's: it never ran the job
+    assert other.get(response.json()["job_id"]) is None
+    assert other.status(response.json()["job_id"]) == final
+    assert other.status("unknown") is None
+
+    # A job whose worker exited mid-way reports its unfinished files as failed
+    exited = JobStore(path)
+    exited.connection()
+    exited.token = "999999999:"  # No such process
+    job = IngestionJob([SavedUpload("a.txt", "a.txt", None, "default"), SavedUpload("b.txt", "b.txt", None, "default")],
+                       store=exited)
+    job.files[0]["stage"] = "done"
+    job.files[1]["stage"] = "embedding"
+    status = other.status(job.id)
+    assert [entry["stage"] for entry in status["files"]] == ["done", "failed"]
+    assert status["state"] == "completed"
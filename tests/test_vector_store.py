@@ -0,0 +1,135 @@
+import threading
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from models import vector_store
+from models.ann_index import build_index, choose_backend
+from models.qa_pipeline import QAPipeline
+from models.vector_store import VectorStore
+
+
+def clustered_vectors(count, dimension=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(50, dimension))
+    return (centers[rng.integers(0, 50, count)] + 0.3 * rng.normal(size=(count, dimension))).astype(np.float32)
+
+
+def make_store(count, **options):
+    vectors = clustered_vectors(count)
+    store = VectorStore(dimension=vectors.shape[1], **options)
+    store.add(vectors, [Document(page_content=str(n)) for n in range(count)])
+    return store, vectors
+
+
+@pytest.mark.parametrize("backend", ["hnsw", "ivf", "ivfpq"])
+def test_backends_recall_exact_neighbours(backend):
+    store, vectors = make_store(3000, backend=backend, nprobe=16)
+    exact = VectorStore(dimension=vectors.shape[1], backend="flat")
+    exact.add(vectors, [None] * len(vectors))
+    queries = clustered_vectors(50, seed=1)
+
+    recall = np.mean([
+        len(set(store.search_ids(query, k=10)[0]) & set(exact.search_ids(query, k=10)[0])) / 10
+        for query in queries
+    ])
+
+    assert store.stats()["backend"] == backend
+    assert recall >= 0.9
+
+
+def test_auto_backend_follows_chunk_count():
+    assert choose_backend(100) == "flat"
+    assert choose_backend(50_000) == "hnsw"
+    assert choose_backend(500_000) == "ivf"
+    assert choose_backend(5_000_000) == "ivfpq"
+
+
+def test_ivf_is_retrained_as_the_corpus_grows():
+    store, _ = make_store(500, backend="ivf")
+    store.search_ids(np.zeros(32), k=1)
+    assert store.stats()["trained_size"] == 500
+
+    store.add(clustered_vectors(1000, seed=2), [None] * 1000)
+    store.search_ids(np.zeros(32), k=1)
+    assert store.stats()["trained_size"] == 500  # Within 4x: new vectors are added to the existing cells
+
+    store.add(clustered_vectors(1000, seed=3), [None] * 1000)
+    store.search_ids(np.zeros(32), k=1)
+    assert store.stats()["trained_size"] == 2500
+
+
+def test_removed_chunks_never_come_back_from_hnsw():
+    store, vectors = make_store(1000, backend="hnsw")
+    store.search_ids(vectors[0], k=1)
+
+    store.remove([0, 1, 2])
+    ids, _ = store.search_ids(vectors[0], k=5)
+    assert not {0, 1, 2} & set(ids)
+    assert len(ids) == 5
+    assert store.stats()["tombstones"] == 3
+
+    store.remove(list(range(3, 300)))  # Past a fifth of the graph: rebuilt without the removed ids
+    store.search_ids(vectors[0], k=5)
+    assert store.stats()["tombstones"] == 0
+    assert len(store.ann) == 700
+
+
+def test_large_rebuilds_run_in_the_background_and_replay_concurrent_changes(monkeypatch):
+    release = threading.Event()
+
+    def held_build(*args, **kwargs):
+        release.wait(10)
+        return build_index(*args, **kwargs)
+
+    monkeypatch.setattr(vector_store, "build_index", held_build)
+    store, vectors = make_store(2000, backend="ivf", background_build_min=0)
+    assert store.stats()["rebuilding"] is True  # Started by the write, not by a search
+
+    ids, _ = store.search_ids(vectors[10], k=1)  # Served by exact search while the index builds
+    assert ids == [10] and store.stats()["backend"] == "flat"
+    store.add(vectors[:5] + 100, [None] * 5)
+    store.remove([10])
+    release.set()
+    store.wait_for_build()
+
+    ids, _ = store.search_ids(vectors[10], k=3)
+    assert store.stats()["backend"] == "ivf"
+    assert store.stats()["rebuilding"] is False
+    assert 10 not in ids
+    assert store.search_ids(vectors[0] + 100, k=1)[0] == [2000]  # Added while building
+
+
+def test_searches_never_build_the_ann_index(monkeypatch):
+    store, vectors = make_store(500, backend="flat")
+    monkeypatch.setattr(vector_store, "build_index", lambda *args, **kwargs: pytest.fail("built on search"))
+    store.backend = "hnsw"
+    store.ann_stale = True  # As if the corpus had outgrown the index
+
+    assert store.search_ids(vectors[3], k=1)[0] == [3]
+    assert store.stats()["backend"] == "flat"
+
+
+def test_ivfpq_falls_back_to_ivf_for_tiny_corpora_without_rebuild_loops():
+    store, vectors = make_store(100, backend="ivfpq")
+    store.search_ids(vectors[0], k=1)
+    ann = store.ann
+
+    store.search_ids(vectors[1], k=1)
+    assert store.ann is ann
+    assert store.stats()["backend"] == "ivf"
+
+
+def test_restored_pipeline_uses_configured_backend(tmp_path, fake_embeddings, fake_llm):
+    options = {"backend": "hnsw", "ef_search": 32}
+    pipeline = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(tmp_path), index_options=options)
+    pipeline.index_documents(["The capital of France is Paris."], ["france.txt"])
+
+    restored = QAPipeline(embeddings=fake_embeddings, llm=fake_llm, index_dir=str(tmp_path), index_options=options)
+    restored.ensure_loaded()
+    restored.vector_store.wait_for_build()  # Pipelines always rebuild on the builder thread
+    response, references = restored.answer_query("capital?")
+
+    assert references == ["france.txt"]
+    assert restored.get_cache_stats()["vector_index"]["backend"] == "hnsw"
@@ -5,10 +5,19 @@ import pptx
 import pandas as pd
 import pytesseract
 from PIL import Image
-import requests
-from bs4 import BeautifulSoup
-import re
 import json
+from backend.config import (
+    CRAWL_MAX_CONNECTIONS, CRAWL_PER_HOST, CRAWL_TIMEOUT_SECONDS, CRAWL_BUDGET_SECONDS, CRAWL_MAX_URLS,
+    CRAWL_CACHE_PATH, CRAWL_CACHE_MAX_BYTES,
+)
+from parsers.crawler import CrawlOptions, crawl_urls, extract_hyperlinks
+
+CRAWL_OPTIONS = CrawlOptions(
+    max_connections=CRAWL_MAX_CONNECTIONS, per_host=CRAWL_PER_HOST, timeout=CRAWL_TIMEOUT_SECONDS,
+    budget_seconds=CRAWL_BUDGET_SECONDS, max_urls=CRAWL_MAX_URLS, cache_path=CRAWL_CACHE_PATH,
+    cache_max_bytes=CRAWL_CACHE_MAX_BYTES,
+)
+
 
 def extract_text_from_image(file_path):
     """Extract text from images using Tesseract OCR."""
@@ -85,19 +94,7 @@ def extract_data_from_json(file_path):
 
 def crawl_url(url):
     """Crawl content from a URL."""
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        text = ' '.join(p.get_text() for p in soup.find_all('p'))
-        return text if text.strip() else "No content found on page."
-    except Exception as e:
-        return f"Web Crawling Error: {str(e)}"
-
-def extract_hyperlinks(text):
-    """Extract URLs from text."""
-    url_pattern = re.compile(r'https?://[^\s<>"]+|www\.[^\s<>"]+')
-    return url_pattern.findall(text)
+    return next(iter(crawl_urls([url], CRAWL_OPTIONS).values()))
 
 def process_file(file_path):
     """Process a single file and extract content."""
@@ -127,9 +124,8 @@ def process_file(file_path):
         text = f"Unsupported file format: {ext}"
 
     if text and "Error" not in text:
-        urls = extract_hyperlinks(text)
-        for url in urls:
-            crawled_text = crawl_url(url)
+        # All links at once, each distinct one fetched once (see parsers.crawler)
+        for url, crawled_text in crawl_urls(extract_hyperlinks(text), CRAWL_OPTIONS).items():
             text += f"\n\nContent from {url}:\n{crawled_text}"
 
     return text, df, filename
\ No newline at end of file
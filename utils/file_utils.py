@@ -1,8 +1,4 @@
 import os
-import re
-import requests
-from bs4 import BeautifulSoup
-from backend.config import ALLOWED_EXTENSIONS
 from parsers.pdf_parser import parse_pdf
 from parsers.docx_parser import parse_docx
 from parsers.pptx_parser import parse_pptx
@@ -11,24 +7,23 @@ from parsers.csv_parser import parse_csv
 from parsers.json_parser import parse_json
 from parsers.txt_parser import parse_txt
 from parsers.image_parser import parse_image
+from backend.config import (
+    ALLOWED_EXTENSIONS,
+    CRAWL_MAX_CONNECTIONS, CRAWL_PER_HOST, CRAWL_TIMEOUT_SECONDS, CRAWL_BUDGET_SECONDS, CRAWL_MAX_URLS,
+    CRAWL_CACHE_PATH, CRAWL_CACHE_MAX_BYTES,
+)
+from parsers.crawler import CrawlOptions, crawl_urls, extract_hyperlinks
+
+CRAWL_OPTIONS = CrawlOptions(
+    max_connections=CRAWL_MAX_CONNECTIONS, per_host=CRAWL_PER_HOST, timeout=CRAWL_TIMEOUT_SECONDS,
+    budget_seconds=CRAWL_BUDGET_SECONDS, max_urls=CRAWL_MAX_URLS, cache_path=CRAWL_CACHE_PATH,
+    cache_max_bytes=CRAWL_CACHE_MAX_BYTES,
+)
 
 
 def crawl_url(url):
     """Crawl content from a URL."""
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        text = ' '.join(p.get_text() for p in soup.find_all('p'))
-        return text if text.strip() else "No content found on page."
-    except Exception as e:
-        return f"Web Crawling Error: {str(e)}"
-
-
-def extract_hyperlinks(text):
-    """Extract URLs from text."""
-    url_pattern = re.compile(r'https?://[^\s<>"]+|www\.[^\s<>"]+')
-    return url_pattern.findall(text)
+    return next(iter(crawl_urls([url], CRAWL_OPTIONS).values()))
 
 
 def process_file(file_path):
@@ -59,9 +54,8 @@ def process_file(file_path):
         text = parse_image(file_path)
 
     if text and "Error" not in text:
-        urls = extract_hyperlinks(text)
-        for url in urls:
-            crawled_text = crawl_url(url)
+        # All links at once, each distinct one fetched once (see parsers.crawler)
+        for url, crawled_text in crawl_urls(extract_hyperlinks(text), CRAWL_OPTIONS).items():
             text += f"\n\nContent from {url}:\n{crawled_text}"
 
     return text, df, filename
\ No newline at end of file
@@ -1,14 +1,14 @@
 from sentence_transformers import SentenceTransformer
-import faiss
 import numpy as np
 import pandas as pd
 import re
 from llama_index.core import Document
+from models.vector_store import VectorStore
 
 # Initialize Sentence Transformer and FAISS
 model = SentenceTransformer('all-MiniLM-L6-v2')
 dimension = 384
-faiss_index = faiss.IndexFlatL2(dimension)
+faiss_index = VectorStore(dimension)
 
 # Global storage
 documents = []
@@ -24,7 +24,7 @@ def index_documents(file_paths):
     documents = []
     embeddings = []
     dataframes = []
-    faiss_index = faiss.IndexFlatL2(dimension)
+    faiss_index = VectorStore(dimension)
 
     for file_path in file_paths:
         text, df, filename = process_file(file_path)
@@ -37,7 +37,8 @@ def index_documents(file_paths):
 
     if embeddings:
         embeddings = np.array(embeddings).astype('float32')
-        faiss_index.add(embeddings)
+        faiss_index.add_chunks(embeddings, [doc.text for doc in documents],
+                               [doc.metadata["filename"] for doc in documents])
 
 
 def answer_query(query):
@@ -73,9 +74,9 @@ def answer_query(query):
                     return f"Data Query Error: {str(e)}", []
 
     query_embedding = model.encode(query, convert_to_numpy=True).astype('float32')
-    D, I = faiss_index.search(np.array([query_embedding]), k=3)
+    ids, _ = faiss_index.search_ids(query_embedding, k=3)
 
-    relevant_docs = [(documents[i].text, documents[i].metadata["filename"]) for i in I[0] if i >= 0]
+    relevant_docs = [(documents[i].text, documents[i].metadata["filename"]) for i in ids]
     if not relevant_docs:
         return "Information not available in uploaded documents.", []
 